@@ -1,3 +1,4 @@
 from archyve.entry import Entry, EntryType
+from archyve.cache import EntryCache
 from archyve.archyve import Archyve
 from archyve import file_structure_functions
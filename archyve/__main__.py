@@ -0,0 +1,10 @@
+"""
+Lets archyve's command line be run as python -m archyve (see the cli module).
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.cli import main
+import sys
+
+
+sys.exit(main())
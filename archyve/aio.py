@@ -0,0 +1,93 @@
+"""
+Module contains the glue that lets blocking archyve work (walking, hashing, deleting) be driven from asyncio without
+blocking the event loop. The work runs on a thread and hands its results to the loop through a bounded queue, so a slow
+consumer holds the work back rather than letting results pile up, and a consumer that stops (or is cancelled) stops the
+work too.
+
+Author: ali.kellaway139@gmail.com
+"""
+from concurrent.futures import Executor, Future, TimeoutError
+from typing import AsyncGenerator, Callable, Final, Iterator, TypeVar
+from threading import Event
+import asyncio
+
+
+# How often (in seconds) a producer waiting for room in the queue checks whether the consumer has gone.
+_POLL: Final[float] = 0.1
+
+# Marks the end of the results.
+_DONE: Final[object] = object()
+
+T = TypeVar('T')
+
+
+class _Failed:
+    """
+    Carries an exception raised by the work over to the loop.
+    """
+    __slots__ = ('exception',)
+
+    def __init__(self, exception: BaseException):
+        self.exception: BaseException = exception
+
+
+def _produce(work: Callable[[], Iterator[T]], queue: asyncio.Queue, loop: asyncio.AbstractEventLoop,
+             stop: Event) -> None:
+    """
+    Runs blocking work on the current thread, putting its results into an asyncio queue.
+    :param work: Makes the iterator of results.
+    :param queue: The queue to put the results into.
+    :param loop: The loop the queue belongs to.
+    :param stop: Set when the consumer no longer wants results.
+    """
+    def put(item: object) -> bool:
+        # Wait for room in the queue, giving up if the consumer goes away.
+        future: Future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(_POLL)
+                return True
+            except TimeoutError:
+                if stop.is_set() or loop.is_closed():
+                    future.cancel()
+                    return False
+
+    iterator: Iterator[T] | None = None
+    try:
+        iterator = work()
+        for item in iterator:
+            if stop.is_set() or not put(item):
+                return
+        put(_DONE)
+    except BaseException as e:
+        put(_Failed(e))
+    finally:
+        close: Callable | None = getattr(iterator, 'close', None)
+        if close is not None:
+            close()  # Stops e.g. the pool of hashing workers behind a generator.
+
+
+async def aiterate(work: Callable[[], Iterator[T]], max_pending: int = 64,
+                   executor: Executor | None = None) -> AsyncGenerator[T, None]:
+    """
+    Iterates blocking work without blocking the event loop.
+    :param work: Makes the iterator of results (called on the worker thread, so it may block too).
+    :param max_pending: The number of results that may wait for the consumer before the work is paused.
+    :param executor: The executor to run the work on (the loop's default executor if None).
+    :return: An asynchronous generator of the results.
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(max_pending)
+    stop: Event = Event()
+    producer: asyncio.Future = loop.run_in_executor(executor, _produce, work, queue, loop, stop)
+    try:
+        while True:
+            item: object = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failed):
+                raise item.exception
+            yield item
+        await producer
+    finally:
+        stop.set()
@@ -4,11 +4,36 @@ hashing or finding duplicates.
 
 Author: ali.kellaway139@gmail.com
 """
-from archyve.file_structure_functions import sub_paths
-from typing import Generator, Iterable, Callable
+from archyve.file_structure_functions import scan, parallel_scan
+from typing import Any, AsyncGenerator, Generator, Iterable, Callable, Hashable, Sequence
 from archyve.entry import Entry, EntryType
-from itertools import chain
+from archyve.hashing import DEFAULT_ALGORITHM, file_digest, edge_digest, edge_digest_with_header
+from archyve.parallel import BACKENDS, ordered_starmap
+from archyve.metadata import capture_dates
+from archyve.media import MediaInfo, media_infos
+from archyve.similarity import ALGORITHMS, clusters, hash_bytes, hash_key, image_hash
+from archyve.sniff import HEADER_SIZE, TYPE_DETECTION, sniff_header, sniff_many
+from archyve.cache import EntryCache, Fingerprint
+from archyve.aio import aiterate
+from archyve.instrumentation import notify, observers
+from archyve.operations import GROUP_SIZE, Operation, Report, execute, flatten_plan
+from archyve.dedupe import STRATEGIES, deduplicate
+from archyve.stats import Summary, redundant_rows, summarize
+from archyve.watch import Change, DuplicateIndex, Snapshot, Watch
+from archyve.manifest import Manifest
+from archyve.external import external_duplicates
+from archyve.verify import Verification, verify_group
+from archyve.table import EntryTable
+from archyve.index import QUERY_KINDS, SUBSTRING, PathIndex, matches
+from archyve.query import EXTENSION, PATH, SIZE, TYPE, Predicate, Query
+from datetime import datetime
+from time import perf_counter
+from itertools import chain, islice
+from collections import deque
+from array import array
+from os import DirEntry
 from pathlib import Path
+import os
 
 
 class Archyve:
@@ -19,13 +44,37 @@ class Archyve:
     archyve to its original state you can use the reset method, however, this will remove all filters. It is therefore
     best practice to do all the set-up before iterating over the archyve.
 
-    NB: If you run into recursion errors you may need to use sys.setrecursionlimit()
+    Type filters (images, videos...) and where() don't need entries to be made: until the archyve is iterated they are
+    collected into a query that is pushed down into the walk (see the query module), so files that don't match are
+    turned away as they are listed. Adding two such archyves together walks both of their directories only once.
     """
 
-    def __init__(self, *directory: Path | str):
+    def __init__(self, *directory: Path | str, cache: EntryCache | Path | str | None = None, workers: int = 1,
+                 backend: str = 'thread', include: Sequence[str] = (), exclude: Sequence[str] = (),
+                 max_depth: int | None = None, walk_workers: int = 1, ordered: bool = True, materialize: bool = False,
+                 type_detection: str = 'extension'):
         """
         Initializes a new Archyve object.
         :param directory: The directory(s) that you want to many with this archyve object.
+        :param cache: A persistent cache (or the location of one) to store digests and capture dates in between runs.
+                      Entries that have not changed since they were cached will not be read again.
+        :param workers: The number of files to hash at once (1 hashes them one at a time on the calling thread).
+        :param backend: Whether to hash on a pool of 'thread's (best for I/O bound hashing) or 'process'es (best when
+                        hashing is CPU bound).
+        :param include: Glob patterns a file must match (any of) to be managed by the archyve.
+        :param exclude: Glob patterns for files and directories the archyve should skip over.
+        :param max_depth: How many levels of sub-folders to look in (0 is only the directories' own files).
+        :param walk_workers: The number of directories to list at once. With more than one, all the directories (and
+                             the folders inside them) are walked on a pool of threads, which pays off when they are on
+                             different disks or network mounts.
+        :param ordered: Whether a parallel walk should give the entries in the same order as a serial walk (at the
+                        cost of some waiting), or as soon as their folder has been listed.
+        :param materialize: Whether to walk the directories once into an EntryTable (the first time the entries are
+                            needed) rather than using a one-shot generator. A materialized archyve can be iterated,
+                            filtered and measured any number of times without walking again (see materialize()).
+        :param type_detection: How the images, videos, audios, texts and unknowns filters decide what type a file is:
+                               by its 'extension' (the default; nothing is read), or by its 'content' (the first few
+                               bytes of each file are read once, on the pool of workers, see the sniff module).
         """
         # Store the paths that will be managed by this archyve.
         self.paths: list[Path] = [Path(d) for d in directory]
@@ -39,23 +88,113 @@ class Archyve:
         # A space to keep a reference to the generator this Archyve will use
         self._entries: Generator[Entry] | None = None
 
+        # The number of bytes read by each stage of the last duplicate search.
+        self.bytes_read: dict[str, int] = {}
+
+        # The persistent cache entries will use (if any).
+        self.cache: EntryCache | None = cache if cache is None or isinstance(cache, EntryCache) else EntryCache(cache)
+
+        # How hashing is spread over workers.
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend \"{backend}\", choose from: {list(BACKENDS)}')
+        self.workers: int = workers
+        self.backend: str = backend
+
+        # Which parts of the directories are walked (applied while walking, so skipped directories are never listed).
+        self.include: tuple[str, ...] = tuple(include)
+        self.exclude: tuple[str, ...] = tuple(exclude)
+        self.max_depth: int | None = max_depth
+
+        # How the directories are walked.
+        self.walk_workers: int = walk_workers
+        self.ordered: bool = ordered
+
+        # The table the archyve is a view of when it is materialized, and which of its rows are in view (None is all).
+        self._materialize: bool = materialize
+        self._table: EntryTable | None = None
+        self._rows: Sequence[int] | None = None
+        self._index: PathIndex | None = None  # An index of the table's paths, built by the first search
+
+        # The filters to push down into the walk, collected until the entries are first needed (None is no filter).
+        self._query: Query | None = None
+
+        # How the type filters decide what type a file is.
+        if type_detection not in TYPE_DETECTION:
+            raise ValueError(f'Unknown type detection \"{type_detection}\", choose from: {list(TYPE_DETECTION)}')
+        self.type_detection: str = type_detection
+
     def archyve_from_generator(self, *generator: Generator[Entry, None, None]) -> 'Archyve':
-        self.__init__(*list({sub_p.path.parent for p in generator for sub_p in p}))
+        self.__init__(*list({sub_p.path.parent for p in generator for sub_p in p}), cache=self.cache,
+                      workers=self.workers, backend=self.backend, include=self.include, exclude=self.exclude,
+                      max_depth=self.max_depth, walk_workers=self.walk_workers, ordered=self.ordered,
+                      type_detection=self.type_detection)
         return self
 
     def entry_file_paths(self) -> Generator[Path, None, None]:
         """
         :return: Generator containing all files (regardless of depth) within all the folders within self.path.
         """
-        return (sp for path in self.paths for sp in sub_paths(path))
+        return (Path(e.path) for e in self.__walk())
+
+    def __walk(self, pushdown: bool = True) -> Iterable[DirEntry]:
+        """
+        :param pushdown: Whether to only give the files the archyve's query accepts.
+        :return: The files in the archyve's directories, as found by a serial or parallel walk.
+        """
+        accept: Callable[[DirEntry], bool] | None = self._query.accepts if pushdown and self._query else None
+        if self.walk_workers > 1:
+            return parallel_scan(self.paths, self.include, self.exclude, self.max_depth, self.walk_workers,
+                                 self.ordered, accept=accept)
+        return scan(self.paths, self.include, self.exclude, self.max_depth, accept)
+
+    def materialize(self) -> 'Archyve':
+        """
+        Walks the archyve's directories once into an EntryTable. From then on the archyve (and any archyve filtered
+        from it) is a view of the table: it can be iterated any number of times, its length is known without a walk,
+        and type filters and searches work on the table's columns without creating entries.
+        :return: This archyve.
+        """
+        self._materialize = True
+        self.__view()
+        return self
+
+    def __view(self) -> tuple[EntryTable, Sequence[int]] | None:
+        """
+        :return: The table and the rows in view, if the archyve is materialized (walking into the table if needed) and
+                 its entries have not been replaced by a generator.
+        """
+        if not self._materialize or self._entries is not None:
+            return None
+        if self._table is None:
+            # The whole walk is kept, so that the archyve can be reset; filters are applied to the table instead.
+            self._table = EntryTable.from_walk(self.__walk(pushdown=False), self.cache)
+        if self._rows is None:
+            rows: range = range(len(self._table))
+            self._rows = self._query.rows(self._table, rows) if self._query else rows
+        return self._table, self._rows
+
+    def __with_rows(self, rows: Sequence[int], inplace: bool) -> 'Archyve':
+        """
+        :param rows: The rows of the table that should be in view.
+        :param inplace: Whether to change this archyve or return a new one.
+        :return: An archyve viewing the given rows of this archyve's table.
+        """
+        archyve: Archyve = self if inplace else self.__like(*self.paths)
+        archyve._materialize, archyve._table, archyve._rows = True, self._table, rows
+        archyve._index = self._index
+        return archyve
 
     @property
     def entries(self) -> Generator[Entry, None, None]:
         """
-        :return: Generator of Entry objects for all files under the Archyve's management.
+        :return: Generator of Entry objects for all files under the Archyve's management (a new generator each time if
+                 the archyve is materialized).
         """
-        if not self._entries:
-            self._entries = (Entry(p) for p in self.entry_file_paths())
+        if view := self.__view():
+            return view[0].entries(view[1])
+
+        if self._entries is None:
+            self._entries = (Entry(e, cache=self.cache) for e in self.__walk())
 
         return self._entries
 
@@ -67,52 +206,542 @@ class Archyve:
         """
         self._entries = new_generator
 
-    def duplicates(self) -> list[list[Entry]]:
+    def duplicates(self, block_size: int = 4096, verify: bool = False) -> list[list[Entry]]:
+        """
+        Returns lists of entries that share the same contents. The search is done in stages so that as little of the
+        archyve is read as possible: entries are first grouped by size (no reads), then groups of the same size are
+        split by a hash of the first and last block_size bytes of each file, and only groups that still collide are
+        compared by their full digests. Groups whose digests are all in the archyve's cache skip straight to the last
+        stage without reading anything. The number of bytes read by each stage is stored in self.bytes_read.
+        :param block_size: The number of bytes read from each end of a file during the partial hashing stage.
+        :param verify: Whether to compare the files in each group byte by byte too (see the verify module), rather than
+                       trust their digests; groups are split wherever their files differ.
+        :return: A list of lists of entries, where the entries in each list have the same contents.
+        """
+        return list(self.iter_duplicates(block_size, verify=verify))
+
+    def iter_duplicates(self, block_size: int = 4096, memory_budget: int | None = None,
+                        spill_directory: Path | str | None = None,
+                        verify: bool = False) -> Generator[list[Entry], None, None]:
+        """
+        Searches for duplicates as duplicates() does, but yields each group as soon as it is confirmed rather than
+        once the whole search is over: groups that don't need a full hash come as soon as the partial stage is done,
+        the rest as soon as the last of their members has been hashed. The groups come in the same order as from
+        duplicates(). Closing the generator early stops any hashing still in flight.
+
+        For archives with too many files to hold an entry for each in memory, give a memory budget: each stage's
+        records are then sorted on disk and merged back (see the external module) rather than grouped in memory, and
+        entries are only made for the files in each group as it is yielded. The groups come in size order instead, and
+        the archyve's cache isn't used (it is held in memory).
+        :param block_size: The number of bytes read from each end of a file during the partial hashing stage.
+        :param memory_budget: The most memory the search's records may take, in bytes (None to search in memory).
+        :param spill_directory: Where to write the sorted runs of an out-of-core search (defaults to the system's
+                                temporary directory).
+        :param verify: Whether to compare the files in each group byte by byte on the archyve's workers before it is
+                       yielded (see the verify module), splitting groups wherever their files differ. The bytes read
+                       are stored in self.bytes_read['verify'].
+        :return: A generator of lists of entries, where the entries in each list have the same contents.
+        """
+        self.bytes_read = {'size': 0, 'partial': 0, 'full': 0}
+        if verify:
+            groups: Generator[list[Entry], None, None] = self.iter_duplicates(block_size, memory_budget,
+                                                                              spill_directory)
+            try:
+                yield from self.__verified(groups)
+            finally:
+                groups.close()
+            return
+        if memory_budget is not None:
+            yield from self.__external_duplicates(block_size, memory_budget, spill_directory)
+            return
+
+        # Files with a unique size cannot have a duplicate.
+        start: float = perf_counter()
+        if observers:
+            notify('stage_started', 'size', 0, 0)
+        size_groups: list[list[Entry]] = Archyve.__group(self.entries, lambda e: e.size)
+        if observers:
+            notify('stage_finished', 'size', perf_counter() - start)
+
+        try:
+            # Split the groups on the ends of each file. Empty files are all the same, so don't need reading, and
+            # groups that were fully hashed on a previous run can skip straight to their digests.
+            hashed: list[bool] = [all(e.cached_digest() is not None for e in group) for group in size_groups]
+            edge_entries: list[Entry] = [e for group, done in zip(size_groups, hashed) if group[0].size and not done
+                                         for e in group]
+            self.__digest_all(edge_entries, block_size)
+            partial_groups: list[list[Entry]] = []
+            for group, done in zip(size_groups, hashed):
+                if group[0].size == 0:
+                    partial_groups.append(group)
+                elif done:
+                    partial_groups.extend(Archyve.__group(group, lambda e: e.digest()))
+                else:
+                    partial_groups.extend(Archyve.__group(group, lambda e: e.edge_digest(block_size)))
+
+            # Anything that could not be read in full by the partial stage needs a full hash to be sure. The entries
+            # are hashed in group order, so each group can be split as soon as its last member is done.
+            full_entries: list[Entry] = [e for group in partial_groups if group[0].size > 2 * block_size
+                                         for e in group]
+            digested: Generator[Entry, None, None] = self.__digested(full_entries)
+            try:
+                for group in partial_groups:
+                    if group[0].size <= 2 * block_size:
+                        yield group
+                    else:
+                        for _ in islice(digested, len(group)):
+                            pass
+                        yield from Archyve.__group(group, lambda e: e.digest())
+            finally:
+                digested.close()
+        finally:
+            if self.cache is not None:
+                self.cache.flush()
+
+    def __external_duplicates(self, block_size: int, memory_budget: int,
+                              spill_directory: Path | str | None) -> Generator[list[Entry], None, None]:
+        """
+        :param block_size: The number of bytes read from each end of a file during the partial hashing stage.
+        :param memory_budget: The most memory the search's records may take, in bytes.
+        :param spill_directory: Where to write the sorted runs.
+        :return: A generator of groups of duplicates, found out-of-core (see iter_duplicates).
+        """
+        if view := self.__view():
+            table, rows = view
+            files: Iterable[tuple[str, int]] = ((table.path(r), table.sizes[r]) for r in rows)
+        elif self._entries is None:  # No entries need making just to be searched.
+            files = ((f.path, f.stat().st_size) for f in self.__walk())
+        else:
+            files = ((os.fspath(e), e.size) for e in self.entries)
+        for group in external_duplicates(files, block_size, memory_budget, spill_directory, self.workers,
+                                         self.backend, bytes_read=self.bytes_read):
+            yield [Entry(path, cache=self.cache, memo={DEFAULT_ALGORITHM: digest} if size else None)
+                   for size, digest, path in group]
+
+    def __verified(self, groups: Iterable[list[Entry]]) -> Generator[list[Entry], None, None]:
         """
-        Returns a list of the paths of files that share the same md5 hash.
-        :param paths: An iterable of paths in which to search for duplicates; defaults to all paths managed by the
-                      archyve. You can filter the search space by inputting any series of paths or generators you like.
-        :return: A dictionary mapping hashes to paths found in any of the parent directories or subdirectories that have
-                 that hash.
+        :param groups: Groups of entries that share a digest.
+        :return: A generator of the groups of entries whose files are identical byte by byte, verified on the archyve's
+                 pool of workers (files that can no longer be read are left out).
         """
-        hashes_to_entries: dict[int, list[Entry]] = {}
-        for entry in self.entries:
-            f_hash: int = hash(entry)
-            duplicates: list[Path] | None = hashes_to_entries.get(f_hash)
-            if duplicates:
-                hashes_to_entries[f_hash].append(entry)
-            else:
-                hashes_to_entries[f_hash] = [entry]
+        pending: deque[list[Entry]] = deque()
+
+        def arguments() -> Generator[tuple, None, None]:
+            for group in groups:
+                pending.append(group)
+                yield [os.fspath(e) for e in group],
+
+        verified: int = 0
+        try:
+            for verification in ordered_starmap(verify_group, arguments(), self.workers, self.backend):
+                entries: dict[str, Entry] = {os.fspath(e): e for e in pending.popleft()}
+                verified += verification.bytes_read
+                self.bytes_read['verify'] = verified
+                yield from ([entries[p] for p in group] for group in verification.groups)
+        finally:  # The search sets self.bytes_read once it starts, so the total is only kept here.
+            self.bytes_read['verify'] = verified
+
+    def __digest_all(self, entries: list[Entry], block_size: int | None = None) -> None:
+        """
+        Makes sure every entry knows its digest, hashing the ones that don't on the archyve's pool of workers.
+        :param entries: The entries to hash.
+        :param block_size: The block size to make edge digests with, or None to make full digests.
+        """
+        for _ in self.__digested(entries, block_size):
+            pass
+
+    def __digested(self, entries: list[Entry], block_size: int | None = None) -> Generator[Entry, None, None]:
+        """
+        Yields the entries in order as soon as each knows its digest, hashing the ones that don't on the archyve's pool
+        of workers. Only a bounded number of files are hashed ahead of the entry being yielded. The bytes read are
+        added to self.bytes_read.
+        :param entries: The entries to hash.
+        :param block_size: The block size to make edge digests with, or None to make full digests.
+        :return: A generator of the entries.
+        """
+        stage: str = 'full' if block_size is None else 'partial'
+        missing: list[Entry] = [e for e in entries if e.cached_digest(block_size=block_size) is None]
+        if block_size is None:
+            arguments = ((os.fspath(e), DEFAULT_ALGORITHM) for e in missing)
+            digests = ordered_starmap(file_digest, arguments, self.workers, self.backend)
+        elif self.type_detection == 'content':
+            # The start of each file is read anyway, so classify it at the same time.
+            arguments = ((os.fspath(e), e.size, block_size, DEFAULT_ALGORITHM, HEADER_SIZE) for e in missing)
+            digests = ordered_starmap(edge_digest_with_header, arguments, self.workers, self.backend)
+        else:
+            arguments = ((os.fspath(e), e.size, block_size, DEFAULT_ALGORITHM) for e in missing)
+            digests = ordered_starmap(edge_digest, arguments, self.workers, self.backend)
+
+        start: float = perf_counter()
+        if observers:
+            notify('stage_started', stage, len(missing),
+                   sum(e.size if block_size is None else min(e.size, 2 * block_size) for e in missing))
+
+        unknown: set[int] = {id(e) for e in missing}
+        yielded: int = 0
+        try:
+            for entry in entries:
+                if id(entry) in unknown:
+                    digest: bytes | tuple[bytes, bytes] = next(digests)
+                    if isinstance(digest, tuple):
+                        digest, header = digest
+                        if entry.cached_content_type() is None:
+                            entry.add_content_type(sniff_header(header))
+                    entry.add_digest(digest, block_size=block_size)
+                    if block_size is not None and entry.size <= 2 * block_size:
+                        entry.add_digest(digest)  # The whole file was hashed, so this is its full digest too.
+                    read: int = entry.size if block_size is None else min(entry.size, 2 * block_size)
+                    self.bytes_read[stage] += read
+                    if observers:
+                        notify('hashed', os.fspath(entry), read)
+                yielded += 1
+                yield entry
+        finally:  # Stop hashing files nobody is waiting for.
+            digests.close()
+            if observers and yielded == len(entries):  # The last entry may be taken without asking for more.
+                notify('stage_finished', stage, perf_counter() - start)
+
+    def deduplicate(self, strategy: str = 'hardlink', keep: str | Callable[[Entry], Any] = 'created',
+                    dry_run: bool = False, block_size: int = 4096,
+                    on_copy: Callable[[str, str, int, int, Exception | None], None] | None = None) -> Report:
+        """
+        Reclaims the space taken by duplicates, keeping one original in each group of duplicates and replacing every
+        other copy with a hard link or a copy-on-write reflink to it, so that every path still works (or deleting the
+        copies). Each group is verified byte by byte first, comparing all of its files together (see the verify
+        module), so a digest collision can never lose data. See the dedupe module.
+        :param strategy: 'hardlink', 'reflink' or 'delete'.
+        :param keep: Chooses the original: the entry with the smallest value of this attribute (e.g. 'created' keeps
+                     the oldest, 'path' the first alphabetically), or of this function of the entry.
+        :param dry_run: Whether to only compare the copies with their originals (nothing is changed).
+        :param block_size: The number of bytes read from each end of a file during the partial hashing stage.
+        :param on_copy: Called with the original, the copy, its size, the bytes reclaimed and the error (None on
+                        success) of each copy, as soon as its group is done (see dedupe.deduplicate).
+        :return: A report of the number of copies replaced, the bytes reclaimed and the copies that couldn't be.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown strategy \"{strategy}\", choose from: {list(STRATEGIES)}')
+        key: Callable[[Entry], Any] = keep if callable(keep) else lambda e: getattr(e, keep)
+
+        def originals_first(group: list[Entry]) -> list[Entry]:
+            original: Entry = min(group, key=key)
+            return [original] + [e for e in group if e is not original]
+
+        return deduplicate((originals_first(g) for g in self.iter_duplicates(block_size)), strategy, self.workers,
+                           dry_run, on_copy)
+
+    def summarize(self, by: str | Sequence[str] = 'type', depth: int | None = None, duplicates: bool = False,
+                  block_size: int = 4096) -> Summary:
+        """
+        Totals the number and size of the archyve's files in groups, e.g. by=('type', 'year') gives the bytes of each
+        type of file modified in each year. The files' stats are gathered into the columns of an EntryTable as they are
+        walked (a materialized archyve already has them), and every group by is done on the columns (see the stats
+        module). Nothing is read unless duplicates are wanted or types are detected by content.
+        :param by: The key(s) to group the files on: 'type', 'extension', 'directory', 'year', 'month' and/or 'day'.
+        :param depth: How many levels below the archyve's directories to name a directory by (e.g. 1 totals each
+                      top level folder); the whole path of each file's folder if None.
+        :param duplicates: Whether to search for duplicates too, and total the redundant copies in each group and the
+                           bytes they waste.
+        :param block_size: The number of bytes read from each end of a file during the partial hashing stage.
+        :return: The summary.
+        """
+        if view := self.__view():
+            table, rows = view
+        else:
+            table: EntryTable = EntryTable(self.cache)
+            for entry in self.entries:
+                table.append(os.fspath(entry), entry.stat)
+            rows = range(len(table))
+
+        content: bool = self.type_detection == 'content' and 'type' in ((by,) if isinstance(by, str) else by)
+        if content:
+            table.sniff(rows, self.workers, self.backend)
+        redundant: set[int] | None = None
+        if duplicates:
+            searched: Archyve = self.__like(*self.paths)
+            searched._materialize, searched._table, searched._rows = True, table, rows
+            redundant = redundant_rows(table, rows, searched.iter_duplicates(block_size))
+            self.bytes_read = searched.bytes_read
+        return summarize(table, rows, by, self.__roots(), depth, content, redundant)
+
+    async def aentries(self, max_pending: int = 256) -> AsyncGenerator[Entry, None]:
+        """
+        The entries of the archyve, walked on a thread so that the event loop isn't blocked.
+        :param max_pending: The number of entries that may wait to be consumed before the walk is paused.
+        :return: An asynchronous generator of the entries.
+        """
+        async for entry in aiterate(lambda: iter(self.entries), max_pending):
+            yield entry
+
+    async def aiter_duplicates(self, block_size: int = 4096) -> AsyncGenerator[list[Entry], None]:
+        """
+        Searches for duplicates (see iter_duplicates) on a thread, so that the event loop isn't blocked. Each group is
+        yielded as soon as it is confirmed. Cancelling the consumer stops the search, including any hashing in flight.
+        :param block_size: The number of bytes read from each end of a file during the partial hashing stage.
+        :return: An asynchronous generator of lists of entries, where the entries in each list have the same contents.
+        """
+        async for group in aiterate(lambda: self.iter_duplicates(block_size), max_pending=16):
+            yield group
+
+    async def aduplicates(self, block_size: int = 4096) -> list[list[Entry]]:
+        """
+        Returns what duplicates() does, without blocking the event loop.
+        :param block_size: The number of bytes read from each end of a file during the partial hashing stage.
+        :return: A list of lists of entries, where the entries in each list have the same contents.
+        """
+        return [group async for group in self.aiter_duplicates(block_size)]
 
-        return [entries for entries in hashes_to_entries.values() if len(entries) > 1]
+    def similar_images(self, threshold: int = 6, algorithm: str = 'phash') -> list[list[Entry]]:
+        """
+        Returns groups of images that look alike: resized, re-encoded or metadata stripped copies of the same picture
+        as well as byte for byte duplicates. The images are hashed on the archyve's pool of workers (hashes already in
+        the archyve's cache are not computed again), then put in a BK-tree, so each image is only compared with the
+        few whose hashes could be close to its own rather than with every other image.
+        :param threshold: The largest number of bits (of 64) the hashes of two images may differ by for them to be
+                          grouped. 0 only groups identical hashes; above about 10 unrelated images start to match.
+        :param algorithm: The perceptual hash to use: 'ahash', 'dhash' or 'phash' (see the similarity module).
+        :return: A list of lists of entries, where the entries in each list look alike.
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f'Unknown image hash \"{algorithm}\", choose from: {list(ALGORITHMS)}')
+        key: str = hash_key(algorithm)
+        images: list[Entry] = [e for e in self.entries if self.__type_of(e) == EntryType.IMAGE]
+        missing: list[Entry] = [e for e in images if e.cached_digest(key) is None]
+        arguments = ((os.fspath(e), algorithm) for e in missing)
+        for entry, value in zip(missing, ordered_starmap(image_hash, arguments, self.workers, self.backend)):
+            entry.add_digest(hash_bytes(value), key)
+
+        if self.cache is not None:
+            self.cache.flush()
+        return clusters(((e, e.image_hash(algorithm)) for e in images), threshold)
+
+    def rescan(self, snapshot: Path | str) -> list[Change]:
+        """
+        Finds what has changed in the archyve's directories since the snapshot saved at the given location (by an
+        earlier rescan or watch), by comparing the size, modification time and inode of every file; nothing is read.
+        The location is then updated to a snapshot of the directories as they are now.
+        :param snapshot: Where the snapshot is kept.
+        :return: The files that were added, removed or modified (in path order).
+        """
+        current: Snapshot = Snapshot.take(self.__walk())
+        changes: list[Change] = Snapshot.load(snapshot).diff(current)
+        current.save(snapshot)
+        return changes
+
+    def watch(self, snapshot: Path | str | None = None, interval: float = 1.0, inotify: bool = True) -> Watch:
+        """
+        Starts watching the archyve's directories. Duplicates are searched for once now, then each batch of changes
+        that the returned watch yields updates its groups (see Watch.duplicates); only the files that changed, and those
+        that gained a file of the same size, are hashed. Use rescan before watching to find out what changed while
+        nothing was watching.
+        :param snapshot: Where to keep a snapshot of the directories saved, for the next rescan (if anywhere).
+        :param interval: How many seconds to wait between looks when inotify isn't available.
+        :param inotify: Whether to use inotify when it is available (otherwise the directories are polled).
+        :return: The watch, which should be closed when it is finished with.
+        """
+        current: Snapshot = Snapshot()
+        if view := self.__view():
+            table, rows = view
+            current.update((table.path(r), Fingerprint(table.sizes[r], table.mtimes[r], table.inodes[r])) for r in rows)
+        else:
+            self.entries = Archyve.__recorded(self.entries, current)
+        groups: list[list[Entry]] = self.duplicates()
+
+        index: DuplicateIndex = DuplicateIndex(self.cache, self.workers, self.backend)
+        index.seed(current, (e for group in groups for e in group))
+        if snapshot is not None:
+            current.save(snapshot)
+        return Watch(self.paths, current, index, self.include, self.exclude, self.max_depth, interval, inotify,
+                     location=snapshot)
+
+    def manifest(self, location: Path | str | None = None) -> Manifest:
+        """
+        Makes a manifest of the archyve: the digest of every file rolled up into a hash of every directory (see the
+        manifest module), with paths relative to the archyve's directory (or to the directory its directories share).
+        If a location is given, the manifest saved there (if any) is updated: only files whose size, modification time
+        or inode has changed since are hashed, and the new manifest is saved in its place.
+        :param location: Where a manifest of the archyve is kept.
+        :return: The manifest.
+        """
+        previous: Manifest | None = Manifest.load(location) if location is not None and os.path.exists(location) \
+            else None
+        roots: list[str] = self.__roots()  # Resolved, as the paths of the entries are
+        root: str = roots[0] if len(roots) == 1 else os.path.commonpath(roots)
+        manifest: Manifest = Manifest.build(root, self.entries, previous, self.workers, self.backend)
+        if self.cache is not None:
+            self.cache.flush()
+        if location is not None:
+            manifest.save(location)
+        return manifest
+
+    def diff(self, other: 'Manifest | Archyve | Path | str', location: Path | str | None = None) -> list[Change]:
+        """
+        Compares the archyve with another copy of it (e.g. a mirror), only looking inside the directories whose hashes
+        differ. Files are compared by their size and digest.
+        :param other: A manifest of the other copy, where one is saved, or an archyve of the other copy.
+        :param location: Where a manifest of this archyve is kept, so only its changed files are hashed (see manifest).
+        :return: The files that would have to be added, removed or modified to turn this archyve into the other copy
+                 (relative to the archyves' directories, in path order).
+        """
+        if isinstance(other, Archyve):
+            other = other.manifest()
+        elif not isinstance(other, Manifest):
+            other = Manifest.load(other)
+        return self.manifest(location).diff(other)
 
     @staticmethod
-    def delete(*path: Path | str | Entry | Iterable[Path | str | Entry]) -> dict[Path, Exception] | None:
+    def __recorded(entries: Iterable[Entry], snapshot: Snapshot) -> Generator[Entry, None, None]:
+        """
+        :param entries: Entries to pass through.
+        :param snapshot: The snapshot to record the fingerprint of each entry in as it passes.
+        :return: A generator of the entries.
+        """
+        for entry in entries:
+            snapshot[os.fspath(entry)] = Fingerprint.of(entry.stat)
+            yield entry
+
+    def capture_dates(self, entries: Iterable[Entry] | None = None) -> list[datetime | None]:
+        """
+        Finds when each image was taken (and each video and audio file recorded), reading the headers of the ones whose
+        capture dates aren't already known on the archyve's pool of workers. Every entry remembers its capture date
+        afterwards, so sorting by Entry.created doesn't read the files again.
+        :param entries: The entries to date (defaults to every entry in the archyve).
+        :return: The capture date of each entry, in order (None for entries that aren't images, videos or audio files,
+                 or don't have one).
+        """
+        entries: list[Entry] = list(self.entries if entries is None else entries)
+        self.__read_media(e for e in entries if e.entry_type in (EntryType.VIDEO, EntryType.AUDIO))
+        missing: list[Entry] = [e for e in entries if not e.cached_capture_date()[0]]
+        for entry, capture_date in zip(missing, capture_dates((os.fspath(e) for e in missing), self.workers,
+                                                              self.backend)):
+            entry.add_capture_date(capture_date)
+        if self.cache is not None:
+            self.cache.flush()
+        return [e.capture_date for e in entries]
+
+    def media(self, entries: Iterable[Entry] | None = None) -> list[MediaInfo | None]:
+        """
+        Finds when each video and audio file was recorded, how long it is and how big its picture is, reading the
+        headers of the ones whose metadata isn't already known on the archyve's pool of workers. Every entry remembers
+        its metadata afterwards.
+        :param entries: The entries to read (defaults to every entry in the archyve).
+        :return: The metadata of each entry, in order (None for entries that aren't videos or audio files).
+        """
+        entries: list[Entry] = list(self.entries if entries is None else entries)
+        self.__read_media(entries)
+        if self.cache is not None:
+            self.cache.flush()
+        return [e.media for e in entries]
+
+    def __read_media(self, entries: Iterable[Entry]) -> None:
+        """
+        Reads the headers of the video and audio files whose metadata isn't already known, on the pool of workers.
+        :param entries: The entries to read.
+        """
+        missing: list[Entry] = [e for e in entries if not e.cached_media()[0]]
+        for entry, info in zip(missing, media_infos((os.fspath(e) for e in missing), self.workers, self.backend)):
+            entry.add_media(info)
+
+    @staticmethod
+    def __group(entries: Iterable[Entry], key: Callable[[Entry], Hashable]) -> list[list[Entry]]:
+        """
+        Groups entries on the given key, dropping any group with only one member.
+        :param entries: The entries to group.
+        :param key: The function that produces the value to group the entries on.
+        :return: A list of the groups of entries that share a key (in the order each key was first seen).
+        """
+        groups: dict[Hashable, list[Entry]] = {}
+        for entry in entries:
+            groups.setdefault(key(entry), []).append(entry)
+        return [group for group in groups.values() if len(group) > 1]
+
+    @staticmethod
+    def delete(*path: Path | str | Entry | Iterable[Path | str | Entry], workers: int = 1,
+               original: Path | str | Entry | None = None) -> dict[Path, Exception] | None:
         """
         Removes files given their paths.
         :param path: The path or list of paths to remove.
+        :param workers: The number of folders removed from at once (see operations.execute).
+        :param original: A file the paths are copies of. If given, only the paths verified byte by byte to be identical
+                         to it (see the verify module) are removed, and never the original itself.
         :return: A dictionary of the path mapped to the reason why it could not be removed.
         """
-        # Make space for failures we might encounter
         failed: dict[Path, Exception] = {}
+        for batch_failed in Archyve.__deletions(path, workers, original):
+            failed.update(batch_failed)
+        return failed or None
 
-        # Attempt to delete all the files
-        for entry in Archyve.create_entries(path):
-            result: Exception | None = entry.delete()
-            if result:
-                failed[entry.path] = result
+    @staticmethod
+    def __deletions(path: Iterable[Path | str | Entry], workers: int, original: Path | str | Entry | None,
+                    batch_size: int | None = None) -> Generator[dict[Path, Exception], None, None]:
+        """
+        Removes files as delete() does, a batch at a time.
+        :param path: The paths to remove.
+        :param workers: The number of folders removed from at once (see operations.execute).
+        :param original: A file the paths must be verified to be copies of (None to remove them unverified).
+        :param batch_size: The number of files removed before the next batch is asked for (all of them if None).
+        :return: A generator of the paths that couldn't be removed (mapped to why), for the verification and then for
+                 each batch.
+        """
+        paths: list[str] = [os.fspath(e) for e in Archyve.create_entries(path)]
+        if original is not None:
+            original: str = os.fspath(original)
+            verification: Verification = verify_group([original] + paths)
+            same: set[str] = next((set(g) for g in verification.groups if g[0] == original), set())
+            failed: dict[Path, Exception] = {}
+            for p in paths:
+                if os.path.realpath(p) == os.path.realpath(original):
+                    failed[Path(p)] = ValueError(f'\"{p}\" is the original')
+                elif p not in same:
+                    failed[Path(p)] = verification.failed.get(original) or verification.failed.get(p) or \
+                        ValueError(f'\"{p}\" is not identical to \"{original}\"')
+            paths = [p for p in paths if Path(p) not in failed]
+            yield failed
+        batch_size = batch_size or max(1, len(paths))
+        for start in range(0, len(paths), batch_size):
+            report: Report = execute([Operation.delete(p) for p in paths[start:start + batch_size]], workers)
+            yield {Path(p): e for p, e in report.failed.items()}
 
-        return failed if failed else None
+    def flatten(self, destination: Path | str, dry_run: bool = False, journal: Path | str | None = None) -> Report:
+        """
+        Moves every entry of the archyve into one folder (which is made if need be), on the archyve's workers. Name
+        clashes are resolved by numbering, e.g. 'photo (1).jpg', and entries already in the folder stay put.
+        :param destination: The folder to move the entries into.
+        :param dry_run: Whether to only check that every move would succeed.
+        :param journal: Where to record the moves so that an interrupted run can be resumed or rolled back (see
+                        operations.resume and operations.rollback).
+        :return: A report of what was moved, how quickly, and what couldn't be.
+        """
+        plan: list[Operation] = flatten_plan(self.entries, destination)
+        return execute(plan, self.workers, dry_run, journal)
 
     @staticmethod
-    def create_entries(*path: Path | str | Entry | Iterable[Path | str | Entry]) -> Generator[Entry, None, None]:
+    async def adelete(*path: Path | str | Entry | Iterable[Path | str | Entry], workers: int = 1,
+                      original: Path | str | Entry | None = None) -> dict[Path, Exception] | None:
+        """
+        Removes files as delete() does (verifying them against an original first, if one is given), on a thread so
+        that the event loop isn't blocked. Cancelling stops the deletion between batches of files (the files already
+        removed stay removed).
+        :param path: The path or list of paths to remove.
+        :param workers: The number of folders removed from at once (see operations.execute).
+        :param original: A file the paths are copies of (see delete).
+        :return: A dictionary of the path mapped to the reason why it could not be removed.
+        """
+        failed: dict[Path, Exception] = {}
+        batch_size: int = GROUP_SIZE * max(1, workers)
+        async for batch_failed in aiterate(lambda: Archyve.__deletions(path, workers, original, batch_size)):
+            failed.update(batch_failed)
+        return failed or None
+
+    @staticmethod
+    def create_entries(*path: Path | str | Entry | DirEntry | Iterable[Path | str | Entry | DirEntry]
+                       ) -> Generator[Entry, None, None]:
         """
         Returns a generator of entries given an unpacked/packed Iterable of Path/str/Entry objects.
         :param path: The path/str/Entry (s) or Iterable of path/str/Entry (s) to return in the Entry Generator output.
         :return: A generator of entries.
         """
         for p in path:
-            if isinstance(p, Path | str | Entry):
+            if isinstance(p, Path | str | Entry | DirEntry):
                 yield Entry(p)
             elif isinstance(p, Iterable):
                 for entry in p:
@@ -132,49 +761,155 @@ class Archyve:
         entry_type: list[EntryType] = [EntryType(e) if isinstance(e, str) else e for e in entry_type]
         return (e for e in filter(lambda e: e.entry_type in entry_type, generator))
 
+    def __filter_type(self, entry_type: EntryType) -> 'Archyve':
+        """
+        :param entry_type: The type of entry to keep.
+        :return: Self where entries are filtered to the given type (using the type column when materialized).
+        """
+        content: bool = self.type_detection == 'content'
+        if view := self.__view():
+            table, rows = view
+            if content:
+                table.sniff(rows, self.workers, self.backend)
+            return self.__with_rows(table.rows_of_type(rows, entry_type, content=content), inplace=True)
+        if content:
+            self.entries = self.__sniffed(self.entries)
+        elif self._entries is None:
+            return self.__push(Predicate(TYPE, frozenset({entry_type})), inplace=True)
+        return self.filter(lambda e: e.is_type(entry_type, content))
+
+    def __push(self, predicates: Predicate | Sequence[Predicate], inplace: bool) -> 'Archyve':
+        """
+        :param predicates: Predicates to add to the query pushed down into the walk.
+        :param inplace: Whether to change this archyve or return a new one.
+        :return: An archyve whose walk only gives files that also meet the predicates.
+        """
+        archyve: Archyve = self if inplace else self.__like(*self.paths)
+        archyve._query = (self._query or Query()).where(*([predicates] if isinstance(predicates, Predicate)
+                                                           else predicates))
+        return archyve
+
+    def __sniffed(self, entries: Iterable[Entry], chunk_size: int = 256) -> Generator[Entry, None, None]:
+        """
+        Reads the content types of entries a chunk at a time on the archyve's pool of workers, as they are iterated.
+        :param entries: The entries to classify.
+        :param chunk_size: The number of entries classified at once.
+        :return: A generator of the entries, which all know their content types.
+        """
+        entries = iter(entries)
+        for chunk in iter(lambda: list(islice(entries, chunk_size)), []):
+            unread: list[Entry] = [e for e in chunk if e.cached_content_type() is None]
+            for entry, content_type in zip(unread, sniff_many((os.fspath(e) for e in unread), self.workers,
+                                                              self.backend)):
+                entry.add_content_type(content_type)
+            yield from chunk
+
+    def __type_of(self, entry: Entry) -> EntryType:
+        """
+        :param entry: An entry in the archyve.
+        :return: The entry's type, decided the way the archyve was asked to (see type_detection).
+        """
+        return entry.content_type if self.type_detection == 'content' else entry.entry_type
+
     @property
     def images(self) -> 'Archyve':
         """
         :return: Self where entries are filtered to be images only.
         """
-        return self.filter(lambda e: e.is_type(EntryType.IMAGE))
+        return self.__filter_type(EntryType.IMAGE)
 
     @property
     def audios(self) -> 'Archyve':
         """
         :return: Self where entries are filtered to be audio only.
         """
-        return self.filter(lambda e: e.is_type(EntryType.AUDIO))
+        return self.__filter_type(EntryType.AUDIO)
 
     @property
     def videos(self) -> 'Archyve':
         """
         :return: Self where entries are filtered to be videos only.
         """
-        return self.filter(lambda e: e.is_type(EntryType.VIDEO))
+        return self.__filter_type(EntryType.VIDEO)
 
     @property
     def texts(self) -> 'Archyve':
         """
         :return: Self where entries are filtered to be text only.
         """
-        return self.filter(lambda e: e.is_type(EntryType.TEXT))
+        return self.__filter_type(EntryType.TEXT)
 
     @property
     def unknowns(self) -> 'Archyve':
         """
         :return: Self where entries are filtered to be unknowns only.
         """
-        return self.filter(lambda e: e.is_type(EntryType.UNKNOWN))
+        return self.__filter_type(EntryType.UNKNOWN)
 
-    def search(self, *string: str, any_all: Callable = any) -> Generator[Entry, None, None]:
+    def search(self, *string: str, any_all: Callable = any, kind: str = SUBSTRING,
+               index: bool = False) -> Generator[Entry, None, None]:
         """
-        Returns entries in the archyve whose paths contain any or all of the search strings.
+        Returns entries in the archyve whose paths contain (or start with, end with or match) any or all of the search
+        strings. A materialized archyve (or one searched with index=True, which materializes it) builds an index of its
+        paths (see the index module) on its first search, so the archyve (and every view of it) can be searched again
+        and again without a walk or checking every path. Otherwise the entries are streamed and checked one by one.
         :param string: The string(s) that a path needs to contain to be 'found' as part of the search.
         :param any_all: Whether the path should contain all or any of the given strings.
+        :param kind: How a path is matched with a string: 'substring', 'prefix', 'suffix' or 'glob' (patterns with a '/'
+                     are matched against the whole path, the rest against the file's name).
+        :param index: Whether to materialize the archyve and index its paths, if it isn't materialized already (worth
+                      it when the archyve will be searched more than once).
         :return: A generator yielding paths that came up in the search.
         """
-        return (e for e in self.entries if any_all(v in str(e.path) for v in string))
+        if kind not in QUERY_KINDS:
+            raise ValueError(f'Unknown kind of query \"{kind}\", choose from: {list(QUERY_KINDS)}')
+        if index and self._entries is None:
+            self.materialize()
+        if view := self.__view():
+            table, rows = view
+            if self._index is None or self._index.table is not table:
+                self._index = PathIndex(table)
+            return table.entries(self._index.search(string, kind, any_all, rows))
+        return (e for e in self.entries if any_all(matches(os.fspath(e), v, kind) for v in string))
+
+    def where(self, *entry_type: EntryType | str, extensions: Iterable[str] = (), path: str | Sequence[str] = (),
+              kind: str = SUBSTRING, any_all: Callable = any, min_size: int | None = None, max_size: int | None = None,
+              inplace: bool = True) -> 'Archyve':
+        """
+        Filters the archyve on the types (going by extension), extensions, paths and sizes of its files. Unlike filter,
+        no entry needs to be made to check a file: the conditions are pushed down into the walk (see the query module),
+        so files that don't meet them are turned away as they are listed, and a materialized archyve checks them against
+        its table's columns. Only an archyve whose entries have been replaced by a generator checks its entries.
+        :param entry_type: The types of file to keep (any of them).
+        :param extensions: The extensions of file to keep (any of them, e.g. '.jpg' or 'jpg'; '' is no extension).
+        :param path: A query (or queries) the files' paths must match (see search).
+        :param kind: How a path is matched with the queries: 'substring', 'prefix', 'suffix' or 'glob'.
+        :param any_all: Whether a path should match any or all of the queries.
+        :param min_size: The smallest size of file to keep, in bytes.
+        :param max_size: The largest size of file to keep, in bytes.
+        :param inplace: Whether to return a new archyve or to return this one with the entries filtered.
+        :return: The filtered archyve.
+        """
+        if kind not in QUERY_KINDS:
+            raise ValueError(f'Unknown kind of query "{kind}", choose from: {list(QUERY_KINDS)}')
+        predicates: list[Predicate] = []
+        if entry_type:
+            predicates.append(Predicate(TYPE, frozenset(EntryType(t) for t in entry_type)))
+        if extensions:
+            predicates.append(Predicate(EXTENSION, frozenset(f'.{e.lstrip(".").lower()}' if e else '' for e in
+                                                             ([extensions] if isinstance(extensions, str)
+                                                              else extensions))))
+        if path:
+            predicates.append(Predicate(PATH, ((path,) if isinstance(path, str) else tuple(path), kind, any_all)))
+        if min_size is not None or max_size is not None:
+            predicates.append(Predicate(SIZE, (min_size, max_size)))
+
+        if view := self.__view():
+            table, rows = view
+            return self.__with_rows(Query().where(*predicates).rows(table, rows), inplace)
+        if self._entries is None:
+            return self.__push(predicates, inplace)
+        return self.filter(Query().where(*predicates).accepts, inplace)
 
     def filter(self, func: Callable, inplace: bool = True) -> 'Archyve':
         """
@@ -183,15 +918,28 @@ class Archyve:
         :param inplace: Whether to return a new archyve or to return this one with the entries filtered.
         :return: This archyve but filtered on the given function.
         """
+        if view := self.__view():
+            table, rows = view
+            return self.__with_rows(array('Q', (row for row in rows if func(table.entry(row)))), inplace)
+
         filtered: Generator[Path, None, None] = (e for e in filter(func, self.entries))
         if inplace:
             self.entries = filtered
             return self
         else:
-            new_archyve: Archyve = Archyve(*self.paths)
+            new_archyve: Archyve = self.__like(*self.paths)
             new_archyve.entries = filtered
             return new_archyve
 
+    def __like(self, *directory: Path | str) -> 'Archyve':
+        """
+        :param directory: The directory(s) the new archyve will manage.
+        :return: A new archyve over the given directories with the same settings as this one.
+        """
+        return Archyve(*directory, cache=self.cache, workers=self.workers, backend=self.backend, include=self.include,
+                       exclude=self.exclude, max_depth=self.max_depth, walk_workers=self.walk_workers,
+                       ordered=self.ordered, materialize=self._materialize, type_detection=self.type_detection)
+
     def __add__(self, other: 'Archyve') -> 'Archyve':
         """
         Adds two archyves together.
@@ -199,13 +947,39 @@ class Archyve:
         :return: The new archyve object.
         """
         if isinstance(other, Archyve):
-            new_archyve: Archyve = Archyve(*list(set(self.paths + other.paths)))
+            # Two views of the same table are added by merging their rows, so nothing is walked again.
+            mine, theirs = self.__view(), other.__view()
+            if mine and theirs and mine[0] is theirs[0]:
+                return self.__with_rows(array('Q', sorted(set(mine[1]) | set(theirs[1]))), inplace=False)
+
+            new_archyve: Archyve = self.__like(*dict.fromkeys(self.paths + other.paths))
+            new_archyve.cache = self.cache or other.cache
+            if not self._materialize and not other._materialize and self._entries is None and \
+                    other._entries is None and self.__walk_settings() == other.__walk_settings():
+                # Neither has been walked yet, so one walk of both archyves' directories can answer both queries.
+                new_archyve._query = (self._query or Query()).within(self.__roots()) | \
+                                     (other._query or Query()).within(other.__roots())
+                return new_archyve
             new_archyve.entries = (e for e in chain(self.entries, other.entries))
             return new_archyve
         else:
             raise NotImplementedError(f'Addition of \'Archyve\' and {type(other)} not implemented.')
 
+    def __walk_settings(self) -> tuple:
+        """
+        :return: The settings that decide which files a walk of the archyve's directories finds.
+        """
+        return self.include, self.exclude, self.max_depth, self.type_detection
+
+    def __roots(self) -> list[str]:
+        """
+        :return: The archyve's directories, as the paths its walk gives begin.
+        """
+        return [str(p.resolve()) for p in self.paths]
+
     def __iter__(self):
+        if self.__view():
+            return iter(self.entries)
         return iter(list(self.entries))
 
     def __next__(self):
@@ -214,10 +988,15 @@ class Archyve:
     def reset(self):
         """
         Puts the archyve back into its original state, so that it can be iterated over once again. This will also
-        remove any filters placed on the archyve.
+        remove any filters placed on the archyve (a materialized archyve goes back to every row of its table without
+        walking again).
         :return: None
         """
         self._entries = None
+        self._rows = None
+        self._query = None
 
     def __len__(self):
+        if view := self.__view():
+            return len(view[1])
         return len(list(self.entries))
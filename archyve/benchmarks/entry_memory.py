@@ -0,0 +1,88 @@
+"""
+Benchmark measuring the memory each file in an archyve costs: as an entry like those archyve used to make (a __dict__
+holding a Path), as the current slotted Entry, and as a row of an EntryTable. The files are made up, so nothing is read
+from disk.
+
+Usage: python -m archyve.benchmarks.entry_memory [--directories 1000] [--files 100]
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Any, Callable, Iterable
+from archyve.table import EntryTable
+from argparse import ArgumentParser
+from archyve.entry import Entry
+from os import stat_result
+from pathlib import Path
+import tracemalloc
+import gc
+
+
+class LegacyEntry:
+    """
+    The attributes an entry used to keep: a Path, a memo and a stat in a __dict__.
+    """
+
+    def __init__(self, path: str, stat: stat_result):
+        self.path: Path = Path(path)
+        self._memo: dict[str, Any] = {}
+        self._stat: stat_result = stat
+
+
+def files(directories: int, files_per_directory: int) -> Iterable[tuple[str, stat_result]]:
+    """
+    :param directories: The number of directories to make up.
+    :param files_per_directory: The number of files in each directory.
+    :return: A generator of made up paths and stats (every path is a new string, as they are when walking a tree).
+    """
+    for d in range(directories):
+        for f in range(files_per_directory):
+            yield f'/archive/photos/{d // 100}/album_{d}/IMG_{f:05}.jpg', \
+                stat_result((0o100644, d * files_per_directory + f, 0, 1, 0, 0, 2 ** 20 + f, 0, 0, 0),
+                            {'st_mtime_ns': 0, 'st_ctime_ns': 0})
+
+
+def measure(build: Callable[[Iterable[tuple[str, stat_result]]], Any], directories: int,
+            files_per_directory: int) -> float:
+    """
+    :param build: A function that keeps every file it is given.
+    :param directories: The number of directories to make up.
+    :param files_per_directory: The number of files in each directory.
+    :return: The number of bytes kept per file.
+    """
+    gc.collect()
+    tracemalloc.start()
+    kept: Any = build(files(directories, files_per_directory))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size / (directories * files_per_directory)
+
+
+def build_table(made_up: Iterable[tuple[str, stat_result]]) -> EntryTable:
+    """
+    :param made_up: The files to put in the table.
+    :return: A table of the files.
+    """
+    table: EntryTable = EntryTable()
+    for path, stat in made_up:
+        table.append(path, stat)
+    return table
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--directories', type=int, default=1000)
+    parser.add_argument('--files', type=int, default=100)
+    args = parser.parse_args()
+
+    layouts: dict[str, Callable] = {
+        'legacy entry': lambda made_up: [LegacyEntry(p, s) for p, s in made_up],
+        'entry': lambda made_up: [Entry(p, stat=s) for p, s in made_up],
+        'entry (no stat)': lambda made_up: [Entry(p) for p, _ in made_up],
+        'entry table': build_table,
+    }
+    legacy: float = measure(layouts['legacy entry'], args.directories, args.files)
+    print(f'{"layout":<16}{"bytes/file":>12}{"saving":>9}')
+    for name, build in layouts.items():
+        per_file: float = measure(build, args.directories, args.files)
+        print(f'{name:<16}{per_file:>12.0f}{legacy / per_file:>8.1f}x')
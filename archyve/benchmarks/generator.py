@@ -0,0 +1,156 @@
+"""
+Module contains a seeded generator of synthetic archives for the benchmarks. The same seed and parameters always make
+the same tree, byte for byte, so results can be compared between commits. The trees are made to look like real photo
+libraries to archyve:
+    - file sizes follow a log-normal distribution (many small files and a long tail of large ones),
+    - folders are nested to a given depth with a given fan-out,
+    - a share of the files are exact duplicates of earlier ones, placed in random folders,
+    - a share are the same size as an earlier file and share its first and last bytes, but differ in the middle (so
+      only a full digest can tell them apart),
+    - images start with a JPEG header holding an EXIF capture date, videos with an MP4 'ftyp' box.
+
+Usage: python -m archyve.benchmarks.generator <location> [--files 1000] [--seed 0]
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Final, NamedTuple
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+import random
+import struct
+import math
+
+
+# The kinds of file made and how often each is made.
+KINDS: Final[dict[str, float]] = {'jpg': 0.6, 'mp4': 0.1, 'txt': 0.3}
+
+# The first capture date given to an image (the rest are spread over the following years).
+_EPOCH: Final[datetime] = datetime(2005, 1, 1)
+
+# The words text files are written from.
+_WORDS: Final[tuple[bytes, ...]] = tuple(b'archive photo album holiday family beach winter summer birthday camera '
+                                         b'library folder duplicate original copy backup'.split())
+
+
+class GeneratedArchive(NamedTuple):
+    """
+    What the generator made.
+    """
+    files: int
+    directories: int
+    bytes: int
+    duplicates: int  # Files that are exact copies of another
+    same_size: int  # Files that are the same size as another (and share its ends), but differ
+
+
+def jpeg_header(capture_date: datetime) -> bytes:
+    """
+    :param capture_date: The date the image was 'taken'.
+    :return: The start of a JPEG: its start of image marker and an APP1 segment holding the capture date as EXIF.
+    """
+    # A little endian TIFF: IFD0 holds a pointer to the EXIF IFD (at 26), which holds DateTimeOriginal (data at 44).
+    date: bytes = capture_date.strftime('%Y:%m:%d %H:%M:%S').encode() + b'\x00'
+    tiff: bytes = b'II*\x00' + struct.pack('<I', 8) + \
+        struct.pack('<HHHII', 1, 0x8769, 4, 1, 26) + struct.pack('<I', 0) + \
+        struct.pack('<HHHII', 1, 0x9003, 2, len(date), 44) + struct.pack('<I', 0) + date
+    segment: bytes = b'Exif\x00\x00' + tiff
+    return b'\xff\xd8' + b'\xff\xe1' + struct.pack('>H', len(segment) + 2) + segment
+
+
+def mp4_header() -> bytes:
+    """
+    :return: The start of an MP4: an 'ftyp' box naming its brands, and the header of an 'mdat' box.
+    """
+    ftyp: bytes = b'isom' + struct.pack('>I', 512) + b'isomiso2avc1mp41'
+    return struct.pack('>I', len(ftyp) + 8) + b'ftyp' + ftyp + struct.pack('>I', 0) + b'mdat'
+
+
+def _contents(rng: random.Random, kind: str, size: int, index: int) -> bytes:
+    """
+    :param rng: The generator's random numbers.
+    :param kind: 'jpg', 'mp4' or 'txt'.
+    :param size: The size of the file.
+    :param index: The number of the file (written into text files so that no two are the same).
+    :return: The contents of a new, unique file.
+    """
+    if kind == 'txt':
+        text: bytes = f'{index}\n'.encode() + b' '.join(rng.choices(_WORDS, k=size // 6 + 1))
+        return text[:size]
+    header: bytes = jpeg_header(_EPOCH + timedelta(seconds=rng.randrange(15 * 365 * 86400))) if kind == 'jpg' \
+        else mp4_header()
+    body: bytes = header + rng.randbytes(max(size - len(header), 0))
+    return body[:size - 2] + b'\xff\xd9' if kind == 'jpg' and size > len(header) + 2 else body[:size]
+
+
+def _differ_in_middle(contents: bytes) -> bytes:
+    """
+    :param contents: The contents of a file.
+    :return: The same contents with the byte in the middle changed.
+    """
+    middle: int = len(contents) // 2
+    return contents[:middle] + bytes([contents[middle] ^ 0xFF]) + contents[middle + 1:]
+
+
+def generate_archive(location: Path | str, files: int = 1000, seed: int = 0, depth: int = 3, fan_out: int = 4,
+                     median_size: int = 64 * 1024, size_sigma: float = 1.5, max_size: int = 16 * 1024 * 1024,
+                     duplicate_ratio: float = 0.2, same_size_ratio: float = 0.05) -> GeneratedArchive:
+    """
+    Makes a synthetic archive (see the module's docstring).
+    :param location: The folder to make the archive in (made if it doesn't exist).
+    :param files: The number of files to make.
+    :param seed: The seed of the random numbers (the same seed makes the same archive).
+    :param depth: The number of levels of folders below the location.
+    :param fan_out: The number of folders in each folder (except the deepest).
+    :param median_size: The median size of a file, in bytes.
+    :param size_sigma: The spread of the sizes (the standard deviation of their logarithm).
+    :param max_size: The largest size a file can be.
+    :param duplicate_ratio: The share of files that are exact copies of an earlier file.
+    :param same_size_ratio: The share of files that are the same size as an earlier file but differ in the middle.
+    :return: A summary of what was made.
+    """
+    rng: random.Random = random.Random(seed)
+    location: Path = Path(location)
+    folders: list[Path] = [location]
+    level: list[Path] = [location]
+    for d in range(depth):
+        level = [folder / f'dir_{d}_{i}' for folder in level for i in range(fan_out)]
+        folders += level
+    for folder in folders:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    made: list[tuple[str, Path]] = []  # The kind and path of every original file (which can be copied)
+    total: int = 0
+    duplicates: int = 0
+    same_size: int = 0
+    kinds: list[str] = list(KINDS)
+    weights: list[float] = list(KINDS.values())
+    for i in range(files):
+        roll: float = rng.random()
+        if made and roll < duplicate_ratio + same_size_ratio:
+            kind, original = rng.choice(made)
+            contents: bytes = original.read_bytes()
+            if roll < duplicate_ratio or not contents:
+                duplicates += 1
+            else:
+                contents = _differ_in_middle(contents)
+                same_size += 1
+            path: Path = rng.choice(folders) / f'file_{i:06}.{kind}'
+        else:
+            kind: str = rng.choices(kinds, weights)[0]
+            size: int = min(int(rng.lognormvariate(math.log(median_size), size_sigma)), max_size)
+            contents: bytes = _contents(rng, kind, size, i)
+            path: Path = rng.choice(folders) / f'file_{i:06}.{kind}'
+            made.append((kind, path))
+        path.write_bytes(contents)
+        total += len(contents)
+    return GeneratedArchive(files, len(folders), total, duplicates, same_size)
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('location')
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate_archive(args.location, args.files, args.seed))
@@ -0,0 +1,52 @@
+"""
+Benchmark comparing the serial duplicate search with the thread and process pool hashing backends, on a tree made by
+create_test_directory.
+
+Usage: python -m archyve.benchmarks.parallel_hashing [--depth 3] [--file-size 1048576] [--workers 8]
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.file_structure_functions import create_test_directory
+from tempfile import TemporaryDirectory
+from archyve.archyve import Archyve
+from argparse import ArgumentParser
+from time import perf_counter
+from random import seed
+import os
+
+
+def time_duplicates(directory: str, workers: int, backend: str) -> tuple[float, int]:
+    """
+    :param directory: The directory to search for duplicates.
+    :param workers: The number of workers to hash with.
+    :param backend: 'thread' or 'process'.
+    :return: The number of seconds the search took and the number of bytes it read.
+    """
+    archyve: Archyve = Archyve(directory, workers=workers, backend=backend)
+    start: float = perf_counter()
+    archyve.duplicates()
+    return perf_counter() - start, sum(archyve.bytes_read.values())
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--file-size', type=int, default=1024 * 1024)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        seed(0)
+        create_test_directory(args.depth, tmp, duplicate_percentage=50, max_directories=3, max_files=20,
+                              file_size=args.file_size)
+
+        # Warm the page cache so every run reads from the same place.
+        time_duplicates(tmp, 1, 'thread')
+
+        serial, read = time_duplicates(tmp, 1, 'thread')
+        print(f'{"backend":<10}{"workers":>8}{"seconds":>10}{"MB/s":>10}{"speedup":>9}')
+        print(f'{"serial":<10}{1:>8}{serial:>10.3f}{read / serial / 1e6:>10.1f}{1:>9.2f}')
+        for backend in ('thread', 'process'):
+            seconds, read = time_duplicates(tmp, args.workers, backend)
+            print(f'{backend:<10}{args.workers:>8}{seconds:>10.3f}{read / seconds / 1e6:>10.1f}'
+                  f'{serial / seconds:>9.2f}')
@@ -0,0 +1,197 @@
+"""
+Benchmark suite for archyve's hot paths, run over an archive made by the seeded generator (see generator.py):
+    - walk_sub_paths / walk_archyve: the rate directories are walked at (files/s),
+    - file_digest / entry_hash: the rate files are hashed at, by hashing.file_digest on the workers and by
+      Entry.__hash__ (MB/s),
+    - duplicates: an end to end duplicate search (files/s),
+    - deduplicate: an end to end dry run deduplication, which also compares every copy byte by byte (files/s),
+    - summarize: a walk and group by of every file by type, top level folder and year (files/s).
+Each benchmark is run --repeat times after a warm up run (so the page cache is warm and every run reads from the same
+place), and once more under tracemalloc to measure its peak memory. The results are printed and can be saved as JSON
+(--output) and compared with the results of another commit (--compare).
+
+Usage: python -m archyve.benchmarks.run [--files 2000] [--seed 0] [--workers 8] [--repeat 3] [--output new.json]
+                                        [--compare old.json] [--only duplicates,deduplicate]
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.file_structure_functions import sub_paths
+from archyve.benchmarks.generator import GeneratedArchive, generate_archive
+from archyve.hashing import file_digest
+from archyve.parallel import ordered_starmap
+from typing import Any, Callable, Final
+from tempfile import TemporaryDirectory
+from archyve.archyve import Archyve
+from argparse import ArgumentParser
+from archyve.entry import Entry
+from time import perf_counter
+from datetime import datetime
+from pathlib import Path
+import tracemalloc
+import subprocess
+import platform
+import json
+import os
+
+
+def walk_sub_paths(directory: Path, workers: int) -> tuple[float, str]:
+    """
+    Walks the directory with file_structure_functions.sub_paths.
+    """
+    return sum(1 for _ in sub_paths(directory)), 'files'
+
+
+def walk_archyve(directory: Path, workers: int) -> tuple[float, str]:
+    """
+    Walks the directory as an archyve does.
+    """
+    return sum(1 for _ in Archyve(directory, workers=workers).entries), 'files'
+
+
+def digest_files(directory: Path, workers: int) -> tuple[float, str]:
+    """
+    Hashes every file on the workers.
+    """
+    paths: list[Path] = list(sub_paths(directory))
+    for _ in ordered_starmap(file_digest, ((p,) for p in paths), workers):
+        pass
+    return sum(p.stat().st_size for p in paths) / 1e6, 'MB'
+
+
+def entry_hash(directory: Path, workers: int) -> tuple[float, str]:
+    """
+    Hashes every file through Entry.__hash__ (i.e. its full digest), one at a time.
+    """
+    paths: list[Path] = list(sub_paths(directory))
+    for p in paths:
+        hash(Entry(p))
+    return sum(p.stat().st_size for p in paths) / 1e6, 'MB'
+
+
+def duplicates(directory: Path, workers: int) -> tuple[float, str]:
+    """
+    Searches the directory for duplicates.
+    """
+    archyve: Archyve = Archyve(directory, workers=workers, materialize=True)
+    archyve.duplicates()
+    return len(archyve), 'files'
+
+
+def deduplicate(directory: Path, workers: int) -> tuple[float, str]:
+    """
+    Deduplicates the directory (as a dry run, so it can be repeated).
+    """
+    archyve: Archyve = Archyve(directory, workers=workers, materialize=True)
+    archyve.deduplicate(keep='path', dry_run=True)
+    return len(archyve), 'files'
+
+
+def summarize(directory: Path, workers: int) -> tuple[float, str]:
+    """
+    Totals the files by type, top level folder and year.
+    """
+    archyve: Archyve = Archyve(directory, workers=workers)
+    return archyve.summarize(by=('type', 'directory', 'year'), depth=1).total('files'), 'files'
+
+
+# The benchmarks, by name. Each does its work over a directory and returns the amount of work done and its unit.
+BENCHMARKS: Final[dict[str, Callable[[Path, int], tuple[float, str]]]] = {
+    'walk_sub_paths': walk_sub_paths, 'walk_archyve': walk_archyve, 'file_digest': digest_files,
+    'entry_hash': entry_hash, 'duplicates': duplicates, 'deduplicate': deduplicate, 'summarize': summarize,
+}
+
+
+def measure(benchmark: Callable[[Path, int], tuple[float, str]], directory: Path, workers: int,
+            repeat: int) -> dict[str, Any]:
+    """
+    :param benchmark: The benchmark to run.
+    :param directory: The archive to run it over.
+    :param workers: The number of workers it may use.
+    :param repeat: The number of timed runs.
+    :return: The seconds each run took, the best rate, and the peak memory allocated by Python during a run.
+    """
+    benchmark(directory, workers)  # Warm up
+    seconds: list[float] = []
+    for _ in range(repeat):
+        start: float = perf_counter()
+        amount, unit = benchmark(directory, workers)
+        seconds.append(perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        benchmark(directory, workers)
+        peak: int = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': seconds, 'best': min(seconds), 'rate': amount / min(seconds), 'unit': f'{unit}/s',
+            'peak_bytes': peak}
+
+
+def run(directory: Path, workers: int = 1, repeat: int = 3, names: list[str] | None = None) -> dict[str, dict]:
+    """
+    :param directory: The archive to run the benchmarks over.
+    :param workers: The number of workers the benchmarks may use.
+    :param repeat: The number of timed runs of each benchmark.
+    :param names: The benchmarks to run (all of them if None).
+    :return: The results of each benchmark, by name.
+    """
+    for name in names or ():
+        if name not in BENCHMARKS:
+            raise ValueError(f'Unknown benchmark \"{name}\", choose from: {list(BENCHMARKS)}')
+    return {name: measure(BENCHMARKS[name], directory, workers, repeat) for name in names or BENCHMARKS}
+
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> list[str]:
+    """
+    :param old: Saved results (e.g. from the previous commit).
+    :param new: Results to compare with them.
+    :return: A line for each benchmark in both, giving the best time of each and the change.
+    """
+    lines: list[str] = [f'{"benchmark":<16}{"old (s)":>10}{"new (s)":>10}{"change":>9}']
+    for name, result in new['results'].items():
+        if name in old['results']:
+            before, after = old['results'][name]['best'], result['best']
+            lines.append(f'{name:<16}{before:>10.4f}{after:>10.4f}{(after - before) / before:>+9.1%}')
+    return lines
+
+
+def commit() -> str | None:
+    """
+    :return: The commit the working tree is at, if it is a git repository.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=Path)
+    parser.add_argument('--compare', type=Path)
+    parser.add_argument('--only', type=lambda s: s.split(','))
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        archive: GeneratedArchive = generate_archive(tmp, args.files, args.seed)
+        results: dict[str, dict] = run(Path(tmp), args.workers, args.repeat, args.only)
+
+    report: dict[str, Any] = {
+        'meta': {'commit': commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+                 'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+                 'workers': args.workers, 'repeat': args.repeat, 'seed': args.seed, 'archive': archive._asdict()},
+        'results': results,
+    }
+    print(f'{"benchmark":<16}{"best (s)":>10}{"rate":>12} {"unit":<8}{"peak (MB)":>10}')
+    for name, result in results.items():
+        print(f'{name:<16}{result["best"]:>10.4f}{result["rate"]:>12.1f} {result["unit"]:<8}'
+              f'{result["peak_bytes"] / 1e6:>10.2f}')
+    if args.compare:
+        print('\n'.join(['', *compare(json.loads(args.compare.read_text()), report)]))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
@@ -0,0 +1,325 @@
+"""
+Module contains a persistent cache of the expensive facts about entries (their digests, EXIF capture dates, video and
+audio header metadata and types) so that a re-run over an archive that has barely changed does not need to read every
+file again.
+
+Each cached row is keyed by the file's path and stamped with a fingerprint of its size, modification time and inode.
+A row is only trusted while the file's current stat still matches that fingerprint.
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Final, Iterable, NamedTuple
+from archyve.media import MediaInfo
+from os import stat_result
+from datetime import datetime
+from pathlib import Path
+import threading
+import sqlite3
+import os
+
+
+# The number of updates held in memory before they are written to disk.
+FLUSH_EVERY: Final[int] = 10_000
+
+_SCHEMA: Final[str] = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    entry_type TEXT,
+    capture_date REAL,
+    capture_date_known INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (path, algorithm)
+);
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    capture_date REAL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER
+);
+'''
+
+
+class Fingerprint(NamedTuple):
+    """
+    The parts of a file's stat that tell us whether it has changed since it was cached.
+    """
+    size: int
+    mtime_ns: int
+    inode: int
+
+    @staticmethod
+    def of(stat: stat_result) -> 'Fingerprint':
+        """
+        :param stat: The stat of a file.
+        :return: The fingerprint of the stat.
+        """
+        return Fingerprint(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class _Record:
+    """
+    The cached facts about one file.
+    """
+    __slots__ = ('fingerprint', 'entry_type', 'capture_date', 'capture_date_known', 'digests', 'media')
+
+    def __init__(self, fingerprint: Fingerprint, entry_type: str | None = None, capture_date: float | None = None,
+                 capture_date_known: bool = False, digests: dict[str, bytes] | None = None,
+                 media: tuple[float | None, float | None, int | None, int | None] | None = None):
+        self.fingerprint: Fingerprint = fingerprint
+        self.entry_type: str | None = entry_type
+        self.capture_date: float | None = capture_date
+        self.capture_date_known: bool = capture_date_known
+        self.digests: dict[str, bytes] = digests if digests is not None else {}
+        self.media: tuple[float | None, float | None, int | None, int | None] | None = media  # As in the media table
+
+
+class EntryCache:
+    """
+    A SQLite backed cache of entry digests, capture dates, media metadata and types. The whole cache is read into memory
+    the first time it is used, and updates are written back in bulk, so looking up a file costs a dictionary lookup
+    rather than a query. The cache is safe to share between threads.
+    """
+
+    def __init__(self, location: Path | str):
+        """
+        Opens (or creates) a cache.
+        :param location: The path of the cache file.
+        """
+        self.location: Path = Path(location)
+        self._lock: threading.RLock = threading.RLock()
+        self._connection: sqlite3.Connection = sqlite3.connect(self.location, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._records: dict[str, _Record] | None = None
+        self._dirty: set[str] = set()
+        self._evicted: set[str] = set()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __enter__(self) -> 'EntryCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def _load(self) -> dict[str, _Record]:
+        """
+        :return: The cached records, reading them from disk if this is the first time they have been needed.
+        """
+        if self._records is None:
+            with self._lock:
+                if self._records is None:
+                    records: dict[str, _Record] = {
+                        path: _Record(Fingerprint(size, mtime_ns, inode), entry_type, capture_date, bool(known))
+                        for path, size, mtime_ns, inode, entry_type, capture_date, known in self._connection.execute(
+                            'SELECT path, size, mtime_ns, inode, entry_type, capture_date, capture_date_known '
+                            'FROM files')
+                    }
+                    for path, algorithm, digest in self._connection.execute(
+                            'SELECT path, algorithm, digest FROM digests'):
+                        if path in records:
+                            records[path].digests[algorithm] = digest
+                    for path, *media in self._connection.execute(
+                            'SELECT path, capture_date, duration, width, height FROM media'):
+                        if path in records:
+                            records[path].media = tuple(media)
+                    self._records = records
+        return self._records
+
+    def _record(self, path: Path | str, stat: stat_result, create: bool = False) -> _Record | None:
+        """
+        :param path: The path of the file.
+        :param stat: The current stat of the file.
+        :param create: Whether to start a new record if there is no valid one.
+        :return: The record for the file if it is still valid, else None (or a fresh record when create is True).
+        """
+        key: str = str(path)
+        fingerprint: Fingerprint = Fingerprint.of(stat)
+        records: dict[str, _Record] = self._load()
+        record: _Record | None = records.get(key)
+        if record is not None and record.fingerprint == fingerprint:
+            return record
+        if not create:
+            return None
+        record = records[key] = _Record(fingerprint)
+        self._evicted.discard(key)
+        return record
+
+    def _changed(self, path: Path | str) -> None:
+        """
+        Marks a record as needing to be written to disk, writing everything out if enough changes have built up.
+        :param path: The path of the record that changed.
+        """
+        self._dirty.add(str(path))
+        if len(self._dirty) >= FLUSH_EVERY:
+            self.flush()
+
+    def get_digest(self, path: Path | str, stat: stat_result, algorithm: str) -> bytes | None:
+        """
+        :param path: The path of the file.
+        :param stat: The current stat of the file.
+        :param algorithm: The algorithm the digest was made with.
+        :return: The cached digest of the file, or None if there isn't a valid one.
+        """
+        with self._lock:
+            record: _Record | None = self._record(path, stat)
+            digest: bytes | None = record.digests.get(algorithm) if record else None
+            if digest is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return digest
+
+    def put_digest(self, path: Path | str, stat: stat_result, algorithm: str, digest: bytes,
+                   entry_type: str | None = None) -> None:
+        """
+        Stores the digest of a file.
+        :param path: The path of the file.
+        :param stat: The stat of the file when it was hashed.
+        :param algorithm: The algorithm the digest was made with.
+        :param digest: The digest.
+        :param entry_type: The type of the entry, if known.
+        """
+        with self._lock:
+            record: _Record = self._record(path, stat, create=True)
+            record.digests[algorithm] = digest
+            record.entry_type = entry_type or record.entry_type
+            self._changed(path)
+
+    def get_capture_date(self, path: Path | str, stat: stat_result) -> tuple[bool, datetime | None]:
+        """
+        :param path: The path of the file.
+        :param stat: The current stat of the file.
+        :return: Whether the capture date is cached, and the capture date (None if the file has none).
+        """
+        with self._lock:
+            record: _Record | None = self._record(path, stat)
+            if record is None or not record.capture_date_known:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, (datetime.fromtimestamp(record.capture_date) if record.capture_date is not None else None)
+
+    def put_capture_date(self, path: Path | str, stat: stat_result, capture_date: datetime | None,
+                         entry_type: str | None = None) -> None:
+        """
+        Stores the capture date of a file.
+        :param path: The path of the file.
+        :param stat: The stat of the file when its date was read.
+        :param capture_date: The capture date, or None if the file does not have one.
+        :param entry_type: The type of the entry, if known.
+        """
+        with self._lock:
+            record: _Record = self._record(path, stat, create=True)
+            record.capture_date = capture_date.timestamp() if capture_date is not None else None
+            record.capture_date_known = True
+            record.entry_type = entry_type or record.entry_type
+            self._changed(path)
+
+    def get_media(self, path: Path | str, stat: stat_result) -> MediaInfo | None:
+        """
+        :param path: The path of the file.
+        :param stat: The current stat of the file.
+        :return: The cached metadata of the video or audio file, or None if it isn't cached.
+        """
+        with self._lock:
+            record: _Record | None = self._record(path, stat)
+            if record is None or record.media is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            capture_date, duration, width, height = record.media
+            return MediaInfo(datetime.fromtimestamp(capture_date) if capture_date is not None else None, duration,
+                             width, height)
+
+    def put_media(self, path: Path | str, stat: stat_result, info: MediaInfo, entry_type: str | None = None) -> None:
+        """
+        Stores the metadata of a video or audio file.
+        :param path: The path of the file.
+        :param stat: The stat of the file when its headers were read.
+        :param info: The metadata.
+        :param entry_type: The type of the entry, if known.
+        """
+        with self._lock:
+            record: _Record = self._record(path, stat, create=True)
+            record.media = (info.capture_date.timestamp() if info.capture_date is not None else None, info.duration,
+                            info.width, info.height)
+            record.entry_type = entry_type or record.entry_type
+            self._changed(path)
+
+    def flush(self) -> None:
+        """
+        Writes all pending changes to disk in one transaction.
+        """
+        with self._lock:
+            if not self._dirty and not self._evicted:
+                return
+            records: dict[str, _Record] = self._load()
+            rows = [(p, *r.fingerprint, r.entry_type, r.capture_date, int(r.capture_date_known))
+                    for p in self._dirty if (r := records.get(p)) is not None]
+            with self._connection:
+                self._connection.executemany('DELETE FROM files WHERE path = ?', ((p,) for p in self._evicted))
+                self._connection.executemany('DELETE FROM digests WHERE path = ?',
+                                             ((p,) for p in self._dirty | self._evicted))
+                self._connection.executemany('DELETE FROM media WHERE path = ?',
+                                             ((p,) for p in self._dirty | self._evicted))
+                self._connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+                self._connection.executemany(
+                    'INSERT INTO digests VALUES (?, ?, ?)',
+                    ((p, a, d) for p in self._dirty if p in records for a, d in records[p].digests.items()))
+                self._connection.executemany(
+                    'INSERT INTO media VALUES (?, ?, ?, ?, ?)',
+                    ((p, *records[p].media) for p in self._dirty if p in records and records[p].media is not None))
+            self._dirty.clear()
+            self._evicted.clear()
+
+    def evict(self, paths: Iterable[Path | str]) -> None:
+        """
+        Removes the given paths from the cache.
+        :param paths: The paths to forget.
+        """
+        with self._lock:
+            records: dict[str, _Record] = self._load()
+            for path in map(str, paths):
+                records.pop(path, None)
+                self._dirty.discard(path)
+                self._evicted.add(path)
+
+    def vacuum(self, *root: Path | str) -> int:
+        """
+        Removes every path that no longer exists (or has changed since it was cached) and compacts the cache file.
+        :param root: If given, only paths under these directories are checked.
+        :return: The number of paths removed.
+        """
+        roots: tuple[str, ...] = tuple(str(Path(r)) for r in root)
+        stale: list[str] = []
+        for path, record in list(self._load().items()):
+            if roots and not any(path == r or Path(path).is_relative_to(r) for r in roots):
+                continue
+            try:
+                if Fingerprint.of(os.stat(path)) != record.fingerprint:
+                    stale.append(path)
+            except OSError:
+                stale.append(path)
+        self.evict(stale)
+        self.flush()
+        with self._lock:
+            self._connection.execute('VACUUM')
+        return len(stale)
+
+    def close(self) -> None:
+        """
+        Writes any pending changes and closes the cache file.
+        """
+        self.flush()
+        self._connection.close()
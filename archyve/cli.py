@@ -0,0 +1,263 @@
+"""
+Module contains archyve's command line interface. Every command writes its results as they are found, one record per
+line (newline delimited JSON, or CSV with a header row), so its output can be piped into other tools while the scan is
+still running and without the whole archive being held in memory.
+
+Usage:
+    archyve scan <directory>... [--type image]                       every file, with its size, type and mtime
+    archyve dupes <directory>... [--cache cache.sqlite]              files that have the same contents
+    archyve similar <directory>... [--threshold 6]                   images that look alike
+    archyve stats <directory>... [--by type,year] [--duplicates]     the number and size of files in each group
+    archyve dedupe <directory>... [--strategy hardlink] [--dry-run]  replace duplicates with links to the oldest copy
+
+Each command takes --workers, --cache, --include/--exclude/--max-depth, --type, --format and --progress (see --help).
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.instrumentation import Progress, observe
+from archyve.dedupe import STRATEGIES
+from archyve.similarity import ALGORITHMS
+from archyve.sniff import TYPE_DETECTION
+from archyve.parallel import BACKENDS
+from archyve.stats import KEYS
+from typing import Any, Callable, Final, Iterable, Sequence, TextIO
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from archyve.cache import EntryCache
+from archyve.entry import Entry, EntryType
+from archyve.archyve import Archyve
+from contextlib import ExitStack
+from datetime import datetime
+from time import monotonic
+import json
+import csv
+import sys
+import os
+
+
+# The ways results can be written out.
+FORMATS: Final[tuple[str, ...]] = ('ndjson', 'csv')
+
+# The type filters of an archyve, by the type they keep.
+_TYPE_FILTERS: Final[dict[EntryType, str]] = {EntryType.IMAGE: 'images', EntryType.VIDEO: 'videos',
+                                              EntryType.AUDIO: 'audios', EntryType.TEXT: 'texts',
+                                              EntryType.UNKNOWN: 'unknowns'}
+
+
+class _Writer:
+    """
+    Writes records (flat dictionaries) to a stream as newline delimited JSON or CSV. The stream is flushed at least
+    every interval seconds, so whatever reads it sees results soon after they are found without a flush per record.
+    """
+
+    def __init__(self, stream: TextIO, output_format: str, interval: float = 0.25):
+        """
+        :param stream: Where to write the records.
+        :param output_format: 'ndjson' or 'csv'.
+        :param interval: The most time between flushes, in seconds.
+        """
+        self.stream: TextIO = stream
+        self.format: str = output_format
+        self.interval: float = interval
+        self.__csv: csv.DictWriter | None = None
+        self.__flushed: float = monotonic()
+
+    def write(self, records: Iterable[dict[str, Any]]) -> None:
+        """
+        :param records: The records to write (in CSV, the first record ever written decides the columns).
+        """
+        for record in records:
+            if self.format == 'ndjson':
+                self.stream.write(json.dumps(record, default=str) + '\n')
+            else:
+                if self.__csv is None:
+                    self.__csv = csv.DictWriter(self.stream, list(record), lineterminator='\n')
+                    self.__csv.writeheader()
+                self.__csv.writerow(record)
+        if monotonic() - self.__flushed >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Flushes the stream, however recently it was flushed.
+        """
+        self.stream.flush()
+        self.__flushed = monotonic()
+
+
+def _type_of(entry: Entry, archyve: Archyve) -> str:
+    """
+    :param entry: An entry of the archyve.
+    :param archyve: The archyve.
+    :return: The name of the entry's type, found the way the archyve finds types.
+    """
+    return (entry.content_type if archyve.type_detection == 'content' else entry.entry_type).value
+
+
+def _files(group_id: int, group: Sequence[Entry]) -> list[dict[str, Any]]:
+    """
+    :param group_id: The number of a group of files.
+    :param group: The files in the group.
+    :return: A record for each file, naming its group.
+    """
+    return [{'group': group_id, 'size': e.size, 'path': os.fspath(e)} for e in group]
+
+
+def _keys(text: str) -> list[str]:
+    """
+    :param text: Comma separated keys to group files on.
+    :return: The keys.
+    """
+    keys: list[str] = text.split(',')
+    for key in keys:
+        if key not in KEYS:
+            raise ArgumentTypeError(f'unknown key \"{key}\", choose from: {",".join(KEYS)}')
+    return keys
+
+
+def scan(archyve: Archyve, args: Namespace, writer: _Writer) -> int:
+    """
+    Writes a record for every file.
+    """
+    for entry in archyve.entries:
+        writer.write([{'path': os.fspath(entry), 'size': entry.size, 'type': _type_of(entry, archyve),
+                       'modified': datetime.fromtimestamp(entry.stat.st_mtime).isoformat(timespec='seconds')}])
+    return 0
+
+
+def dupes(archyve: Archyve, args: Namespace, writer: _Writer) -> int:
+    """
+    Writes a record for every file that has a duplicate, as soon as its group of duplicates is confirmed.
+    """
+    memory_budget: int | None = args.memory_budget * 1024 ** 2 if args.memory_budget is not None else None
+    groups = archyve.iter_duplicates(args.block_size, memory_budget, args.spill_directory, args.verify)
+    for group_id, group in enumerate(groups, 1):
+        writer.write(_files(group_id, group))
+    return 0
+
+
+def similar(archyve: Archyve, args: Namespace, writer: _Writer) -> int:
+    """
+    Writes a record for every image that looks like another.
+    """
+    for group_id, group in enumerate(archyve.similar_images(args.threshold, args.algorithm), 1):
+        writer.write(_files(group_id, group))
+    return 0
+
+
+def stats(archyve: Archyve, args: Namespace, writer: _Writer) -> int:
+    """
+    Writes the number and total size of the files in each group (and the bytes wasted by duplicates in each).
+    """
+    writer.write(archyve.summarize(args.by, args.depth, args.duplicates, args.block_size))
+    return 0
+
+
+def dedupe(archyve: Archyve, args: Namespace, writer: _Writer) -> int:
+    """
+    Replaces duplicates with links to (or deletes them in favour of) the copy to keep, and writes a record for every
+    copy (what would be done to it, in a dry run) as soon as its group is done. The totals are written to standard
+    error.
+    """
+    def write(original: str, copy: str, size: int, reclaimed: int, error: Exception | None) -> None:
+        writer.write([{'original': original, 'copy': copy, 'size': size, 'reclaimed': reclaimed,
+                       'error': repr(error) if error is not None else None}])
+
+    report = archyve.deduplicate(args.strategy, args.keep, args.dry_run, args.block_size, write)
+    print(report, file=sys.stderr)
+    return 1 if report.failed else 0
+
+
+# The commands, by name.
+COMMANDS: Final[dict[str, Callable[[Archyve, Namespace, _Writer], int]]] = {
+    'scan': scan, 'dupes': dupes, 'similar': similar, 'stats': stats, 'dedupe': dedupe,
+}
+
+
+def parser() -> ArgumentParser:
+    """
+    :return: The parser of archyve's command line.
+    """
+    common: ArgumentParser = ArgumentParser(add_help=False)
+    common.add_argument('directories', nargs='+', help='the directories to manage')
+    common.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='the number of files to read at once (default: the number of CPUs)')
+    common.add_argument('--backend', choices=list(BACKENDS), default='thread', help='what to read files on')
+    common.add_argument('-c', '--cache', help='a cache of digests, kept between runs so unchanged files aren\'t read')
+    common.add_argument('-i', '--include', action='append', default=[], help='only files matching this glob')
+    common.add_argument('-e', '--exclude', action='append', default=[],
+                        help='skip files and folders matching this glob')
+    common.add_argument('--max-depth', type=int, help='how many levels of sub-folders to look in')
+    common.add_argument('-t', '--type', action='append', default=[], choices=[t.value for t in EntryType],
+                        help='only files of this type (may be given more than once)')
+    common.add_argument('--type-detection', choices=list(TYPE_DETECTION), default='extension',
+                        help='tell file types by their extension or by their contents')
+    common.add_argument('-f', '--format', choices=list(FORMATS), default='ndjson', help='how to write the results')
+    common.add_argument('-o', '--output', help='where to write the results (default: standard output)')
+    common.add_argument('--progress', action='store_true', help='show progress on standard error')
+
+    archyve_parser: ArgumentParser = ArgumentParser(prog='archyve', description=__doc__.splitlines()[1])
+    commands = archyve_parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('scan', parents=[common], help='list every file')
+    dupes_parser: ArgumentParser = commands.add_parser('dupes', parents=[common], help='find duplicate files')
+    dupes_parser.add_argument('--block-size', type=int, default=4096,
+                              help='the bytes read from each end of a file before hashing it all')
+    dupes_parser.add_argument('--memory-budget', type=int,
+                              help='sort on disk, holding at most this many MiB of records in memory (for archives '
+                                   'with more files than fit in memory)')
+    dupes_parser.add_argument('--spill-directory', help='where to sort on disk (default: the temporary directory)')
+    dupes_parser.add_argument('--verify', action='store_true', help='compare each group byte by byte too')
+    similar_parser: ArgumentParser = commands.add_parser('similar', parents=[common],
+                                                         help='find images that look alike')
+    similar_parser.add_argument('--threshold', type=int, default=6, help='the most bits two image hashes may differ by')
+    similar_parser.add_argument('--algorithm', choices=list(ALGORITHMS), default='phash')
+    stats_parser: ArgumentParser = commands.add_parser('stats', parents=[common], help='total the files in groups')
+    stats_parser.add_argument('--by', type=_keys, default=['type'],
+                              help=f'what to group the files on, comma separated (from: {",".join(KEYS)})')
+    stats_parser.add_argument('--depth', type=int, help='how many levels below the directories to group folders by')
+    stats_parser.add_argument('--duplicates', action='store_true', help='total the bytes wasted by duplicates too')
+    stats_parser.add_argument('--block-size', type=int, default=4096)
+    dedupe_parser: ArgumentParser = commands.add_parser('dedupe', parents=[common], help='reclaim duplicates\' space')
+    dedupe_parser.add_argument('--strategy', choices=list(STRATEGIES), default='hardlink')
+    dedupe_parser.add_argument('--keep', default='created', help='the entry attribute whose smallest value is kept')
+    dedupe_parser.add_argument('--dry-run', action='store_true', help='only check what would be done')
+    dedupe_parser.add_argument('--block-size', type=int, default=4096)
+    return archyve_parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """
+    Runs archyve's command line.
+    :param argv: The arguments (defaults to sys.argv[1:]).
+    :return: The exit status.
+    """
+    args: Namespace = parser().parse_args(argv)
+    with ExitStack() as stack:
+        cache: EntryCache | None = stack.enter_context(EntryCache(args.cache)) if args.cache else None
+        archyve: Archyve = Archyve(*args.directories, cache=cache, workers=args.workers, backend=args.backend,
+                                   include=args.include, exclude=args.exclude, max_depth=args.max_depth,
+                                   type_detection=args.type_detection)
+        types: list[EntryType] = [EntryType(t) for t in args.type]
+        if len(types) == 1:
+            getattr(archyve, _TYPE_FILTERS[types[0]])
+        elif types and args.type_detection == 'extension':
+            archyve.where(*types)  # Pushed down into the walk, so no entry is made for a file of another type.
+        elif types:
+            archyve.filter(lambda e: any(e.is_type(t, content=True) for t in types))
+
+        stream: TextIO = stack.enter_context(open(args.output, 'w', newline='')) if args.output else sys.stdout
+        if args.progress:
+            progress: Progress = Progress()
+            stack.callback(progress.close)
+            stack.enter_context(observe(progress))
+        writer: _Writer = _Writer(stream, args.format)
+        try:
+            status: int = COMMANDS[args.command](archyve, args, writer)
+            writer.flush()
+            return status
+        except BrokenPipeError:  # Whatever we were piped into (e.g. head) has stopped reading.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
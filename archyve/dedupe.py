@@ -0,0 +1,182 @@
+"""
+Module contains functions to reclaim the space taken by duplicate files without losing any of their paths. Each copy of
+a kept original is replaced by a hard link to it, or by a copy-on-write reflink of it (FICLONE, supported by e.g. btrfs
+and XFS), or is deleted. Every group is verified byte by byte before any of its copies are replaced (see the verify
+module), so a digest collision can never lose data, and the replacement is renamed over the copy so its path is never
+missing.
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Callable, Final, Iterable, Sequence
+from archyve.parallel import ordered_starmap
+from archyve.operations import Report
+from archyve.instrumentation import notify, observers
+from archyve.verify import Verification, identical, verify_group
+from collections import deque
+from time import perf_counter
+import shutil
+import errno
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+# The ways duplicates can be removed.
+HARDLINK: Final[str] = 'hardlink'
+REFLINK: Final[str] = 'reflink'
+DELETE: Final[str] = 'delete'
+STRATEGIES: Final[tuple[str, ...]] = (HARDLINK, REFLINK, DELETE)
+
+# The ioctl that clones one file's extents into another (see ioctl_ficlone(2)).
+FICLONE: Final[int] = 0x40049409
+
+
+def reflink(source: os.PathLike | str, destination: os.PathLike | str) -> None:
+    """
+    Makes a new file that shares the source's data on disk until either is written to.
+    :param source: The file to clone.
+    :param destination: Where to make the clone (must not exist).
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported on this platform', os.fspath(destination))
+    with open(source, 'rb') as src, open(destination, 'xb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(destination)
+            raise
+
+
+def _link(original: str, temporary: str, strategy: str) -> None:
+    """
+    Makes a file that shares an original's data.
+    :param original: The original file.
+    :param temporary: Where to make the new file.
+    :param strategy: HARDLINK or REFLINK.
+    """
+    if strategy == HARDLINK:
+        os.link(original, temporary)
+    else:
+        reflink(original, temporary)
+
+
+def replace_copy(original: os.PathLike | str, copy: os.PathLike | str, strategy: str = HARDLINK,
+                 dry_run: bool = False, verified: bool = False) -> int:
+    """
+    Replaces a copy of a file with a link to it (or deletes it), after checking their contents are identical.
+    :param original: The file to keep.
+    :param copy: The duplicate of it.
+    :param strategy: HARDLINK, REFLINK or DELETE.
+    :param dry_run: Whether to only check the copy (it is still compared with the original).
+    :param verified: Whether the copy has just been verified to be identical to the original (see verify.verify_group),
+                     so isn't compared again.
+    :return: The number of bytes reclaimed (0 if the copy already shared the original's data, or held data that is
+             still linked elsewhere).
+    """
+    original, copy = os.fspath(original), os.fspath(copy)
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy \"{strategy}\", choose from: {list(STRATEGIES)}')
+    stat: os.stat_result = os.stat(copy)
+    if os.path.samefile(original, copy):
+        return 0  # Already a hard link to the original.
+    if not verified and not identical(original, copy):
+        raise ValueError(f'\"{copy}\" is not identical to \"{original}\"')
+    reclaimed: int = stat.st_size if stat.st_nlink == 1 else 0
+    if dry_run:
+        return reclaimed
+
+    if strategy == DELETE:
+        os.unlink(copy)
+        return reclaimed
+    folder, name = os.path.split(copy)
+    temporary: str = os.path.join(folder, f'.{name}.{os.getpid()}.link')
+    _link(original, temporary, strategy)
+    try:
+        if strategy == REFLINK:
+            shutil.copystat(copy, temporary)  # A clone is a new file: keep the copy's own permissions and times.
+        os.replace(temporary, copy)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return reclaimed
+
+
+def _deduplicate_group(paths: Sequence[str], strategy: str,
+                       dry_run: bool) -> tuple[list[tuple[str, int, int, Exception | None]], int]:
+    """
+    Replaces the copies in a group of duplicates with links to the first file of the group, once the whole group has
+    been verified in one pass.
+    :param paths: The paths of the duplicates, the one to keep first.
+    :param strategy: HARDLINK, REFLINK or DELETE.
+    :param dry_run: Whether to only check the copies.
+    :return: The path, the size, the bytes reclaimed and the error (None on success) of each copy, and the number of
+             bytes read to verify them.
+    """
+    verification: Verification = verify_group(paths)
+    original: str = paths[0]
+    same: set[str] = next((set(g) for g in verification.groups if g[0] == original), set())
+    outcomes: list[tuple[str, int, int, Exception | None]] = []
+    for copy in paths[1:]:
+        error: Exception | None = verification.failed.get(original) or verification.failed.get(copy)
+        if error is None and copy not in same:
+            error = ValueError(f'\"{copy}\" is not identical to \"{original}\"')
+        if error is not None:
+            outcomes.append((copy, 0, 0, error))
+            continue
+        try:
+            size: int = os.path.getsize(copy)
+            outcomes.append((copy, size, replace_copy(original, copy, strategy, dry_run, verified=True), None))
+        except (OSError, ValueError) as e:
+            outcomes.append((copy, 0, 0, e))
+    return outcomes, verification.bytes_read
+
+
+def deduplicate(groups: Iterable[Sequence[os.PathLike | str]], strategy: str = HARDLINK, workers: int = 1,
+                dry_run: bool = False,
+                on_copy: Callable[[str, str, int, int, Exception | None], None] | None = None) -> Report:
+    """
+    Replaces duplicates with links to (or removes them in favour of) the first file of their group.
+    :param groups: Groups of files with the same contents, the file to keep first in each group.
+    :param strategy: HARDLINK, REFLINK or DELETE.
+    :param workers: The number of groups handled at once.
+    :param dry_run: Whether to only check the copies (every copy is still compared with its original).
+    :param on_copy: Called with the original, the copy, its size, the bytes reclaimed (that would be, in a dry run)
+                    and the error (None on success) of each copy, as soon as its group is done.
+    :return: A report of the number of copies replaced, their total size, the bytes reclaimed, the bytes read to
+             verify them and what failed.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy \"{strategy}\", choose from: {list(STRATEGIES)}')
+
+    report: Report = Report(dry_run)
+    start: float = perf_counter()
+    originals: deque[str] = deque()  # The original of each group handed to the workers, in order
+
+    def arguments() -> Iterable[tuple]:
+        for group in groups:
+            paths: list[str] = [os.fspath(p) for p in group]
+            originals.append(paths[0])
+            yield paths, strategy, dry_run
+
+    for outcomes, verified in ordered_starmap(_deduplicate_group, arguments(), workers):
+        report.verified += verified
+        original: str = originals.popleft()
+        for copy, size, reclaimed, error in outcomes:
+            if on_copy is not None:
+                on_copy(original, copy, size, reclaimed, error)
+            if error is None:
+                report.done += 1
+                report.bytes += size
+                report.reclaimed += reclaimed
+                if observers and not dry_run:
+                    notify('operated', strategy, copy, size)
+            else:
+                report.failed[copy] = error
+                if observers:
+                    notify('error', copy, error)
+    report.seconds = perf_counter() - start
+    return report
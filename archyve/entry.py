@@ -6,13 +6,22 @@ NB: Each file in an archive is an Entry.
 Author: ali.kellaway139@gmail.com
 """
 from PIL import Image, ExifTags, UnidentifiedImageError
-from os.path import getsize, getctime
+from archyve.cache import EntryCache
+from archyve import metadata, similarity
+from archyve.similarity import image_hash
+from archyve.media import MediaInfo, media_info
+from archyve.operations import move_file
+from archyve.instrumentation import notify, observers
 from datetime import datetime
-from typing import Any, Union
-from functools import cache
+from typing import Any, Callable, Union
+from os import DirEntry, stat_result
+from archyve.hashing import DEFAULT_ALGORITHM, CHUNK_SIZE, file_digest, edge_digest
+from functools import lru_cache
+from time import perf_counter
 from pathlib import Path
-from hashlib import md5
 from enum import Enum
+import sys
+import os
 
 
 class EntryType(Enum):
@@ -55,42 +64,249 @@ class Entry:
         # Add any extra text extensions here
     }
 
-    def __init__(self, path: Union[Path, str, 'Entry']):
+    # Entries are kept lean so that millions of them fit in memory: no __dict__, the parent directory string is shared
+    # between the entries in the same folder, and the type, stat and memo are only filled in when they are needed.
+    __slots__ = ('_parent', '_name', '_type', '_stat', '_dir_entry', '_memo', 'cache')
+
+    def __init__(self, path: Union[Path, str, 'Entry', DirEntry], cache: EntryCache | None = None,
+                 stat: stat_result | None = None, memo: dict[str, Any] | None = None):
         """
         Create a new instance of the class.
-        :param path: The path of the file to represent.
+        :param path: The path of the file to represent (or the os.DirEntry a directory walk found it as).
+        :param cache: A persistent cache to check for the entry's digests and capture date before reading the file.
+        :param stat: The stat of the file, if it is already known.
+        :param memo: The dictionary the entry remembers its digests in. Passing one in lets the caller keep what the
+                     entry works out after the entry itself is gone (an EntryTable does this).
         """
+        self._type: EntryType | None = None
+        self._stat: stat_result | None = stat
+        self._dir_entry: DirEntry | None = None
+        self._memo: dict[str, Any] | None = memo
+        self.cache: EntryCache | None = cache
+
         # Use our parameters to create the object.
         if isinstance(path, Path | str):
-            self.path: Path = Path(path)
+            self.__set_path(os.fspath(Path(path)))
+
+        # If we got the entry from a directory walk, it can give us the file's stat without another call.
+        elif isinstance(path, DirEntry):
+            self.__set_path(path.path)
+            self._dir_entry = path
 
         # If we got an Entry object as input
         elif isinstance(path, Entry):
-            for attribute, value in path.__dict__.items():
-                setattr(self, attribute, value)
+            for attribute in Entry.__slots__:
+                value: Any = getattr(path, attribute)
+                setattr(self, attribute, value.copy() if isinstance(value, dict) else value)
+            self.cache = cache or path.cache
+            self._stat = stat or path._stat
+            self._memo = memo if memo is not None else self._memo
 
         # We don't know what to do with this input type
         else:
             raise NotImplementedError(f'Constructor for entry with input \"{path}\" not implemented.')
 
+    def __set_path(self, path: str) -> None:
+        """
+        Points the entry at a new path, sharing the parent directory string with other entries in the same folder.
+        :param path: The new (normalised) path.
+        """
+        parent, self._name = os.path.split(path)
+        self._parent = sys.intern(parent)
+
+    @property
+    def path(self) -> Path:
+        """
+        :return: The path of the file.
+        """
+        return Path(self._parent, self._name)
+
+    @property
+    def name(self) -> str:
+        """
+        :return: The name of the file (without making a Path).
+        """
+        return self._name
+
+    def __fspath__(self) -> str:
+        """
+        Lets an entry be used anywhere a path can (e.g. open(entry)) without making a Path.
+        :return: The path of the file as a string.
+        """
+        return os.path.join(self._parent, self._name)
+
+    @property
+    def __memo(self) -> dict[str, Any]:
+        """
+        :return: The dictionary the entry remembers what it has worked out in (made when first needed).
+        """
+        if self._memo is None:
+            self._memo = {}
+        return self._memo
+
     def __hash__(self) -> int:
         """
         Returns the hash of the underlying file given its path.
-        :return: A string hash of the file at the path.
+        :return: An int hash of the file's digest.
+        """
+        return hash(self.digest())
+
+    def digest(self, algorithm: str = DEFAULT_ALGORITHM, chunk_size: int = CHUNK_SIZE) -> bytes:
+        """
+        Returns the digest of the contents of the file. The file is streamed through a fixed size buffer, so memory
+        use does not grow with the size of the file. The digest is remembered so the file is only read once per
+        algorithm.
+        :param algorithm: The name of the hash algorithm to use (see hashing.available_algorithms()).
+        :param chunk_size: The number of bytes to read at a time.
+        :return: The full digest of the file.
+        """
+        return self.__digest(algorithm, lambda: file_digest(os.fspath(self), algorithm, chunk_size), lambda: self.size)
+
+    def edge_digest(self, block_size: int = 4096, algorithm: str = DEFAULT_ALGORITHM) -> bytes:
+        """
+        Returns a digest of the first and last block_size bytes of the file. This is much cheaper than hashing the
+        whole file and is enough to tell apart most files that happen to share a size. Files no bigger than two blocks
+        are hashed in full.
+        :param block_size: The number of bytes to read from each end of the file.
+        :param algorithm: The name of the hash algorithm to use.
+        :return: The digest of the ends of the file.
+        """
+        return self.__digest(Entry.__digest_key(algorithm, block_size),
+                             lambda: edge_digest(os.fspath(self), self.size, block_size, algorithm),
+                             lambda: min(self.size, 2 * block_size))
+
+    def image_hash(self, algorithm: str = 'phash', hash_size: int = 8) -> int | None:
+        """
+        Returns a perceptual hash of the image (see similarity.image_hash). Like digests, it is only computed once and
+        is kept in the entry's cache if it has one.
+        :param algorithm: The name of the perceptual hash to use ('ahash', 'dhash' or 'phash').
+        :param hash_size: The width and height of the grid of bits (the hash has hash_size ** 2 bits).
+        :return: The hash, or None if the entry isn't an image that can be opened.
+        """
+        if not self.entry_type == EntryType.IMAGE:
+            return None
+        digest: bytes = self.__digest(similarity.hash_key(algorithm, hash_size),
+                                      lambda: similarity.hash_bytes(image_hash(os.fspath(self), algorithm, hash_size),
+                                                                    hash_size),
+                                      lambda: self.size)
+        return int.from_bytes(digest, 'big') if digest else None
+
+    def cached_digest(self, algorithm: str = DEFAULT_ALGORITHM, block_size: int | None = None) -> bytes | None:
+        """
+        Returns the digest of the file if it is already known (either from an earlier call to digest or from the
+        entry's cache), without reading the file.
+        :param algorithm: The name of the hash algorithm.
+        :param block_size: If given, look for the edge digest with this block size instead of the full digest.
+        :return: The digest of the file, or None if it would need to be read.
+        """
+        key: str = Entry.__digest_key(algorithm, block_size)
+        digest: bytes | None = self._memo.get(key) if self._memo else None
+        if digest is None and self.cache is not None:
+            digest = self.cache.get_digest(os.fspath(self), self.stat, key)
+            if observers:
+                notify('cache_lookup', digest is not None)
+            if digest is not None:
+                self.__memo[key] = digest
+        return digest
+
+    def add_digest(self, digest: bytes, algorithm: str = DEFAULT_ALGORITHM, block_size: int | None = None) -> None:
+        """
+        Records a digest of the file that was computed elsewhere (e.g. in another process), so that it does not need to
+        be computed again. The digest is also written to the entry's cache if it has one.
+        :param digest: The digest of the file.
+        :param algorithm: The name of the hash algorithm the digest was made with.
+        :param block_size: The block size if this is an edge digest, else None for a full digest.
         """
-        md5_hash = md5()
-        with open(Path(self.path).resolve(), 'rb') as f:
-            buf = f.read()
-            md5_hash.update(buf)
-            return hash(md5_hash.hexdigest())
+        key: str = Entry.__digest_key(algorithm, block_size)
+        self.__memo[key] = digest
+        if self.cache is not None:
+            self.cache.put_digest(os.fspath(self), self.stat, key, digest, self.entry_type.value)
+
+    @staticmethod
+    def __digest_key(algorithm: str, block_size: int | None) -> str:
+        """
+        :param algorithm: The name of the hash algorithm.
+        :param block_size: The block size of an edge digest, or None for a full digest.
+        :return: The name a digest is remembered under.
+        """
+        return algorithm if block_size is None else f'{algorithm}:edge{block_size}'
+
+    def __digest(self, key: str, compute: Callable[[], bytes], read: Callable[[], int]) -> bytes:
+        """
+        Returns a digest of the file, looking in memory and then in the entry's cache before computing it.
+        :param key: The name the digest is remembered under.
+        :param compute: The function that reads the file to produce the digest.
+        :param read: The function giving the number of bytes compute reads (only called when observed).
+        :return: The digest.
+        """
+        memo: dict[str, Any] = self.__memo
+        if key not in memo:
+            if self.cache is None:
+                memo[key] = compute()
+            else:
+                stat: stat_result = self.stat
+                digest: bytes | None = self.cache.get_digest(os.fspath(self), stat, key)
+                if observers:
+                    notify('cache_lookup', digest is not None)
+                if digest is not None:
+                    memo[key] = digest
+                    return digest
+                digest = compute()
+                self.cache.put_digest(os.fspath(self), stat, key, digest, self.entry_type.value)
+                memo[key] = digest
+            if observers:
+                notify('hashed', os.fspath(self), read())
+        return memo[key]
 
     @property
     def entry_type(self) -> EntryType:
         """
-        Returns the entry type enum of the given file if it is recognized, else Unknown.
+        Returns the entry type enum of the given file if its extension is recognized (whatever its case), else Unknown.
+        It is only worked out once. See content_type for the type according to the file's contents.
         :return: The EntryType of the given path.
         """
-        return Entry.EXTENSION_MAP.get(Path(self.path).suffix, EntryType.UNKNOWN)
+        if self._type is None:
+            self._type = Entry.EXTENSION_MAP.get(os.path.splitext(self._name)[1].lower(), EntryType.UNKNOWN)
+        return self._type
+
+    @property
+    def content_type(self) -> EntryType:
+        """
+        Returns the type of the file according to the first few bytes of its contents (see sniff.sniff), which finds
+        files whose extensions are missing or wrong. Files whose contents aren't recognised fall back to entry_type.
+        It is only read once.
+        :return: The EntryType of the file's contents.
+        """
+        content_type: EntryType | None = self.cached_content_type()
+        if content_type is None:
+            from archyve.sniff import sniff  # The sniff module needs EntryType from this one.
+            self.add_content_type(sniff(self))
+            content_type = self._memo['content_type']
+        return content_type
+
+    def cached_content_type(self) -> EntryType | None:
+        """
+        :return: The type of the file's contents if it has already been read, else None.
+        """
+        return self._memo.get('content_type') if self._memo else None
+
+    def add_content_type(self, content_type: EntryType | None) -> None:
+        """
+        Records the type of the file's contents, found elsewhere (e.g. by sniff.sniff_many on a pool of workers, or
+        from the header read by a duplicate search), so that it does not need to be read again.
+        :param content_type: The type of the contents, or None if they weren't recognised.
+        """
+        self.__memo['content_type'] = content_type or self.entry_type
+
+    @property
+    def stat(self) -> stat_result:
+        """
+        :return: The stat of the file. It is only fetched once (entries made by a directory walk reuse the walk's).
+        """
+        if self._stat is None:
+            self._stat = self._dir_entry.stat() if self._dir_entry is not None else os.stat(self)
+            self._dir_entry = None
+        return self._stat
 
     @property
     def size(self) -> int:
@@ -98,15 +314,16 @@ class Entry:
         Returns the size in bytes of the file.
         :return:
         """
-        return getsize(self.path)
+        return self.stat.st_size
 
     def __eq__(self, other: Any) -> bool:
         """
-        Returns whether the file's contents is equal to the other file's contents.
+        Returns whether the file's contents is equal to the other file's contents. Files of different sizes are never
+        read, otherwise the full digests are compared.
         :param other: The other file.
         :return: bool True if the contents are equal.
         """
-        return isinstance(other, Entry) and hash(self) == hash(other)
+        return isinstance(other, Entry) and self.size == other.size and self.digest() == other.digest()
 
     def __lt__(self, other: Any) -> bool:
         """
@@ -116,38 +333,159 @@ class Entry:
         """
         if not isinstance(other, Entry):
             raise NotImplementedError(f'Size comparison between Entry and \"{type(other)}\" is not implemented.')
-        return getsize(self.path) < getsize(other.path)
+        return self.size < other.size
 
     @property
     def created(self) -> datetime:
         """
-        :return: The creation date of the file (other the taken date in the item is an image and has an entry for this).
+        :return: The creation date of the file (or when it was taken / recorded, if it is an image, video or audio file
+                 whose headers say).
+        """
+        capture_date: datetime | None = self.capture_date
+        return capture_date if capture_date else datetime.fromtimestamp(self.stat.st_ctime)
+
+    @property
+    def capture_date(self) -> datetime | None:
+        """
+        :return: The date the image was taken according to its exif data (or the video / audio file was recorded
+                 according to its headers, see media), or None if it isn't one of these or doesn't have one. It is only
+                 worked out once, and the entry's cache (if it has one) is checked before the headers of the file are
+                 read (see metadata.capture_date).
+        """
+        if self.entry_type in (EntryType.VIDEO, EntryType.AUDIO):
+            return self.media.capture_date
+        known, capture_date = self.cached_capture_date()
+        if not known:
+            capture_date = metadata.capture_date(os.fspath(self))
+            self.add_capture_date(capture_date)
+        return capture_date
+
+    def cached_capture_date(self) -> tuple[bool, datetime | None]:
+        """
+        Returns the capture date of the image (or video / audio file) if it is already known (from an earlier call to
+        capture_date or from the entry's cache), without reading the file.
+        :return: Whether the capture date is known, and the capture date (None if it isn't known or there isn't one).
         """
+        if self.entry_type in (EntryType.VIDEO, EntryType.AUDIO):
+            known, info = self.cached_media()
+            return known, info.capture_date if info is not None else None
         if not self.entry_type == EntryType.IMAGE:
-            time_stamp: float = getctime(self.path)
-        else:  # File is an image, look for the date it was taken.
-            exif: dict | None = self.exif
-            date_taken: str | None = exif.get('DateTimeOriginal') if exif else None
-            time_stamp: float = float(date_taken) if date_taken else getctime(self.path)
+            return True, None
+        if self._memo and 'capture_date' in self._memo:
+            return True, self._memo['capture_date']
+        if self.cache is not None:
+            known, capture_date = self.cache.get_capture_date(os.fspath(self), self.stat)
+            if known:
+                self.__memo['capture_date'] = capture_date
+                return True, capture_date
+        return False, None
 
-        return datetime.fromtimestamp(time_stamp)
+    def add_capture_date(self, capture_date: datetime | None) -> None:
+        """
+        Records the capture date of the image, found elsewhere (e.g. by metadata.capture_dates on a pool of workers),
+        so that it does not need to be read again. It is also written to the entry's cache if it has one.
+        :param capture_date: When the image was taken, or None if it doesn't say.
+        """
+        self.__memo['capture_date'] = capture_date
+        if self.cache is not None:
+            self.cache.put_capture_date(os.fspath(self), self.stat, capture_date, self.entry_type.value)
+
+    @property
+    def media(self) -> MediaInfo | None:
+        """
+        :return: When the video or audio file was recorded, how long it is and how big its picture is, according to its
+                 headers (see media.media_info), or None if it isn't a video or audio file. It is only worked out once,
+                 and the entry's cache (if it has one) is checked before the headers of the file are read.
+        """
+        known, info = self.cached_media()
+        if not known:
+            start: float = perf_counter()
+            info = media_info(os.fspath(self))
+            self.add_media(info)
+            if observers:
+                notify('metadata_read', os.fspath(self), perf_counter() - start)
+        return info
+
+    def cached_media(self) -> tuple[bool, MediaInfo | None]:
+        """
+        Returns the metadata of the video or audio file if it is already known (from an earlier call to media or from
+        the entry's cache), without reading the file.
+        :return: Whether the metadata is known, and the metadata (None if it isn't known or this isn't a video or audio
+                 file).
+        """
+        if self.entry_type not in (EntryType.VIDEO, EntryType.AUDIO):
+            return True, None
+        if self._memo and 'media' in self._memo:
+            return True, self._memo['media']
+        if self.cache is not None:
+            info: MediaInfo | None = self.cache.get_media(os.fspath(self), self.stat)
+            if info is not None:
+                self.__memo['media'] = info
+                return True, info
+        return False, None
+
+    def add_media(self, info: MediaInfo) -> None:
+        """
+        Records the metadata of the video or audio file, found elsewhere (e.g. by media.media_infos on a pool of
+        workers), so that it does not need to be read again. It is also written to the entry's cache if it has one.
+        :param info: The metadata.
+        """
+        self.__memo['media'] = info
+        if self.cache is not None:
+            self.cache.put_media(os.fspath(self), self.stat, info, self.entry_type.value)
+
+    @property
+    def duration(self) -> float | None:
+        """
+        :return: How long the video or audio file is in seconds, or None if it isn't one or its headers don't say.
+        """
+        info: MediaInfo | None = self.media
+        return info.duration if info is not None else None
+
+    @property
+    def dimensions(self) -> tuple[int, int] | None:
+        """
+        :return: The width and height of the image or video (from its headers), or None if it isn't one or they can't
+                 be read.
+        """
+        if self.entry_type != EntryType.IMAGE:
+            info: MediaInfo | None = self.media
+            return info.dimensions if info is not None else None
+        if self._memo and 'dimensions' in self._memo:
+            return self._memo['dimensions']
+        try:
+            with Image.open(self) as img:  # Only the headers are read until the pixels are asked for.
+                dimensions: tuple[int, int] | None = img.size
+        except (UnidentifiedImageError, OSError):
+            dimensions = None
+        self.__memo['dimensions'] = dimensions
+        return dimensions
 
     @property
     def exif(self) -> dict[str, str] | None:
         """
-        :return: the exif data for the entry if it's an image and has exif data. Else returns None.
+        :return: the exif data for the entry (including the EXIF sub-directory, where e.g. DateTimeOriginal lives) if
+                 it's an image and has exif data. Else returns None.
         """
         if not self.entry_type == EntryType.IMAGE:
             return None
         else:
+            start: float = perf_counter()
             try:
-                with Image.open(self.path) as img:
-                    return {ExifTags.TAGS[k]: v for k, v in img.getexif().items()}
-            except UnidentifiedImageError:
+                with Image.open(self) as img:
+                    exif: Image.Exif = img.getexif()
+                    tags: dict[int, Any] = {**exif, **exif.get_ifd(metadata.EXIF_IFD_POINTER)}
+                    return {ExifTags.TAGS.get(k, str(k)): v for k, v in tags.items()}
+            except UnidentifiedImageError as e:
+                if observers:
+                    notify('error', os.fspath(self), e)
                 return None
+            finally:
+                if observers:
+                    notify('metadata_read', os.fspath(self), perf_counter() - start)
 
     @staticmethod
-    @cache
+    @lru_cache(maxsize=None)
     def __suffix_set():
         """
         :return: A set of all the suffixes known.
@@ -158,7 +496,7 @@ class Entry:
         """
         :return: A string representation of the entry (its path).
         """
-        return str(self.path)
+        return os.fspath(self)
 
     def delete(self) -> Exception | None:
         """
@@ -175,21 +513,24 @@ class Entry:
         Renames the entry.
         :param new_file_name: The new name to give the entry.
         """
-        self.path.rename(self.path.parent / new_file_name)
+        self.move(os.path.join(self._parent, new_file_name))
 
     def move(self, new_path: Path | str) -> None:
         """
-        Moves the entry to a new path.
+        Moves the entry to a new path (copying it, if the new path is on another device).
         :param new_path: The new path the entry will have.
         """
-        self.path.rename(new_path)
+        move_file(self, new_path, replace=True)
+        self.__set_path(os.fspath(Path(new_path)))
+        self._type = self._stat = self._dir_entry = None
 
-    def is_type(self, e_type: EntryType) -> bool:
+    def is_type(self, e_type: EntryType, content: bool = False) -> bool:
         """
         :param e_type: The entry type to check equality for.
+        :param content: Whether to go by the file's contents (see content_type) rather than its extension.
         :return: Whether this entry is of the parameter type.
         """
-        return self.entry_type == e_type
+        return (self.content_type if content else self.entry_type) == e_type
 
 
 if __name__ == '__main__':
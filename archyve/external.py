@@ -0,0 +1,281 @@
+"""
+Module contains an out-of-core duplicate search, for archives with too many files for every entry to be held in memory
+at once. Each stage of the search (size, then the ends of each file, then each whole file) writes a small record per
+file - its size, a digest and its path - to sorted runs on disk, and reads them back with a streaming k-way merge
+(heapq.merge), so files with the same key come out next to each other and can be grouped one group at a time. The
+records held in memory never take more than the memory budget (give or take the read buffers of the runs being
+merged), however large the archive.
+
+Usage:
+    files = ((os.fspath(e), e.size) for e in archyve.entries)
+    for group in external_duplicates(files, memory_budget=64 * 1024 ** 2):
+        print(group)  # [(size, digest, path), ...]
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import BinaryIO, Final, Generator, Iterable, Iterator
+from archyve.hashing import DEFAULT_ALGORITHM, edge_digest, file_digest
+from archyve.instrumentation import notify, observers
+from archyve.parallel import ordered_starmap
+from tempfile import TemporaryDirectory
+from itertools import chain, groupby
+from time import perf_counter
+from pathlib import Path
+import struct
+import heapq
+import os
+
+
+# The memory records may take up during a search when no budget is given, in bytes.
+DEFAULT_MEMORY_BUDGET: Final[int] = 256 * 1024 ** 2
+
+# The size of the buffer each run is read through while it is merged.
+READ_BUFFER: Final[int] = 64 * 1024
+
+# Roughly what a record costs in memory besides the bytes of its digest and path (the tuple, the int, the bytes and
+# str objects, and its slot in the list it is buffered in).
+_RECORD_OVERHEAD: Final[int] = 200
+
+# How a record is written to a run: its size and the lengths of its digest and path (followed by both).
+_HEADER: Final[struct.Struct] = struct.Struct('>QBH')
+
+# A record: the file's size, a digest of it (empty until it has been hashed) and its path.
+Record = tuple[int, bytes, str]
+
+
+def _read_run(file: BinaryIO) -> Generator[Record, None, None]:
+    """
+    :param file: A run, open for reading.
+    :return: A generator of the records in the run.
+    """
+    header_size: int = _HEADER.size
+    while header := file.read(header_size):
+        size, digest_length, path_length = _HEADER.unpack(header)
+        body: bytes = file.read(digest_length + path_length)
+        yield size, body[:digest_length], os.fsdecode(body[digest_length:])
+
+
+class ExternalSorter:
+    """
+    Sorts more records than fit in memory: records are buffered until they would take more than the memory budget,
+    then sorted and written to a run on disk. Reading the sorter merges the runs (and whatever is still buffered). If
+    there are too many runs to merge at once within the budget, they are merged in several passes. The buffered
+    records are handed over to the merge and released as soon as it is used up, so a sorter can only be read once.
+    """
+
+    def __init__(self, directory: Path | str, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        """
+        :param directory: Where to write the runs (it should be on a local disk with room for a copy of the records).
+        :param memory_budget: The most memory the buffered records may take, in bytes.
+        """
+        self.directory: Path = Path(directory)
+        self.memory_budget: int = memory_budget
+        self.runs: list[Path] = []
+        self.__buffer: list[Record] = []
+        self.__buffered: int = 0
+        self.__count: int = 0
+        self.__written: int = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    @property
+    def buffered(self) -> int:
+        """
+        :return: Roughly how much memory the records still held in memory take, in bytes.
+        """
+        return self.__buffered
+
+    def add(self, record: Record) -> None:
+        """
+        :param record: A record to sort.
+        """
+        self.__buffer.append(record)
+        self.__buffered += _RECORD_OVERHEAD + len(record[1]) + len(record[2])
+        self.__count += 1
+        if self.__buffered >= self.memory_budget:
+            self.__spill()
+
+    def __spill(self) -> None:
+        """
+        Writes the buffered records to a new run, in order.
+        """
+        self.__buffer.sort()
+        self.runs.append(self.__write(self.__buffer))
+        self.__buffer, self.__buffered = [], 0
+
+    def __write(self, records: Iterable[Record]) -> Path:
+        """
+        :param records: Records, in order.
+        :return: The run they were written to.
+        """
+        path: Path = self.directory / f'run-{id(self)}-{self.__written}'
+        self.__written += 1
+        with open(path, 'wb', buffering=READ_BUFFER) as f:
+            for size, digest, file_path in records:
+                encoded: bytes = os.fsencode(file_path)
+                f.write(_HEADER.pack(size, len(digest), len(encoded)))
+                f.write(digest)
+                f.write(encoded)
+        return path
+
+    def __iter__(self) -> Iterator[Record]:
+        """
+        :return: A generator of every record added so far, in order.
+        """
+        # Each run being merged holds a read buffer, so only as many are merged at once as the budget allows for.
+        fan_in: int = max(2, self.memory_budget // READ_BUFFER)
+        while len(self.runs) > fan_in:
+            batch, self.runs = self.runs[:fan_in], self.runs[fan_in:]
+            self.runs.append(self.__write(self.__merge(batch, [])))
+            for run in batch:
+                run.unlink()
+        self.__buffer.sort()
+        buffer, self.__buffer, self.__buffered = self.__buffer, [], 0
+        return self.__merge(self.runs, buffer)
+
+    @staticmethod
+    def __merge(runs: list[Path], buffer: list[Record]) -> Generator[Record, None, None]:
+        """
+        :param runs: Runs to merge.
+        :param buffer: Sorted records still in memory (emptied once they have all been merged).
+        :return: A generator of the records in all of them, in order.
+        """
+        files: list[BinaryIO] = [open(run, 'rb', buffering=READ_BUFFER) for run in runs]
+        try:
+            yield from heapq.merge(buffer, *(_read_run(f) for f in files))
+        finally:
+            buffer.clear()  # Release the memory before the next stage fills its own buffer.
+            for f in files:
+                f.close()
+
+
+def _shared(records: Iterable[Record], key_length: int) -> Generator[Record, None, None]:
+    """
+    :param records: Records in order.
+    :param key_length: How many of the records' fields make up their key (1 for size, 2 for size and digest).
+    :return: A generator of the records whose key another record has too (the rest can't have a duplicate).
+    """
+    previous: Record | None = None
+    previous_shared: bool = False
+    for record in records:
+        if previous is not None and record[:key_length] == previous[:key_length]:
+            if not previous_shared:
+                yield previous
+            yield record
+            previous_shared = True
+        else:
+            previous_shared = False
+        previous = record
+
+
+def _hashed(record: Record, block_size: int | None, algorithm: str) -> tuple[Record, bytes | None]:
+    """
+    :param record: The record of a file.
+    :param block_size: The number of bytes to read from each end of the file, or None to read all of it.
+    :param algorithm: The hash algorithm.
+    :return: The record, and the edge (see hashing.edge_digest) or full digest of the file (None if it has gone since
+             it was found).
+    """
+    size, _, path = record
+    try:
+        return record, file_digest(path, algorithm) if block_size is None else \
+            edge_digest(path, size, block_size, algorithm)
+    except FileNotFoundError:
+        return record, None
+
+
+def external_duplicates(files: Iterable[tuple[str, int]], block_size: int = 4096,
+                        memory_budget: int = DEFAULT_MEMORY_BUDGET, directory: Path | str | None = None,
+                        workers: int = 1, backend: str = 'thread', algorithm: str = DEFAULT_ALGORITHM,
+                        bytes_read: dict[str, int] | None = None) -> Generator[list[Record], None, None]:
+    """
+    Finds files with the same contents in stages, as Archyve.duplicates does (by size, then by the first and last
+    block_size bytes, then by the whole file), but sorting each stage's records on disk rather than grouping them in
+    memory. Files are hashed on a pool of workers as the records stream past; a file that disappears during the search
+    is left out. Groups of files no bigger than two blocks come first (in size order) as soon as their ends are hashed,
+    then the rest (in size and digest order) once every file that could be in one has been hashed.
+    :param files: The path and size of every file to search.
+    :param block_size: The number of bytes read from each end of a file during the partial stage.
+    :param memory_budget: The most memory the records of a stage may take, in bytes (split between the stage being
+                          read and the stage being written).
+    :param directory: Where to write the sorted runs (defaults to the system's temporary directory). The runs are
+                      removed when the search is finished or closed.
+    :param workers: The number of files to hash at once.
+    :param backend: 'thread' or 'process' (see parallel.ordered_starmap).
+    :param algorithm: The hash algorithm.
+    :param bytes_read: A dictionary to add the bytes read by the 'partial' and 'full' stages to.
+    :return: A generator of groups of records (size, digest, path) of files with the same contents; the digest is the
+             full digest of the file.
+    """
+    bytes_read = bytes_read if bytes_read is not None else {}
+    for stage in ('size', 'partial', 'full'):
+        bytes_read.setdefault(stage, 0)
+    budget: int = max(1, memory_budget // 2)
+    with TemporaryDirectory(prefix='archyve-', dir=directory) as runs:
+        # Size: only sizes that more than one file has need reading.
+        start: float = perf_counter()
+        if observers:
+            notify('stage_started', 'size', 0, 0)
+        by_size: ExternalSorter = ExternalSorter(runs, budget)
+        for path, size in files:
+            by_size.add((size, b'', path))
+        if observers:
+            notify('stage_finished', 'size', perf_counter() - start)
+
+        # Partial: hash the ends of every file that shares its size.
+        start = perf_counter()
+        if observers:
+            notify('stage_started', 'partial', 0, 0)
+        by_edges: ExternalSorter = ExternalSorter(runs, budget)
+
+        def non_empty(records: Iterable[Record]) -> Generator[Record, None, None]:
+            for record in records:
+                if record[0]:
+                    yield record
+                else:  # Empty files are all the same, so aren't read.
+                    by_edges.add(record)
+
+        arguments = ((r, block_size, algorithm) for r in non_empty(_shared(by_size, 1)))
+        for (size, _, path), digest in ordered_starmap(_hashed, arguments, workers, backend):
+            if digest is not None:
+                by_edges.add((size, digest, path))
+                bytes_read['partial'] += min(size, 2 * block_size)
+                if observers:
+                    notify('hashed', path, min(size, 2 * block_size))
+        if observers:
+            notify('stage_finished', 'partial', perf_counter() - start)
+
+        # Files no bigger than two blocks were read whole by the partial stage, so their groups are already certain.
+        # Records come in size order, so these groups all come before any that need a full hash.
+        records: Iterator[Record] = _shared(by_edges, 2)
+        group: list[Record] = []
+        first_large: list[Record] = []
+        for record in records:
+            if record[0] > 2 * block_size:
+                first_large.append(record)
+                break
+            if group and group[-1][:2] != record[:2]:
+                yield group
+                group = []
+            group.append(record)
+        if group:
+            yield group
+
+        # Full: hash every file that still shares its size and edges with another.
+        start = perf_counter()
+        if observers:
+            notify('stage_started', 'full', 0, 0)
+        by_digest: ExternalSorter = ExternalSorter(runs, budget)
+        arguments = ((r, None, algorithm) for r in chain(first_large, records))
+        for (size, _, path), digest in ordered_starmap(_hashed, arguments, workers, backend):
+            if digest is not None:
+                by_digest.add((size, digest, path))
+                bytes_read['full'] += size
+                if observers:
+                    notify('hashed', path, size)
+        if observers:
+            notify('stage_finished', 'full', perf_counter() - start)
+
+        for _, members in groupby(_shared(by_digest, 2), key=lambda r: r[:2]):
+            yield list(members)
@@ -1,11 +1,26 @@
 """
 Module contains functions useful for interacting with and manipulating file systems and structures.
 """
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from archyve.instrumentation import notify, observers
+from typing import Callable, Generator, Sequence
+from threading import Lock
+from os import DirEntry, stat_result
 from sys import path as syspath
-from typing import Generator
-from itertools import chain
+from fnmatch import fnmatchcase
 from random import randint
 from pathlib import Path
+import os
+
+
+def _listing(directory: Path | str) -> list[DirEntry]:
+    """
+    Lists a directory once, sorted by name so that walks are repeatable.
+    :param directory: The directory to list.
+    :return: The entries in the directory.
+    """
+    with os.scandir(directory) as it:
+        return sorted(it, key=lambda e: e.name)
 
 
 def sub_files(directory: Path) -> Generator[Path, None, None]:
@@ -14,7 +29,7 @@ def sub_files(directory: Path) -> Generator[Path, None, None]:
     :param directory: The directory in which to search.
     :return: The list of file paths in the given directory.
     """
-    return (Path(f'{directory}') / f.name for f in directory.iterdir() if f.is_file())
+    return (Path(directory) / e.name for e in _listing(directory) if e.is_file())
 
 
 def sub_dirs(directory: Path) -> Generator[Path, None, None]:
@@ -23,25 +38,279 @@ def sub_dirs(directory: Path) -> Generator[Path, None, None]:
     :param directory: The string path of the folder from which to extract the paths of sub-folders from.
     :return: A list of sub folder paths.
     """
-    return (Path(f'{directory}') / f.name for f in directory.iterdir() if f.is_dir())
+    return (Path(directory) / e.name for e in _listing(directory) if e.is_dir())
+
+
+def _glob(parts: Sequence[str], pattern: Sequence[str]) -> bool:
+    """
+    :param parts: The components of a relative path.
+    :param pattern: The components of a glob pattern ('**' matches any number of components).
+    :return: Whether the path matches the pattern.
+    """
+    if not pattern:
+        return not parts
+    if pattern[0] == '**':
+        return any(_glob(parts[i:], pattern[1:]) for i in range(len(parts) + 1))
+    return bool(parts) and fnmatchcase(parts[0], pattern[0]) and _glob(parts[1:], pattern[1:])
+
+
+def _matches(relative: str, name: str, patterns: Sequence[str]) -> bool:
+    """
+    :param relative: The path relative to the root of the walk (with forward slashes).
+    :param name: The name of the file or directory.
+    :param patterns: Glob patterns; those containing a '/' are matched against the relative path (a '*' does not
+                     cross a '/', a '**' does), the rest against the name.
+    :return: Whether any of the patterns match.
+    """
+    return any(_glob(relative.split('/'), p.split('/')) if '/' in p else fnmatchcase(name, p) for p in patterns)
+
+
+# A directory waiting to be listed: its path, its path relative to the root of the walk, and its depth.
+_Folder = tuple[str, str, int]
+
+
+class _Walk:
+    """
+    The settings and state shared by every directory listed in one walk. Listing is safe to do from many threads.
+    """
+
+    def __init__(self, include: Sequence[str] = (), exclude: Sequence[str] = (), max_depth: int | None = None,
+                 accept: Callable[[DirEntry], bool] | None = None):
+        """
+        :param include: Glob patterns a file must match (any of) to be yielded; all files are yielded if empty.
+        :param exclude: Glob patterns for files and directories to skip; excluded directories are not descended into.
+        :param max_depth: How many levels of sub-folders to descend into; no limit if None.
+        :param accept: Whether to yield a file that passed the patterns (e.g. query.Query.accepts); all are if None.
+        """
+        self.include: Sequence[str] = include
+        self.exclude: Sequence[str] = exclude
+        self.max_depth: int | None = max_depth
+        self.accept: Callable[[DirEntry], bool] | None = accept
+        self._visited: set[tuple[int, int]] = set()
+        self._lock: Lock = Lock()
+
+    def root(self, directory: Path | str) -> _Folder:
+        """
+        :param directory: A directory to start walking from.
+        :return: The folder to list first.
+        """
+        root: str = str(Path(directory).resolve())
+        self._first_visit(os.stat(root))
+        return root, '', 0
+
+    def roots(self, directories: Sequence[Path | str]) -> list[_Folder]:
+        """
+        Records every directory as visited before any is walked, so that a directory inside another is only walked from
+        its own root, whether the walk is serial or parallel.
+        :param directories: The directories to start walking from.
+        :return: The folders to list first (one per directory, leaving out directories given already).
+        """
+        roots: list[_Folder] = []
+        for directory in directories:
+            root: str = str(Path(directory).resolve())
+            if self._first_visit(os.stat(root)):
+                roots.append((root, '', 0))
+        return roots
+
+    def _first_visit(self, stat: stat_result) -> bool:
+        """
+        :param stat: The stat of a directory.
+        :return: Whether this is the first time the walk has come across the directory.
+        """
+        with self._lock:
+            if (stat.st_dev, stat.st_ino) in self._visited:
+                return False
+            self._visited.add((stat.st_dev, stat.st_ino))
+            return True
+
+    def accepts(self, relative: str, directory: bool = False) -> bool:
+        """
+        Checks a file or directory against the walk's settings without listing anything (e.g. for something a watcher
+        was told about).
+        :param relative: The path relative to the root of the walk (with forward slashes).
+        :param directory: Whether the path is a directory (include patterns only apply to files).
+        :return: Whether the walk would yield the file, or descend into the directory.
+        """
+        parts: list[str] = relative.split('/')
+        depth: int = len(parts) if directory else len(parts) - 1
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.exclude and any(_matches('/'.join(parts[:i + 1]), parts[i], self.exclude) for i in range(len(parts))):
+            return False
+        return directory or not self.include or _matches(relative, parts[-1], self.include)
+
+    def walk(self, folder: _Folder) -> Generator[DirEntry, None, None]:
+        """
+        Walks the tree below a folder with an explicit stack, depth first.
+        :param folder: The folder to start from.
+        :return: A generator of the files in the tree.
+        """
+        stack: list[_Folder] = [folder]
+        while stack:
+            files, sub_folders = self.list(stack.pop())
+            yield from files
+            stack.extend(reversed(sub_folders))
+
+    def list(self, folder: _Folder) -> tuple[list[DirEntry], list[_Folder]]:
+        """
+        Lists a folder once, splitting it into the files to yield and the sub-folders to walk next.
+        :param folder: The folder to list.
+        :return: The files and the sub-folders, both in name order.
+        """
+        path, relative, depth = folder
+        files: list[DirEntry] = []
+        sub_folders: list[_Folder] = []
+        try:
+            listing: list[DirEntry] = _listing(path)
+        except OSError as e:
+            if observers:
+                notify('error', path, e)
+            raise
+        for entry in listing:
+            entry_relative: str = f'{relative}{entry.name}'
+            if self.exclude and _matches(entry_relative, entry.name, self.exclude):
+                continue
+            if entry.is_dir():
+                if self.max_depth is not None and depth >= self.max_depth:
+                    continue
+                # Don't go round in circles through links back up the tree (or into a folder walked already). Every
+                # folder is recorded, so a link to a real ancestor is caught too; only a link needs following to stat.
+                if not self._first_visit(entry.stat(follow_symlinks=entry.is_symlink())):
+                    continue
+                sub_folders.append((entry.path, f'{entry_relative}/', depth + 1))
+            elif entry.is_file() and (not self.include or _matches(entry_relative, entry.name, self.include)) and \
+                    (self.accept is None or self.accept(entry)):
+                files.append(entry)
+        if observers:
+            for entry in files:
+                notify('discovered', entry.path)
+        return files, sub_folders
+
+
+def scan(directory: Path | str | Sequence[Path | str], include: Sequence[str] = (), exclude: Sequence[str] = (),
+         max_depth: int | None = None, accept: Callable[[DirEntry], bool] | None = None
+         ) -> Generator[DirEntry, None, None]:
+    """
+    Walks the tree below directory with an explicit stack (so deep trees cannot hit the recursion limit), listing each
+    directory exactly once. The files are yielded as os.DirEntry objects, which remember their type and stat, so callers
+    don't need to stat them again. Files come in the same order as sub_paths: a directory's own files first, then each
+    of its sub-folders in turn.
+    :param directory: The root directory to walk, or several to walk in turn (sharing one record of the directories
+                      visited, see parallel_scan).
+    :param include: Glob patterns a file must match (any of) to be yielded; all files are yielded if empty.
+    :param exclude: Glob patterns for files and directories to skip; excluded directories are not descended into.
+    :param max_depth: How many levels of sub-folders to descend into (0 is only the root's own files); no limit if None.
+    :param accept: Whether to yield a file that passed the patterns, decided before anything else is done with it (e.g.
+                   query.Query.accepts); every file is yielded if None.
+    :return: A generator of the files in the tree.
+    """
+    walk: _Walk = _Walk(include, exclude, max_depth, accept)
+    for root in walk.roots([directory] if isinstance(directory, (str, os.PathLike)) else directory):
+        yield from walk.walk(root)
+
+
+def parallel_scan(directories: Sequence[Path | str], include: Sequence[str] = (), exclude: Sequence[str] = (),
+                  max_depth: int | None = None, workers: int = 8, ordered: bool = True,
+                  max_pending: int | None = None, accept: Callable[[DirEntry], bool] | None = None
+                  ) -> Generator[DirEntry, None, None]:
+    """
+    Walks several trees at once on a pool of threads. Every directory (not just every root) is a separate task, so one
+    large tree is spread over the pool as well as many small ones, and the total time approaches that of the slowest
+    directory rather than the sum of them all. Only max_pending directory listings are held at once however big the
+    trees are.
+    :param directories: The root directories to walk.
+    :param include: Glob patterns a file must match (any of) to be yielded; all files are yielded if empty.
+    :param exclude: Glob patterns for files and directories to skip; excluded directories are not descended into.
+    :param max_depth: How many levels of sub-folders to descend into (0 is only the roots' own files); no limit if None.
+    :param workers: The number of directories to list at once.
+    :param ordered: If True the files come in exactly the order scan would give for each root in turn (listings are
+                    fetched ahead of time); if False they come as soon as their directory has been listed.
+    :param max_pending: The maximum number of directory listings in flight or waiting to be yielded (defaults to four
+                        per worker).
+    :param accept: Whether to yield a file that passed the patterns (see scan); every file is yielded if None.
+    :return: A generator of the files in the trees.
+    """
+    walk: _Walk = _Walk(include, exclude, max_depth, accept)
+    roots: list[_Folder] = walk.roots(directories)
+    max_pending: int = max_pending or workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from (_ordered_walk if ordered else _unordered_walk)(walk, roots, pool, max_pending)
+
+
+def _ordered_walk(walk: _Walk, roots: list[_Folder], pool: Executor,
+                  max_pending: int) -> Generator[DirEntry, None, None]:
+    """
+    Walks depth first exactly as scan does, while listing the folders at the top of the stack ahead of time.
+    :param walk: The walk the folders belong to.
+    :param roots: The folders to start from.
+    :param pool: The pool to list folders on.
+    :param max_pending: The maximum number of listings fetched ahead.
+    :return: A generator of the files in the trees.
+    """
+    stack: list[list] = [[folder, None] for folder in reversed(roots)]
+    pending: int = 0
+    try:
+        while stack:
+            # The folders at the top of the stack are the next to be walked, so list them first.
+            for item in reversed(stack[-max_pending:]):
+                if pending >= max_pending:
+                    break
+                if item[1] is None:
+                    item[1] = pool.submit(walk.list, item[0])
+                    pending += 1
+
+            files, sub_folders = stack.pop()[1].result()
+            pending -= 1
+            yield from files
+            stack.extend([folder, None] for folder in reversed(sub_folders))
+    finally:  # Don't list folders nobody will see if we are closed early.
+        for _, future in stack:
+            if future is not None:
+                future.cancel()
+
+
+def _unordered_walk(walk: _Walk, roots: list[_Folder], pool: Executor,
+                    max_pending: int) -> Generator[DirEntry, None, None]:
+    """
+    Walks the trees yielding each folder's files as soon as it has been listed.
+    :param walk: The walk the folders belong to.
+    :param roots: The folders to start from.
+    :param pool: The pool to list folders on.
+    :param max_pending: The maximum number of listings in flight.
+    :return: A generator of the files in the trees.
+    """
+    waiting: list[_Folder] = list(reversed(roots))
+    pending: set[Future] = set()
+    try:
+        while waiting or pending:
+            while waiting and len(pending) < max_pending:
+                pending.add(pool.submit(walk.list, waiting.pop()))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, sub_folders = future.result()
+                waiting.extend(reversed(sub_folders))
+                yield from files
+    finally:  # Don't list folders nobody will see if we are closed early.
+        for future in pending:
+            future.cancel()
 
 
-def sub_paths(directory: Path | str) -> Generator[Path, None, None]:
+def sub_paths(directory: Path | str, include: Sequence[str] = (), exclude: Sequence[str] = (),
+              max_depth: int | None = None) -> Generator[Path, None, None]:
     """
     Gets the resolved paths of every sub file in every sub folder into one list
     (all end points in the tree below the entry point given).
     :param directory: The root directory to get the tree of.
+    :param include: Glob patterns a file must match (any of) to be included.
+    :param exclude: Glob patterns for files and directories to leave out.
+    :param max_depth: How many levels of sub-folders to descend into; no limit if None.
     :return: An iterable of string paths of each sub file.
     """
-    directory: Path = Path(directory).resolve()
-    sf = sub_files(directory)
-    for d in sub_dirs(directory):
-        sf = chain(sf, sub_paths(d))
-    return sf
+    return (Path(e.path) for e in scan(directory, include, exclude, max_depth))
 
 
 def create_test_directory(depth: int, location: Path | str = syspath[0], duplicate_percentage: int = 25,
-                          max_directories: int = 5, max_files: int = 100):
+                          max_directories: int = 5, max_files: int = 100, file_size: int = 0):
     """
     Creates a random directory tree populated with text files. Some of which are duplicates.
     :param depth: The depth of the tree to create.
@@ -49,6 +318,7 @@ def create_test_directory(depth: int, location: Path | str = syspath[0], duplica
     :param duplicate_percentage: The percentage of the txt files that will be duplicates.
     :param max_directories: The maximum number of directories that can be created on each level of the tree.
     :param max_files: The maximum number of files that can be created on each level of the tree.
+    :param file_size: The size in bytes to pad every file out to (files are left as they are if this is smaller).
     :return:
     """
     if depth == 0:
@@ -70,18 +340,15 @@ def create_test_directory(depth: int, location: Path | str = syspath[0], duplica
     for i in range(dup_files):
         path: Path = location / ('file_' + str(i) + '.txt')
         with open(path, 'w') as f:
-            f.write("This is a randomly generated duplicate file.")
+            f.write("This is a randomly generated duplicate file.".ljust(file_size, '.'))
 
     # Create the unique files
     for i in range(dup_files, unique_files + dup_files):
-        file_name = "file_" + str(i) + ".txt"
-        with open(file_name, 'w') as f:
-            f.write(
-                f'This is a randomly generated unique file. Path hash: {hash(str(location) + file_name)}')
         path: Path = location / ('file_' + str(i) + '.txt')
         with open(path, 'w') as f:
-            f.write(f'This is a randomly generated unique file. Path hash: {hash(str(path))}')
+            f.write(f'This is a randomly generated unique file. Path hash: {hash(str(path))}'.ljust(file_size, '.'))
 
     # Do the same again for some of the directories we just created.
     for i in range(num_directories):
-        create_test_directory(depth - 1, location=(location / f'dir_{i}'))
+        create_test_directory(depth - 1, location=(location / f'dir_{i}'), duplicate_percentage=duplicate_percentage,
+                              max_directories=max_directories, max_files=max_files, file_size=file_size)
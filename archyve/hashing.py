@@ -0,0 +1,132 @@
+"""
+Module contains functions to compute digests of files without holding them in memory. Files are streamed through a
+fixed size buffer that is reused between reads (and between files hashed on the same thread), so the memory used per
+file stays constant no matter how big the file is.
+
+Faster non-cryptographic hashes are used when their packages are installed (xxhash, blake3), otherwise hashlib is used.
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Any, Callable, Final
+from pathlib import Path
+import threading
+import hashlib
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - optional dependency
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:  # pragma: no cover - optional dependency
+    blake3 = None
+
+
+# The size of the buffer files are read through.
+CHUNK_SIZE: Final[int] = 1024 * 1024
+
+# Constructors for the hashes that do not come from hashlib.
+_EXTRA_ALGORITHMS: Final[dict[str, Callable[[], Any]]] = {
+    **({'xxh64': xxhash.xxh64, 'xxh3_64': xxhash.xxh3_64, 'xxh3_128': xxhash.xxh3_128} if xxhash else {}),
+    **({'blake3': blake3.blake3} if blake3 else {}),
+}
+
+# The fastest algorithm available in this environment.
+DEFAULT_ALGORITHM: Final[str] = next(a for a in ('xxh3_128', 'blake3', 'blake2b')
+                                     if a in _EXTRA_ALGORITHMS or a in hashlib.algorithms_available)
+
+# Buffers are reused between files hashed on the same thread.
+_buffers: threading.local = threading.local()
+
+
+def available_algorithms() -> set[str]:
+    """
+    :return: The names of all the algorithms that can be used in this environment.
+    """
+    return set(_EXTRA_ALGORITHMS) | hashlib.algorithms_available
+
+
+def new_hash(algorithm: str = DEFAULT_ALGORITHM) -> Any:
+    """
+    Returns a new hash object for the given algorithm.
+    :param algorithm: The name of the algorithm (e.g. 'xxh3_128', 'blake3', 'blake2b', 'md5').
+    :return: An object with update() and digest() methods.
+    """
+    if algorithm in _EXTRA_ALGORITHMS:
+        return _EXTRA_ALGORITHMS[algorithm]()
+    try:
+        return hashlib.new(algorithm)
+    except ValueError:
+        raise ValueError(f'Unknown hash algorithm \"{algorithm}\", choose from: {sorted(available_algorithms())}')
+
+
+def _buffer(chunk_size: int) -> memoryview:
+    """
+    :param chunk_size: The size of buffer needed.
+    :return: A view onto a buffer of chunk_size bytes that belongs to the current thread.
+    """
+    buffers: dict[int, bytearray] | None = getattr(_buffers, 'buffers', None)
+    if buffers is None:
+        buffers = _buffers.buffers = {}
+    if chunk_size not in buffers:
+        buffers[chunk_size] = bytearray(chunk_size)
+    return memoryview(buffers[chunk_size])
+
+
+def file_digest(path: Path | str, algorithm: str = DEFAULT_ALGORITHM, chunk_size: int = CHUNK_SIZE) -> bytes:
+    """
+    Returns the digest of the whole contents of a file, read chunk_size bytes at a time.
+    :param path: The path of the file to hash.
+    :param algorithm: The name of the hash algorithm to use.
+    :param chunk_size: The number of bytes to read at a time.
+    :return: The digest of the file.
+    """
+    file_hash = new_hash(algorithm)
+    view: memoryview = _buffer(chunk_size)
+    with open(path, 'rb', buffering=0) as f:
+        while n := f.readinto(view):
+            file_hash.update(view[:n])
+    return file_hash.digest()
+
+
+def edge_digest(path: Path | str, size: int, block_size: int = 4096, algorithm: str = DEFAULT_ALGORITHM) -> bytes:
+    """
+    Returns the digest of the first and last block_size bytes of a file. Files no bigger than two blocks are hashed in
+    full.
+    :param path: The path of the file to hash.
+    :param size: The size of the file in bytes.
+    :param block_size: The number of bytes to read from each end of the file.
+    :param algorithm: The name of the hash algorithm to use.
+    :return: The digest of the ends of the file.
+    """
+    return edge_digest_with_header(path, size, block_size, algorithm, 0)[0]
+
+
+def edge_digest_with_header(path: Path | str, size: int, block_size: int = 4096, algorithm: str = DEFAULT_ALGORITHM,
+                            header_size: int = 64) -> tuple[bytes, bytes]:
+    """
+    Returns the edge digest of a file (see edge_digest) along with the first header_size bytes of the file, which are
+    read anyway, so that the file can also be classified by its contents (see sniff.sniff_header) without reading it
+    again.
+    :param path: The path of the file to hash.
+    :param size: The size of the file in bytes.
+    :param block_size: The number of bytes to read from each end of the file.
+    :param algorithm: The name of the hash algorithm to use.
+    :param header_size: The number of bytes from the start of the file to return (at most block_size).
+    :return: The digest of the ends of the file, and the start of the file.
+    """
+    file_hash = new_hash(algorithm)
+    view: memoryview = _buffer(block_size)
+    header: bytes | None = None
+    with open(path, 'rb', buffering=0) as f:
+        if size > 2 * block_size:
+            n: int = f.readinto(view)
+            header = bytes(view[:min(n, header_size)])
+            file_hash.update(view[:n])
+            f.seek(-block_size, 2)
+        while n := f.readinto(view):
+            if header is None:
+                header = bytes(view[:min(n, header_size)])
+            file_hash.update(view[:n])
+    return file_hash.digest(), header or b''
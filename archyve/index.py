@@ -0,0 +1,256 @@
+"""
+Module contains an index of the paths in an EntryTable, so that an archyve can be searched many times without checking
+every path on every search. A path is a directory followed by a name, and a table only stores each directory once, so
+the index is split the same way:
+    - directories are few, so they are simply checked one by one,
+    - names are indexed by the trigrams (runs of three characters) they contain, so a substring search only checks the
+      names that contain the query's rarest trigram,
+    - names are also kept sorted forwards and backwards, so prefix and suffix searches are a binary search.
+A query that crosses from a directory into a name (e.g. 'march/IMG_') is split at its last separator. Each part of the
+index is only built the first time a query needs it.
+
+Queries are one of:
+    - substring: the path contains the query.
+    - prefix / suffix: the path starts / ends with the query.
+    - glob: the query is a glob pattern (see fnmatch); patterns containing a '/' are matched against the whole path
+      ('*' does not cross a '/', '**' does), the rest against the file's name. The literal parts of the pattern narrow
+      down the paths that are matched.
+
+Usage:
+    index = PathIndex(table)
+    rows = index.search(['IMG_', '2023/'], any_all=all)
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.file_structure_functions import _matches
+from typing import Callable, Final, Iterable, Sequence
+from archyve.table import EntryTable
+from collections import defaultdict
+from bisect import bisect_left
+from array import array
+import re
+import os
+
+
+# The kinds of query.
+SUBSTRING: Final[str] = 'substring'
+PREFIX: Final[str] = 'prefix'
+SUFFIX: Final[str] = 'suffix'
+GLOB: Final[str] = 'glob'
+QUERY_KINDS: Final[tuple[str, ...]] = (SUBSTRING, PREFIX, SUFFIX, GLOB)
+
+# The number of characters in each indexed run.
+GRAM: Final[int] = 3
+
+# Splits a glob pattern into the literal text between its wildcards.
+_WILDCARDS: Final[re.Pattern] = re.compile(r'\*+|\?|\[[^]]*]')
+
+
+def matches(path: str, query: str, kind: str = SUBSTRING) -> bool:
+    """
+    :param path: A path.
+    :param query: A query (see the module's docstring).
+    :param kind: The kind of query: 'substring', 'prefix', 'suffix' or 'glob'.
+    :return: Whether the path matches the query.
+    """
+    if kind == SUBSTRING:
+        return query in path
+    if kind == PREFIX:
+        return path.startswith(query)
+    if kind == SUFFIX:
+        return path.endswith(query)
+    if kind == GLOB:
+        return _matches(path.replace(os.sep, '/'), os.path.basename(path), [query])
+    raise ValueError(f'Unknown kind of query \"{kind}\", choose from: {list(QUERY_KINDS)}')
+
+
+class PathIndex:
+    """
+    Finds the rows of an EntryTable whose paths match a query in time that depends on how many paths could match rather
+    than on the size of the table. The index is rebuilt (lazily) if the table has grown since it was built.
+    """
+
+    def __init__(self, table: EntryTable):
+        """
+        :param table: The table to index.
+        """
+        self.table: EntryTable = table
+        self.__size: int = -1
+        self.__reset()
+
+    def __reset(self) -> None:
+        """
+        Forgets everything built so far if the table has grown.
+        """
+        if self.__size == len(self.table):
+            return
+        self.__size = len(self.table)
+        self.__grams: dict[str, array] | None = None  # The rows whose names contain each trigram
+        self.__rows_of: list[array] | None = None  # The rows in each directory, by its position in table.parents
+        self.__by_name: array | None = None  # The rows, sorted by name
+        self.__by_reversed_name: array | None = None  # The rows, sorted by name spelled backwards
+
+    def __name_grams(self) -> dict[str, array]:
+        """
+        :return: The rows whose names contain each trigram (in ascending order).
+        """
+        if self.__grams is None:
+            # A name with a trigram in it twice is listed twice, which is quicker to build than checking for it.
+            grams: defaultdict[str, list[int]] = defaultdict(list)
+            for row, name in enumerate(self.table.names):
+                for i in range(len(name) - GRAM + 1):
+                    grams[name[i:i + GRAM]].append(row)
+            self.__grams = {gram: array('I', rows) for gram, rows in grams.items()}
+        return self.__grams
+
+    def __directory_rows(self) -> list[array]:
+        """
+        :return: The rows in each directory (in ascending order), by the directory's position in table.parents.
+        """
+        if self.__rows_of is None:
+            rows_of: list[array] = [array('I') for _ in self.table.parents]
+            for row, parent_id in enumerate(self.table.parent_ids):
+                rows_of[parent_id].append(row)
+            self.__rows_of = rows_of
+        return self.__rows_of
+
+    def __sorted(self, reverse: bool) -> tuple[array, Callable[[int], str]]:
+        """
+        :param reverse: Whether to sort on the names spelled backwards.
+        :return: The rows sorted by name (or name spelled backwards), and the key they are sorted on.
+        """
+        names: list[str] = self.table.names
+        if reverse:
+            key: Callable[[int], str] = lambda row: names[row][::-1]
+            if self.__by_reversed_name is None:
+                self.__by_reversed_name = array('I', sorted(range(len(names)), key=key))
+            return self.__by_reversed_name, key
+        if self.__by_name is None:
+            self.__by_name = array('I', sorted(range(len(names)), key=names.__getitem__))
+        return self.__by_name, names.__getitem__
+
+    def __names_starting(self, prefix: str, reverse: bool = False) -> Iterable[int]:
+        """
+        :param prefix: The start of a name (or the end of a name spelled backwards).
+        :param reverse: Whether to look for names ending with the prefix spelled backwards.
+        :return: The rows whose names start (or end) with the prefix.
+        """
+        rows, key = self.__sorted(reverse)
+        start: int = bisect_left(rows, prefix, key=key)
+        end: int = bisect_left(rows, prefix + '\U0010ffff', lo=start, key=key) if prefix else len(rows)
+        return rows[start:end]
+
+    def __names_containing(self, text: str) -> Iterable[int]:
+        """
+        :param text: Text a name must contain.
+        :return: The rows whose names could contain the text (a superset, to be checked).
+        """
+        if len(text) < GRAM:
+            return range(len(self.table))
+        grams: dict[str, array] = self.__name_grams()
+        rarest: array | None = None
+        for gram in {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}:
+            postings: array | None = grams.get(gram)
+            if postings is None:
+                return ()
+            if rarest is None or len(postings) < len(rarest):
+                rarest = postings
+        return rarest
+
+    def __directories(self, test: Callable[[str], bool]) -> Iterable[int]:
+        """
+        :param test: Whether a directory is wanted.
+        :return: Every row in the directories that pass the test.
+        """
+        rows_of: list[array] = self.__directory_rows()
+        return (row for parent_id, parent in enumerate(self.table.parents) if test(parent)
+                for row in rows_of[parent_id])
+
+    def __candidates(self, query: str, kind: str) -> Iterable[int]:
+        """
+        :param query: A query.
+        :param kind: The kind of query.
+        :return: Rows that could match the query (a superset of those that do, to be checked).
+        """
+        head, separator, tail = query.rpartition(os.sep)
+        if kind == SUBSTRING:
+            # In a directory, in a name, or crossing from the end of a directory into the start of a name.
+            candidates: list[Iterable[int]] = [self.__directories(lambda p: query in p)]
+            if separator:
+                rows_of: list[array] = self.__directory_rows()
+                names: list[str] = self.table.names
+                candidates.append(row for parent_id, parent in enumerate(self.table.parents)
+                                  if (parent + os.sep).endswith(head + os.sep)
+                                  for row in rows_of[parent_id] if names[row].startswith(tail))
+            else:
+                candidates.append(self.__names_containing(query))
+            return (row for rows in candidates for row in rows)
+        if kind == PREFIX:
+            rows_of: list[array] = self.__directory_rows()
+            names: list[str] = self.table.names
+            within: Iterable[int] = self.__directories(lambda p: p.startswith(query))
+            crossing: Iterable[int] = (row for parent_id, parent in enumerate(self.table.parents)
+                                       if separator and parent in (head, head + os.sep)
+                                       for row in rows_of[parent_id] if names[row].startswith(tail))
+            return (row for rows in (within, crossing) for row in rows)
+        if kind == SUFFIX:
+            # A name never contains a separator, so a suffix with one must end with a whole name.
+            return self.__names_starting(tail[::-1], reverse=True)
+        if kind == GLOB:
+            return self.__glob_candidates(query)
+        raise ValueError(f'Unknown kind of query \"{kind}\", choose from: {list(QUERY_KINDS)}')
+
+    def __glob_candidates(self, pattern: str) -> Iterable[int]:
+        """
+        :param pattern: A glob pattern.
+        :return: Rows that could match the pattern, narrowed down by its literal parts.
+        """
+        parts: list[str] = _WILDCARDS.split(pattern)
+        literals: list[str] = [part for part in parts if '[' not in part and ']' not in part]
+        if '/' in pattern:
+            # Every literal is somewhere in the path; the longest is likely the rarest.
+            longest: str = max(literals, key=len, default='').replace('/', os.sep)
+            return self.__candidates(longest, SUBSTRING) if longest else range(len(self.table))
+        if parts[0] and '[' not in parts[0]:
+            return self.__names_starting(parts[0])
+        if parts[-1] and ']' not in parts[-1]:
+            return self.__names_starting(parts[-1][::-1], reverse=True)
+        longest: str = max(literals, key=len, default='')
+        return self.__names_containing(longest) if longest else range(len(self.table))
+
+    def rows(self, query: str, kind: str = SUBSTRING) -> array:
+        """
+        :param query: A query (see the module's docstring).
+        :param kind: The kind of query: 'substring', 'prefix', 'suffix' or 'glob'.
+        :return: The rows whose paths match the query, in ascending order.
+        """
+        self.__reset()
+        if kind == GLOB and not query:
+            return array('Q')
+        path: Callable[[int], str] = self.table.path
+        return array('Q', sorted({row for row in self.__candidates(query, kind) if matches(path(row), query, kind)}))
+
+    def search(self, queries: Sequence[str], kind: str = SUBSTRING, any_all: Callable = any,
+               rows: Sequence[int] | None = None) -> array:
+        """
+        :param queries: The queries.
+        :param kind: The kind of the queries: 'substring', 'prefix', 'suffix' or 'glob'.
+        :param any_all: Whether a path needs to match any or all of the queries.
+        :param rows: The rows to search (all of them if None).
+        :return: The rows (of those searched) whose paths match any/all of the queries, in ascending order.
+        """
+        if not queries:  # As any([]) and all([]) would say.
+            return array('Q', (range(len(self.table)) if rows is None else rows) if any_all is all else ())
+        found: set[int] | None = None
+        for query in queries:
+            matched: array = self.rows(query, kind)
+            if found is None:
+                found = set(matched)
+            elif any_all is all:
+                found.intersection_update(matched)
+            else:
+                found.update(matched)
+        found = found or set()
+        if rows is not None and not (isinstance(rows, range) and rows == range(len(self.table))):
+            found.intersection_update(rows)
+        return array('Q', sorted(found))
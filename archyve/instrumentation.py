@@ -0,0 +1,310 @@
+"""
+Module contains the instrumentation archyve reports its progress through. The hot paths (directory walks, hashing,
+cache lookups, EXIF reads and bulk operations) tell every registered Observer what they are doing; when no observer is
+registered each of them costs a single truthiness check of the observers list.
+    - Observer: the events, as methods that do nothing (override the ones you want).
+    - Metrics: counts the events, and can write them out in the Prometheus text format.
+    - Progress: draws a one line progress display (with rate and ETA) on a terminal.
+
+Observers are called on whichever thread the work is done on, so they must be thread safe.
+
+Usage:
+    with observe(Progress(), metrics := Metrics()):
+        archyve.duplicates()
+    print(metrics.prometheus())
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Final, Generator, TextIO
+from contextlib import contextmanager
+from time import monotonic
+from threading import Lock
+import sys
+
+
+class Observer:
+    """
+    Receives archyve's events. Every method does nothing, so an observer only needs to override those it wants.
+    """
+
+    def discovered(self, path: str) -> None:
+        """
+        :param path: A file found by a directory walk.
+        """
+
+    def stage_started(self, stage: str, files: int, size: int) -> None:
+        """
+        :param stage: The stage of work that is starting (e.g. 'size', 'partial' or 'full' in a duplicate search).
+        :param files: The number of files the stage will work on (0 if it isn't known).
+        :param size: The number of bytes the stage will read (0 if it isn't known).
+        """
+
+    def stage_finished(self, stage: str, seconds: float) -> None:
+        """
+        :param stage: The stage of work that finished.
+        :param seconds: How long it took.
+        """
+
+    def hashed(self, path: str, size: int) -> None:
+        """
+        :param path: A file that was hashed.
+        :param size: The number of bytes read to hash it.
+        """
+
+    def cache_lookup(self, hit: bool) -> None:
+        """
+        :param hit: Whether a digest was found in an entry cache (so the file didn't need reading).
+        """
+
+    def metadata_read(self, path: str, seconds: float) -> None:
+        """
+        :param path: A file whose metadata (e.g. EXIF) was read.
+        :param seconds: How long the read took.
+        """
+
+    def operated(self, kind: str, path: str, size: int) -> None:
+        """
+        :param kind: The kind of operation done to a file ('delete' or 'move', see the operations module).
+        :param path: The file.
+        :param size: The size of the file.
+        """
+
+    def error(self, path: str, error: BaseException) -> None:
+        """
+        :param path: A file or folder that something went wrong with.
+        :param error: What went wrong.
+        """
+
+
+# The registered observers. Hot paths check this list before building an event, so keep it empty when not observing.
+observers: Final[list[Observer]] = []
+
+
+def notify(event: str, *args) -> None:
+    """
+    Tells every registered observer about an event.
+    :param event: The name of the Observer method to call.
+    :param args: The arguments of the event.
+    """
+    for observer in observers:
+        getattr(observer, event)(*args)
+
+
+@contextmanager
+def observe(*observer: Observer) -> Generator[tuple[Observer, ...], None, None]:
+    """
+    Registers observers for the duration of a with block.
+    :param observer: The observers to register.
+    :return: A context manager giving the observers.
+    """
+    observers.extend(observer)
+    try:
+        yield observer
+    finally:
+        for o in observer:
+            observers.remove(o)
+
+
+class Metrics(Observer):
+    """
+    Counts archyve's events, as Prometheus style counters.
+    """
+
+    def __init__(self, max_errors: int = 1000):
+        """
+        :param max_errors: The number of the most recent errors to remember the paths of.
+        """
+        self.files_discovered: int = 0
+        self.files_hashed: int = 0
+        self.bytes_hashed: int = 0
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        self.metadata_reads: int = 0
+        self.metadata_seconds: float = 0.0
+        self.operations: dict[str, int] = {}
+        self.operation_bytes: dict[str, int] = {}
+        self.stage_seconds: dict[str, float] = {}
+        self.errors: int = 0
+        self.recent_errors: dict[str, str] = {}  # The most recent errors, by path
+        self.max_errors: int = max_errors
+        self.__lock: Lock = Lock()
+
+    def discovered(self, path: str) -> None:
+        with self.__lock:
+            self.files_discovered += 1
+
+    def stage_finished(self, stage: str, seconds: float) -> None:
+        with self.__lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def hashed(self, path: str, size: int) -> None:
+        with self.__lock:
+            self.files_hashed += 1
+            self.bytes_hashed += size
+
+    def cache_lookup(self, hit: bool) -> None:
+        with self.__lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def metadata_read(self, path: str, seconds: float) -> None:
+        with self.__lock:
+            self.metadata_reads += 1
+            self.metadata_seconds += seconds
+
+    def operated(self, kind: str, path: str, size: int) -> None:
+        with self.__lock:
+            self.operations[kind] = self.operations.get(kind, 0) + 1
+            self.operation_bytes[kind] = self.operation_bytes.get(kind, 0) + size
+
+    def error(self, path: str, error: BaseException) -> None:
+        with self.__lock:
+            self.errors += 1
+            self.recent_errors.pop(path, None)
+            self.recent_errors[path] = repr(error)
+            if len(self.recent_errors) > self.max_errors:
+                del self.recent_errors[next(iter(self.recent_errors))]
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """
+        :return: The share of cache lookups that found a digest (0 if there were none).
+        """
+        lookups: int = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    def prometheus(self, prefix: str = 'archyve') -> str:
+        """
+        :param prefix: The prefix of every metric's name.
+        :return: The counters in the Prometheus text exposition format.
+        """
+        lines: list[str] = []
+
+        def metric(name: str, kind: str, description: str, values: dict[str, float] | float, label: str = '') -> None:
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for key, value in (values.items() if isinstance(values, dict) else [('', values)]):
+                labels: str = f'{{{label}="{key}"}}' if key else ''
+                lines.append(f'{prefix}_{name}{labels} {value}')
+
+        with self.__lock:
+            metric('files_discovered_total', 'counter', 'Files found by directory walks.', self.files_discovered)
+            metric('files_hashed_total', 'counter', 'Files hashed.', self.files_hashed)
+            metric('bytes_hashed_total', 'counter', 'Bytes read to hash files.', self.bytes_hashed)
+            metric('cache_lookups_total', 'counter', 'Digest lookups in entry caches.',
+                   {'hit': self.cache_hits, 'miss': self.cache_misses}, 'result')
+            metric('metadata_reads_total', 'counter', 'Files whose metadata was read.', self.metadata_reads)
+            metric('metadata_seconds_total', 'counter', 'Time spent reading metadata.', self.metadata_seconds)
+            metric('operations_total', 'counter', 'Files deleted or moved.', dict(self.operations), 'kind')
+            metric('operation_bytes_total', 'counter', 'Bytes deleted or moved.', dict(self.operation_bytes), 'kind')
+            metric('stage_seconds_total', 'counter', 'Time spent in each stage of work.', dict(self.stage_seconds),
+                   'stage')
+            metric('errors_total', 'counter', 'Files or folders something went wrong with.', self.errors)
+        return '\n'.join(lines) + '\n'
+
+
+class Progress(Observer):
+    """
+    Draws a one line progress display, e.g.
+        [partial] 1,200/5,000 files  48.0/200.0 MB  95.2 MB/s  ETA 0:00:02  3 errors
+    redrawing it at most every interval seconds. Stages that don't know their size show what has been done so far.
+    """
+
+    def __init__(self, stream: TextIO = sys.stderr, interval: float = 0.2):
+        """
+        :param stream: Where to draw the display.
+        :param interval: The least time between redraws, in seconds.
+        """
+        self.stream: TextIO = stream
+        self.interval: float = interval
+        self.stage: str = 'walk'
+        self.files: int = 0  # The number of files the stage will work on (0 if unknown)
+        self.size: int = 0  # The number of bytes the stage will read (0 if unknown)
+        self.files_done: int = 0
+        self.bytes_done: int = 0
+        self.discovered_files: int = 0
+        self.errors: int = 0
+        self.__started: float = monotonic()
+        self.__drawn: float = 0.0
+        self.__width: int = 0
+        self.__lock: Lock = Lock()
+
+    def discovered(self, path: str) -> None:
+        with self.__lock:
+            self.discovered_files += 1
+            self.__draw()
+
+    def stage_started(self, stage: str, files: int, size: int) -> None:
+        with self.__lock:
+            self.stage, self.files, self.size = stage, files, size
+            self.files_done = self.bytes_done = 0
+            self.__started = monotonic()
+            self.__draw(force=True)
+
+    def stage_finished(self, stage: str, seconds: float) -> None:
+        with self.__lock:
+            self.__draw(force=True)
+
+    def hashed(self, path: str, size: int) -> None:
+        with self.__lock:
+            self.files_done += 1
+            self.bytes_done += size
+            self.__draw()
+
+    def operated(self, kind: str, path: str, size: int) -> None:
+        self.hashed(path, size)
+
+    def error(self, path: str, error: BaseException) -> None:
+        with self.__lock:
+            self.errors += 1
+            self.__draw()
+
+    def line(self) -> str:
+        """
+        :return: The progress display as it stands.
+        """
+        elapsed: float = monotonic() - self.__started
+        parts: list[str] = [f'[{self.stage}]']
+        if self.stage == 'walk':
+            parts.append(f'{self.discovered_files:,} files found')
+        else:
+            parts.append(f'{self.files_done:,}/{self.files:,} files' if self.files else f'{self.files_done:,} files')
+            if self.size or self.bytes_done:
+                mb: str = f'{self.bytes_done / 1e6:,.1f}/{self.size / 1e6:,.1f} MB' if self.size else \
+                    f'{self.bytes_done / 1e6:,.1f} MB'
+                parts.append(mb)
+            if elapsed > 0 and self.bytes_done:
+                rate: float = self.bytes_done / elapsed
+                parts.append(f'{rate / 1e6:,.1f} MB/s')
+                if self.size > self.bytes_done:
+                    eta: int = int((self.size - self.bytes_done) / rate)
+                    parts.append(f'ETA {eta // 3600}:{eta // 60 % 60:02}:{eta % 60:02}')
+        if self.errors:
+            parts.append(f'{self.errors} error{"s" if self.errors != 1 else ""}')
+        return '  '.join(parts)
+
+    def __draw(self, force: bool = False) -> None:
+        """
+        Redraws the display over the previous one, unless it was drawn less than interval seconds ago.
+        :param force: Whether to redraw however recently the display was drawn.
+        """
+        now: float = monotonic()
+        if not force and now - self.__drawn < self.interval:
+            return
+        self.__drawn = now
+        line: str = self.line()
+        self.stream.write('\r' + line.ljust(self.__width))
+        self.stream.flush()
+        self.__width = len(line)
+
+    def close(self) -> None:
+        """
+        Draws the final state of the display and moves onto a new line.
+        """
+        with self.__lock:
+            self.__draw(force=True)
+            self.stream.write('\n')
+            self.stream.flush()
+            self.__width = 0
@@ -0,0 +1,255 @@
+"""
+Module contains manifests of archives: the size, fingerprint and digest of every file in a directory tree, rolled up
+into a hash of each directory (a Merkle tree). A directory's hash covers the names, sizes and digests of everything
+beneath it, so two trees (e.g. an archive and its mirror) are identical exactly when their root hashes are, and
+comparing two manifests only descends into the directories whose hashes differ.
+
+Paths in a manifest are relative to the tree's root and separated by '/', so manifests of the same tree on different
+machines can be compared. A manifest is saved as newline delimited JSON, one file per line in path order after a
+header line, and is read back one line at a time. Directory hashes are not saved; they are worked out (without reading
+any files) the first time they are needed.
+
+Usage:
+    old = Manifest.load('mirror.manifest')
+    new = Manifest.build('/archive', Archyve('/archive').entries, previous=old)  # Only changed files are hashed
+    changes = old.diff(new)
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.hashing import DEFAULT_ALGORITHM, new_hash
+from typing import Final, Generator, Iterable, NamedTuple
+from archyve.watch import ADDED, MODIFIED, REMOVED, Change, _digest_or_none
+from archyve.instrumentation import notify, observers
+from archyve.parallel import ordered_starmap
+from archyve.cache import Fingerprint
+from archyve.entry import Entry
+from pathlib import Path
+import json
+import os
+
+
+# The version of the format manifests are saved in.
+FORMAT_VERSION: Final[int] = 1
+
+
+class ManifestFile(NamedTuple):
+    """
+    What a manifest records about a file: its fingerprint (to tell whether it has changed since) and its digest.
+    """
+    size: int
+    mtime_ns: int
+    inode: int
+    digest: bytes
+
+
+class Manifest:
+    """
+    The files of a directory tree (by their path relative to its root), and the Merkle hash of each of its directories.
+    """
+
+    def __init__(self, files: dict[str, ManifestFile] | None = None, algorithm: str = DEFAULT_ALGORITHM):
+        """
+        :param files: The files, by their path relative to the root ('/' separated).
+        :param algorithm: The algorithm the files' digests (and the directories' hashes) are made with.
+        """
+        self.files: dict[str, ManifestFile] = files if files is not None else {}
+        self.algorithm: str = algorithm
+        self.__children: dict[str, tuple[list[str], list[str]]] | None = None
+        self.__hashes: dict[str, bytes] | None = None
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Manifest):
+            return NotImplemented
+        return self.algorithm == other.algorithm and self.digest == other.digest
+
+    @staticmethod
+    def build(root: Path | str, entries: Iterable[Entry], previous: 'Manifest | None' = None, workers: int = 1,
+              backend: str = 'thread', algorithm: str | None = None) -> 'Manifest':
+        """
+        Makes a manifest of the given files. Files whose fingerprint (size, modification time and inode) is the same as
+        in the previous manifest keep their digest from it, as do entries that already know their digest (e.g. from
+        the entry cache); only the rest are read, on a pool of workers.
+        :param root: The directory the files are in (at any depth), as their paths begin.
+        :param entries: The files.
+        :param previous: An earlier manifest of the same tree, if there is one.
+        :param workers: The number of files to hash at once.
+        :param backend: 'thread' or 'process' (see parallel.ordered_starmap).
+        :param algorithm: The algorithm to make digests with (defaults to the previous manifest's, else the fastest
+                          available).
+        :return: The manifest.
+        :raises ValueError: If a file isn't in the root directory.
+        """
+        algorithm = algorithm or (previous.algorithm if previous is not None else DEFAULT_ALGORITHM)
+        old: dict[str, ManifestFile] = previous.files if previous is not None and previous.algorithm == algorithm \
+            else {}
+        prefix: str = os.path.join(os.fspath(root), '')
+        files: dict[str, ManifestFile] = {}
+        missing: list[tuple[str, Entry]] = []
+        for entry in entries:
+            path: str = os.fspath(entry)
+            if not path.startswith(prefix):
+                raise ValueError(f'\"{path}\" is not in \"{root}\"')
+            key: str = path[len(prefix):]
+            key = key.replace(os.sep, '/') if os.sep != '/' else key
+            fingerprint: Fingerprint = Fingerprint.of(entry.stat)
+            record: ManifestFile | None = old.get(key)
+            if record is not None and record[:3] == fingerprint:
+                files[key] = record
+                continue
+            digest: bytes | None = entry.cached_digest(algorithm)
+            if digest is None:
+                missing.append((key, entry))
+            else:
+                files[key] = ManifestFile(*fingerprint, digest)
+
+        arguments = ((os.fspath(e), algorithm) for _, e in missing)
+        for (key, entry), digest in zip(missing, ordered_starmap(_digest_or_none, arguments, workers, backend)):
+            if digest is None:  # It has gone since it was found.
+                continue
+            entry.add_digest(digest, algorithm)
+            files[key] = ManifestFile(*Fingerprint.of(entry.stat), digest)
+            if observers:
+                notify('hashed', os.fspath(entry), entry.size)
+        return Manifest(dict(sorted(files.items())), algorithm)
+
+    @staticmethod
+    def load(location: Path | str) -> 'Manifest':
+        """
+        :param location: Where a manifest was saved.
+        :return: The manifest.
+        :raises ValueError: If the file isn't a manifest (or is of a newer format).
+        """
+        with open(location) as f:
+            header: dict = json.loads(f.readline() or '{}')
+            if header.get('version') != FORMAT_VERSION:
+                raise ValueError(f'\"{location}\" is not a manifest this version of archyve can read.')
+            files: dict[str, ManifestFile] = {}
+            for line in f:
+                path, size, mtime_ns, inode, digest = json.loads(line)
+                files[path] = ManifestFile(size, mtime_ns, inode, bytes.fromhex(digest))
+        return Manifest(files, header['algorithm'])
+
+    def save(self, location: Path | str) -> None:
+        """
+        Saves the manifest, one file per line. The file is replaced in one step, so an interrupted save never leaves
+        half a manifest.
+        :param location: Where to save the manifest.
+        """
+        temporary: str = f'{location}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(json.dumps({'version': FORMAT_VERSION, 'algorithm': self.algorithm, 'files': len(self.files),
+                                'digest': self.digest.hex()}) + '\n')
+            for path, (size, mtime_ns, inode, digest) in sorted(self.files.items()):
+                f.write(json.dumps([path, size, mtime_ns, inode, digest.hex()]) + '\n')
+        os.replace(temporary, location)
+
+    def __tree(self) -> dict[str, tuple[list[str], list[str]]]:
+        """
+        :return: The names of the files and of the sub-directories in each directory ('' is the root).
+        """
+        if self.__children is None:
+            children: dict[str, tuple[list[str], list[str]]] = {'': ([], [])}
+            for path in self.files:
+                parent, _, name = path.rpartition('/')
+                if parent not in children:
+                    # Add the directory (and any of its ancestors not seen yet) to the tree, then link each to the one
+                    # above it.
+                    new: list[str] = []
+                    directory: str = parent
+                    while directory not in children:
+                        children[directory] = ([], [])
+                        new.append(directory)
+                        directory = directory.rpartition('/')[0]
+                    for directory in new:
+                        above, _, directory_name = directory.rpartition('/')
+                        children[above][1].append(directory_name)
+                children[parent][0].append(name)
+            self.__children = children
+        return self.__children
+
+    def __directory_hashes(self) -> dict[str, bytes]:
+        """
+        :return: The Merkle hash of each directory: a hash of the name, size and digest of each of its files and the
+                 name and hash of each of its sub-directories, in name order.
+        """
+        if self.__hashes is None:
+            children: dict[str, tuple[list[str], list[str]]] = self.__tree()
+            hashes: dict[str, bytes] = {}
+            for directory in sorted(children, key=lambda d: d.count('/') + bool(d), reverse=True):  # Deepest first
+                prefix: str = f'{directory}/' if directory else ''
+                names, directories = children[directory]
+                members: list[tuple[str, bytes]] = \
+                    [(n, b'f%d:' % self.files[prefix + n].size + self.files[prefix + n].digest) for n in names] + \
+                    [(n, b'd' + hashes[prefix + n]) for n in directories]
+                digest = new_hash(self.algorithm)
+                for name, member in sorted(members):
+                    digest.update(name.encode('utf-8', 'surrogateescape') + b'\x00' + member)
+                hashes[directory] = digest.digest()
+            self.__hashes = hashes
+        return self.__hashes
+
+    @property
+    def digest(self) -> bytes:
+        """
+        :return: The hash of the whole tree.
+        """
+        return self.__directory_hashes()['']
+
+    def directory_hash(self, path: str = '') -> bytes | None:
+        """
+        :param path: A directory, relative to the root ('/' separated, '' is the root).
+        :return: The Merkle hash of the directory, or None if there are no files in it.
+        """
+        return self.__directory_hashes().get(path.strip('/'))
+
+    def __beneath(self, directory: str) -> Generator[str, None, None]:
+        """
+        :param directory: A directory in the manifest.
+        :return: A generator of the paths of every file in the directory, at any depth.
+        """
+        children: dict[str, tuple[list[str], list[str]]] = self.__tree()
+        stack: list[str] = [directory]
+        while stack:
+            current: str = stack.pop()
+            names, directories = children[current]
+            yield from (f'{current}/{n}' if current else n for n in names)
+            stack.extend(f'{current}/{d}' if current else d for d in directories)
+
+    def diff(self, newer: 'Manifest') -> list[Change]:
+        """
+        Compares this manifest with a newer one (or one of a mirror), only looking inside directories whose hashes
+        differ. A file is modified if its size or digest has changed (its times and inode don't matter).
+        :param newer: The other manifest.
+        :return: The files that were added, removed or modified going from this manifest to the other (in path order).
+        :raises ValueError: If the manifests' digests were made with different algorithms.
+        """
+        if newer.algorithm != self.algorithm:
+            raise ValueError(f'Manifests made with different algorithms ({self.algorithm} and {newer.algorithm}) '
+                             f'can\'t be compared.')
+        old_hashes, new_hashes = self.__directory_hashes(), newer.__directory_hashes()
+        old_tree, new_tree = self.__tree(), newer.__tree()
+        changes: list[Change] = []
+        stack: list[str] = ['']
+        while stack:
+            directory: str = stack.pop()
+            if old_hashes[directory] == new_hashes[directory]:
+                continue
+            prefix: str = f'{directory}/' if directory else ''
+            (old_names, old_directories), (new_names, new_directories) = old_tree[directory], new_tree[directory]
+            for name in set(old_names) | set(new_names):
+                path: str = prefix + name
+                old, new = self.files.get(path), newer.files.get(path)
+                if old is None:
+                    changes.append(Change(ADDED, path))
+                elif new is None:
+                    changes.append(Change(REMOVED, path))
+                elif (old.size, old.digest) != (new.size, new.digest):
+                    changes.append(Change(MODIFIED, path))
+            old_set, new_set = set(old_directories), set(new_directories)
+            stack.extend(prefix + d for d in old_set & new_set)
+            changes.extend(Change(REMOVED, p) for d in old_set - new_set for p in self.__beneath(prefix + d))
+            changes.extend(Change(ADDED, p) for d in new_set - old_set for p in newer.__beneath(prefix + d))
+        return sorted(changes, key=lambda c: c.path)
@@ -0,0 +1,476 @@
+"""
+Module contains small readers of the headers of video and audio files, which find when a recording was made, how long it
+is and (for videos) how big its picture is, without decoding it. Only headers are read (a few kilobytes at most); the
+boxes, chunks and blocks that don't hold metadata (e.g. the media data itself, or cover art) are skipped with a seek.
+    - MP4 / MOV (and the other ISO base media formats, e.g. M4A and 3GP): the 'mvhd' box (creation time and duration)
+      and each track's 'tkhd' box (width and height), inside the 'moov' box wherever in the file it is.
+    - RIFF: WAV ('fmt ' and 'data' chunks for the duration, the 'bext' chunk or LIST/INFO 'ICRD' for the date) and AVI
+      (the 'avih' chunk).
+    - FLAC: the STREAMINFO block (duration) and the Vorbis comment block (DATE).
+    - MP3: the ID3v2 tag (TDRC, or TYER/TDAT/TIME, and TLEN), then the first MPEG frame (the frame count of a Xing, Info
+      or VBRI header, or else the bit rate) for the duration if the tag doesn't say.
+
+MP4 times (seconds since 1904, in UTC) are given in local time, like EXIF dates and file times.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.parallel import ordered_starmap
+from typing import BinaryIO, Final, Generator, Iterable, NamedTuple
+from struct import error as struct_error, unpack, unpack_from
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+import os
+
+
+class MediaInfo(NamedTuple):
+    """
+    What the headers of a video or audio file say (None for anything they don't).
+    """
+    capture_date: datetime | None = None
+    duration: float | None = None  # Seconds
+    width: int | None = None
+    height: int | None = None
+
+    @property
+    def dimensions(self) -> tuple[int, int] | None:
+        """
+        :return: The width and height of the picture, if the file has one.
+        """
+        return (self.width, self.height) if self.width and self.height else None
+
+
+# Seconds between the start of 1904 (when MP4 times count from) and the start of 1970.
+MP4_EPOCH: Final[int] = 2_082_844_800
+
+# The top level boxes an ISO base media file can start with.
+MP4_BOXES: Final[frozenset[bytes]] = frozenset({b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot'})
+
+# The bit rates (kbit/s) of MPEG audio frames, by MPEG version (1, or 2 and 2.5) and layer.
+_BIT_RATES: Final[dict[tuple[bool, int], tuple[int, ...]]] = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# The sample rates of MPEG audio frames, by the version bits of the frame header (1 is reserved).
+_SAMPLE_RATES: Final[dict[int, tuple[int, int, int]]] = {
+    3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000),
+}
+
+
+def parse_date(text: str | None) -> datetime | None:
+    """
+    :param text: A date as written in a tag: ISO 8601 ('2023-05-02T14:30:00Z', '2023-05-02 14:30', '2023-05-02'), or
+                 only a year and month or a year.
+    :return: The date (in local time if the text names a time zone), or None if there isn't one or it isn't valid.
+    """
+    text = (text or '').strip('\x00 ')
+    try:
+        if len(text) == 4:
+            return datetime(int(text), 1, 1)
+        if len(text) == 7:
+            return datetime(int(text[:4]), int(text[5:]), 1)
+        date: datetime = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    return date.astimezone().replace(tzinfo=None) if date.tzinfo is not None else date
+
+
+def _mp4_date(seconds: int) -> datetime | None:
+    """
+    :param seconds: An MP4 time (seconds since the start of 1904, in UTC).
+    :return: The time in local time, or None if it wasn't set.
+    """
+    if seconds <= MP4_EPOCH:  # Unset (0), or before 1970 (which is a camera whose clock wasn't set)
+        return None
+    try:
+        return datetime.fromtimestamp(seconds - MP4_EPOCH)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def _boxes(file: BinaryIO, start: int, end: int) -> Generator[tuple[bytes, int, int], None, None]:
+    """
+    Walks a run of ISO base media boxes by seeking from one header to the next.
+    :param file: The file.
+    :param start: Where the first box starts.
+    :param end: Where the last box ends.
+    :return: A generator of the type of each box, and where its contents start and where it ends.
+    :raises ValueError: If a box is malformed.
+    """
+    position: int = start
+    while position + 8 <= end:
+        file.seek(position)
+        header: bytes = file.read(16)
+        if len(header) < 8:
+            return
+        size, kind = unpack_from('>I4s', header)
+        contents: int = position + 8
+        if size == 1:  # The size is too big for 32 bits, so follows the type
+            if len(header) < 16:
+                raise ValueError('Malformed box.')
+            size, = unpack_from('>Q', header, 8)
+            contents += 8
+        elif size == 0:  # The box runs to the end
+            size = end - position
+        if size < contents - position:
+            raise ValueError('Malformed box.')
+        yield kind, contents, min(position + size, end)
+        position += size
+
+
+def mp4_info(file: BinaryIO) -> MediaInfo:
+    """
+    :param file: An ISO base media file (MP4, MOV, M4A, 3GP...).
+    :return: What its 'mvhd' and 'tkhd' boxes say.
+    :raises ValueError: If its boxes are malformed.
+    """
+    size: int = os.fstat(file.fileno()).st_size
+    capture_date, duration, width, height = None, None, None, None
+    for kind, start, end in _boxes(file, 0, size):
+        if kind != b'moov':
+            continue
+        for child, child_start, child_end in _boxes(file, start, end):
+            if child == b'mvhd':
+                file.seek(child_start)
+                header: bytes = file.read(min(child_end - child_start, 32))
+                created, _, timescale, length = unpack_from('>QQIQ' if header[0] == 1 else '>IIII', header, 4)
+                capture_date = _mp4_date(created)
+                # A duration of all ones means it isn't known.
+                duration = length / timescale if timescale and length not in (0, 2 ** 32 - 1, 2 ** 64 - 1) else None
+            elif child == b'trak' and width is None:
+                for box, box_start, box_end in _boxes(file, child_start, child_end):
+                    if box == b'tkhd':
+                        file.seek(box_start)
+                        header: bytes = file.read(min(box_end - box_start, 96))
+                        track_width, track_height = unpack_from('>II', header, 88 if header[0] == 1 else 76)
+                        if track_width and track_height:  # Sound tracks have no size
+                            width, height = track_width >> 16, track_height >> 16  # 16.16 fixed point
+                        break
+        break
+    return MediaInfo(capture_date, duration, width, height)
+
+
+def _riff_chunks(file: BinaryIO, start: int, end: int) -> Generator[tuple[bytes, int, int], None, None]:
+    """
+    Walks a run of RIFF chunks by seeking from one header to the next.
+    :param file: The file.
+    :param start: Where the first chunk starts.
+    :param end: Where the last chunk ends.
+    :return: A generator of the id of each chunk, and where its contents start and how long they are.
+    """
+    position: int = start
+    while position + 8 <= end:
+        file.seek(position)
+        header: bytes = file.read(8)
+        if len(header) < 8:
+            return
+        kind, size = unpack('<4sI', header)
+        yield kind, position + 8, min(size, end - position - 8)
+        position += 8 + size + (size & 1)  # Chunks are padded to an even length
+
+
+def riff_info(file: BinaryIO) -> MediaInfo:
+    """
+    :param file: A RIFF file (WAV or AVI).
+    :return: What its headers say.
+    :raises ValueError: If it isn't a WAV or AVI.
+    """
+    header: bytes = file.read(12)
+    if header[8:12] not in (b'WAVE', b'AVI '):
+        raise ValueError('Not a WAV or AVI.')
+    end: int = min(8 + unpack_from('<I', header, 4)[0], os.fstat(file.fileno()).st_size)
+    capture_date, duration, width, height = None, None, None, None
+    byte_rate, data_size = 0, 0
+    for kind, start, size in _riff_chunks(file, 12, end):
+        file.seek(start)
+        if kind == b'fmt ':
+            byte_rate, = unpack_from('<I', file.read(16), 8)
+        elif kind == b'data':
+            data_size = size
+        elif kind == b'bext':  # Broadcast WAV: the origination date and time follow the description and originator
+            file.seek(start + 320)
+            stamp: str = file.read(18).decode('ascii', errors='replace')
+            capture_date = parse_date(f'{stamp[:4]}-{stamp[5:7]}-{stamp[8:10]}T{stamp[10:12]}:{stamp[13:15]}:'
+                                      f'{stamp[16:18]}') or capture_date
+        elif kind == b'LIST':
+            list_type: bytes = file.read(4)
+            for child, child_start, child_size in _riff_chunks(file, start + 4, start + size):
+                file.seek(child_start)
+                if list_type == b'INFO' and child == b'ICRD' and capture_date is None:
+                    capture_date = parse_date(file.read(min(child_size, 64)).decode('latin-1'))
+                elif list_type == b'hdrl' and child == b'avih':
+                    avih: tuple[int, ...] = unpack('<10I', file.read(40))
+                    duration = avih[0] * avih[4] / 1e6 if avih[0] and avih[4] else None
+                    width, height = avih[8] or None, avih[9] or None
+    if byte_rate and data_size:
+        duration = data_size / byte_rate
+    return MediaInfo(capture_date, duration, width, height)
+
+
+def flac_info(file: BinaryIO) -> MediaInfo:
+    """
+    :param file: A FLAC file.
+    :return: What its STREAMINFO and Vorbis comment blocks say.
+    :raises ValueError: If its metadata blocks are malformed.
+    """
+    file.seek(4)
+    capture_date, duration = None, None
+    last: bool = False
+    while not last:
+        header: bytes = file.read(4)
+        if len(header) < 4:
+            raise ValueError('FLAC metadata cut short.')
+        last, kind, length = bool(header[0] & 0x80), header[0] & 0x7F, int.from_bytes(header[1:], 'big')
+        if kind == 0:  # STREAMINFO: 20 bits of sample rate, 8 of channels and sample size, then 36 of sample count
+            bits: int = int.from_bytes(file.read(length)[10:18], 'big')
+            rate, samples = bits >> 44, bits & (2 ** 36 - 1)
+            duration = samples / rate if rate and samples else None
+        elif kind == 4:  # VORBIS_COMMENT: little endian lengths, a vendor string, then 'KEY=value' comments
+            block: bytes = file.read(length)
+            position: int = 4 + unpack_from('<I', block)[0]
+            count, = unpack_from('<I', block, position)
+            position += 4
+            for _ in range(count):
+                size, = unpack_from('<I', block, position)
+                key, _, value = block[position + 4:position + 4 + size].decode('utf-8', errors='replace').partition('=')
+                if key.upper() == 'DATE':
+                    capture_date = parse_date(value)
+                position += 4 + size
+        else:
+            file.seek(length, os.SEEK_CUR)
+    return MediaInfo(capture_date, duration)
+
+
+def _syncsafe(data: bytes) -> int:
+    """
+    :param data: An ID3 'syncsafe' integer (7 bits in each byte).
+    :return: The integer.
+    """
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _id3_text(frame: bytes) -> str:
+    """
+    :param frame: The contents of an ID3 text frame (its encoding, then its text).
+    :return: The text.
+    """
+    encoding: str = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}.get(frame[0], 'latin-1') if frame else ''
+    return frame[1:].decode(encoding, errors='replace').strip('\x00 ') if frame else ''
+
+
+class _Id3Reader:
+    """
+    Reads the bytes of an ID3v2 tag from its file, without reading past the end of the tag. If the whole tag is
+    unsynchronised (ID3v2.2 and 2.3 only: a zero byte follows every 0xFF that could be mistaken for a frame sync) the
+    zero bytes are taken back out as it is read, and the frame sizes count the bytes without them, so frames can only
+    be skipped by reading them; otherwise they are skipped with a seek.
+    """
+
+    def __init__(self, file: BinaryIO, size: int, unsynchronised: bool = False):
+        """
+        :param file: The file, at the start of the tag's frames (or extended header).
+        :param size: The number of bytes of the tag left in the file.
+        :param unsynchronised: Whether the whole tag is unsynchronised.
+        """
+        self.file: BinaryIO = file
+        self.remaining: int = size
+        self.unsynchronised: bool = unsynchronised
+        self.__after_sync: bool = False  # Whether the last byte read was 0xFF
+
+    def read(self, size: int) -> bytes:
+        """
+        :param size: The number of bytes of the tag wanted.
+        :return: The next bytes of the tag (fewer if the tag ends first).
+        """
+        if not self.unsynchronised:
+            data: bytes = self.file.read(min(size, self.remaining))
+            self.remaining -= len(data)
+            return data
+        data: bytearray = bytearray()
+        while len(data) < size and self.remaining > 0:
+            raw: bytes = self.file.read(min(size - len(data), self.remaining))
+            if not raw:
+                break
+            self.remaining -= len(raw)
+            if self.__after_sync and raw[:1] == b'\x00':
+                raw = raw[1:]
+            self.__after_sync = raw.endswith(b'\xff')
+            data += raw.replace(b'\xff\x00', b'\xff')
+        return bytes(data)
+
+    def skip(self, size: int) -> None:
+        """
+        :param size: The number of bytes of the tag to skip.
+        """
+        size = max(0, size)
+        if not self.unsynchronised:
+            size = min(size, self.remaining)
+            self.file.seek(size, os.SEEK_CUR)
+            self.remaining -= size
+            return
+        while size > 0:
+            data: bytes = self.read(min(size, 64 * 1024))
+            if not data:
+                break
+            size -= len(data)
+
+
+def _id3_frames(reader: _Id3Reader, version: int) -> dict[str, str]:
+    """
+    :param reader: Reads the frames of an ID3v2 tag (the tag after its header and any extended header).
+    :param version: The major version of the tag (2, 3 or 4).
+    :return: The text frames, by id (ID3v2.2's three letter ids included). Every other frame (e.g. cover art) is
+             skipped without being read, as are text frames that are compressed or encrypted.
+    """
+    frames: dict[str, str] = {}
+    id_size, header_size = (3, 6) if version == 2 else (4, 10)
+    while True:
+        header: bytes = reader.read(header_size)
+        if len(header) < header_size or header[0] == 0:  # Padding follows the last frame
+            break
+        frame_id: str = header[:id_size].decode('latin-1')
+        size_bytes: bytes = header[id_size:2 * id_size]
+        size: int = int.from_bytes(size_bytes, 'big') if version != 4 else _syncsafe(size_bytes)
+        flags: int = header[9] if version != 2 else 0
+        # ID3v2.3 marks compression 0x80, encryption 0x40 and a group byte 0x20; ID3v2.4 a group byte 0x40,
+        # compression 0x08, encryption 0x04, unsynchronisation 0x02 and a four byte data length 0x01.
+        unreadable: int = 0xC0 if version == 3 else 0x0C if version == 4 else 0
+        if not frame_id.startswith('T') or flags & unreadable:
+            reader.skip(size)
+            continue
+        data: bytes = reader.read(size)
+        if version == 3:
+            data = data[1:] if flags & 0x20 else data
+        elif version == 4:
+            data = data[(1 if flags & 0x40 else 0) + (4 if flags & 0x01 else 0):]
+            if flags & 0x02:
+                data = data.replace(b'\xff\x00', b'\xff')
+        frames[frame_id] = _id3_text(data)
+    return frames
+
+
+def id3_frames(tag: bytes, version: int) -> dict[str, str]:
+    """
+    :param tag: The frames of an ID3v2 tag (the tag after its header).
+    :param version: The major version of the tag (2, 3 or 4).
+    :return: The text frames, by id (ID3v2.2's three letter ids included).
+    """
+    return _id3_frames(_Id3Reader(BytesIO(tag), len(tag)), version)
+
+
+def _mpeg_duration(file: BinaryIO, start: int, size: int) -> float | None:
+    """
+    :param file: An MPEG audio file (e.g. an MP3).
+    :param start: Where the first frame starts (after any ID3 tag).
+    :param size: The size of the file.
+    :return: The duration, from the frame count in the first frame's Xing, Info or VBRI header, or else from the bit
+             rate of the first frame (exact for constant bit rates); None if there is no frame at start.
+    """
+    file.seek(start)
+    frame: bytes = file.read(64)
+    if len(frame) < 4 or frame[0] != 0xFF or frame[1] & 0xE0 != 0xE0:
+        return None
+    version_bits, layer = (frame[1] >> 3) & 3, 4 - ((frame[1] >> 1) & 3)
+    rate_index, bit_rate_index, mono = (frame[2] >> 2) & 3, frame[2] >> 4, frame[3] >> 6 == 3
+    if version_bits == 1 or layer == 4 or rate_index == 3 or bit_rate_index in (0, 15):
+        return None
+    mpeg1: bool = version_bits == 3
+    sample_rate: int = _SAMPLE_RATES[version_bits][rate_index]
+    samples_per_frame: int = 384 if layer == 1 else 1152 if layer == 2 or mpeg1 else 576
+
+    # A variable bit rate file counts its frames in a header in place of the first frame's audio.
+    xing: int = 4 + (17 if mono else 32) if mpeg1 else 4 + (9 if mono else 17)
+    if frame[xing:xing + 4] in (b'Xing', b'Info') and frame[xing + 7] & 1:
+        frames, = unpack_from('>I', frame, xing + 8)
+        return frames * samples_per_frame / sample_rate
+    if frame[36:40] == b'VBRI':
+        frames, = unpack_from('>I', frame, 50)
+        return frames * samples_per_frame / sample_rate
+    return (size - start) * 8 / (_BIT_RATES[mpeg1, layer][bit_rate_index] * 1000)
+
+
+def mp3_info(file: BinaryIO) -> MediaInfo:
+    """
+    :param file: An MPEG audio file (e.g. an MP3), with or without an ID3v2 tag.
+    :return: What its ID3v2 tag and first frame say.
+    :raises ValueError: If its ID3 tag is malformed.
+    """
+    size: int = os.fstat(file.fileno()).st_size
+    header: bytes = file.read(10)
+    frames: dict[str, str] = {}
+    audio_start: int = 0
+    if header[:3] == b'ID3':
+        version, flags, tag_size = header[3], header[5], _syncsafe(header[6:10])
+        # ID3v2.4 unsynchronises frame by frame instead (see _id3_frames), and ID3v2.2 has no extended header.
+        reader: _Id3Reader = _Id3Reader(file, tag_size, bool(flags & 0x80) and version < 4)
+        if flags & 0x40 and version > 2:  # An extended header comes before the frames
+            extended: bytes = reader.read(4)
+            reader.skip(_syncsafe(extended) - 4 if version == 4 else int.from_bytes(extended, 'big'))
+        frames = _id3_frames(reader, version)
+        audio_start = 10 + tag_size + (10 if flags & 0x10 else 0)  # A footer may follow the tag
+
+    capture_date: datetime | None = parse_date(frames.get('TDRC'))
+    year: str | None = frames.get('TYER') or frames.get('TYE')
+    if capture_date is None and year:  # ID3v2.3 splits the date up: TYER is YYYY, TDAT DDMM and TIME HHMM
+        day_month, time = frames.get('TDAT') or frames.get('TDA') or '', frames.get('TIME') or frames.get('TIM') or ''
+        capture_date = parse_date(year)
+        if capture_date and len(day_month) == 4:
+            capture_date = parse_date(f'{year}-{day_month[2:]}-{day_month[:2]}') or capture_date
+            if len(time) == 4:
+                capture_date = capture_date.replace(hour=int(time[:2]) % 24, minute=int(time[2:]) % 60)
+
+    length: str = frames.get('TLEN') or frames.get('TLE') or ''
+    duration: float | None = int(length) / 1000 if length.isdigit() and int(length) else \
+        _mpeg_duration(file, audio_start, size)
+    return MediaInfo(capture_date, duration)
+
+
+def header_media_info(path: Path | str) -> MediaInfo:
+    """
+    Reads what the headers of a video or audio file say, recognising its container from its first few bytes.
+    :param path: The file.
+    :return: What the headers say.
+    :raises ValueError: If the file isn't a container this module understands, or its headers are malformed.
+    """
+    with open(path, 'rb') as f:
+        start: bytes = f.read(12)
+        f.seek(0)
+        try:
+            if start[4:8] in MP4_BOXES:
+                return mp4_info(f)
+            if start[:4] == b'RIFF':
+                return riff_info(f)
+            if start[:4] == b'fLaC':
+                return flac_info(f)
+            if start[:3] == b'ID3' or (len(start) > 1 and start[0] == 0xFF and start[1] & 0xE0 == 0xE0):
+                return mp3_info(f)
+        except (struct_error, IndexError) as e:  # Something points beyond what is there.
+            raise ValueError('Headers cut short.') from e
+    raise ValueError('Not a container this module understands.')
+
+
+def media_info(path: Path | str) -> MediaInfo:
+    """
+    :param path: A video or audio file.
+    :return: What its headers say (nothing, if it can't be read or isn't a container this module understands).
+    """
+    try:
+        return header_media_info(path)
+    except (ValueError, OSError):
+        return MediaInfo()
+
+
+def media_infos(paths: Iterable[Path | str], workers: int = 1, backend: str = 'thread') -> Iterable[MediaInfo]:
+    """
+    Reads the headers of many video and audio files, on a pool of workers.
+    :param paths: The files.
+    :param workers: The number of files to read at once.
+    :param backend: 'thread' or 'process' (see parallel.ordered_starmap).
+    :return: A generator of what the headers of each file say, in the same order as the paths.
+    """
+    return ordered_starmap(media_info, ((p,) for p in paths), workers, backend)
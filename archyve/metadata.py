@@ -0,0 +1,185 @@
+"""
+Module contains a small EXIF reader that finds when a photo was taken by reading only the headers of JPEG and TIFF
+files, rather than decoding the image. Pillow is only used for other formats, or when the headers can't be made sense
+of.
+
+The date a photo was taken (DateTimeOriginal) is not in the main EXIF directory but in the EXIF sub-directory it points
+to, so both are read; the main directory's DateTime (when the file was last changed) is used if the camera didn't
+record one.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.parallel import ordered_starmap
+from typing import BinaryIO, Final, Iterable
+from PIL import Image, UnidentifiedImageError
+from datetime import datetime
+from struct import error as struct_error, unpack_from
+from pathlib import Path
+import os
+
+
+# The format exif dates are written in.
+EXIF_DATE_FORMAT: Final[str] = '%Y:%m:%d %H:%M:%S'
+
+# The tags used to find the capture date.
+EXIF_IFD_POINTER: Final[int] = 0x8769
+DATE_TIME_ORIGINAL: Final[int] = 0x9003
+DATE_TIME_DIGITIZED: Final[int] = 0x9004
+DATE_TIME: Final[int] = 0x0132
+
+# How much of a TIFF file is read to look for its dates (EXIF directories are near the start).
+TIFF_HEADER_SIZE: Final[int] = 64 * 1024
+
+# The JPEG markers that end the headers: start of scan and end of image.
+_JPEG_HEADER_END: Final[frozenset[int]] = frozenset({0xDA, 0xD9})
+
+
+def parse_exif_date(value: str | bytes | None) -> datetime | None:
+    """
+    :param value: A date as written in EXIF data ('YYYY:MM:DD HH:MM:SS').
+    :return: The date, or None if there isn't one or it isn't valid (cameras write '0000:00:00 00:00:00' and worse).
+    """
+    if isinstance(value, bytes):
+        value = value.decode('ascii', errors='replace')
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip('\x00 ')[:19], EXIF_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def _ifd(tiff: bytes, offset: int, order: str) -> dict[int, tuple[int, int, bytes]]:
+    """
+    Reads the entries of one image file directory.
+    :param tiff: The TIFF data (offsets are relative to its start).
+    :param offset: Where the directory starts.
+    :param order: The byte order of the data, '<' or '>'.
+    :return: Each entry's tag mapped to its type, count, and the four bytes holding its value (or its value's offset).
+    """
+    count, = unpack_from(f'{order}H', tiff, offset)
+    entries: dict[int, tuple[int, int, bytes]] = {}
+    for position in range(offset + 2, offset + 2 + 12 * count, 12):
+        tag, kind, number = unpack_from(f'{order}HHI', tiff, position)
+        entries[tag] = kind, number, tiff[position + 8:position + 12]
+    return entries
+
+
+def _ascii(tiff: bytes, entry: tuple[int, int, bytes] | None, order: str) -> str | None:
+    """
+    :param tiff: The TIFF data.
+    :param entry: An entry from a directory.
+    :param order: The byte order of the data, '<' or '>'.
+    :return: The entry's value if it is text, else None.
+    """
+    if entry is None or entry[0] != 2:
+        return None
+    kind, count, value = entry
+    if count > 4:
+        offset, = unpack_from(f'{order}I', value)
+        value = tiff[offset:offset + count]
+    return value[:count].decode('ascii', errors='replace')
+
+
+def tiff_capture_date(tiff: bytes) -> datetime | None:
+    """
+    Finds the capture date in TIFF formatted data (a TIFF file, or the EXIF block of a JPEG).
+    :param tiff: The data.
+    :return: The capture date, or None if there isn't one.
+    :raises ValueError: If the data isn't TIFF formatted or is cut short.
+    """
+    if tiff[:4] not in (b'II*\x00', b'MM\x00*'):
+        raise ValueError('Not TIFF data.')
+    order: str = '<' if tiff[:2] == b'II' else '>'
+    try:
+        ifd0: dict[int, tuple[int, int, bytes]] = _ifd(tiff, unpack_from(f'{order}I', tiff, 4)[0], order)
+        exif: dict[int, tuple[int, int, bytes]] = {}
+        if EXIF_IFD_POINTER in ifd0:
+            exif = _ifd(tiff, unpack_from(f'{order}I', ifd0[EXIF_IFD_POINTER][2])[0], order)
+    except struct_error as e:  # An offset points beyond what we have.
+        raise ValueError('TIFF data cut short.') from e
+    return parse_exif_date(_ascii(tiff, exif.get(DATE_TIME_ORIGINAL), order)) or \
+        parse_exif_date(_ascii(tiff, exif.get(DATE_TIME_DIGITIZED), order)) or \
+        parse_exif_date(_ascii(tiff, ifd0.get(DATE_TIME), order))
+
+
+def jpeg_exif(file: BinaryIO) -> bytes | None:
+    """
+    Walks the segments at the start of a JPEG (skipping over them without reading them) until the EXIF one is found.
+    :param file: The JPEG, positioned just after its start of image marker.
+    :return: The TIFF formatted EXIF data, or None if the image doesn't have any.
+    :raises ValueError: If the headers are malformed.
+    """
+    while True:
+        header: bytes = file.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            raise ValueError('Malformed JPEG header.')
+        marker, length = header[1], int.from_bytes(header[2:], 'big')
+        if marker in _JPEG_HEADER_END:
+            return None
+        if marker == 0xE1:
+            segment: bytes = file.read(length - 2)
+            if segment.startswith(b'Exif\x00\x00'):
+                return segment[6:]
+        else:
+            file.seek(length - 2, os.SEEK_CUR)
+
+
+def header_capture_date(path: Path | str) -> datetime | None:
+    """
+    Finds when a JPEG or TIFF was taken from its headers alone (a few kilobytes at most are read).
+    :param path: The image.
+    :return: The capture date, or None if the image doesn't have one.
+    :raises ValueError: If the file isn't a JPEG or TIFF, or its headers are malformed.
+    """
+    with open(path, 'rb') as f:
+        start: bytes = f.read(4)
+        if start[:2] == b'\xff\xd8':
+            f.seek(2)
+            exif: bytes | None = jpeg_exif(f)
+            return tiff_capture_date(exif) if exif is not None else None
+        if start in (b'II*\x00', b'MM\x00*'):
+            return tiff_capture_date(start + f.read(TIFF_HEADER_SIZE - 4))
+    raise ValueError('Not a JPEG or TIFF.')
+
+
+def pillow_capture_date(path: Path | str) -> datetime | None:
+    """
+    Finds when an image was taken by opening it with Pillow (slower, but understands many more formats).
+    :param path: The image.
+    :return: The capture date, or None if the image doesn't have one or Pillow can't open it.
+    """
+    try:
+        with Image.open(path) as img:
+            exif: Image.Exif = img.getexif()
+            sub_ifd: dict = exif.get_ifd(EXIF_IFD_POINTER)
+            return parse_exif_date(sub_ifd.get(DATE_TIME_ORIGINAL)) or \
+                parse_exif_date(sub_ifd.get(DATE_TIME_DIGITIZED)) or parse_exif_date(exif.get(DATE_TIME))
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+
+def capture_date(path: Path | str) -> datetime | None:
+    """
+    Finds when an image was taken, from its headers if it is a JPEG or TIFF, else with Pillow.
+    :param path: The image.
+    :return: The capture date, or None if the image doesn't have one.
+    """
+    try:
+        return header_capture_date(path)
+    except ValueError:
+        return pillow_capture_date(path)
+    except OSError:
+        return None
+
+
+def capture_dates(paths: Iterable[Path | str], workers: int = 1,
+                  backend: str = 'thread') -> Iterable[datetime | None]:
+    """
+    Finds when many images were taken, on a pool of workers.
+    :param paths: The images.
+    :param workers: The number of images to read at once.
+    :param backend: 'thread' or 'process' (see parallel.ordered_starmap).
+    :return: A generator of the capture dates, in the same order as the paths.
+    """
+    return ordered_starmap(capture_date, ((p,) for p in paths), workers, backend)
@@ -0,0 +1,483 @@
+"""
+Module contains an engine that runs bulk file operations (deletes, moves and renames) described by a plan:
+    - Operation: one delete, move or rename. A plan is a list of them.
+    - execute: runs a plan on a pool of threads. Operations are grouped by the device and directories they touch, and
+      each group is run in order by one worker, so that workers don't contend for the same directory. Moves between
+      devices fall back to copy, fsync and unlink. A dry run checks every operation without touching anything.
+    - Journal: a newline delimited JSON record of a plan and of each operation as it completes, so that a run that is
+      interrupted can be resumed (resume) or undone (rollback).
+    - Report: what a run did, how long it took and what failed.
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Final, Iterable, NamedTuple, Sequence
+from archyve.parallel import ordered_starmap
+from archyve.instrumentation import notify, observers
+from time import perf_counter
+from pathlib import Path
+import threading
+import filecmp
+import shutil
+import errno
+import json
+import os
+
+
+# The kinds of operation.
+DELETE: Final[str] = 'delete'
+MOVE: Final[str] = 'move'
+
+# The most operations given to a worker at once (so a single large directory is still spread over the pool).
+GROUP_SIZE: Final[int] = 256
+
+# The size of the buffer files are copied through when they are moved between devices.
+COPY_BUFFER: Final[int] = 1024 * 1024
+
+# The version written at the top of a journal.
+_JOURNAL_VERSION: Final[int] = 1
+
+
+class Operation(NamedTuple):
+    """
+    A single file operation.
+    """
+    kind: str  # DELETE or MOVE
+    source: str
+    destination: str | None = None
+
+    @staticmethod
+    def delete(path: os.PathLike | str) -> 'Operation':
+        """
+        :param path: The file to delete.
+        :return: An operation that deletes the file.
+        """
+        return Operation(DELETE, os.fspath(path))
+
+    @staticmethod
+    def move(source: os.PathLike | str, destination: os.PathLike | str) -> 'Operation':
+        """
+        :param source: The file to move.
+        :param destination: Where to move it (its parent folders are made if they don't exist).
+        :return: An operation that moves the file.
+        """
+        return Operation(MOVE, os.fspath(source), os.fspath(destination))
+
+    @staticmethod
+    def rename(source: os.PathLike | str, new_file_name: str) -> 'Operation':
+        """
+        :param source: The file to rename.
+        :param new_file_name: The new name of the file (in the same folder).
+        :return: An operation that renames the file.
+        """
+        source: str = os.fspath(source)
+        return Operation(MOVE, source, os.path.join(os.path.dirname(source), new_file_name))
+
+
+class Report:
+    """
+    What a run of a plan did.
+    """
+
+    def __init__(self, dry_run: bool = False):
+        self.dry_run: bool = dry_run
+        self.done: int = 0  # The number of operations that succeeded (or would succeed, in a dry run)
+        self.bytes: int = 0  # The size of the files they acted on
+        self.copied: int = 0  # The number of bytes copied to move files between devices
+        self.reclaimed: int = 0  # The number of bytes of disk space freed (counted by deduplication)
+        self.verified: int = 0  # The number of bytes read to verify that copies are identical (by deduplication)
+        self.seconds: float = 0.0
+        self.failed: dict[str, Exception] = {}  # The reason each operation that failed did so, by source path
+
+    @property
+    def files_per_second(self) -> float:
+        return self.done / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __repr__(self) -> str:
+        return (f'Report({"dry run, " if self.dry_run else ""}{self.done} done, {len(self.failed)} failed, '
+                f'{self.bytes} bytes, {self.copied} copied, {self.reclaimed} reclaimed, {self.verified} verified, '
+                f'{self.seconds:.3f}s, {self.files_per_second:.1f} files/s)')
+
+
+class Journal:
+    """
+    A record of a plan and its progress, written as newline delimited JSON: a header, one line per operation, then one
+    line per operation as it completes (or fails). Lines are flushed as they are written, so the journal survives the
+    process being killed; a line cut short by a crash is ignored when the journal is loaded.
+    """
+
+    def __init__(self, location: Path | str):
+        self.location: Path = Path(location)
+        self.__file = None
+        self.__lock: threading.Lock = threading.Lock()
+
+    def start(self, plan: Sequence[Operation]) -> None:
+        """
+        Writes a new journal for a plan (replacing anything already at the location).
+        :param plan: The plan about to be run.
+        """
+        self.close()
+        self.__file = open(self.location, 'w', encoding='utf-8')
+        lines: list[dict] = [{'journal': _JOURNAL_VERSION, 'operations': len(plan)}]
+        lines += [{'i': i, 'op': op.kind, 'source': op.source, 'destination': op.destination}
+                  for i, op in enumerate(plan)]
+        self.__file.writelines(json.dumps(line) + '\n' for line in lines)
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+    def reopen(self) -> None:
+        """
+        Opens an existing journal so that more progress can be recorded in it.
+        """
+        self.close()
+        with open(self.location, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            torn: bool = f.read(1) != b'\n'
+        self.__file = open(self.location, 'a', encoding='utf-8')
+        if torn:  # End the line a crash cut short, so the next record isn't lost with it.
+            self.__file.write('\n')
+
+    def record(self, index: int, error: Exception | None = None) -> None:
+        """
+        Records that an operation completed, or failed.
+        :param index: The position of the operation in the plan.
+        :param error: Why the operation failed (None if it succeeded).
+        """
+        line: dict = {'done': index} if error is None else {'failed': index, 'error': repr(error)}
+        with self.__lock:
+            self.__file.write(json.dumps(line) + '\n')
+            self.__file.flush()
+
+    def close(self) -> None:
+        if self.__file is not None:
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+            self.__file = None
+
+    def load(self) -> tuple[list[Operation], set[int]]:
+        """
+        :return: The plan in the journal, and the positions of the operations that were completed.
+        """
+        plan: list[Operation] = []
+        done: set[int] = set()
+        with open(self.location, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record: dict = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Cut short by a crash
+                if 'op' in record:
+                    plan.append(Operation(record['op'], record['source'], record['destination']))
+                elif 'done' in record:
+                    done.add(record['done'])
+        return plan, done
+
+
+def fsync_directory(path: os.PathLike | str) -> None:
+    """
+    Makes the entries of a folder (e.g. a file that was just renamed into it) durable, where the OS supports it.
+    :param path: The folder.
+    """
+    try:
+        fd: int = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # Not every platform or filesystem can sync a folder.
+    finally:
+        os.close(fd)
+
+
+def copy_across(source: str, destination: str) -> int:
+    """
+    Moves a file to another device: it is copied to a temporary file next to the destination, synced to disk, renamed
+    into place, and only then is the original removed. The destination never holds a partial copy.
+    :param source: The file to move.
+    :param destination: Where to move it.
+    :return: The number of bytes copied.
+    """
+    folder: str = os.path.dirname(destination) or '.'
+    temporary: str = os.path.join(folder, f'.{os.path.basename(destination)}.{os.getpid()}.part')
+    try:
+        with open(source, 'rb') as src, open(temporary, 'wb') as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+            dst.flush()
+            os.fsync(dst.fileno())
+            copied: int = dst.tell()
+        shutil.copystat(source, temporary)
+        os.replace(temporary, destination)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+        raise
+    fsync_directory(folder)
+    os.unlink(source)
+    return copied
+
+
+def move_file(source: os.PathLike | str, destination: os.PathLike | str, replace: bool = False) -> int:
+    """
+    Moves a file, on the same device or to another one.
+    :param source: The file to move.
+    :param destination: Where to move it.
+    :param replace: Whether a file already at the destination may be replaced.
+    :return: The number of bytes that had to be copied (0 if the file was renamed).
+    """
+    source, destination = os.fspath(source), os.fspath(destination)
+    if not replace and os.path.lexists(destination):
+        raise FileExistsError(errno.EEXIST, 'Destination already exists', destination)
+    try:
+        (os.replace if replace else os.rename)(source, destination)
+        return 0
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    return copy_across(source, destination)
+
+
+def _run(op: Operation, dry_run: bool, resuming: bool) -> tuple[int, int]:
+    """
+    Runs (or checks) one operation.
+    :param op: The operation.
+    :param dry_run: Whether to only check that the operation would succeed.
+    :param resuming: Whether the operation may already have been done by an interrupted run.
+    :return: The size of the file, and the number of bytes copied to move it.
+    """
+    try:
+        size: int = os.lstat(op.source).st_size
+    except FileNotFoundError:
+        if resuming and (op.kind == DELETE or os.path.lexists(op.destination)):
+            return 0, 0  # Done before the interruption, but not recorded.
+        raise
+
+    if op.kind == DELETE:
+        if not dry_run:
+            os.unlink(op.source)
+        return size, 0
+    if op.kind != MOVE:
+        raise ValueError(f'Unknown operation \"{op.kind}\"')
+
+    if os.path.lexists(op.destination):
+        if resuming and not os.path.samefile(op.source, op.destination) and \
+                filecmp.cmp(op.source, op.destination, shallow=False):
+            # Copied to another device before the interruption, but the original wasn't removed yet.
+            if not dry_run:
+                os.unlink(op.source)
+            return size, 0
+        raise FileExistsError(errno.EEXIST, 'Destination already exists', op.destination)
+    if dry_run:
+        return size, 0
+    os.makedirs(os.path.dirname(op.destination) or '.', exist_ok=True)
+    return size, move_file(op.source, op.destination)
+
+
+def _run_group(plan: Sequence[Operation], indices: list[int], dry_run: bool, resuming: bool,
+               journal: Journal | None) -> list[tuple[int, int, int, Exception | None]]:
+    """
+    Runs a group of operations in order.
+    :param plan: The plan.
+    :param indices: The positions of the operations in the group.
+    :param dry_run: Whether to only check the operations.
+    :param resuming: Whether the operations may already have been done by an interrupted run.
+    :param journal: Where to record the progress (None to not record it).
+    :return: The position, file size, bytes copied and error (None on success) of each operation.
+    """
+    outcomes: list[tuple[int, int, int, Exception | None]] = []
+    for i in indices:
+        try:
+            size, copied = _run(plan[i], dry_run, resuming)
+            outcomes.append((i, size, copied, None))
+        except OSError as e:
+            outcomes.append((i, 0, 0, e))
+        if journal is not None:
+            journal.record(i, outcomes[-1][3])
+    return outcomes
+
+
+def _groups(plan: Sequence[Operation], indices: Iterable[int]) -> list[list[int]]:
+    """
+    Groups operations by the device and folder of their source and the folder of their destination.
+    :param plan: The plan.
+    :param indices: The positions of the operations to group.
+    :return: The positions of the operations in each group, at most GROUP_SIZE to a group.
+    """
+    devices: dict[str, int] = {}
+    groups: dict[tuple[int, str, str | None], list[int]] = {}
+    for i in indices:
+        op: Operation = plan[i]
+        folder: str = os.path.dirname(op.source)
+        if folder not in devices:
+            try:
+                devices[folder] = os.stat(folder or '.').st_dev
+            except OSError:
+                devices[folder] = -1
+        key: tuple[int, str, str | None] = (devices[folder], folder,
+                                            os.path.dirname(op.destination) if op.destination else None)
+        groups.setdefault(key, []).append(i)
+    return [g[i:i + GROUP_SIZE] for g in groups.values() for i in range(0, len(g), GROUP_SIZE)]
+
+
+def _claimed(plan: Sequence[Operation], indices: Iterable[int], report: Report) -> list[int]:
+    """
+    Fails every move after the first to the same destination, and every operation after the first on the same source,
+    so that workers running at the same time can't overwrite each other's results.
+    :param plan: The plan.
+    :param indices: The positions of the operations to run.
+    :param report: Where to record the failures.
+    :return: The positions of the operations that may run.
+    """
+    sources: set[str] = set()
+    destinations: set[str] = set()
+    allowed: list[int] = []
+    for i in indices:
+        op: Operation = plan[i]
+        if op.source in sources:
+            report.failed[op.source] = ValueError('The plan acts on this file more than once')
+        elif op.destination is not None and op.destination in destinations:
+            report.failed[op.source] = FileExistsError(errno.EEXIST, 'The plan moves another file here',
+                                                       op.destination)
+        else:
+            sources.add(op.source)
+            if op.destination is not None:
+                destinations.add(op.destination)
+            allowed.append(i)
+    return allowed
+
+
+def execute(plan: Sequence[Operation], workers: int = 4, dry_run: bool = False,
+            journal: Journal | Path | str | None = None) -> Report:
+    """
+    Runs a plan of operations on a pool of threads.
+    :param plan: The operations to run.
+    :param workers: The number of groups of operations run at once.
+    :param dry_run: Whether to only check that each operation would succeed (nothing is changed, or journaled).
+    :param journal: Where to record the plan and its progress so the run can be resumed or rolled back.
+    :return: A report of what was done (or would be done, in a dry run).
+    """
+    journal: Journal | None = None if dry_run or journal is None else \
+        journal if isinstance(journal, Journal) else Journal(journal)
+    if journal is not None:
+        journal.start(plan)
+    return _execute(plan, range(len(plan)), workers, dry_run, journal, resuming=False)
+
+
+def _execute(plan: Sequence[Operation], indices: Iterable[int], workers: int, dry_run: bool, journal: Journal | None,
+             resuming: bool) -> Report:
+    """
+    Runs some of the operations of a plan on a pool of threads.
+    :param plan: The plan.
+    :param indices: The positions of the operations to run.
+    :param workers: The number of groups of operations run at once.
+    :param dry_run: Whether to only check the operations.
+    :param journal: An open journal to record the progress in (None to not record it).
+    :param resuming: Whether the operations may already have been done by an interrupted run.
+    :return: A report of what was done.
+    """
+    report: Report = Report(dry_run)
+    start: float = perf_counter()
+    try:
+        indices: list[int] = _claimed(plan, indices, report)
+        if observers:
+            notify('stage_started', 'operations', len(indices), 0)
+        groups: Iterable[tuple] = ((plan, g, dry_run, resuming, journal) for g in _groups(plan, indices))
+        for outcomes in ordered_starmap(_run_group, groups, workers):
+            for i, size, copied, error in outcomes:
+                if error is None:
+                    report.done += 1
+                    report.bytes += size
+                    report.copied += copied
+                    if observers and not dry_run:
+                        notify('operated', plan[i].kind, plan[i].source, size)
+                else:
+                    report.failed[plan[i].source] = error
+        if observers:
+            for source, error in report.failed.items():
+                notify('error', source, error)
+    finally:
+        if journal is not None:
+            journal.close()
+    report.seconds = perf_counter() - start
+    if observers:
+        notify('stage_finished', 'operations', report.seconds)
+    return report
+
+
+def resume(journal: Journal | Path | str, workers: int = 4) -> Report:
+    """
+    Runs the operations of an interrupted plan that weren't completed. Operations that were completed but not yet
+    recorded when the run was interrupted are recognised and counted as done.
+    :param journal: The journal of the interrupted run.
+    :param workers: The number of groups of operations run at once.
+    :return: A report of what was done.
+    """
+    journal: Journal = journal if isinstance(journal, Journal) else Journal(journal)
+    plan, done = journal.load()
+    journal.reopen()
+    return _execute(plan, (i for i in range(len(plan)) if i not in done), workers, False, journal, resuming=True)
+
+
+def rollback(journal: Journal | Path | str) -> Report:
+    """
+    Undoes the completed moves of a plan (interrupted or not), newest first and one at a time, so a move that depends on
+    a later one (e.g. 'x' to 'y' then 'z' to 'x') is only undone once the later one has been. Each move is checked as it
+    is undone: if its destination is gone or its source has been taken since, it is reported as a failure rather than
+    guessed at. Deleted files can't be brought back: each one is reported as a failure too.
+    :param journal: The journal of the run to undo.
+    :return: A report of what was undone.
+    """
+    plan, done = Journal(journal.location if isinstance(journal, Journal) else journal).load()
+    report: Report = Report()
+    start: float = perf_counter()
+    for i in sorted(done, reverse=True):
+        op: Operation = plan[i]
+        if op.kind == DELETE:
+            report.failed[op.source] = FileNotFoundError(errno.ENOENT, 'Deleted files cannot be restored', op.source)
+            continue
+        try:
+            size, copied = _run(Operation.move(op.destination, op.source), False, False)
+        except OSError as e:
+            report.failed[op.destination] = e
+            continue
+        report.done += 1
+        report.bytes += size
+        report.copied += copied
+        if observers:
+            notify('operated', MOVE, op.destination, size)
+    if observers:
+        for source, error in report.failed.items():
+            notify('error', source, error)
+    report.seconds = perf_counter() - start
+    return report
+
+
+def flatten_plan(paths: Iterable[os.PathLike | str], destination: os.PathLike | str) -> list[Operation]:
+    """
+    Plans moving files into a single folder. Files whose names are taken (by a file already in the folder, or by an
+    earlier file in the plan) are given a numbered suffix, e.g. 'photo (1).jpg'. Files already in the folder stay put.
+    :param paths: The files to move.
+    :param destination: The folder to move them into.
+    :return: The plan.
+    """
+    destination: str = os.fspath(destination)
+    taken: set[str] = set(os.listdir(destination)) if os.path.isdir(destination) else set()
+    plan: list[Operation] = []
+    for path in paths:
+        path: str = os.fspath(path)
+        folder, name = os.path.split(path)
+        if os.path.abspath(folder) == os.path.abspath(destination):
+            continue
+        stem, extension = os.path.splitext(name)
+        n: int = 0
+        while name in taken:
+            n += 1
+            name = f'{stem} ({n}){extension}'
+        taken.add(name)
+        plan.append(Operation.move(path, os.path.join(destination, name)))
+    return plan
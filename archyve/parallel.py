@@ -0,0 +1,75 @@
+"""
+Module contains helpers to run work over many files concurrently, on a pool of threads or processes, while keeping the
+amount of work in flight bounded and the results in the same order as the input.
+
+Threads suit I/O bound work (hashlib releases the GIL while it hashes large buffers), processes suit work that holds
+the GIL. Functions run on the process backend must be picklable, i.e. defined at the top level of a module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Final, Generator, Iterable, Iterator
+from itertools import islice
+from collections import deque
+
+
+# The backends that can be used to run work concurrently.
+BACKENDS: Final[dict[str, type[Executor]]] = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+
+def _run_chunk(func: Callable, chunk: list[tuple]) -> list[Any]:
+    """
+    Runs a function over a chunk of argument tuples (so that a process pool is sent a few large tasks rather than many
+    small ones).
+    :param func: The function to run.
+    :param chunk: The arguments of each call.
+    :return: The results of each call.
+    """
+    return [func(*args) for args in chunk]
+
+
+def executor(workers: int, backend: str = 'thread') -> Executor:
+    """
+    :param workers: The number of workers the pool should have.
+    :param backend: 'thread' or 'process'.
+    :return: A new pool of the given kind.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend \"{backend}\", choose from: {list(BACKENDS)}')
+    return BACKENDS[backend](max_workers=workers)
+
+
+def ordered_starmap(func: Callable, arguments: Iterable[tuple], workers: int = 1, backend: str = 'thread',
+                    chunk_size: int | None = None, max_pending: int | None = None) -> Generator[Any, None, None]:
+    """
+    Calls func(*args) for every tuple of arguments on a pool of workers, yielding the results in the same order as the
+    arguments. Only max_pending chunks are in flight at once, so arguments are consumed lazily and memory stays
+    bounded however many there are. With one worker everything runs serially on the calling thread.
+    :param func: The function to call.
+    :param arguments: The arguments of each call.
+    :param workers: The number of workers to use.
+    :param backend: 'thread' or 'process'.
+    :param chunk_size: The number of calls sent to a worker at once (defaults to 1 for threads and 64 for processes).
+    :param max_pending: The maximum number of chunks in flight (defaults to four per worker).
+    :return: A generator of the results.
+    """
+    if workers <= 1:
+        yield from (func(*args) for args in arguments)
+        return
+
+    chunk_size: int = chunk_size or (1 if backend == 'thread' else 64)
+    max_pending: int = max_pending or workers * 4
+    arguments = iter(arguments)
+    chunks: Iterator[list[tuple]] = iter(lambda: list(islice(arguments, chunk_size)), [])
+
+    with executor(workers, backend) as pool:
+        pending: deque[Future] = deque(pool.submit(_run_chunk, func, c) for c in islice(chunks, max_pending))
+        try:
+            while pending:
+                results: list[Any] = pending.popleft().result()
+                for chunk in islice(chunks, 1):
+                    pending.append(pool.submit(_run_chunk, func, chunk))
+                yield from results
+        finally:  # Don't wait for work nobody will collect if we are closed early.
+            for future in pending:
+                future.cancel()
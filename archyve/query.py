@@ -0,0 +1,141 @@
+"""
+Module contains the filters an archyve can push down into its directory walk, so that files it doesn't want are turned
+away on their name (or stat) as they are listed, before an Entry is made for them. A query is any of several branches,
+each of which is all of its predicates and only applies to the files below its own directories; so filters chained on
+an archyve add predicates to every branch, and adding two archyves together joins their branches into one query that a
+single walk of both archyves' directories can answer.
+
+Predicates are one of:
+    - type: the file's type is one of these (going by its extension),
+    - extension: the file's extension is one of these,
+    - path: the file's path matches any / all of these queries (see index.matches),
+    - size: the file's size is between these bounds (the only predicate that needs the file's stat).
+
+The same query can be answered from the columns of an EntryTable (see Query.rows).
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Any, Callable, Final, NamedTuple, Sequence
+from archyve.entry import Entry, EntryType
+from archyve.index import matches
+from archyve.table import EntryTable
+from os import DirEntry
+from array import array
+import os
+
+
+# The kinds of predicate.
+TYPE: Final[str] = 'type'
+EXTENSION: Final[str] = 'extension'
+PATH: Final[str] = 'path'
+SIZE: Final[str] = 'size'
+
+
+class Predicate(NamedTuple):
+    """
+    One condition a file must meet. The value depends on the kind:
+        - type: a frozenset of EntryTypes,
+        - extension: a frozenset of lower case extensions (with their dot, '' for none),
+        - path: the queries, the kind of query and any or all,
+        - size: the smallest and largest size allowed (None for no bound).
+    """
+    kind: str
+    value: Any
+
+
+# A branch of a query: the directories it applies to (None for all of them) and the predicates it is made of.
+Branch = tuple[tuple[str, ...] | None, tuple[Predicate, ...]]
+
+
+def _holds(predicate: Predicate, extension: str, path: Callable[[], str], size: Callable[[], int]) -> bool:
+    """
+    :param predicate: A predicate.
+    :param extension: The file's (lower case) extension.
+    :param path: Gets the file's path.
+    :param size: Gets the file's size.
+    :return: Whether the file meets the predicate.
+    """
+    kind, value = predicate
+    if kind == TYPE:
+        return Entry.EXTENSION_MAP.get(extension, EntryType.UNKNOWN) in value
+    if kind == EXTENSION:
+        return extension in value
+    if kind == PATH:
+        queries, query_kind, any_all = value
+        file_path: str = path()
+        return any_all(matches(file_path, q, query_kind) for q in queries)
+    smallest, largest = value
+    file_size: int = size()
+    return (smallest is None or file_size >= smallest) and (largest is None or file_size <= largest)
+
+
+class Query:
+    """
+    A filter on the files of a walk that can be answered without making entries: any of its branches, each of which is
+    all of its predicates (see the module's docstring).
+    """
+
+    def __init__(self, branches: Sequence[Branch] = ((None, ()),)):
+        """
+        :param branches: The branches (the default is one branch that accepts every file).
+        """
+        self.branches: tuple[Branch, ...] = tuple(branches)
+
+    def __repr__(self) -> str:
+        return f'Query({self.branches!r})'
+
+    def where(self, *predicate: Predicate) -> 'Query':
+        """
+        :param predicate: Predicates every file must also meet.
+        :return: A query that accepts the files this one does that also meet the predicates.
+        """
+        return Query((roots, predicates + predicate) for roots, predicates in self.branches)
+
+    def within(self, directories: Sequence[str]) -> 'Query':
+        """
+        :param directories: Directories (as the walk gives them, i.e. resolved).
+        :return: A query whose branches that applied everywhere only apply below the given directories.
+        """
+        directories = tuple(os.path.join(d, '') for d in directories)
+        return Query((directories if roots is None else roots, predicates) for roots, predicates in self.branches)
+
+    def __or__(self, other: 'Query') -> 'Query':
+        """
+        :param other: Another query.
+        :return: A query that accepts the files that either query accepts.
+        """
+        return Query(self.branches + other.branches)
+
+    def accepts(self, file: DirEntry | Entry) -> bool:
+        """
+        :param file: A file found by a walk (or an entry).
+        :return: Whether the query accepts the file (its stat is only looked at if a size predicate needs it).
+        """
+        path: str = os.fspath(file)
+        extension: str = os.path.splitext(file.name)[1].lower()
+        size: Callable[[], int] = (lambda: file.size) if isinstance(file, Entry) else (lambda: file.stat().st_size)
+        for roots, predicates in self.branches:
+            if roots is not None and not path.startswith(roots):
+                continue
+            if all(_holds(p, extension, lambda: path, size) for p in predicates):
+                return True
+        return False
+
+    def rows(self, table: EntryTable, rows: Sequence[int]) -> array:
+        """
+        :param table: A table.
+        :param rows: The rows to choose from.
+        :return: The rows whose files the query accepts, answered from the table's columns.
+        """
+        extensions, extension_ids, sizes = table.extensions, table.extension_ids, table.sizes
+        accepted: array = array('Q')
+        for row in rows:
+            path: Callable[[], str] = lambda: table.path(row)
+            extension: str = extensions[extension_ids[row]]
+            for roots, predicates in self.branches:
+                if roots is not None and not path().startswith(roots):
+                    continue
+                if all(_holds(p, extension, path, lambda: sizes[row]) for p in predicates):
+                    accepted.append(row)
+                    break
+        return accepted
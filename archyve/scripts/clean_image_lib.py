@@ -1,29 +1,29 @@
 """
 Script contains logic to analyse and clean an image library. The goal is to remove duplicates, keeping the oldest
-copy that we can find. We also want to flatten the entire library, so that the user can sort by date manually and drag
-into albums.
+copy that we can find (the other copies become hard links to it, so no path is lost). We also want to flatten the
+entire library, so that the user can sort by date manually and drag into albums.
 
 Author: ali.kellaway139@gmail.com
 """
 from archyve.archyve import Archyve
+from archyve.dedupe import deduplicate
 from archyve.entry import Entry
 
 
 if __name__ == '__main__':
     # NB DO NOT RUN THIS IF YOU DON'T UNDERSTAND IT.
 
-    archyve: Archyve = Archyve(r"<put your path here>")
+    path: str = r"<put your path here>"
 
-    # Get a list of all the duplicate images and videos
-    archyve = archyve.images + archyve.videos
-    duplicate_lists: list[list[Entry]] = archyve.images.duplicates()
+    # Get a list of all the duplicate images and videos (type filters are in place, so each side needs its own archyve;
+    # the two are walked together, once)
+    archyve: Archyve = Archyve(path).images + Archyve(path).videos
+    duplicate_lists: list[list[Entry]] = archyve.duplicates()
 
-    # Sort the duplicates by age
-    for i in range(len(duplicate_lists)):
-        duplicate_lists[i] = sorted(duplicate_lists[i], key=lambda e: e.created)
-
-    # Delete the ones that are not the oldest
-    delete: list[list[Entry]] = [duplicate_list[1:] for duplicate_list in duplicate_lists]
-    for entry_list in delete:
-        archyve.delete(entry_list)
+    # Read every image's and video's capture date from its headers once, on a pool of workers
+    archyve.capture_dates(e for duplicate_list in duplicate_lists for e in duplicate_list)
 
+    # Keep the oldest copy of each duplicate and hard link the others to it, so every path still works but the space is
+    # reclaimed (use 'delete' to remove the other copies instead); every copy is checked byte by byte first
+    oldest_first = (sorted(duplicate_list, key=lambda e: e.created) for duplicate_list in duplicate_lists)
+    print(deduplicate(oldest_first, strategy='hardlink'))
@@ -0,0 +1,260 @@
+"""
+Module contains perceptual hashes of images, and an index to find the images whose hashes are close to each other.
+Unlike a digest, a perceptual hash barely changes when an image is resized, re-encoded or has its metadata stripped, so
+images whose hashes differ in only a few bits are very likely the same picture.
+
+Three hashes are available (all 64 bits by default):
+    - ahash: which pixels of a tiny grey copy of the image are brighter than its mean.
+    - dhash: which pixels are brighter than their right hand neighbour.
+    - phash: which low frequencies of a discrete cosine transform are above their median (the most robust).
+
+NumPy is used for the transform when it is installed, otherwise it is done in pure Python (only the low frequencies
+that make up the hash are computed, so this is still quick).
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Callable, Final, Generic, Iterable, TypeVar
+from PIL import Image, UnidentifiedImageError
+from functools import lru_cache
+from statistics import median
+from pathlib import Path
+import math
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+
+# How many times bigger than the hash the image is shrunk to before the DCT of phash.
+PHASH_FACTOR: Final[int] = 4
+
+T = TypeVar('T')
+
+
+def _grey(path: Path | str, width: int, height: int) -> list[int]:
+    """
+    :param path: The image.
+    :param width: The width to shrink the image to.
+    :param height: The height to shrink the image to.
+    :return: The brightness of each pixel of a grey copy of the image shrunk to width x height, row by row.
+    """
+    with Image.open(path) as img:
+        # JPEGs can be decoded at a fraction of their size, which is far quicker than decoding them in full.
+        img.draft('L', (width * 4, height * 4))
+        return list(img.convert('L').resize((width, height), Image.Resampling.LANCZOS).tobytes())
+
+
+def _bits(flags: Iterable[bool]) -> int:
+    """
+    :param flags: The bits of a hash, most significant first.
+    :return: The hash.
+    """
+    value: int = 0
+    for flag in flags:
+        value = (value << 1) | flag
+    return value
+
+
+def average_hash(path: Path | str, hash_size: int = 8) -> int:
+    """
+    :param path: The image.
+    :param hash_size: The width and height of the grid of bits (the hash has hash_size ** 2 bits).
+    :return: The average hash of the image.
+    """
+    pixels: list[int] = _grey(path, hash_size, hash_size)
+    mean: float = sum(pixels) / len(pixels)
+    return _bits(p > mean for p in pixels)
+
+
+def difference_hash(path: Path | str, hash_size: int = 8) -> int:
+    """
+    :param path: The image.
+    :param hash_size: The width and height of the grid of bits (the hash has hash_size ** 2 bits).
+    :return: The difference hash of the image.
+    """
+    pixels: list[int] = _grey(path, hash_size + 1, hash_size)
+    return _bits(pixels[row + col] > pixels[row + col + 1]
+                 for row in range(0, len(pixels), hash_size + 1) for col in range(hash_size))
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(size: int, frequencies: int) -> tuple[tuple[float, ...], ...]:
+    """
+    :param size: The number of samples being transformed.
+    :param frequencies: The number of (lowest) frequencies wanted.
+    :return: The rows of the DCT-II matrix for the wanted frequencies.
+    """
+    return tuple(tuple(math.cos(math.pi * k * (2 * n + 1) / (2 * size)) for n in range(size))
+                 for k in range(frequencies))
+
+
+def _low_frequencies(pixels: list[int], size: int, frequencies: int) -> list[float]:
+    """
+    Computes the lowest frequencies of the 2D discrete cosine transform of a square image.
+    :param pixels: The image's pixels, row by row.
+    :param size: The width and height of the image.
+    :param frequencies: The number of frequencies wanted in each direction.
+    :return: The frequencies x frequencies lowest coefficients, row by row.
+    """
+    matrix: tuple[tuple[float, ...], ...] = _dct_matrix(size, frequencies)
+    if numpy is not None:
+        dct: numpy.ndarray = numpy.asarray(matrix)
+        return (dct @ numpy.asarray(pixels, dtype=float).reshape(size, size) @ dct.T).ravel().tolist()
+
+    # The transform is separable: transform every row, then the columns of the result.
+    rows: list[list[float]] = [[sum(c * p for c, p in zip(basis, pixels[r:r + size])) for basis in matrix]
+                               for r in range(0, size * size, size)]
+    return [sum(basis[r] * rows[r][u] for r in range(size)) for basis in matrix for u in range(frequencies)]
+
+
+def perceptual_hash(path: Path | str, hash_size: int = 8) -> int:
+    """
+    :param path: The image.
+    :param hash_size: The width and height of the grid of bits (the hash has hash_size ** 2 bits).
+    :return: The perceptual (DCT) hash of the image.
+    """
+    size: int = hash_size * PHASH_FACTOR
+    coefficients: list[float] = _low_frequencies(_grey(path, size, size), size, hash_size)
+    middle: float = median(coefficients[1:])  # The first is the mean brightness, which would skew the median.
+    return _bits(c > middle for c in coefficients)
+
+
+# The hashes that can be used, by name.
+ALGORITHMS: Final[dict[str, Callable[[Path | str, int], int]]] = {
+    'ahash': average_hash, 'dhash': difference_hash, 'phash': perceptual_hash
+}
+
+
+def image_hash(path: Path | str, algorithm: str = 'phash', hash_size: int = 8) -> int | None:
+    """
+    :param path: The image.
+    :param algorithm: The name of the hash to compute (see ALGORITHMS).
+    :param hash_size: The width and height of the grid of bits (the hash has hash_size ** 2 bits).
+    :return: The hash of the image, or None if it can't be opened as an image.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unknown image hash \"{algorithm}\", choose from: {list(ALGORITHMS)}')
+    try:
+        return ALGORITHMS[algorithm](path, hash_size)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+
+def hash_key(algorithm: str, hash_size: int = 8) -> str:
+    """
+    :param algorithm: The name of a perceptual hash.
+    :param hash_size: The width and height of its grid of bits.
+    :return: The name the hash is kept under alongside an entry's digests (e.g. in an EntryCache).
+    """
+    return f'image:{algorithm}{hash_size}'
+
+
+def hash_bytes(value: int | None, hash_size: int = 8) -> bytes:
+    """
+    :param value: A perceptual hash, or None if the image couldn't be hashed.
+    :param hash_size: The width and height of its grid of bits.
+    :return: The hash as bytes, so it can be kept alongside digests (empty if there is no hash).
+    """
+    return b'' if value is None else value.to_bytes((hash_size ** 2 + 7) // 8, 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    """
+    :param a: A hash.
+    :param b: Another hash.
+    :return: The number of bits the hashes differ in.
+    """
+    return (a ^ b).bit_count()
+
+
+class BKTree(Generic[T]):
+    """
+    A Burkhard-Keller tree of hashes. Each node's children are kept by their distance from it, so by the triangle
+    inequality a search for hashes within threshold of a target only needs to visit children whose distance is within
+    threshold of the target's distance to their parent; most of the tree is never looked at.
+    """
+
+    def __init__(self):
+        # A node is [hash, items with that hash, {distance: child node}].
+        self._root: list | None = None
+        self._size: int = 0
+
+    def add(self, value: int, item: T) -> None:
+        """
+        Adds an item to the tree.
+        :param value: The item's hash.
+        :param item: The item.
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node: list = self._root
+        while True:
+            distance: int = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child: list | None = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, threshold: int) -> list[tuple[int, T]]:
+        """
+        :param value: The hash to search around.
+        :param threshold: The largest number of bits a hash may differ from value by.
+        :return: The distance to and the item of everything in the tree within threshold of value.
+        """
+        found: list[tuple[int, T]] = []
+        stack: list[list] = [self._root] if self._root is not None else []
+        while stack:
+            node: list = stack.pop()
+            distance: int = hamming(value, node[0])
+            if distance <= threshold:
+                found.extend((distance, item) for item in node[1])
+            stack.extend(child for d, child in node[2].items() if distance - threshold <= d <= distance + threshold)
+        return found
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def clusters(hashes: Iterable[tuple[T, int | None]], threshold: int) -> list[list[T]]:
+    """
+    Groups items whose hashes are within threshold of each other (or of another item in the group), without comparing
+    every pair of items.
+    :param hashes: Each item and its hash (items whose hash is None are left out).
+    :param threshold: The largest number of bits two hashes may differ by and still be grouped.
+    :return: The groups with more than one member, in the order their first member was given.
+    """
+    tree: BKTree[int] = BKTree()
+    items: list[T] = []
+    values: list[int] = []
+    for item, value in hashes:
+        if value is not None:
+            tree.add(value, len(items))
+            items.append(item)
+            values.append(value)
+
+    # Join each item's group to the groups of everything near it (a union-find).
+    parents: list[int] = list(range(len(items)))
+
+    def root(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for i, value in enumerate(values):
+        for _, j in tree.search(value, threshold):
+            a, b = root(i), root(j)
+            if a != b:
+                parents[max(a, b)] = min(a, b)
+
+    groups: dict[int, list[T]] = {}
+    for i, item in enumerate(items):
+        groups.setdefault(root(i), []).append(item)
+    return [group for group in groups.values() if len(group) > 1]
@@ -0,0 +1,137 @@
+"""
+Module contains a classifier that works out what kind of file something is from the first few bytes of its contents
+(its magic number) rather than from its extension, so that files with missing, wrong or unusual extensions can still be
+sorted. Only HEADER_SIZE bytes are read from each file, in a single read.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.parallel import ordered_starmap
+from typing import Final, Iterable
+from archyve.entry import EntryType
+from pathlib import Path
+import os
+
+
+# The number of bytes read from the start of a file to classify it.
+HEADER_SIZE: Final[int] = 64
+
+# The ways an entry's type can be worked out: from its extension (no reads), or from its contents (one small read).
+TYPE_DETECTION: Final[tuple[str, ...]] = ('extension', 'content')
+
+# Magic numbers found at the very start of a file, checked in order. Those short enough to begin ordinary text (BMP,
+# FLV and Flash) are checked in sniff_header instead, along with the fields that follow them.
+SIGNATURES: Final[tuple[tuple[bytes, EntryType], ...]] = (
+    (b'\xff\xd8\xff', EntryType.IMAGE),  # JPEG
+    (b'\x89PNG\r\n\x1a\n', EntryType.IMAGE),
+    (b'GIF87a', EntryType.IMAGE), (b'GIF89a', EntryType.IMAGE),
+    (b'II*\x00', EntryType.IMAGE), (b'MM\x00*', EntryType.IMAGE),  # TIFF (and most camera raw formats)
+    (b'\x00\x00\x01\x00', EntryType.IMAGE),  # ICO
+    (b'8BPS', EntryType.IMAGE),  # Photoshop
+    (b'ID3', EntryType.AUDIO),  # MP3 with tags
+    (b'fLaC', EntryType.AUDIO),
+    (b'OggS', EntryType.AUDIO),
+    (b'#!AMR', EntryType.AUDIO),
+    (b'\x1aE\xdf\xa3', EntryType.VIDEO),  # Matroska / WebM
+    (b'\x00\x00\x01\xba', EntryType.VIDEO), (b'\x00\x00\x01\xb3', EntryType.VIDEO),  # MPEG program / video stream
+    (b'0&\xb2u\x8ef\xcf\x11', EntryType.VIDEO),  # ASF (WMV / WMA)
+    (b'.RMF', EntryType.VIDEO),
+    (b'%PDF', EntryType.TEXT),
+    (b'{\\rtf', EntryType.TEXT),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', EntryType.TEXT),  # Legacy Office documents
+    (b'\xef\xbb\xbf', EntryType.TEXT),  # UTF-8 byte order mark
+)
+
+# Containers whose contents are named by a four byte code at offset 8.
+_RIFF_FORMS: Final[dict[bytes, EntryType]] = {b'WAVE': EntryType.AUDIO, b'AVI ': EntryType.VIDEO,
+                                              b'WEBP': EntryType.IMAGE}
+_AIFF_FORMS: Final[frozenset[bytes]] = frozenset({b'AIFF', b'AIFC'})
+
+# The sizes of the BMP info headers (at offset 14), from the OS/2 BITMAPCOREHEADER to BITMAPV5HEADER.
+_BMP_HEADER_SIZES: Final[frozenset[int]] = frozenset({12, 40, 52, 56, 108, 124})
+
+# Flash (SWF) files: uncompressed, zlib and LZMA compressed, followed by a version byte and the file's length.
+_SWF_SIGNATURES: Final[frozenset[bytes]] = frozenset({b'FWS', b'CWS', b'ZWS'})
+_SWF_VERSIONS: Final[range] = range(1, 64)
+
+# ISO media ('ftyp') brands that aren't video.
+_IMAGE_BRANDS: Final[frozenset[bytes]] = frozenset({b'heic', b'heix', b'hevc', b'hevx', b'mif1', b'msf1', b'avif',
+                                                    b'avis', b'crx '})
+_AUDIO_BRANDS: Final[frozenset[bytes]] = frozenset({b'M4A ', b'M4B ', b'M4P ', b'F4A ', b'F4B '})
+
+# The bytes allowed in plain text besides printable ASCII: tab, line feed, form feed and carriage return.
+_TEXT_CONTROLS: Final[frozenset[int]] = frozenset(b'\t\n\x0c\r')
+
+
+def sniff_header(header: bytes) -> EntryType | None:
+    """
+    Classifies a file from the start of its contents.
+    :param header: The first bytes of the file (HEADER_SIZE is enough for every signature).
+    :return: The type of the file, or None if it isn't recognised.
+    """
+    if not header:
+        return None
+    for signature, entry_type in SIGNATURES:
+        if header.startswith(signature):
+            return entry_type
+
+    # The signatures short enough to begin ordinary text need the fields after them to hold up too.
+    if header.startswith(b'BM'):  # Reserved bytes that must be zero, then the size of the info header.
+        if header[6:10] == bytes(4) and int.from_bytes(header[14:18], 'little') in _BMP_HEADER_SIZES:
+            return EntryType.IMAGE
+    elif header.startswith(b'FLV'):  # Version 1 is the only version there is.
+        if header[3:4] == b'\x01':
+            return EntryType.VIDEO
+    elif header[:3] in _SWF_SIGNATURES:  # The length's top byte is below any byte text can have (under 128 MiB).
+        if len(header) >= 8 and header[3] in _SWF_VERSIONS and header[7] < 0x08:
+            return EntryType.VIDEO
+
+    code: bytes = header[8:12]
+    if header.startswith(b'RIFF') and code in _RIFF_FORMS:
+        return _RIFF_FORMS[code]
+    if header.startswith(b'FORM') and code in _AIFF_FORMS:
+        return EntryType.AUDIO
+    if header[4:8] == b'ftyp':
+        return EntryType.IMAGE if code in _IMAGE_BRANDS else EntryType.AUDIO if code in _AUDIO_BRANDS else \
+            EntryType.VIDEO
+    if len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 and header[1] & 0x06:
+        return EntryType.AUDIO  # An MPEG audio frame (MP3 without tags) or ADTS AAC.
+
+    # Anything else that is printable UTF-8 is text (a character cut in half at the end of the header is fine).
+    try:
+        text: str = header.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(header) - 3:
+            return None
+        text: str = header[:e.start].decode('utf-8')
+    if all(c.isprintable() or ord(c) in _TEXT_CONTROLS for c in text):
+        return EntryType.TEXT
+    return None
+
+
+def sniff(path: Path | str) -> EntryType | None:
+    """
+    Classifies a file from its contents, with a single read of HEADER_SIZE bytes.
+    :param path: The file.
+    :return: The type of the file, or None if it isn't recognised (or can't be read).
+    """
+    try:
+        fd: int = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        return sniff_header(os.read(fd, HEADER_SIZE))
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def sniff_many(paths: Iterable[Path | str], workers: int = 1, backend: str = 'thread') -> Iterable[EntryType | None]:
+    """
+    Classifies many files from their contents, on a pool of workers.
+    :param paths: The files.
+    :param workers: The number of files to read at once.
+    :param backend: 'thread' or 'process' (see parallel.ordered_starmap).
+    :return: A generator of the type of each file (None where it isn't recognised), in the same order as the paths.
+    """
+    return ordered_starmap(sniff, ((p,) for p in paths), workers, backend)
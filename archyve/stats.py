@@ -0,0 +1,329 @@
+"""
+Module contains summaries of an archive: the number and total size of its files grouped by any mix of their type,
+extension, directory and modification date, and (optionally) how many of those bytes are taken by duplicates. Totals
+are worked out from the columns of an EntryTable (see the table module), so nothing is stat'ed again and no entries are
+made; with NumPy installed every group by is vectorized, otherwise it is done in a single pure Python pass.
+
+Files are grouped on these keys:
+    - type: the file's EntryType ('image', 'video', ...).
+    - extension: the file's lower case extension ('' if it hasn't one).
+    - directory: the folder the file is in, or only its first depth levels below the archive's root.
+    - year, month, day: when the file was last modified (in UTC), e.g. '2024', '2024-03', '2024-03-17'.
+
+Usage:
+    print(archyve.summarize(by=('type', 'year')))
+    print(archyve.summarize(by='directory', depth=1, duplicates=True).top('wasted_bytes', 10))
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.table import ENTRY_TYPES, EntryTable
+from typing import Any, Callable, Final, Hashable, Iterable, Iterator, Sequence
+from archyve.entry import Entry
+from collections import Counter
+from datetime import date
+from pathlib import Path
+from array import array
+import os
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+
+# The keys files can be grouped on.
+KEYS: Final[tuple[str, ...]] = ('type', 'extension', 'directory', 'year', 'month', 'day')
+
+# The totals of every group, and those only worked out when duplicates are searched for.
+TOTALS: Final[tuple[str, ...]] = ('files', 'bytes')
+DUPLICATE_TOTALS: Final[tuple[str, ...]] = ('copies', 'wasted_bytes')
+
+# Nanoseconds in a day, and the ordinal (see date.fromordinal) of the first day of the Unix epoch.
+_DAY: Final[int] = 86_400 * 10 ** 9
+_EPOCH: Final[int] = date(1970, 1, 1).toordinal()
+
+
+class Summary:
+    """
+    A table of totals, with a row for each group of files (sorted by key). Each row gives the group's key(s), its
+    number of files and their total size, and (if duplicates were searched for) how many of the files are redundant
+    copies of another file and the bytes those copies take up.
+    """
+
+    def __init__(self, by: Sequence[str], rows: list[tuple], duplicates: bool = False):
+        """
+        :param by: The keys the files were grouped on.
+        :param rows: The rows, each the group's keys followed by its totals.
+        :param duplicates: Whether the rows include the duplicate totals.
+        """
+        self.by: tuple[str, ...] = tuple(by)
+        self.columns: tuple[str, ...] = (*self.by, *TOTALS, *(DUPLICATE_TOTALS if duplicates else ()))
+        self.rows: list[tuple] = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """
+        :return: An iterator of the rows as dictionaries, by column.
+        """
+        return (dict(zip(self.columns, row)) for row in self.rows)
+
+    def __getitem__(self, key: Hashable | tuple) -> dict[str, Any]:
+        """
+        :param key: The key of a group (a tuple of keys when grouped on more than one).
+        :return: The group's row as a dictionary, by column.
+        """
+        key = key if isinstance(key, tuple) else (key,)
+        for row in self.rows:
+            if row[:len(self.by)] == key:
+                return dict(zip(self.columns, row))
+        raise KeyError(key)
+
+    def top(self, column: str = 'bytes', n: int | None = None) -> 'Summary':
+        """
+        :param column: The total to sort on.
+        :param n: The number of rows to keep (all of them if None).
+        :return: A summary of the n rows with the largest totals.
+        """
+        position: int = self.columns.index(column)
+        rows: list[tuple] = sorted(self.rows, key=lambda row: row[position], reverse=True)[:n]
+        return Summary(self.by, rows, len(self.columns) > len(self.by) + len(TOTALS))
+
+    def total(self, column: str = 'bytes') -> int:
+        """
+        :param column: A total.
+        :return: The total over every group.
+        """
+        position: int = self.columns.index(column)
+        return sum(row[position] for row in self.rows)
+
+    def __str__(self) -> str:
+        """
+        :return: The summary as an aligned, plain text table.
+        """
+        cells: list[list[str]] = [list(self.columns)] + [[f'{v:,}' if isinstance(v, int) else str(v) for v in row]
+                                                         for row in self.rows]
+        widths: list[int] = [max(len(row[i]) for row in cells) for i in range(len(self.columns))]
+        keys: int = len(self.by)
+        return '\n'.join('  '.join(cell.ljust(w) if i < keys else cell.rjust(w)
+                                   for i, (cell, w) in enumerate(zip(row, widths))).rstrip() for row in cells)
+
+    def __repr__(self) -> str:
+        return f'Summary(by={self.by}, {len(self.rows)} groups)'
+
+
+def _column(column: array, rows: Sequence[int]) -> Sequence[int]:
+    """
+    :param column: A column of the table.
+    :param rows: The rows wanted.
+    :return: The column's values at the rows (a NumPy array if NumPy is installed).
+    """
+    if numpy is not None:
+        values = numpy.asarray(column)
+        return values[rows.start:rows.stop:rows.step] if isinstance(rows, range) else values[numpy.asarray(rows)]
+    if isinstance(rows, range) and rows == range(len(column)):
+        return column
+    return array(column.typecode, (column[row] for row in rows))
+
+
+def _factorize(values) -> tuple[Any, Any]:
+    """
+    NumPy's unique(return_inverse=True), but for integers that fall in a narrow range (codes, days, directory
+    positions) the distinct values are found by counting rather than by sorting, which is several times quicker.
+    :param values: A NumPy array of integers.
+    :return: The position of each value in the distinct values, and the distinct values (in order).
+    """
+    low, high = int(values.min()), int(values.max())
+    if high - low > 4 * len(values) + 1024:
+        distinct, inverse = numpy.unique(values, return_inverse=True)
+        return inverse.ravel(), distinct
+    shifted = values - low
+    distinct = numpy.flatnonzero(numpy.bincount(shifted))
+    lookup = numpy.zeros(high - low + 1, dtype=numpy.int64)
+    lookup[distinct] = numpy.arange(len(distinct))
+    return lookup[shifted], distinct + low
+
+
+def _encode(values: Sequence[Hashable], label: Callable[[Any], str]) -> tuple[Sequence[int], list[str]]:
+    """
+    Turns the values of a column into the codes of their labels. Only each distinct value is labelled, so labelling can
+    be slow (e.g. a date conversion) without slowing down large tables.
+    :param values: The values of each row (a NumPy array if NumPy is installed).
+    :param label: Gives the label of a value (distinct values may share a label).
+    :return: The code of each row's label (its position in the list of labels), and the labels.
+    """
+    codes: dict[str, int] = {}
+    if numpy is not None:
+        if not len(values):
+            return values, []
+        inverse, distinct = _factorize(values)
+        lookup: list[int] = [codes.setdefault(label(v), len(codes)) for v in distinct.tolist()]
+        return numpy.asarray(lookup, dtype=numpy.int64)[inverse], list(codes)
+
+    known: dict[Hashable, int] = {}
+    encoded: array = array('q')
+    for value in values:
+        code: int | None = known.get(value)
+        if code is None:
+            code = known[value] = codes.setdefault(label(value), len(codes))
+        encoded.append(code)
+    return encoded, list(codes)
+
+
+def _directories(table: EntryTable, roots: Sequence[Path | str], depth: int | None) -> Callable[[int], str]:
+    """
+    :param table: The table.
+    :param roots: The directories the table's files were found in, as the files' paths begin (i.e. resolved).
+    :param depth: How many levels below its root to name a directory by (its whole path if None).
+    :return: Gives the name of a directory of the table, by its position in table.parents.
+    """
+    roots: list[str] = sorted((os.fspath(r) for r in roots), key=len, reverse=True)
+
+    def name(parent_id: int) -> str:
+        parent: str = table.parents[parent_id]
+        if depth is None:
+            return parent
+        for root in roots:
+            if parent == root:
+                return parent
+            if parent.startswith(root) and parent[len(root)] == os.sep:
+                return os.path.join(root, *parent[len(root) + 1:].split(os.sep)[:depth])
+        return parent
+
+    return name
+
+
+def _day_label(key: str) -> Callable[[int], str]:
+    """
+    :param key: 'year', 'month' or 'day'.
+    :return: Gives the label of a day (counted from the start of 1970).
+    """
+    length: int = {'year': 4, 'month': 7, 'day': 10}[key]
+    return lambda day: date.fromordinal(_EPOCH + day).isoformat()[:length]
+
+
+def _codes(table: EntryTable, rows: Sequence[int], key: str, roots: Sequence[Path | str], depth: int | None,
+           content: bool) -> tuple[Sequence[int], list[str]]:
+    """
+    :param table: The table.
+    :param rows: The rows to group.
+    :param key: The key to group them on (see KEYS).
+    :param roots: The directories the table's files were found in.
+    :param depth: How many levels below its root to name a directory by (its whole path if None).
+    :param content: Whether to go by the files' content types (which must have been read) rather than their extensions.
+    :return: The code of each row's key (its position in the list of keys), and the keys.
+    """
+    if key == 'type':
+        return _encode(_column(table.content_types if content else table.types, rows), lambda t: ENTRY_TYPES[t].value)
+    if key == 'extension':
+        return _encode(_column(table.extension_ids, rows), lambda e: table.extensions[e])
+    if key == 'directory':
+        return _encode(_column(table.parent_ids, rows), _directories(table, roots, depth))
+    mtimes: Sequence[int] = _column(table.mtimes, rows)
+    days: Sequence[int] = mtimes // _DAY if numpy is not None else array('q', (t // _DAY for t in mtimes))
+    return _encode(days, _day_label(key))
+
+
+def _aggregate(encoded: list[tuple[Sequence[int], list[str]]], sizes: Sequence[int],
+               redundant: Sequence[int] | None) -> list[tuple[tuple[int, ...], list[int]]]:
+    """
+    Adds up the totals of each group of rows.
+    :param encoded: The code of each row's key(s) and the keys, for each key grouped on (see _encode).
+    :param sizes: The size of each row's file.
+    :param redundant: Whether each row's file is a redundant copy of another (1) or not (0), if known.
+    :return: The codes of each group's keys, and its totals.
+    """
+    if numpy is not None:
+        if not len(sizes):
+            return []
+        # Number each combination of keys as a mixed radix number, so that rows can be grouped on a single column.
+        combined = numpy.zeros(len(sizes), dtype=numpy.int64)
+        for codes, labels in encoded:
+            combined = combined * len(labels) + codes
+        inverse, distinct = _factorize(combined)
+        sizes = numpy.asarray(sizes, dtype=numpy.int64)
+        totals: list = [numpy.bincount(inverse, minlength=len(distinct)),
+                        numpy.zeros(len(distinct), dtype=numpy.int64)]
+        numpy.add.at(totals[1], inverse, sizes)
+        if redundant is not None:
+            redundant = numpy.asarray(redundant, dtype=numpy.int64)
+            totals.append(numpy.bincount(inverse, weights=redundant, minlength=len(distinct)).astype(numpy.int64))
+            totals.append(numpy.zeros(len(distinct), dtype=numpy.int64))
+            numpy.add.at(totals[3], inverse, sizes * redundant)
+        keys: list = []
+        for _, labels in reversed(encoded):
+            distinct, codes = numpy.divmod(distinct, len(labels))
+            keys.insert(0, codes.tolist())
+        return list(zip(zip(*keys), zip(*(t.tolist() for t in totals))))
+
+    groups: dict[tuple[int, ...], list[int]] = {}
+    flags: Iterable[int] = redundant if redundant is not None else [0] * len(sizes)
+    for *key, size, copy in zip(*(codes for codes, _ in encoded), sizes, flags):
+        total: list[int] | None = groups.get(key := tuple(key))
+        if total is None:
+            total = groups[key] = [0, 0, 0, 0]
+        total[0] += 1
+        total[1] += size
+        if copy:
+            total[2] += 1
+            total[3] += size
+    return [(k, t if redundant is not None else t[:2]) for k, t in groups.items()]
+
+
+def redundant_rows(table: EntryTable, rows: Sequence[int], groups: Iterable[list[Entry]]) -> set[int]:
+    """
+    Finds the rows whose files are redundant copies: every file in a group of duplicates but the first, except those
+    that are hard links to a file already counted (they take up no more space). A hard link is the same inode on the
+    same device: an archyve can span several mounts, whose inode numbers overlap.
+    :param table: The table the duplicates were found in.
+    :param rows: The rows that were searched.
+    :param groups: The groups of duplicates found (see Archyve.iter_duplicates).
+    :return: The rows of the redundant copies.
+    """
+    sizes: array = table.sizes
+    counts: Counter = Counter(sizes[row] for row in rows)
+    # Only a file whose size is shared can have a duplicate, so only those need finding by path.
+    row_of: dict[str, int] = {table.path(row): row for row in rows if counts[sizes[row]] > 1}
+    redundant: set[int] = set()
+    devices, inodes = table.devices, table.inodes
+    for group in groups:
+        files: set[tuple[int, int]] = set()
+        for i, entry in enumerate(group):
+            row: int = row_of[os.fspath(entry)]
+            file: tuple[int, int] = (devices[row], inodes[row]) if inodes[row] else (-1, row)  # No inode: not a link.
+            if file not in files:
+                files.add(file)
+                if i:
+                    redundant.add(row)
+    return redundant
+
+
+def summarize(table: EntryTable, rows: Sequence[int] | None = None, by: str | Sequence[str] = 'type',
+              roots: Sequence[Path | str] = (), depth: int | None = None, content: bool = False,
+              redundant: set[int] | None = None) -> Summary:
+    """
+    Works out the number and total size of the files in each group.
+    :param table: The table of files.
+    :param rows: The rows to summarize (all of them if None).
+    :param by: The key(s) to group the files on (see KEYS).
+    :param roots: The directories the table's files were found in, as the files' paths begin (used to shorten
+                  directories to depth).
+    :param depth: How many levels below its root to name a directory by (its whole path if None).
+    :param content: Whether to group types by the files' content types (which must have been read, see
+                    EntryTable.sniff) rather than their extensions.
+    :param redundant: The rows whose files are redundant copies (see redundant_rows), to total the duplicates too.
+    :return: The summary.
+    """
+    by: tuple[str, ...] = (by,) if isinstance(by, str) else tuple(by)
+    for key in by:
+        if key not in KEYS:
+            raise ValueError(f'Unknown key \"{key}\", choose from: {list(KEYS)}')
+    rows: Sequence[int] = range(len(table)) if rows is None else rows
+
+    encoded: list[tuple[Sequence[int], list[str]]] = [_codes(table, rows, key, roots, depth, content) for key in by]
+    flags: Sequence[int] | None = None if redundant is None else array('B', (row in redundant for row in rows))
+    groups: list[tuple[tuple[int, ...], list[int]]] = _aggregate(encoded, _column(table.sizes, rows), flags)
+    summary_rows: list[tuple] = [(*(labels[c] for c, (_, labels) in zip(codes, encoded)), *totals)
+                                 for codes, totals in groups]
+    return Summary(by, sorted(summary_rows, key=lambda row: row[:len(by)]), redundant is not None)
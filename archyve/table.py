@@ -0,0 +1,177 @@
+"""
+Module contains a column oriented, in-memory table of the files found by a directory walk. Walking a large archive is
+slow, so an archyve can walk once into a table and then answer any number of questions (lengths, filters, searches,
+duplicate searches) from the table instead of from the file system.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.entry import Entry, EntryType
+from typing import Any, Final, Iterable, Sequence
+from archyve.cache import EntryCache
+from archyve.sniff import sniff_many
+from os import DirEntry, stat_result
+from stat import S_IFREG
+from array import array
+import sys
+import os
+
+
+# Entry types are stored as their position in this list.
+ENTRY_TYPES: Final[list[EntryType]] = list(EntryType)
+_TYPE_CODES: Final[dict[EntryType, int]] = {t: i for i, t in enumerate(ENTRY_TYPES)}
+
+# The content type of a file whose contents haven't been read yet.
+_UNREAD: Final[int] = 255
+
+
+class EntryTable:
+    """
+    Holds the path, size, times, device, inode, extension and type of every file found by a walk in parallel columns,
+    so that millions of files cost a few dozen bytes each rather than a Python object each. Each directory's path (and
+    each extension) is only stored once; a file's row holds the position of its directory and its own name. Digests
+    and capture dates are filled in lazily, as entries made from the table work them out.
+    """
+
+    def __init__(self, cache: EntryCache | None = None):
+        """
+        Creates an empty table.
+        :param cache: The persistent cache that entries made from the table should use.
+        """
+        self.cache: EntryCache | None = cache
+        self.parents: list[str] = []  # Every directory a file in the table is in, in the order they were found
+        self.parent_ids: array = array('I')  # Positions in parents
+        self.names: list[str] = []
+        self.__parent_ids: dict[str, int] = {}
+        self.extensions: list[str] = []  # Every (lower case) extension a file in the table has
+        self.extension_ids: array = array('I')  # Positions in extensions
+        self.__extension_ids: dict[str, int] = {}
+        self.sizes: array = array('q')
+        self.mtimes: array = array('q')  # Nanoseconds
+        self.ctimes: array = array('q')  # Nanoseconds
+        self.devices: array = array('Q')
+        self.inodes: array = array('Q')  # Only unique on their device (and 0 where the file system has none)
+        self.types: array = array('B')  # Positions in ENTRY_TYPES
+        self.content_types: array = array('B')  # Positions in ENTRY_TYPES, or _UNREAD
+        self.memos: list[dict[str, Any] | None] = []  # What entries have worked out about each file (digests etc.)
+
+    @staticmethod
+    def from_walk(files: Iterable[DirEntry], cache: EntryCache | None = None) -> 'EntryTable':
+        """
+        Builds a table from the files found by a directory walk (see file_structure_functions.scan).
+        :param files: The files to put in the table.
+        :param cache: The persistent cache that entries made from the table should use.
+        :return: The table.
+        """
+        table: EntryTable = EntryTable(cache)
+        for file in files:
+            table.append(file.path, file.stat())
+        return table
+
+    def append(self, path: str, stat: stat_result) -> None:
+        """
+        Adds a file to the end of the table.
+        :param path: The path of the file.
+        :param stat: The stat of the file.
+        """
+        parent, name = os.path.split(path)
+        parent_id: int | None = self.__parent_ids.get(parent)
+        if parent_id is None:
+            parent_id = self.__parent_ids[parent] = len(self.parents)
+            self.parents.append(sys.intern(parent))
+        self.parent_ids.append(parent_id)
+        self.names.append(name)
+        extension: str = os.path.splitext(name)[1].lower()
+        extension_id: int | None = self.__extension_ids.get(extension)
+        if extension_id is None:
+            extension_id = self.__extension_ids[extension] = len(self.extensions)
+            self.extensions.append(extension)
+        self.extension_ids.append(extension_id)
+        self.sizes.append(stat.st_size)
+        self.mtimes.append(stat.st_mtime_ns)
+        self.ctimes.append(stat.st_ctime_ns)
+        self.devices.append(stat.st_dev)
+        self.inodes.append(stat.st_ino)
+        self.types.append(_TYPE_CODES[Entry.EXTENSION_MAP.get(extension, EntryType.UNKNOWN)])
+        self.content_types.append(_UNREAD)
+        self.memos.append(None)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def path(self, row: int) -> str:
+        """
+        :param row: The row of a file.
+        :return: The path of the file.
+        """
+        return os.path.join(self.parents[self.parent_ids[row]], self.names[row])
+
+    def stat(self, row: int) -> stat_result:
+        """
+        :param row: The row of a file.
+        :return: A stat of the file rebuilt from the table (only its type, inode, device, size and times are filled in).
+        """
+        mtime_ns, ctime_ns = self.mtimes[row], self.ctimes[row]
+        return stat_result((S_IFREG, self.inodes[row], self.devices[row], 0, 0, 0, self.sizes[row], mtime_ns // 10 ** 9,
+                            mtime_ns // 10 ** 9, ctime_ns // 10 ** 9),
+                           {'st_atime': mtime_ns / 1e9, 'st_mtime': mtime_ns / 1e9, 'st_ctime': ctime_ns / 1e9,
+                            'st_atime_ns': mtime_ns, 'st_mtime_ns': mtime_ns, 'st_ctime_ns': ctime_ns})
+
+    def entry_type(self, row: int) -> EntryType:
+        """
+        :param row: The row of a file.
+        :return: The type of the file.
+        """
+        return ENTRY_TYPES[self.types[row]]
+
+    def entry(self, row: int) -> Entry:
+        """
+        Makes an entry for a row. The entry shares its memo with the table, so whatever it works out (e.g. its digest)
+        is kept by the table for the next entry made for the same row.
+        :param row: The row of a file.
+        :return: An entry for the file.
+        """
+        memo: dict[str, Any] | None = self.memos[row]
+        if memo is None:
+            memo = self.memos[row] = {}
+        if self.content_types[row] != _UNREAD:
+            memo['content_type'] = ENTRY_TYPES[self.content_types[row]]
+        return Entry(self.path(row), cache=self.cache, stat=self.stat(row), memo=memo)
+
+    def entries(self, rows: Iterable[int]) -> Iterable[Entry]:
+        """
+        :param rows: The rows to make entries for.
+        :return: A generator of entries for the rows.
+        """
+        return (self.entry(row) for row in rows)
+
+    def sniff(self, rows: Sequence[int], workers: int = 1, backend: str = 'thread') -> None:
+        """
+        Reads the content types (see sniff.sniff) of the given rows whose contents haven't been read yet.
+        :param rows: The rows to classify.
+        :param workers: The number of files to read at once.
+        :param backend: 'thread' or 'process' (see parallel.ordered_starmap).
+        """
+        content_types: array = self.content_types
+        unread: list[int] = []
+        for row in rows:
+            if content_types[row] == _UNREAD:
+                # Entries made from the table may have found out already (e.g. during a duplicate search).
+                known: EntryType | None = (self.memos[row] or {}).get('content_type')
+                if known is None:
+                    unread.append(row)
+                else:
+                    content_types[row] = _TYPE_CODES[known]
+        for row, content_type in zip(unread, sniff_many((self.path(row) for row in unread), workers, backend)):
+            content_types[row] = _TYPE_CODES[content_type] if content_type is not None else self.types[row]
+
+    def rows_of_type(self, rows: Sequence[int], *entry_type: EntryType, content: bool = False) -> array:
+        """
+        :param rows: The rows to choose from.
+        :param entry_type: The types of file wanted.
+        :param content: Whether to go by the files' content types (which must have been read, see sniff) rather than
+                        their extensions.
+        :return: The rows whose files are one of the given types.
+        """
+        codes: set[int] = {_TYPE_CODES[t] for t in entry_type}
+        types: array = self.content_types if content else self.types
+        return array('Q', (row for row in rows if types[row] in codes))
@@ -1,16 +1,51 @@
 """
-Module contains logic to run all unit tests within the project.
+Module contains logic to run all unit tests within the project, and the helpers the unit tests share.
 
 Author: ali.kellaway139@gmail.com
 """
-from unittest import TestSuite, defaultTestLoader, TextTestRunner
+from unittest import TestCase, TestSuite, defaultTestLoader, TextTestRunner
+from tempfile import TemporaryDirectory
+from archyve.entry import Entry
+from typing import Final, Iterable
 from pathlib import Path
-from typing import Final
 
 
 TEST_MATERIALS: Final[Path] = Path(__file__).parent / 'test_materials'
 
 
+class ArchiveTestCase(TestCase):
+    """
+    A test case with an empty archive (self.archive) in a temporary directory (self.root) of its own, which is removed
+    after each test. The paths are left as the temporary directory gives them (not resolved), so that tests see the
+    paths a user would pass.
+    """
+
+    def setUp(self):
+        self.tmp: TemporaryDirectory = TemporaryDirectory()
+        self.root: Path = Path(self.tmp.name)
+        self.archive: Path = self.root / 'archive'
+        self.archive.mkdir()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+def names(entries: Iterable[Entry]) -> list[str]:
+    """
+    :param entries: Entries.
+    :return: Their file names, sorted.
+    """
+    return sorted(e.name for e in entries)
+
+
+def group_names(groups: Iterable[Iterable[Entry]]) -> list[list[str]]:
+    """
+    :param groups: Groups of entries, e.g. returned by a duplicate search.
+    :return: The file names in each group, sorted (and the groups sorted) so that the order does not matter.
+    """
+    return sorted(names(group) for group in groups)
+
+
 if __name__ == '__main__':
     test_suite: TestSuite = defaultTestLoader.discover(start_dir=str(Path(__file__).parent), pattern='test_*.py')
     TextTestRunner().run(test_suite)
@@ -0,0 +1,104 @@
+"""
+Module contains unit tests for the asyncio API.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from archyve.archyve import Archyve
+from archyve.aio import aiterate
+from archyve.entry import Entry
+from typing import Iterator
+from pathlib import Path
+import threading
+import asyncio
+
+
+class TestAio(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(20):
+            (self.archive / f'{i:02}.bin').write_bytes(bytes([i % 5]) * 10000)
+
+    def test_matches_sync(self):
+        """
+        Test that the asynchronous methods find what the synchronous ones do, in the same order.
+        """
+        archyve: Archyve = Archyve(self.archive, workers=3, materialize=True)
+
+        async def run() -> tuple[list[Entry], list[list[Entry]], list[list[Entry]]]:
+            entries: list[Entry] = [e async for e in archyve.aentries()]
+            streamed: list[list[Entry]] = [g async for g in archyve.aiter_duplicates(block_size=1024)]
+            return entries, streamed, await archyve.aduplicates(block_size=1024)
+
+        entries, streamed, duplicates = asyncio.run(run())
+        self.assertEqual([e.path for e in entries], [e.path for e in archyve])
+        expected: list[list[Path]] = [[e.path for e in g] for g in archyve.duplicates(block_size=1024)]
+        self.assertEqual(len(expected), 5)
+        self.assertEqual([[e.path for e in g] for g in streamed], expected)
+        self.assertEqual([[e.path for e in g] for g in duplicates], expected)
+
+    def test_backpressure(self):
+        """
+        Test that the work is held back by a slow consumer, and stops when the consumer does.
+        """
+        produced: list[int] = []
+        closed: threading.Event = threading.Event()
+
+        def work() -> Iterator[int]:
+            try:
+                for i in range(1000):
+                    produced.append(i)
+                    yield i
+            finally:
+                closed.set()
+
+        async def run() -> list[int]:
+            consumed: list[int] = []
+            async for i in aiterate(work, max_pending=4):
+                consumed.append(i)
+                await asyncio.sleep(0.01)
+                if len(consumed) == 5:
+                    break
+            return consumed
+
+        self.assertEqual(asyncio.run(run()), [0, 1, 2, 3, 4])
+        self.assertTrue(closed.wait(5))
+        self.assertLess(len(produced), 12)
+
+    def test_errors(self):
+        """
+        Test that an exception raised by the work reaches the consumer.
+        """
+        def work() -> Iterator[int]:
+            yield 1
+            raise OSError('disk on fire')
+
+        async def run() -> list[int]:
+            return [i async for i in aiterate(work)]
+
+        self.assertRaisesRegex(OSError, 'disk on fire', asyncio.run, run())
+
+    def test_adelete(self):
+        """
+        Test that files are deleted off the loop, verified against an original if one is given, and that failures are
+        reported as delete() reports them.
+        """
+        paths: list[Path] = sorted(self.archive.iterdir())[:3]
+        missing: Path = self.archive / 'missing.bin'
+        failed: dict[Path, Exception] = asyncio.run(Archyve.adelete(paths, missing))
+        self.assertFalse(any(p.exists() for p in paths))
+        self.assertEqual(list(failed), [missing])
+        self.assertIsNone(asyncio.run(Archyve.adelete(self.archive / '03.bin')))
+
+        # Against an original, only its true copies are removed, as with delete().
+        original: Path = self.archive / '05.bin'
+        failed = asyncio.run(Archyve.adelete([self.archive / n for n in ('10.bin', '06.bin', '05.bin', '15.bin')],
+                                             workers=2, original=original))
+        self.assertEqual(sorted(p.name for p in failed), ['05.bin', '06.bin'])
+        self.assertEqual([p.exists() for p in (original, self.archive / '06.bin', self.archive / '10.bin',
+                                               self.archive / '15.bin')], [True, True, False, False])
+
+
+if __name__ == '__main__':
+    main()
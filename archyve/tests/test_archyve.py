@@ -0,0 +1,111 @@
+"""
+Module contains unit tests for the archyve module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.tests.run_unit_tests import TEST_MATERIALS, group_names
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from pathlib import Path
+from typing import Final
+
+
+ENTRY_TEST_MATS: Final[Path] = TEST_MATERIALS / 'entry'
+
+
+class TestDuplicates(TestCase):
+    def test_duplicates(self):
+        """
+        Test that the staged duplicate search finds the same groups that a full hash of every file would.
+        """
+        groups: list[list[Entry]] = Archyve(ENTRY_TEST_MATS).duplicates()
+        self.assertIn(['black_square.jpg', 'black_square1.jpg'], group_names(groups))
+        self.assertNotIn('image_with_exif.jpg', {n for group in group_names(groups) for n in group})
+
+    def test_duplicates_same_size(self):
+        """
+        Test that files of the same size are only grouped when their contents match, including when they only differ
+        in the middle (which the partial hashing stage cannot see).
+        """
+        with TemporaryDirectory() as tmp:
+            tmp: Path = Path(tmp)
+            (tmp / 'a.bin').write_bytes(b'a' * 5000 + b'x' + b'a' * 5000)
+            (tmp / 'b.bin').write_bytes(b'a' * 5000 + b'x' + b'a' * 5000)
+            (tmp / 'c.bin').write_bytes(b'a' * 5000 + b'y' + b'a' * 5000)
+            (tmp / 'd.bin').write_bytes(b'b' * 10001)
+            (tmp / 'e.bin').write_bytes(b'unique')
+
+            archyve: Archyve = Archyve(tmp)
+            groups: list[list[Entry]] = archyve.duplicates(block_size=1024)
+            self.assertEqual(group_names(groups), [['a.bin', 'b.bin']])
+
+            # The partial stage reads both ends of the four same size files, the full stage reads the three that share
+            # their ends.
+            self.assertEqual(archyve.bytes_read, {'size': 0, 'partial': 4 * 2048, 'full': 3 * 10001})
+
+            # A directory inside another one given is only walked once, so no file is a duplicate of itself.
+            (tmp / 'sub').mkdir()
+            (tmp / 'sub' / 'f.bin').write_bytes(b'f')
+            for walk_workers in (1, 2):
+                with self.subTest(walk_workers=walk_workers):
+                    overlapping: Archyve = Archyve(tmp, tmp / 'sub', walk_workers=walk_workers)
+                    self.assertEqual(group_names(overlapping.duplicates(block_size=1024)), [['a.bin', 'b.bin']])
+                    self.assertEqual(len(Archyve(tmp, tmp / 'sub', walk_workers=walk_workers)), 6)
+
+    def test_duplicates_workers(self):
+        """
+        Test that hashing on a pool of threads or processes finds the same groups, in the same order, as hashing
+        serially.
+        """
+        serial: list[list[Entry]] = Archyve(TEST_MATERIALS).duplicates(block_size=512)
+        for backend in ('thread', 'process'):
+            archyve: Archyve = Archyve(TEST_MATERIALS, workers=3, backend=backend)
+            self.assertEqual([[e.path for e in g] for g in archyve.duplicates(block_size=512)],
+                             [[e.path for e in g] for g in serial])
+        self.assertRaises(ValueError, Archyve, TEST_MATERIALS, backend='fibre')
+
+
+class TestMaterialized(TestCase):
+    def test_reiterable(self):
+        """
+        Test that a materialized archyve can be measured, iterated and searched for duplicates repeatedly, giving the
+        same answers as a freshly walked archyve each time.
+        """
+        archyve: Archyve = Archyve(TEST_MATERIALS, materialize=True)
+        walked: list[Path] = [e.path for e in Archyve(TEST_MATERIALS).entries]
+        self.assertEqual(len(archyve), len(walked))
+        self.assertEqual(len(archyve), len(walked))
+        self.assertEqual([e.path for e in archyve], walked)
+        self.assertEqual([e.path for e in archyve.entries], walked)
+
+        expected: list[list[str]] = group_names(Archyve(TEST_MATERIALS).duplicates())
+        self.assertEqual(group_names(archyve.duplicates()), expected)
+        self.assertEqual(group_names(archyve.duplicates()), expected)
+        self.assertEqual(sum(archyve.bytes_read.values()), 0)  # The table remembered the digests.
+
+    def test_filters(self):
+        """
+        Test that filters and searches on a materialized archyve are views that match the walked equivalents.
+        """
+        archyve: Archyve = Archyve(TEST_MATERIALS, materialize=True)
+        total: int = len(archyve)
+        images: Archyve = archyve.filter(lambda e: True, inplace=False).images
+        self.assertEqual([e.path for e in images], [e.path for e in Archyve(TEST_MATERIALS).images.entries])
+        self.assertEqual(len(archyve), total)
+
+        videos: Archyve = Archyve(TEST_MATERIALS, materialize=True).videos
+        self.assertEqual(len(videos), 2)
+        self.assertEqual({e.path.name for e in archyve.search('black_square', 'with', any_all=all)},
+                         {'black_square_with_one_line.jpg', 'black_square_with_one_line1.jpg',
+                          'black_square_with_one_line2.jpg', 'black_square_with_cross.jpg'})
+
+        archyve.filter(lambda e: e.size == 0)
+        self.assertLess(len(archyve), total)
+        archyve.reset()
+        self.assertEqual(len(archyve), total)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Module contains unit tests for the benchmark suite and its archive generator.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.benchmarks.generator import GeneratedArchive, generate_archive
+from archyve.benchmarks.run import BENCHMARKS, compare, run
+from archyve.metadata import header_capture_date
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from archyve.archyve import Archyve
+from archyve.entry import EntryType
+from archyve.sniff import sniff
+from pathlib import Path
+
+
+def tree(location: Path) -> dict[str, bytes]:
+    """
+    :param location: A folder.
+    :return: The contents of every file under the folder, by path relative to it.
+    """
+    return {p.relative_to(location).as_posix(): p.read_bytes() for p in location.rglob('*') if p.is_file()}
+
+
+class TestBenchmarks(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+
+    def test_generator(self):
+        """
+        Test that the same seed makes the same archive, and that the archive has the duplicates and headers asked for.
+        """
+        a: GeneratedArchive = generate_archive(self.root / 'a', files=60, seed=1, depth=2, fan_out=3, median_size=9000,
+                                               duplicate_ratio=0.3, same_size_ratio=0.1)
+        b: GeneratedArchive = generate_archive(self.root / 'b', files=60, seed=1, depth=2, fan_out=3, median_size=9000,
+                                               duplicate_ratio=0.3, same_size_ratio=0.1)
+        self.assertEqual(a, b)
+        self.assertEqual(tree(self.root / 'a'), tree(self.root / 'b'))
+        generate_archive(self.root / 'c', files=60, seed=2, depth=2, fan_out=3, median_size=9000)
+        self.assertNotEqual(tree(self.root / 'a'), tree(self.root / 'c'))
+        self.assertEqual((a.files, a.directories), (60, 13))
+        self.assertGreater(a.duplicates, 0)
+        self.assertGreater(a.same_size, 0)
+
+        copies: int = sum(len(g) - 1 for g in Archyve(self.root / 'a').duplicates())
+        self.assertEqual(copies, a.duplicates)
+        for path in (self.root / 'a').rglob('*.jpg'):
+            if path.stat().st_size > 100:
+                self.assertEqual(sniff(path), EntryType.IMAGE)
+                self.assertIsNotNone(header_capture_date(path))
+
+    def test_run(self):
+        """
+        Test that every benchmark runs and that results can be compared.
+        """
+        generate_archive(self.archive, files=20, median_size=2000)
+        results: dict[str, dict] = run(self.archive, workers=2, repeat=1)
+        self.assertEqual(set(results), set(BENCHMARKS))
+        self.assertTrue(all(r['rate'] > 0 and r['peak_bytes'] > 0 for r in results.values()))
+        self.assertEqual(len(compare({'results': results}, {'results': results})), len(BENCHMARKS) + 1)
+        self.assertRaises(ValueError, run, self.archive, names=['sort'])
+
+
+if __name__ == '__main__':
+    main()
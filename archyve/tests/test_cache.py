@@ -0,0 +1,83 @@
+"""
+Module contains unit tests for the cache module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.tests.run_unit_tests import ArchiveTestCase, TEST_MATERIALS
+from archyve.cache import EntryCache
+from unittest import main
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from pathlib import Path
+from typing import Final
+import os
+
+
+ENTRY_TEST_MATS: Final[Path] = TEST_MATERIALS / 'entry'
+
+
+class TestEntryCache(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location: Path = self.root / 'cache.sqlite'
+        for name in ('a.bin', 'b.bin'):
+            (self.archive / name).write_bytes(b'a' * 20000)
+        (self.archive / 'c.bin').write_bytes(b'c' * 20000)
+
+    def test_rerun_reads_nothing(self):
+        """
+        Test that a second duplicate search over an unchanged archive is answered from the cache.
+        """
+        with EntryCache(self.location) as cache:
+            first: Archyve = Archyve(self.archive, cache=cache)
+            self.assertEqual(len(first.duplicates()), 1)
+            self.assertGreater(first.bytes_read['full'], 0)
+
+        with EntryCache(self.location) as cache:
+            self.assertEqual(len(cache), 3)
+            second: Archyve = Archyve(self.archive, cache=cache)
+            self.assertEqual(len(second.duplicates()), 1)
+            self.assertEqual(second.bytes_read, {'size': 0, 'partial': 0, 'full': 0})
+
+    def test_changed_file_is_rehashed(self):
+        """
+        Test that a file whose stat no longer matches its cached fingerprint is read again.
+        """
+        with EntryCache(self.location) as cache:
+            Archyve(self.archive, cache=cache).duplicates()
+
+        (self.archive / 'c.bin').write_bytes(b'a' * 20000)
+        os.utime(self.archive / 'c.bin', ns=(0, 0))
+        with EntryCache(self.location) as cache:
+            archyve: Archyve = Archyve(self.archive, cache=cache)
+            groups: list[list[Entry]] = archyve.duplicates()
+            self.assertEqual([len(group) for group in groups], [3])
+
+    def test_vacuum(self):
+        """
+        Test that vacuum forgets files that no longer exist.
+        """
+        with EntryCache(self.location) as cache:
+            Archyve(self.archive, cache=cache).duplicates()
+            (self.archive / 'c.bin').unlink()
+            self.assertEqual(cache.vacuum(self.archive), 1)
+            self.assertEqual(len(cache), 2)
+
+        with EntryCache(self.location) as cache:
+            self.assertEqual(len(cache), 2)
+
+    def test_capture_date(self):
+        """
+        Test that capture dates (including the lack of one) are cached.
+        """
+        with EntryCache(self.location) as cache:
+            for name in ('image.jpg', 'image_with_exif.jpg'):
+                entry: Entry = Entry(ENTRY_TEST_MATS / name, cache=cache)
+                self.assertEqual(entry.capture_date, Entry(ENTRY_TEST_MATS / name).capture_date)
+            misses: int = cache.misses
+            self.assertEqual(Entry(ENTRY_TEST_MATS / 'image.jpg', cache=cache).capture_date, None)
+            self.assertEqual(cache.misses, misses)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Module contains unit tests for the cli module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from contextlib import redirect_stderr, redirect_stdout
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from archyve.cli import main as cli
+from unittest.mock import patch
+from archyve.entry import Entry
+from io import StringIO
+from pathlib import Path
+import json
+import csv
+
+
+class TestCli(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        (self.archive / 'sub').mkdir(parents=True)
+        (self.archive / 'a.jpg').write_bytes(b'a' * 5000)
+        (self.archive / 'sub' / 'b.jpg').write_bytes(b'a' * 5000)
+        (self.archive / 'c.txt').write_bytes(b'a' * 5000)
+        (self.archive / 'd.txt').write_bytes(b'd' * 10)
+
+    def run_cli(self, *argv: str) -> tuple[int, str]:
+        """
+        :param argv: The command line arguments.
+        :return: The exit status and what was written to standard output.
+        """
+        stdout: StringIO = StringIO()
+        with redirect_stdout(stdout), redirect_stderr(StringIO()):
+            status: int = cli([*argv, str(self.archive), '--workers', '2'])
+        return status, stdout.getvalue()
+
+    def test_scan(self):
+        """
+        Test that a scan writes a record for every file (of the chosen types), as NDJSON or CSV.
+        """
+        status, output = self.run_cli('scan')
+        self.assertEqual(status, 0)
+        records: list[dict] = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual({r['path'] for r in records},
+                         {str(self.archive / p) for p in ('a.jpg', 'sub/b.jpg', 'c.txt', 'd.txt')})
+        self.assertEqual({r['type'] for r in records}, {'image', 'text'})
+
+        status, output = self.run_cli('scan', '--type', 'text', '--format', 'csv')
+        rows: list[dict] = list(csv.DictReader(StringIO(output)))
+        self.assertEqual(list(rows[0]), ['path', 'size', 'type', 'modified'])
+        self.assertEqual(sorted((r['path'], r['size']) for r in rows),
+                         [(str(self.archive / 'c.txt'), '5000'), (str(self.archive / 'd.txt'), '10')])
+
+        # Several types, and results written to a file.
+        output_file: Path = self.root / 'scan.ndjson'
+        status, output = self.run_cli('scan', '-t', 'text', '-t', 'image', '--exclude', 'sub', '-o', str(output_file))
+        self.assertEqual(output, '')
+        self.assertEqual(len(output_file.read_text().splitlines()), 3)
+
+        # Several types are pushed down into the walk: no entry is made for a file of another type.
+        with patch('archyve.archyve.Entry', wraps=Entry) as made:
+            status, output = self.run_cli('scan', '-t', 'image', '-t', 'video')
+        self.assertEqual(sorted(json.loads(line)['path'] for line in output.splitlines()),
+                         [str(self.archive / 'a.jpg'), str(self.archive / 'sub' / 'b.jpg')])
+        self.assertEqual(made.call_count, 2)
+        status, output = self.run_cli('scan', '-t', 'image', '-t', 'video', '--type-detection', 'content')
+        self.assertEqual(output, '')  # Neither is really an image.
+
+    def test_dupes(self):
+        """
+        Test that every file with a duplicate is written, numbered by its group.
+        """
+        status, output = self.run_cli('dupes', '--block-size', '1024')
+        self.assertEqual(status, 0)
+        records: list[dict] = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual({r['group'] for r in records}, {1})
+        self.assertEqual({r['path'] for r in records},
+                         {str(self.archive / p) for p in ('a.jpg', 'sub/b.jpg', 'c.txt')})
+        status, external = self.run_cli('dupes', '--block-size', '1024', '--memory-budget', '1')
+        self.assertEqual(sorted(external.splitlines()), sorted(output.splitlines()))
+        status, verified = self.run_cli('dupes', '--block-size', '1024', '--verify')
+        self.assertEqual(verified, output)
+
+    def test_stats(self):
+        """
+        Test that the files of each type are counted.
+        """
+        status, output = self.run_cli('stats', '--format', 'csv')
+        self.assertEqual(list(csv.DictReader(StringIO(output))),
+                         [{'type': 'image', 'files': '2', 'bytes': '10000'},
+                          {'type': 'text', 'files': '2', 'bytes': '5010'}])
+
+    def test_dedupe(self):
+        """
+        Test that a dry run deduplication changes nothing but lists every copy, and that a real one links the
+        duplicates together.
+        """
+        status, output = self.run_cli('dedupe', '--dry-run', '--keep', 'path')
+        self.assertEqual(status, 0)
+        expected: list[dict] = [{'original': str(self.archive / 'a.jpg'), 'copy': str(self.archive / p), 'size': 5000,
+                                 'reclaimed': 5000, 'error': None} for p in ('c.txt', 'sub/b.jpg')]
+        self.assertEqual(sorted((json.loads(line) for line in output.splitlines()), key=lambda r: r['copy']),
+                         expected)
+        self.assertEqual(len({(self.archive / p).stat().st_ino for p in ('a.jpg', 'sub/b.jpg', 'c.txt')}), 3)
+
+        status, output = self.run_cli('dedupe', '--strategy', 'hardlink', '--keep', 'path', '--format', 'csv')
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(r['copy'] for r in csv.DictReader(StringIO(output))), [r['copy'] for r in expected])
+        self.assertEqual(len({(self.archive / p).stat().st_ino for p in ('a.jpg', 'sub/b.jpg', 'c.txt')}), 1)
+
+
+if __name__ == '__main__':
+    main()
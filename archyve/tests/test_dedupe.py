@@ -0,0 +1,99 @@
+"""
+Module contains unit tests for the dedupe module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.dedupe import HARDLINK, REFLINK, deduplicate, identical, reflink, replace_copy
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from archyve.operations import Report
+from archyve.archyve import Archyve
+from pathlib import Path
+import os
+
+
+def reflinks_supported(folder: Path) -> bool:
+    """
+    :param folder: A folder.
+    :return: Whether the filesystem the folder is on supports reflinks.
+    """
+    (folder / 'probe').write_bytes(b'probe')
+    try:
+        reflink(folder / 'probe', folder / 'probe_clone')
+        return True
+    except OSError:
+        return False
+
+
+class TestDedupe(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        (self.archive / 'albums').mkdir(parents=True)
+        (self.archive / 'original.jpg').write_bytes(b'x' * 5000)
+        (self.archive / 'albums' / 'copy_1.jpg').write_bytes(b'x' * 5000)
+        (self.archive / 'albums' / 'copy_2.jpg').write_bytes(b'x' * 5000)
+        (self.archive / 'other.jpg').write_bytes(b'y' * 3000)
+        (self.archive / 'other_copy.jpg').write_bytes(b'y' * 3000)
+
+    def test_hardlink(self):
+        """
+        Test that copies become hard links to the original chosen, keeping every path, and that the space is counted.
+        """
+        archyve: Archyve = Archyve(self.archive, materialize=True)
+        report: Report = archyve.deduplicate(keep='path', dry_run=True)
+        self.assertEqual((report.done, report.reclaimed, report.failed), (3, 13000, {}))
+        self.assertEqual(os.stat(self.archive / 'original.jpg').st_nlink, 1)
+        self.assertEqual(report.verified, 3 * 5000 + 2 * 3000)  # Every file is read once.
+
+        report: Report = archyve.deduplicate(keep=lambda e: e.name.startswith('copy'))
+        self.assertEqual((report.done, report.reclaimed, report.failed), (3, 13000, {}))
+        self.assertEqual(os.stat(self.archive / 'original.jpg').st_nlink, 3)
+        self.assertTrue((self.archive / 'albums' / 'copy_2.jpg').samefile(self.archive / 'original.jpg'))
+        self.assertEqual(os.stat(self.archive / 'other.jpg').st_nlink, 2)
+        self.assertEqual(len(list(self.archive.rglob('*.jpg'))), 5)
+
+        # Running again finds nothing left to reclaim.
+        report: Report = archyve.deduplicate()
+        self.assertEqual((report.done, report.reclaimed, report.verified), (3, 0, 0))  # Links needn't be read.
+
+    def test_delete(self):
+        """
+        Test that the delete strategy keeps only the original chosen.
+        """
+        report: Report = Archyve(self.archive).deduplicate('delete', keep='path')
+        self.assertEqual((report.done, report.reclaimed), (3, 13000))
+        self.assertEqual(sorted(p.name for p in self.archive.rglob('*.jpg')), ['copy_1.jpg', 'other.jpg'])
+        self.assertRaises(ValueError, Archyve(self.archive).deduplicate, 'symlink')
+
+    def test_verification(self):
+        """
+        Test that files with the same digest but different bytes are never linked, whatever the groups claim.
+        """
+        (self.archive / 'impostor.jpg').write_bytes(b'x' * 4999 + b'z')
+        self.assertFalse(identical(self.archive / 'original.jpg', self.archive / 'impostor.jpg'))
+        self.assertTrue(identical(self.archive / 'original.jpg', self.archive / 'albums' / 'copy_1.jpg', 64))
+
+        report: Report = deduplicate([[self.archive / 'original.jpg', self.archive / 'impostor.jpg',
+                                       self.archive / 'albums' / 'copy_1.jpg']], HARDLINK)
+        self.assertEqual(report.done, 1)
+        self.assertIsInstance(report.failed[str(self.archive / 'impostor.jpg')], ValueError)
+        self.assertEqual((self.archive / 'impostor.jpg').read_bytes()[-1:], b'z')
+
+    def test_reflink(self):
+        """
+        Test that reflinks replace copies where the filesystem supports them, and leave them untouched where it
+        doesn't.
+        """
+        original, copy = self.archive / 'other.jpg', self.archive / 'other_copy.jpg'
+        if reflinks_supported(self.root):
+            self.assertEqual(replace_copy(original, copy, REFLINK), 3000)
+            self.assertFalse(copy.samefile(original))
+        else:
+            self.assertRaises(OSError, replace_copy, original, copy, REFLINK)
+        self.assertEqual(copy.read_bytes(), b'y' * 3000)
+        self.assertEqual(sorted(p.name for p in self.archive.iterdir()),
+                         ['albums', 'original.jpg', 'other.jpg', 'other_copy.jpg'])
+
+
+if __name__ == '__main__':
+    main()
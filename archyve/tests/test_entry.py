@@ -6,6 +6,9 @@ Author: ali.kellaway139@gmail.com
 from archyve.tests.run_unit_tests import TEST_MATERIALS
 from archyve.entry import EntryType, Entry
 from unittest import TestCase, main
+from hashlib import blake2b, md5
+from os import DirEntry, scandir
+import os
 from pathlib import Path
 from typing import Final
 
@@ -40,6 +43,43 @@ class TestMediaTypes(TestCase):
         self.assertTrue(Entry(ENTRY_TEST_MATS / 'black_square.jpg') == Entry(ENTRY_TEST_MATS / 'black_square1.jpg'))
         self.assertFalse(Entry(ENTRY_TEST_MATS / 'black_square.jpg') == Entry(ENTRY_TEST_MATS / 'image.jpg'))
 
+    def test_digest(self):
+        """
+        Test that digests are full length, match hashlib, and are the same however big the read buffer is.
+        """
+        path: Path = ENTRY_TEST_MATS / 'image_with_exif.jpg'
+        expected: bytes = blake2b(path.read_bytes()).digest()
+        self.assertEqual(Entry(path).digest('blake2b'), expected)
+        self.assertEqual(Entry(path).digest('blake2b', chunk_size=1000), expected)
+        self.assertEqual(Entry(path).digest('md5'), md5(path.read_bytes()).digest())
+        self.assertEqual(Entry(ENTRY_TEST_MATS / 'image.jpg').digest('md5'), md5(b'').digest())
+        self.assertRaises(ValueError, Entry(path).digest, 'not_an_algorithm')
+
+    def test_from_dir_entry(self):
+        """
+        Test that an entry made from a directory walk's DirEntry points at the same file and reuses the walk's stat.
+        """
+        with scandir(ENTRY_TEST_MATS) as it:
+            dir_entry: DirEntry = next(e for e in it if e.name == 'black_square.jpg')
+        entry: Entry = Entry(dir_entry)
+        self.assertEqual(entry.path, ENTRY_TEST_MATS / 'black_square.jpg')
+        self.assertEqual(entry.stat, dir_entry.stat())
+        self.assertEqual(entry.size, 3990)
+        self.assertEqual(Entry(entry).size, 3990)
+
+    def test_compact(self):
+        """
+        Test that entries have no __dict__, share their parent directory's path, and can be used as paths.
+        """
+        first: Entry = Entry(ENTRY_TEST_MATS / 'black_square.jpg')
+        second: Entry = Entry(str(ENTRY_TEST_MATS / 'black_square1.jpg'))
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertIs(first._parent, second._parent)
+        self.assertEqual(os.fspath(first), str(ENTRY_TEST_MATS / 'black_square.jpg'))
+        self.assertEqual(first.name, 'black_square.jpg')
+        with open(first, 'rb') as f:
+            self.assertEqual(len(f.read()), first.size)
+
     def test_lt(self):
         """
         Test that our less than override is working as intended.
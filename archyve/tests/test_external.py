@@ -0,0 +1,76 @@
+"""
+Module contains unit tests for the external module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.external import READ_BUFFER, ExternalSorter, Record, external_duplicates
+from archyve.tests.run_unit_tests import ArchiveTestCase, group_names
+from unittest import main
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from pathlib import Path
+from random import Random
+import os
+
+
+class TestExternal(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.runs: Path = self.root / 'runs'
+        self.runs.mkdir()
+        random: Random = Random(7)
+        contents: list[bytes] = [b'', b'small', b'a' * 3000, b'a' * 1500 + b'b' + b'a' * 1499, b'a' * 2999 + b'c',
+                                 bytes(random.getrandbits(8) for _ in range(10000))]
+        for i in range(60):
+            path: Path = self.archive / f'{i % 4}' / f'file{i}.bin'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Copies of a few contents, files that only differ in the middle, and files that are one of a kind.
+            path.write_bytes(contents[i % len(contents)] if i < 40 else os.urandom(100 + i))
+
+    def test_sorter(self):
+        """
+        Test that records come back in order however many runs they were spilled to, including when the runs have to
+        be merged in more than one pass.
+        """
+        random: Random = Random(1)
+        records: list[Record] = [(random.randrange(50), os.urandom(random.randrange(3)), f'{random.random()}/é/\udcff')
+                                 for _ in range(5000)]
+        sorter: ExternalSorter = ExternalSorter(self.runs, memory_budget=READ_BUFFER // 2)
+        for record in records:
+            sorter.add(record)
+        self.assertGreater(len(sorter.runs), 2)
+        self.assertGreater(sorter.buffered, 0)
+        merged = iter(sorter)
+        self.assertEqual(sorter.buffered, 0)  # Handed over to the merge, and released once it is used up.
+        self.assertEqual(list(merged), sorted(records))
+        self.assertEqual(len(sorter.runs), 2)  # Merged down to as many as the budget has read buffers for.
+        self.assertEqual(len(sorter), len(records))
+
+    def test_duplicates(self):
+        """
+        Test that the out-of-core search finds the same groups as the in-memory one, with full digests, and leaves no
+        runs behind.
+        """
+        archyve: Archyve = Archyve(self.archive, materialize=True)
+        expected: list[list[str]] = group_names(archyve.duplicates(block_size=1024))
+        full: int = archyve.bytes_read['full']
+        self.assertEqual(len(expected), 6)
+        for budget in (1, 10 ** 9):
+            for source in (Archyve(self.archive), Archyve(self.archive, materialize=True), Archyve(self.archive).images
+                           + Archyve(self.archive)):
+                with self.subTest(budget=budget, source=source):
+                    found: list[list[Entry]] = list(source.iter_duplicates(1024, budget, self.runs))
+                    self.assertEqual(group_names(found), expected)
+                    self.assertEqual(source.bytes_read['full'], full)
+                    for group in found:
+                        self.assertEqual(len({e.digest() for e in group}), 1)
+                    self.assertEqual(list(self.runs.iterdir()), [])
+
+        records: list[list[Record]] = list(external_duplicates(
+            ((os.fspath(p), p.stat().st_size) for p in self.archive.rglob('*.bin')), block_size=1024, workers=3))
+        self.assertEqual(sorted(sorted(os.path.basename(p) for _, _, p in group) for group in records), expected)
+        self.assertEqual([group[0][0] for group in records], sorted(group[0][0] for group in records))
+
+
+if __name__ == '__main__':
+    main()
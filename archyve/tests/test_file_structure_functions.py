@@ -1,5 +1,8 @@
-from archyve.file_structure_functions import sub_files, sub_dirs, sub_paths
+from archyve.file_structure_functions import sub_files, sub_dirs, sub_paths, scan, parallel_scan
 from archyve.tests.run_unit_tests import TEST_MATERIALS
+from tempfile import TemporaryDirectory
+from sys import getrecursionlimit, setrecursionlimit
+from os import DirEntry
 from pathlib import Path
 from typing import Final
 import unittest
@@ -32,6 +35,78 @@ class TestFileStructureFunctions(unittest.TestCase):
         for p in sp:
             assert p.exists()
 
+    def test_sub_paths_filters(self):
+        """
+        Test that include/exclude globs and the max depth are applied while walking.
+        """
+        def stems(**kwargs) -> set[str]:
+            return {path.stem for path in sub_paths(TEST_MATS / 'sub_paths', **kwargs)}
+
+        self.assertEqual(stems(max_depth=0), {'file20'})
+        self.assertEqual(stems(max_depth=1), {f'file{i}' for i in (*range(1, 15), 20)})
+        self.assertEqual(stems(include=['file1?.txt']), {f'file{i}' for i in range(10, 20)})
+        self.assertEqual(stems(exclude=['dir4', 'dir1/*']), {f'file{i}' for i in (*range(5, 13), 20)})
+        self.assertEqual(stems(include=['dir4/subdir/*']), {'file15', 'file16'})
+
+    def test_scan_deep_tree(self):
+        """
+        Test that trees deeper than the recursion limit can be walked, and that the walk yields DirEntry objects with
+        their paths.
+        """
+        with TemporaryDirectory() as tmp:
+            deepest: Path = Path(tmp).joinpath(*(['d'] * 300))
+            deepest.mkdir(parents=True)
+            (deepest / 'bottom.txt').write_text('bottom')
+            limit: int = getrecursionlimit()
+            setrecursionlimit(100)
+            try:
+                found: list[DirEntry] = list(scan(tmp))
+            finally:
+                setrecursionlimit(limit)
+            self.assertEqual([e.name for e in found], ['bottom.txt'])
+            self.assertEqual(Path(found[0].path), deepest.resolve() / 'bottom.txt')
+
+    def test_scan_symlink_cycle(self):
+        """
+        Test that a link back to a real ancestor isn't walked into again, so every file is found once.
+        """
+        with TemporaryDirectory() as tmp:
+            (Path(tmp) / 'a' / 'b').mkdir(parents=True)
+            (Path(tmp) / 'a' / 'b' / 'f').write_text('f')
+            (Path(tmp) / 'a' / 'b' / 'link').symlink_to(Path(tmp) / 'a', target_is_directory=True)
+            self.assertEqual([e.name for e in scan(tmp)], ['f'])
+            self.assertEqual([e.name for e in parallel_scan([tmp], workers=2)], ['f'])
+
+    def test_scan_overlapping_roots(self):
+        """
+        Test that roots inside (or the same as) other roots are walked once, the same way serially and in parallel.
+        """
+        with TemporaryDirectory() as tmp:
+            (Path(tmp) / 'sub').mkdir()
+            (Path(tmp) / 'x.txt').write_text('x')
+            (Path(tmp) / 'sub' / 'y.txt').write_text('y')
+            roots: list[Path] = [Path(tmp), Path(tmp) / 'sub', Path(tmp)]
+            serial: list[str] = [e.path for e in scan(roots)]
+            self.assertEqual(serial, [str(Path(tmp).resolve() / 'x.txt'), str(Path(tmp).resolve() / 'sub' / 'y.txt')])
+            self.assertEqual([e.path for e in parallel_scan(roots, workers=2)], serial)
+
+    def test_parallel_scan(self):
+        """
+        Test that walking several roots on a pool finds the same files as walking them one after another, in the same
+        order when asked to.
+        """
+        roots: list[Path] = [TEST_MATS / 'sub_paths', TEST_MATS / 'sub_files', TEST_MATERIALS / 'images']
+        serial: list[str] = [e.path for root in roots for e in scan(root)]
+        ordered: list[str] = [e.path for e in parallel_scan(roots, workers=3, max_pending=2)]
+        unordered: list[str] = [e.path for e in parallel_scan(roots, workers=3, ordered=False, max_pending=2)]
+        self.assertEqual(ordered, serial)
+        self.assertCountEqual(unordered, serial)
+
+        # Stopping early doesn't hang waiting for the rest of the walk.
+        walk = parallel_scan(roots, workers=2)
+        self.assertEqual(next(walk).path, serial[0])
+        walk.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,95 @@
+"""
+Module contains unit tests for the index module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.index import QUERY_KINDS, PathIndex, matches
+from archyve.tests.run_unit_tests import TEST_MATERIALS
+from archyve.table import EntryTable
+from unittest import TestCase, main
+from unittest.mock import patch
+from archyve.archyve import Archyve
+from random import Random
+import os
+
+
+class TestIndex(TestCase):
+    def setUp(self):
+        random: Random = Random(0)
+        words: list[str] = ['2023', 'march', 'IMG_', 'a', 'ab', 'b.c', 'x y', '.jpg']
+        root: str = os.sep + 'r'
+        directories: list[str] = [root] + [os.path.join(root, *random.choices(words, k=random.randint(1, 3)))
+                                           for _ in range(20)]
+        self.table: EntryTable = EntryTable()
+        stat: os.stat_result = os.stat(TEST_MATERIALS)
+        for _ in range(1000):
+            name: str = ''.join(random.choices(words, k=random.randint(1, 3))) + random.choice(['', '.jpg', '.txt'])
+            self.table.append(os.path.join(random.choice(directories), name), stat)
+
+    def test_rows(self):
+        """
+        Test that every kind of query finds exactly the paths that checking every path would, including queries that
+        cross from a directory into a name.
+        """
+        queries: dict[str, list[str]] = {
+            'substring': ['march', 'IMG_', 'ch/IM', '/a', 'a/', 'y', '2023/march/', 'r/2023', 'zzz', 'b.c.jpg'],
+            'prefix': ['/r/2023', '/r/2023/', '/r/march/IMG', '/r', '/', 'r'],
+            'suffix': ['.jpg', 'march/a.jpg', 'G', '/a', '/', 'b.c'],
+            'glob': ['*.jpg', 'IMG_*', '*march*', '**/2023/*', '/r/*/a*', 'a?b*', '[ab]*.txt', '*', 'IMG_*.jpg'],
+        }
+        index: PathIndex = PathIndex(self.table)
+        for kind, kind_queries in queries.items():
+            for query in kind_queries:
+                query = query.replace('/', os.sep) if kind != 'glob' else query
+                with self.subTest(kind=kind, query=query):
+                    self.assertEqual(list(index.rows(query, kind)),
+                                     [row for row in range(len(self.table))
+                                      if matches(self.table.path(row), query, kind)])
+
+    def test_search(self):
+        """
+        Test any/all searches, searches of some of the rows, and that the index notices the table growing.
+        """
+        index: PathIndex = PathIndex(self.table)
+        march, image = set(index.rows('march')), set(index.rows('IMG_'))
+        self.assertEqual(set(index.search(['march', 'IMG_'])), march | image)
+        self.assertEqual(set(index.search(['march', 'IMG_'], any_all=all)), march & image)
+        self.assertEqual(set(index.search(['march'], rows=range(100))), {r for r in march if r < 100})
+        self.assertEqual(len(index.search([], any_all=all)), len(self.table))
+
+        self.table.append(os.path.join(os.sep + 'r', 'new_march.jpg'), os.stat(TEST_MATERIALS))
+        self.assertIn(len(self.table) - 1, index.rows('march'))
+        with self.assertRaises(ValueError):
+            index.rows('march', 'regex')
+
+    def test_archyve(self):
+        """
+        Test that an archyve can be searched repeatedly (its first indexed search materializes it), for every kind of
+        query, and that a streaming archyve is searched without being materialized or indexed.
+        """
+        with patch('archyve.archyve.PathIndex', wraps=PathIndex) as index:
+            streamed: set[str] = {e.path.name for e in Archyve(TEST_MATERIALS).search('black_square', 'with',
+                                                                                       any_all=all)}
+            index.assert_not_called()
+            archyve: Archyve = Archyve(TEST_MATERIALS)
+            found: set[str] = {e.path.name for e in archyve.search('black_square', 'with', any_all=all, index=True)}
+            self.assertEqual(index.call_count, 1)
+        self.assertEqual(streamed, found)
+        self.assertEqual(found, {'black_square_with_one_line.jpg', 'black_square_with_one_line1.jpg',
+                                 'black_square_with_one_line2.jpg', 'black_square_with_cross.jpg'})
+        self.assertEqual({e.path.name for e in archyve.search('black_square', 'with', any_all=all)}, found)
+        self.assertEqual({e.path.name for e in archyve.search('black_square_with_*.jpg', kind='glob')}, found)
+        self.assertTrue(all(e.path.name.endswith('.jpg') for e in archyve.search('.jpg', kind='suffix')))
+        self.assertEqual(len(list(archyve.search(str(TEST_MATERIALS), kind='prefix'))), len(archyve))
+        self.assertEqual(len(list(archyve.videos.search('', kind='prefix'))), len(Archyve(TEST_MATERIALS).videos))
+
+        # A filtered generator can't be indexed, but can still be searched.
+        generator: Archyve = Archyve(TEST_MATERIALS).filter(lambda e: e.path.suffix == '.jpg')
+        self.assertEqual({e.path.name for e in generator.search('black_square_with_*', kind='glob')}, found)
+        self.assertEqual(set(QUERY_KINDS), {'substring', 'prefix', 'suffix', 'glob'})
+        with self.assertRaises(ValueError):
+            archyve.search('black', kind='regex')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Module contains unit tests for the instrumentation module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.instrumentation import Metrics, Observer, Progress, observe, observers
+from archyve.tests.run_unit_tests import ArchiveTestCase, TEST_MATERIALS
+from unittest import main
+from archyve.cache import EntryCache
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from pathlib import Path
+from io import StringIO
+
+
+class Recorder(Observer):
+    """
+    Remembers the stages it is told about.
+    """
+
+    def __init__(self):
+        self.stages: list[tuple[str, str]] = []
+
+    def stage_started(self, stage: str, files: int, size: int) -> None:
+        self.stages.append(('started', stage))
+
+    def stage_finished(self, stage: str, seconds: float) -> None:
+        self.stages.append(('finished', stage))
+
+
+class TestInstrumentation(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        (self.archive / 'sub').mkdir(parents=True)
+        (self.archive / 'a.bin').write_bytes(b'a' * 20000)
+        (self.archive / 'sub' / 'b.bin').write_bytes(b'a' * 20000)
+        (self.archive / 'c.bin').write_bytes(b'c' * 20000)
+        (self.archive / 'd.bin').write_bytes(b'd' * 10)
+        self.cache: Path = self.root / 'cache.sqlite'
+
+    def test_duplicates(self):
+        """
+        Test that a duplicate search reports the files it finds, the bytes it hashes and its stages, and that a second
+        search reports its cache hits.
+        """
+        metrics, recorder = Metrics(), Recorder()
+        with EntryCache(self.cache) as cache, observe(metrics, recorder):
+            archyve: Archyve = Archyve(self.archive, cache=cache)
+            self.assertEqual(len(archyve.duplicates(block_size=1024)), 1)
+        self.assertEqual(observers, [])
+        self.assertEqual(metrics.files_discovered, 4)
+        self.assertEqual(metrics.bytes_hashed, sum(archyve.bytes_read.values()))
+        self.assertEqual(metrics.bytes_hashed, 3 * 2048 + 2 * 20000)
+        self.assertEqual(recorder.stages,
+                         [(event, stage) for stage in ('size', 'partial', 'full') for event in ('started', 'finished')])
+        self.assertEqual(set(metrics.stage_seconds), {'size', 'partial', 'full'})
+        self.assertEqual(metrics.cache_hits, 0)
+
+        metrics: Metrics = Metrics()
+        with EntryCache(self.cache) as cache, observe(metrics):
+            Archyve(self.archive, cache=cache).duplicates(block_size=1024)
+        self.assertEqual(metrics.bytes_hashed, 0)
+        self.assertEqual(metrics.cache_misses, 1)  # c.bin's full digest was never needed, so was never cached
+        self.assertGreater(metrics.cache_hit_rate, 0.8)
+
+    def test_entries(self):
+        """
+        Test that hashing an entry, reading its EXIF and deleting files are all reported, including what goes wrong.
+        """
+        metrics: Metrics = Metrics()
+        with observe(metrics):
+            hash(Entry(self.archive / 'a.bin'))
+            self.assertIsNotNone(Entry(TEST_MATERIALS / 'entry' / 'image_with_exif.jpg').exif)
+            (self.archive / 'broken.jpg').write_bytes(b'not an image')
+            self.assertIsNone(Entry(self.archive / 'broken.jpg').exif)
+            Archyve.delete(self.archive / 'c.bin', self.archive / 'missing.bin')
+        self.assertEqual((metrics.files_hashed, metrics.bytes_hashed), (1, 20000))
+        self.assertEqual(metrics.metadata_reads, 2)
+        self.assertEqual(metrics.operations, {'delete': 1})
+        self.assertEqual(metrics.operation_bytes, {'delete': 20000})
+        self.assertEqual(metrics.errors, 2)
+        self.assertEqual(set(metrics.recent_errors),
+                         {str(self.archive / 'broken.jpg'), str(self.archive / 'missing.bin')})
+
+        text: str = metrics.prometheus()
+        self.assertIn('# TYPE archyve_bytes_hashed_total counter\narchyve_bytes_hashed_total 20000\n', text)
+        self.assertIn('archyve_operations_total{kind="delete"} 1\n', text)
+        self.assertIn('archyve_cache_lookups_total{result="hit"} 0\n', text)
+
+    def test_progress(self):
+        """
+        Test that the progress display shows the stage, how far through it is and what is left.
+        """
+        stream: StringIO = StringIO()
+        progress: Progress = Progress(stream, interval=0)
+        progress.discovered('a')
+        self.assertTrue(stream.getvalue().endswith('[walk]  1 files found'))
+        progress.stage_started('full', 4, 4_000_000)
+        progress.hashed('a', 1_000_000)
+        progress.error('b', OSError())
+        line: str = progress.line()
+        self.assertRegex(line, r'^\[full\]  1/4 files  1\.0/4\.0 MB  [\d,.]+ MB/s  ETA \d+:\d\d:\d\d  1 error$')
+
+        # Drawing over a longer line blanks out what is left of it.
+        progress.stage_started('size', 0, 0)
+        self.assertTrue(stream.getvalue().endswith('\r' + '[size]  0 files  1 error'.ljust(len(line))))
+        progress.close()
+        self.assertTrue(stream.getvalue().endswith('1 error\n'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Module contains unit tests for the manifest module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.watch import ADDED, MODIFIED, REMOVED, Change
+from archyve.manifest import Manifest, ManifestFile
+from archyve.instrumentation import Metrics, observe
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from archyve.archyve import Archyve
+from pathlib import Path
+import shutil
+import os
+
+
+class TestManifest(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mirror: Path = self.root / 'mirror'
+        for path, data in (('a.bin', b'a' * 100), ('2023/03/b.bin', b'b' * 200), ('2023/03/c.bin', b'c'),
+                           ('2023/04/d.bin', b'd' * 50), ('2024/e.bin', b'')):
+            (self.archive / path).parent.mkdir(parents=True, exist_ok=True)
+            (self.archive / path).write_bytes(data)
+        shutil.copytree(self.archive, self.mirror)
+
+    def test_hashes(self):
+        """
+        Test that identical trees have identical hashes wherever they are (their times and inodes don't matter), and
+        that a change only alters the hashes of the directories above it.
+        """
+        archive: Manifest = Archyve(self.archive).manifest()
+        mirror: Manifest = Archyve(self.mirror).manifest()
+        self.assertEqual(len(archive), 5)
+        self.assertEqual(archive, mirror)
+        self.assertEqual(archive.diff(mirror), [])
+        self.assertIsNone(archive.directory_hash('2022'))
+
+        (self.mirror / '2023/04/d.bin').write_bytes(b'D' * 50)
+        changed: Manifest = Archyve(self.mirror).manifest()
+        self.assertNotEqual(archive, changed)
+        self.assertEqual(archive.directory_hash('2023/03'), changed.directory_hash('2023/03/'))
+        self.assertEqual(archive.directory_hash('2024'), changed.directory_hash('2024'))
+        for directory in ('', '2023', '2023/04'):
+            self.assertNotEqual(archive.directory_hash(directory), changed.directory_hash(directory))
+
+        # A file moved into a sibling directory changes the tree, even though no contents did.
+        os.rename(self.mirror / '2023/04/d.bin', self.mirror / '2023/03/d.bin')
+        self.assertNotEqual(changed.digest, Archyve(self.mirror).manifest().digest)
+        self.assertEqual(Manifest().digest, Manifest().digest)
+
+    def test_diff(self):
+        """
+        Test that the diff lists exactly what was added, removed (including whole directories) and modified.
+        """
+        (self.mirror / '2023/03/c.bin').write_bytes(b'C')
+        (self.mirror / 'a.bin').unlink()
+        shutil.rmtree(self.mirror / '2023/04')
+        (self.mirror / '2025/01').mkdir(parents=True)
+        (self.mirror / '2025/01/f.bin').write_bytes(b'f')
+        (self.mirror / '2024/g.bin').write_bytes(b'g')
+        os.utime(self.archive / '2023/03/b.bin', ns=(0, 0))  # Times don't make a file modified.
+        expected: list[Change] = [Change(MODIFIED, '2023/03/c.bin'), Change(REMOVED, '2023/04/d.bin'),
+                                  Change(ADDED, '2024/g.bin'), Change(ADDED, '2025/01/f.bin'),
+                                  Change(REMOVED, 'a.bin')]
+        self.assertEqual(Archyve(self.archive).diff(Archyve(self.mirror)), expected)
+        reverse: list[Change] = Archyve(self.mirror).diff(Archyve(self.archive).manifest())
+        swapped: dict[str, str] = {ADDED: REMOVED, REMOVED: ADDED, MODIFIED: MODIFIED}
+        self.assertEqual(reverse, [Change(swapped[c.kind], c.path) for c in expected])
+
+        # Several directories are compared relative to the one they share.
+        self.assertEqual(len(Archyve(self.archive / '2023', self.archive / '2024').manifest().files), 4)
+        self.assertIn('2023/03/b.bin', Archyve(self.archive / '2023', self.archive / '2024').manifest().files)
+
+        # Relative directories are compared by the same relative paths as absolute ones.
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.root)
+        self.assertEqual(list(Archyve('archive').manifest().files), list(Archyve(self.archive).manifest().files))
+        self.assertEqual(Archyve('archive').diff(Archyve(self.mirror)), expected)
+        self.assertIn('03/b.bin', Archyve(os.path.join('archive', '2023')).manifest().files)
+        with self.assertRaises(ValueError):
+            Manifest.build(self.mirror, Archyve(self.archive).entries)
+
+    def test_incremental(self):
+        """
+        Test that a saved manifest round trips, and that updating it only hashes the files that changed.
+        """
+        location: Path = self.root / 'archive.manifest'
+        first: Manifest = Archyve(self.archive).manifest(location)
+        loaded: Manifest = Manifest.load(location)
+        self.assertEqual(loaded.files, first.files)
+        self.assertEqual(loaded, first)
+
+        (self.archive / '2024/e.bin').write_bytes(b'e')
+        metrics: Metrics = Metrics()
+        with observe(metrics):
+            second: Manifest = Archyve(self.archive).manifest(location)
+        self.assertEqual(metrics.files_hashed, 1)
+        self.assertEqual(first.diff(second), [Change(MODIFIED, '2024/e.bin')])
+        self.assertEqual(Manifest.load(location), second)
+
+        # A manifest made with another algorithm can't be compared, and a stale one is ignored rather than trusted.
+        other: Manifest = Manifest({'a.bin': ManifestFile(1, 0, 0, b'')}, algorithm='md5')
+        self.assertRaises(ValueError, first.diff, other)
+        self.assertEqual(Manifest.build(self.archive, Archyve(self.archive).entries, previous=other).algorithm, 'md5')
+        location.write_text('not a manifest\n')
+        self.assertRaises(ValueError, Manifest.load, location)
+
+
+if __name__ == '__main__':
+    main()
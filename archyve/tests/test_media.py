@@ -0,0 +1,232 @@
+"""
+Module contains unit tests for the media module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.media import MP4_EPOCH, MediaInfo, header_media_info, media_info, media_infos, mp3_info, parse_date
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from archyve.cache import EntryCache
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from datetime import datetime, timedelta, timezone
+from struct import pack
+from pathlib import Path
+from typing import Any, BinaryIO, Final
+from PIL import Image
+
+
+RECORDED: Final[datetime] = datetime(2021, 6, 5, 14, 30, 15)
+
+
+def box(kind: bytes, payload: bytes) -> bytes:
+    """
+    :return: An ISO base media box.
+    """
+    return pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def mp4(version: int = 0, moov_last: bool = False) -> bytes:
+    """
+    :return: An MP4 recorded at RECORDED, 12.5 seconds long, with a sound track before a 1920x1080 picture track.
+    """
+    created: int = int(RECORDED.timestamp()) + MP4_EPOCH
+    if version == 0:
+        mvhd: bytes = pack('>IIIII', 0, created, created, 1000, 12500) + bytes(80)
+        tkhd: bytes = b'\x00\x00\x00\x07' + bytes(72)
+    else:
+        mvhd: bytes = pack('>IQQIQ', 1 << 24, created, created, 1000, 12500) + bytes(80)
+        tkhd: bytes = b'\x01\x00\x00\x07' + bytes(84)
+    sound: bytes = box(b'trak', box(b'tkhd', tkhd + pack('>II', 0, 0)))
+    picture: bytes = box(b'trak', box(b'tkhd', tkhd + pack('>II', 1920 << 16, 1080 << 16)))
+    moov: bytes = box(b'moov', box(b'mvhd', mvhd) + sound + picture)
+    mdat: bytes = pack('>I4sQ', 1, b'mdat', 16 + 4096) + bytes(4096)  # A 64 bit size
+    ftyp: bytes = box(b'ftyp', b'isom\x00\x00\x02\x00')
+    return ftyp + mdat + moov if moov_last else ftyp + moov + mdat
+
+
+def riff(form: bytes, chunks: bytes) -> bytes:
+    """
+    :return: A RIFF file.
+    """
+    return b'RIFF' + pack('<I', 4 + len(chunks)) + form + chunks
+
+
+def chunk(kind: bytes, data: bytes) -> bytes:
+    """
+    :return: A RIFF chunk (padded to an even length).
+    """
+    return kind + pack('<I', len(data)) + data + bytes(len(data) & 1)
+
+
+def id3(version: int, frames: dict[str, str | bytes], flags: int = 0, extended: bytes = b'') -> bytes:
+    """
+    :return: An ID3v2 tag holding the given frames (text frames in Latin-1), an extended header if one is given, and
+             some padding.
+    """
+    body: bytes = extended
+    for frame_id, text in frames.items():
+        data: bytes = b'\x00' + text.encode('latin-1') if isinstance(text, str) else text
+        size: bytes = pack('>I', len(data)) if version == 3 else bytes((len(data) >> s) & 0x7F for s in (21, 14, 7, 0))
+        body += frame_id.encode() + size + b'\x00\x00' + data
+    body += bytes(64)
+    return b'ID3' + bytes((version, 0, flags | (0x40 if extended else 0))) + \
+        bytes((len(body) >> s) & 0x7F for s in (21, 14, 7, 0)) + body
+
+
+class CountingFile:
+    """
+    A file that counts the bytes read from it.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file: BinaryIO = file
+        self.bytes_read: int = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data: bytes = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.file, name)
+
+
+class TestMedia(TestCase):
+    def test_mp4(self):
+        """
+        Test that the recording time and duration come from 'mvhd' and the size from the first track that has a
+        picture, in both versions of the boxes and wherever the 'moov' box is.
+        """
+        with TemporaryDirectory() as tmp:
+            for version in (0, 1):
+                for moov_last in (False, True):
+                    path: Path = Path(tmp) / f'video{version}{moov_last}.mp4'
+                    path.write_bytes(mp4(version, moov_last))
+                    info: MediaInfo = header_media_info(path)
+                    self.assertEqual(info, MediaInfo(RECORDED, 12.5, 1920, 1080))
+                    self.assertEqual(info.dimensions, (1920, 1080))
+
+            path: Path = Path(tmp) / 'malformed.mp4'
+            path.write_bytes(mp4()[:16] + pack('>I4s', 4, b'moov'))  # Smaller than its own header
+            self.assertRaises(ValueError, header_media_info, path)
+            self.assertEqual(media_info(path), MediaInfo())
+
+    def test_riff(self):
+        """
+        Test that a WAV's duration comes from its byte rate and its date from its 'bext' chunk (or LIST/INFO), and that
+        an AVI's come from its 'avih' chunk.
+        """
+        fmt: bytes = chunk(b'fmt ', pack('<HHIIHH', 1, 2, 44100, 176400, 4, 16))
+        bext: bytes = chunk(b'bext', bytes(320) + b'2021-06-0514:30:15' + bytes(264))
+        info: bytes = chunk(b'LIST', b'INFO' + chunk(b'ICRD', b'2021-06-05\x00'))
+        with TemporaryDirectory() as tmp:
+            path: Path = Path(tmp) / 'audio.wav'
+            path.write_bytes(riff(b'WAVE', fmt + bext + chunk(b'data', bytes(352800))))
+            self.assertEqual(header_media_info(path), MediaInfo(RECORDED, 2.0))
+            path.write_bytes(riff(b'WAVE', fmt + info + chunk(b'data', bytes(17640 + 1))))
+            self.assertEqual(header_media_info(path).capture_date, datetime(2021, 6, 5))
+            self.assertAlmostEqual(header_media_info(path).duration, 0.1, 4)
+
+            avih: bytes = chunk(b'avih', pack('<14I', 40000, 0, 0, 0, 250, 0, 1, 0, 640, 480, 0, 0, 0, 0))
+            path = Path(tmp) / 'video.avi'
+            path.write_bytes(riff(b'AVI ', chunk(b'LIST', b'hdrl' + avih) + chunk(b'LIST', b'movi')))
+            self.assertEqual(header_media_info(path), MediaInfo(None, 10.0, 640, 480))
+
+    def test_flac(self):
+        """
+        Test that a FLAC's duration comes from its STREAMINFO and its date from its Vorbis comments.
+        """
+        stream_info: bytes = bytes(10) + ((48000 << 44) | (1 << 41) | (15 << 36) | 144000).to_bytes(8, 'big') + \
+            bytes(16)
+        comments: list[bytes] = [b'TITLE=Song', b'DATE=2021-06-05T14:30:15']
+        vorbis: bytes = pack('<I', 6) + b'vendor' + pack('<I', len(comments)) + \
+            b''.join(pack('<I', len(c)) + c for c in comments)
+        picture: bytes = bytes(1000)
+        with TemporaryDirectory() as tmp:
+            path: Path = Path(tmp) / 'audio.flac'
+            path.write_bytes(b'fLaC' + bytes((0,)) + len(stream_info).to_bytes(3, 'big') + stream_info +
+                             bytes((6,)) + len(picture).to_bytes(3, 'big') + picture +
+                             bytes((0x84,)) + len(vorbis).to_bytes(3, 'big') + vorbis + bytes(100))
+            self.assertEqual(header_media_info(path), MediaInfo(RECORDED, 3.0))
+
+    def test_mp3(self):
+        """
+        Test that an MP3's date comes from its ID3 tag (of either version) and its duration from TLEN, a Xing header,
+        or the bit rate.
+        """
+        xing: bytes = b'\xff\xfb\x90\x00' + bytes(32) + b'Xing' + pack('>II', 1, 100) + bytes(365)
+        cbr: bytes = b'\xff\xfb\x90\x00' + bytes(15996)  # 128 kbit/s, so a second
+        with TemporaryDirectory() as tmp:
+            path: Path = Path(tmp) / 'audio.mp3'
+            path.write_bytes(id3(3, {'TYER': '2021', 'TDAT': '0506', 'TIME': '1430'}) + xing)
+            self.assertEqual(header_media_info(path), MediaInfo(RECORDED.replace(second=0), 100 * 1152 / 44100))
+            path.write_bytes(id3(4, {'TDRC': '2021-06-05T14:30:15', 'TLEN': '61000'}) + cbr)
+            self.assertEqual(header_media_info(path), MediaInfo(RECORDED, 61.0))
+            path.write_bytes(cbr)
+            self.assertEqual(header_media_info(path), MediaInfo(None, 1.0))
+
+            # Cover art (and any other frame that isn't text) is skipped with a seek, after an extended header too.
+            cover: bytes = b'\x00image/jpeg\x00\x03\x00' + bytes(2 * 1024 ** 2)
+            for version, extended in ((3, pack('>IHI', 6, 0, 0)), (4, bytes((0, 0, 0, 6, 1, 0)))):
+                with self.subTest(version=version):
+                    path.write_bytes(id3(version, {'APIC': cover, 'TDRC': '2021-06-05T14:30:15', 'TLEN': '61000'},
+                                         extended=extended) + cbr)
+                    with open(path, 'rb') as f:
+                        counting: CountingFile = CountingFile(f)
+                        self.assertEqual(mp3_info(counting), MediaInfo(RECORDED, 61.0))
+                    self.assertLess(counting.bytes_read, 4096)
+
+            # An unsynchronised tag has a zero after every 0xFF, which must be taken out again to find the frames.
+            frames: bytes = id3(3, {'TXXX': b'\x00\xff\xfe', 'TYER': '2021'})[10:].replace(b'\xff', b'\xff\x00')
+            path.write_bytes(b'ID3\x03\x00\x80' + bytes((len(frames) >> s) & 0x7F for s in (21, 14, 7, 0)) + frames +
+                             cbr)
+            self.assertEqual(header_media_info(path), MediaInfo(datetime(2021, 1, 1), 1.0))
+
+    def test_parse(self):
+        """
+        Test that the dates tags hold are parsed, and the invalid ones ignored.
+        """
+        self.assertEqual(parse_date('2021-06-05 14:30:15'), RECORDED)
+        self.assertEqual(parse_date('2021-06'), datetime(2021, 6, 1))
+        self.assertEqual(parse_date('2021'), datetime(2021, 1, 1))
+        aware: datetime = RECORDED.replace(tzinfo=timezone(timedelta(hours=5)))
+        self.assertEqual(parse_date(aware.isoformat()), aware.astimezone().replace(tzinfo=None))
+        self.assertIsNone(parse_date('2021-13'))
+        self.assertIsNone(parse_date(''))
+        self.assertIsNone(parse_date(None))
+
+    def test_entry(self):
+        """
+        Test that entries date videos by when they were recorded, remember their metadata (in their cache too), and
+        that an archyve reads many on a pool.
+        """
+        with TemporaryDirectory() as tmp:
+            Path(tmp, 'video.mp4').write_bytes(mp4())
+            Path(tmp, 'empty.mov').touch()
+            Image.new('L', (12, 8)).save(Path(tmp) / 'image.png')
+            with EntryCache(Path(tmp) / 'cache.sqlite') as cache:
+                video: Entry = Entry(Path(tmp) / 'video.mp4', cache=cache)
+                self.assertEqual(video.cached_media(), (False, None))
+                self.assertEqual(video.created, RECORDED)
+                self.assertEqual(video.duration, 12.5)
+                self.assertEqual(video.dimensions, (1920, 1080))
+            with EntryCache(Path(tmp) / 'cache.sqlite') as cache:
+                self.assertEqual(Entry(Path(tmp) / 'video.mp4', cache=cache).cached_capture_date(), (True, RECORDED))
+
+            self.assertEqual(Entry(Path(tmp) / 'image.png').dimensions, (12, 8))
+            self.assertIsNone(Entry(Path(tmp) / 'image.png').media)
+            empty: Entry = Entry(Path(tmp) / 'empty.mov')
+            self.assertEqual(empty.media, MediaInfo())
+            self.assertIsNone(empty.dimensions)
+
+            archyve: Archyve = Archyve(tmp, workers=2)
+            paths: list[Path] = [Path(tmp) / 'video.mp4', Path(tmp) / 'empty.mov']
+            self.assertEqual(list(media_infos(paths, workers=2)), [media_info(p) for p in paths])
+            self.assertEqual(sorted(archyve.videos.media(), key=lambda i: i.duration or 0),
+                             [MediaInfo(), MediaInfo(RECORDED, 12.5, 1920, 1080)])
+            self.assertIn(RECORDED, Archyve(tmp, workers=2).capture_dates())
+
+
+if __name__ == '__main__':
+    main()
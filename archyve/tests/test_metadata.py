@@ -0,0 +1,84 @@
+"""
+Module contains unit tests for the metadata module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.metadata import capture_date, capture_dates, header_capture_date, parse_exif_date, pillow_capture_date, \
+    tiff_capture_date
+from archyve.tests.run_unit_tests import TEST_MATERIALS
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from datetime import datetime
+from struct import pack
+from pathlib import Path
+from typing import Final
+from PIL import Image
+
+
+ENTRY_TEST_MATS: Final[Path] = TEST_MATERIALS / 'entry'
+TAKEN: Final[datetime] = datetime(2010, 8, 1, 10, 45, 34)
+
+
+class TestCaptureDate(TestCase):
+    def test_header(self):
+        """
+        Test that the capture date is read from the EXIF sub-directory (not the main directory's DateTime, which is
+        when the file was last changed) and agrees with Pillow.
+        """
+        path: Path = ENTRY_TEST_MATS / 'image_with_exif.jpg'
+        self.assertEqual(header_capture_date(path), TAKEN)
+        self.assertEqual(pillow_capture_date(path), TAKEN)
+        with TemporaryDirectory() as tmp:
+            Image.new('L', (8, 8)).save(Path(tmp) / 'no_exif.jpg')
+            self.assertIsNone(header_capture_date(Path(tmp) / 'no_exif.jpg'))
+        self.assertRaises(ValueError, header_capture_date, ENTRY_TEST_MATS / 'image.jpg')  # Empty
+        self.assertRaises(ValueError, header_capture_date, ENTRY_TEST_MATS / 'image.png')
+        self.assertIsNone(capture_date(ENTRY_TEST_MATS / 'image.jpg'))
+        self.assertIsNone(capture_date(ENTRY_TEST_MATS / 'image.png'))
+        self.assertIsNone(capture_date(ENTRY_TEST_MATS / 'audio.mp3'))
+
+    def test_tiff(self):
+        """
+        Test that both byte orders of TIFF are understood.
+        """
+        for order, magic in (('<', b'II*\x00'), ('>', b'MM\x00*')):
+            # The main directory holds DateTime and points at the EXIF directory, which holds DateTimeOriginal.
+            date, original = b'2020:04:05 15:10:41\x00', b'2010:08:01 10:45:34\x00'
+            tiff: bytes = magic + pack(f'{order}I', 8) + \
+                pack(f'{order}HHHII', 2, 0x0132, 2, 20, 56) + pack(f'{order}HHII', 0x8769, 4, 1, 38) + b'\x00' * 4 + \
+                pack(f'{order}HHHII', 1, 0x9003, 2, 20, 76) + b'\x00' * 4 + date + original
+            self.assertEqual(tiff_capture_date(tiff), TAKEN)
+            self.assertRaises(ValueError, tiff_capture_date, tiff[:20])
+
+        with Image.open(ENTRY_TEST_MATS / 'image_with_exif.jpg') as img, TemporaryDirectory() as tmp:
+            path: Path = Path(tmp) / 'image.tif'
+            img.resize((8, 8)).save(path, exif=img.getexif())
+            self.assertEqual(header_capture_date(path), pillow_capture_date(path))
+
+    def test_parse(self):
+        """
+        Test that the dates cameras write are parsed, and the invalid ones they write are ignored.
+        """
+        self.assertEqual(parse_exif_date('2010:08:01 10:45:34\x00'), TAKEN)
+        self.assertEqual(parse_exif_date(b'2010:08:01 10:45:34'), TAKEN)
+        self.assertIsNone(parse_exif_date('0000:00:00 00:00:00'))
+        self.assertIsNone(parse_exif_date(''))
+
+    def test_batch(self):
+        """
+        Test that dating many images on a pool gives the same dates, and that entries remember them.
+        """
+        paths: list[Path] = sorted(ENTRY_TEST_MATS.iterdir())
+        self.assertEqual(list(capture_dates(paths, workers=3)), [capture_date(p) for p in paths])
+
+        entries: list[Entry] = [Entry(p) for p in paths]
+        dates: list[datetime | None] = Archyve(ENTRY_TEST_MATS, workers=3).capture_dates(entries)
+        self.assertIn(TAKEN, dates)
+        self.assertTrue(all(e.cached_capture_date()[0] for e in entries))
+        self.assertEqual(Entry(ENTRY_TEST_MATS / 'image_with_exif.jpg').created, TAKEN)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Module contains unit tests for the operations module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.operations import Journal, Operation, Report, execute, flatten_plan, resume, rollback
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from unittest.mock import patch
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from pathlib import Path
+import errno
+import os
+
+
+class TestOperations(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        for folder in ('2019', '2020', '2020/holiday'):
+            (self.archive / folder).mkdir(parents=True)
+            for i in range(3):
+                (self.archive / folder / f'img_{i}.jpg').write_bytes(folder.encode() * (i + 1))
+        self.flat: Path = self.root / 'flat'
+        self.journal: Path = self.root / 'flatten.journal'
+
+    def files(self, folder: Path) -> set[str]:
+        """
+        :param folder: A folder.
+        :return: The paths of every file under the folder, relative to it.
+        """
+        return {p.relative_to(folder).as_posix() for p in folder.rglob('*') if p.is_file()}
+
+    def test_flatten(self):
+        """
+        Test that flattening gives clashing names numbered suffixes, that a dry run changes nothing, and that the
+        report counts what was moved.
+        """
+        before: set[str] = self.files(self.archive)
+        report: Report = Archyve(self.archive, materialize=True).flatten(self.flat, dry_run=True)
+        self.assertEqual((report.done, report.failed, report.bytes), (9, {}, 120))
+        self.assertEqual(self.files(self.archive), before)
+        self.assertFalse(self.flat.exists())
+
+        report: Report = Archyve(self.archive, workers=3).flatten(self.flat)
+        self.assertEqual((report.done, report.failed, report.bytes, report.copied), (9, {}, 120, 0))
+        self.assertEqual(self.files(self.archive), set())
+        self.assertEqual(self.files(self.flat), {f'img_{i}{s}.jpg' for i in range(3) for s in ('', ' (1)', ' (2)')})
+
+    def test_failures(self):
+        """
+        Test that operations that can't be done are reported without stopping the rest, and that a plan can't make
+        two files collide.
+        """
+        a, b = self.archive / '2019' / 'img_0.jpg', self.archive / '2019' / 'img_1.jpg'
+        report: Report = execute([Operation.move(a, self.flat / 'x.jpg'), Operation.move(b, self.flat / 'x.jpg'),
+                                  Operation.delete(self.archive / 'missing.jpg'),
+                                  Operation.rename(self.archive / '2020' / 'img_0.jpg', 'img_1.jpg'),
+                                  Operation.delete(self.archive / '2020' / 'img_2.jpg')], workers=2)
+        self.assertEqual(report.done, 2)
+        self.assertEqual({Path(p).name: type(e) for p, e in report.failed.items()},
+                         {'img_1.jpg': FileExistsError, 'missing.jpg': FileNotFoundError,
+                          'img_0.jpg': FileExistsError})
+        self.assertTrue(b.exists())
+        self.assertFalse((self.archive / '2020' / 'img_2.jpg').exists())
+
+        failed: dict[Path, Exception] = Archyve.delete(self.archive / '2019', self.archive / 'missing.jpg', workers=2)
+        self.assertEqual(set(failed), {self.archive / '2019', self.archive / 'missing.jpg'})
+
+    def test_across_devices(self):
+        """
+        Test that a move to another device is done by copying, and that an entry can be moved to another device.
+        """
+        real_rename = os.rename
+
+        def rename(source, destination):
+            if Path(destination).parent == self.flat:
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+            return real_rename(source, destination)
+
+        entry: Entry = Entry(self.archive / '2019' / 'img_2.jpg')
+        self.flat.mkdir()
+        with patch('archyve.operations.os.rename', rename):
+            entry.move(self.flat / 'moved.jpg')
+            report: Report = Archyve(self.archive).flatten(self.flat)
+        self.assertEqual((report.done, report.copied), (8, 108))
+        self.assertEqual(entry.path, self.flat / 'moved.jpg')
+        self.assertEqual(entry.path.read_bytes(), b'2019' * 3)
+        self.assertEqual(self.files(self.archive), set())
+        self.assertFalse(any(name.endswith('.part') for name in os.listdir(self.flat)))
+
+    def test_resume_and_rollback(self):
+        """
+        Test that an interrupted run can be resumed (recognising work that was done but not recorded), and that a run
+        can be rolled back.
+        """
+        before: set[str] = self.files(self.archive)
+        plan: list[Operation] = flatten_plan(sorted(p for p in self.archive.rglob('*') if p.is_file()), self.flat)
+        (self.root / 'junk.tmp').write_bytes(b'junk')
+        plan.append(Operation.delete(self.root / 'junk.tmp'))
+
+        # Pretend the run was killed after doing the first four moves and recording only the first two.
+        journal: Journal = Journal(self.journal)
+        journal.start(plan)
+        self.flat.mkdir()
+        for i, op in enumerate(plan[:4]):
+            os.rename(op.source, op.destination)
+            if i < 2:
+                journal.record(i)
+        journal.close()
+        with open(self.journal, 'a') as f:
+            f.write('{"done": 4')  # Cut short
+
+        report: Report = resume(self.journal, workers=2)
+        self.assertEqual((report.done, report.failed), (8, {}))
+        self.assertEqual(len(self.files(self.flat)), 9)
+        self.assertFalse((self.root / 'junk.tmp').exists())
+
+        report: Report = rollback(self.journal)
+        self.assertEqual((report.done, list(report.failed)), (9, [str(self.root / 'junk.tmp')]))
+        self.assertEqual(self.files(self.archive), before)
+        self.assertEqual(self.files(self.flat), set())
+
+
+    def test_rollback_chained(self):
+        """
+        Test that moves into a path another move vacated are undone in order, and that only completed moves are undone.
+        """
+        x, y, z = (self.root / n for n in ('x', 'y', 'z'))
+        x.write_bytes(b'x')
+        z.write_bytes(b'z')
+        report: Report = execute([Operation.move(x, y), Operation.move(z, x)], journal=self.journal)
+        self.assertEqual((report.done, report.failed), (2, {}))
+        report = rollback(self.journal)
+        self.assertEqual((report.done, report.failed), (2, {}))
+        self.assertEqual((x.read_bytes(), z.read_bytes(), y.exists()), (b'x', b'z', False))
+
+        # A move that never ran isn't undone, even if its destination exists and its source doesn't.
+        journal: Journal = Journal(self.journal)
+        journal.start([Operation.move(z, y)])
+        journal.close()
+        y.write_bytes(b'y')
+        z.unlink()
+        self.assertEqual(rollback(self.journal).done, 0)
+        self.assertTrue(y.exists())
+
+        # A move whose destination has gone since is reported, not skipped.
+        execute([Operation.move(x, self.root / 'w')], journal=self.journal)
+        (self.root / 'w').unlink()
+        self.assertEqual(list(rollback(self.journal).failed), [str(self.root / 'w')])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""
+Module contains unit tests for the parallel module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.parallel import ordered_starmap
+from unittest import TestCase, main
+from operator import mul
+
+
+class TestOrderedStarmap(TestCase):
+    def test_order(self):
+        """
+        Test that results come back in the order of their arguments whichever backend is used.
+        """
+        expected: list[int] = [i * 3 for i in range(500)]
+        arguments: list[tuple[int, int]] = [(i, 3) for i in range(500)]
+        self.assertEqual(list(ordered_starmap(mul, arguments)), expected)
+        self.assertEqual(list(ordered_starmap(mul, arguments, workers=4, max_pending=2)), expected)
+        self.assertEqual(list(ordered_starmap(mul, iter(arguments), workers=2, backend='process')), expected)
+
+    def test_unknown_backend(self):
+        """
+        Test that asking for a backend that doesn't exist fails loudly.
+        """
+        self.assertRaises(ValueError, list, ordered_starmap(mul, [(1, 2)], workers=2, backend='fibre'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Module contains unit tests for the query module, and the filters archyves push down into their walks.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.query import EXTENSION, SIZE, TYPE, Predicate, Query
+from archyve.instrumentation import Metrics, observe
+from archyve import file_structure_functions
+from archyve.tests.run_unit_tests import ArchiveTestCase, names
+from unittest import main
+from unittest.mock import patch
+from archyve.archyve import Archyve
+from archyve.entry import Entry, EntryType
+from archyve.table import EntryTable
+from pathlib import Path
+
+
+class TestQuery(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.a: Path = self.root / 'a'
+        self.b: Path = self.root / 'b'
+        for path, size in (('a/x.jpg', 100), ('a/y.mp4', 200), ('a/z.txt', 50), ('a/sub/w.JPG', 10),
+                           ('b/v.mov', 300), ('b/q.png', 5), ('b/r', 1)):
+            (self.root / path).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / path).write_bytes(b'.' * size)
+
+    def test_query(self):
+        """
+        Test that a query gives the same answers for the files of a walk and for the rows of a table, and that its
+        branches only apply below their own directories.
+        """
+        query: Query = Query().where(Predicate(TYPE, frozenset({EntryType.IMAGE}))).within([str(self.a)]) | \
+            Query().where(Predicate(SIZE, (100, None)), Predicate(EXTENSION, frozenset({'.mov', ''})))
+        files = list(file_structure_functions.scan(self.root))
+        accepted: list[str] = sorted(f.name for f in files if query.accepts(f))
+        self.assertEqual(accepted, ['v.mov', 'w.JPG', 'x.jpg'])
+        self.assertEqual(sorted(f.name for f in file_structure_functions.scan(self.root, accept=query.accepts)),
+                         accepted)
+        table: EntryTable = EntryTable.from_walk(files)
+        self.assertEqual(sorted(table.names[r] for r in query.rows(table, range(len(table)))), accepted)
+        self.assertEqual(names(e for e in table.entries(range(len(table))) if query.accepts(e)), accepted)
+
+    def test_pushdown(self):
+        """
+        Test that type filters and where() turn files away during the walk, before entries are made for them, and agree
+        with the same filters on a materialized archyve and on entries.
+        """
+        metrics: Metrics = Metrics()
+        with observe(metrics), patch('archyve.archyve.Entry', wraps=Entry) as made:
+            self.assertEqual(names(Archyve(self.a).images), ['w.JPG', 'x.jpg'])
+        self.assertEqual(metrics.files_discovered, 2)
+        self.assertEqual(made.call_count, 2)
+
+        filters: list[dict] = [{'extensions': ['jpg', '.MP4']}, {'min_size': 50, 'max_size': 100},
+                               {'path': ['sub', 'x.'], 'any_all': any}, {'path': '*.jp*g', 'kind': 'glob'}]
+        for arguments in filters:
+            with self.subTest(**arguments):
+                pushed: list[str] = names(Archyve(self.a).where(**arguments))
+                materialized: list[str] = names(Archyve(self.a, materialize=True).where(**arguments))
+                archyve: Archyve = Archyve(self.a)
+                archyve.entries = (e for e in archyve.entries)  # Replaced by a generator, so entries are checked.
+                self.assertEqual(pushed, materialized)
+                self.assertEqual(pushed, names(archyve.where(**arguments)))
+        self.assertEqual(names(Archyve(self.a).where(EntryType.VIDEO, EntryType.TEXT)), ['y.mp4', 'z.txt'])
+        self.assertEqual(names(Archyve(self.a).images.where(max_size=50)), ['w.JPG'])
+
+        # Filters on an archyve that isn't walked yet still apply once it is materialized, and reset removes them.
+        archyve: Archyve = Archyve(self.a).videos
+        self.assertEqual(names(archyve.materialize()), ['y.mp4'])
+        archyve.reset()
+        self.assertEqual(len(archyve), 4)
+        self.assertRaises(ValueError, Archyve(self.a).where, path='x', kind='regex')
+
+    def test_union(self):
+        """
+        Test that adding filtered archyves that haven't been walked yet walks each directory once, and gives each side
+        only the files from its own directories.
+        """
+        with patch('archyve.file_structure_functions._listing', wraps=file_structure_functions._listing) as listed:
+            union: Archyve = Archyve(self.a).images + Archyve(self.b).images + Archyve(self.a).videos
+            self.assertEqual(names(union), ['q.png', 'w.JPG', 'x.jpg', 'y.mp4'])
+        self.assertEqual(listed.call_count, 3)  # a, a/sub and b
+
+        self.assertEqual(names(Archyve(self.a).images + Archyve(self.b)), ['q.png', 'r', 'v.mov', 'w.JPG', 'x.jpg'])
+        self.assertEqual(names(Archyve(self.a).images + Archyve(self.a, max_depth=0).texts), ['w.JPG', 'x.jpg',
+                                                                                               'z.txt'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Module contains unit tests for the similarity module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.similarity import ALGORITHMS, BKTree, clusters, hamming, hash_key, image_hash
+from archyve.tests.run_unit_tests import TEST_MATERIALS
+from tempfile import TemporaryDirectory
+from archyve.cache import EntryCache
+from unittest import TestCase, main
+from archyve.archyve import Archyve
+from archyve.entry import Entry
+from random import Random
+from pathlib import Path
+from typing import Final
+from PIL import Image
+
+
+ENTRY_TEST_MATS: Final[Path] = TEST_MATERIALS / 'entry'
+
+
+class TestImageHashes(TestCase):
+    def test_copies(self):
+        """
+        Test that resized, re-encoded and metadata stripped copies of a photo hash close to it, and other images don't.
+        """
+        original: Path = ENTRY_TEST_MATS / 'image_with_exif.jpg'
+        other: Path = TEST_MATERIALS / 'images' / 'images_sub_dir' / 'black_square_with_cross.jpg'
+        with TemporaryDirectory() as tmp, Image.open(original) as img:
+            small: Path = Path(tmp) / 'small.jpg'
+            img.resize((img.width // 5, img.height // 5)).save(small, quality=60)
+            png: Path = Path(tmp) / 'stripped.png'
+            img.resize((img.width // 3, img.height // 3)).save(png)
+            for algorithm in ALGORITHMS:
+                value: int = image_hash(original, algorithm)
+                self.assertLessEqual(hamming(value, image_hash(small, algorithm)), 6)
+                self.assertLessEqual(hamming(value, image_hash(png, algorithm)), 6)
+                self.assertGreater(hamming(value, image_hash(other, algorithm)), 10)
+        self.assertIsNone(image_hash(ENTRY_TEST_MATS / 'image.jpg'))  # Empty
+        self.assertRaises(ValueError, image_hash, original, 'not_an_algorithm')
+
+    def test_bk_tree(self):
+        """
+        Test that searching the tree finds exactly what comparing with every hash would.
+        """
+        rng: Random = Random(0)
+        values: list[int] = [rng.getrandbits(64) for _ in range(500)]
+        values += [v ^ (1 << rng.randrange(64)) for v in values[:100]]  # Near copies
+        tree: BKTree[int] = BKTree()
+        for i, v in enumerate(values):
+            tree.add(v, i)
+        self.assertEqual(len(tree), len(values))
+        for target in values[:50]:
+            self.assertEqual(sorted(tree.search(target, 8)),
+                             sorted((hamming(target, v), i) for i, v in enumerate(values) if hamming(target, v) <= 8))
+
+    def test_clusters(self):
+        """
+        Test that items are grouped with everything within the threshold of any member of their group.
+        """
+        self.assertEqual(clusters([('a', 0b0000), ('b', 0b0001), ('c', 0b0011), ('d', 0b1100), ('e', None)], 1),
+                         [['a', 'b', 'c']])
+
+    def test_similar_images(self):
+        """
+        Test that an archyve groups the images that look alike, and that their hashes are cached.
+        """
+        groups: list[list[Entry]] = Archyve(TEST_MATERIALS / 'images', workers=2).similar_images(threshold=4)
+        self.assertEqual([sorted({e.name for e in g}) for g in groups],
+                         [['black_square.jpg', 'black_square1.jpg', 'black_square2.jpg', 'black_square3.jpg'],
+                          ['black_square_with_one_line.jpg', 'black_square_with_one_line1.jpg',
+                           'black_square_with_one_line2.jpg']])
+
+        with TemporaryDirectory() as tmp, EntryCache(Path(tmp) / 'cache.sqlite') as cache:
+            Archyve(TEST_MATERIALS / 'images', cache=cache).similar_images()
+            again: Archyve = Archyve(TEST_MATERIALS / 'images', cache=cache)
+            self.assertTrue(all(e.cached_digest(hash_key('phash')) is not None for e in again.images))
+
+
+if __name__ == '__main__':
+    main()
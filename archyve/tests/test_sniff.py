@@ -0,0 +1,97 @@
+"""
+Module contains unit tests for the sniff module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.sniff import sniff, sniff_header, sniff_many
+from archyve.tests.run_unit_tests import ArchiveTestCase, TEST_MATERIALS
+from archyve.entry import Entry, EntryType
+from unittest import main
+from archyve.archyve import Archyve
+from pathlib import Path
+from typing import Final
+
+
+ENTRY_TEST_MATS: Final[Path] = TEST_MATERIALS / 'entry'
+
+
+class TestSniff(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        (self.archive / 'photo.JPG').write_bytes((ENTRY_TEST_MATS / 'black_square.jpg').read_bytes())
+        (self.archive / 'photo_without_extension').write_bytes((ENTRY_TEST_MATS / 'black_square.jpg').read_bytes())
+        (self.archive / 'song.txt').write_bytes(b'RIFF\x24\x00\x00\x00WAVEfmt ' + bytes(9000))
+        (self.archive / 'notes.txt').write_bytes(b'Remember the milk.\n' * 500)
+        (self.archive / 'empty.mp4').write_bytes(b'')
+        (self.archive / 'bmw.txt').write_bytes(b'BMW service log\n' * 100)
+        (self.archive / 'flv.txt').write_bytes(b'FLV notes\n' * 100)
+
+    def test_headers(self):
+        """
+        Test that common signatures are recognised, including the containers that hold different kinds of media.
+        """
+        self.assertEqual(sniff_header(b'\x89PNG\r\n\x1a\n\x00\x00'), EntryType.IMAGE)
+        self.assertEqual(sniff_header(b'RIFF\x00\x00\x00\x00WEBPVP8 '), EntryType.IMAGE)
+        self.assertEqual(sniff_header(b'RIFF\x00\x00\x00\x00AVI LIST'), EntryType.VIDEO)
+        self.assertEqual(sniff_header(b'\x00\x00\x00\x18ftypheic'), EntryType.IMAGE)
+        self.assertEqual(sniff_header(b'\x00\x00\x00\x18ftypM4A '), EntryType.AUDIO)
+        self.assertEqual(sniff_header(b'\x00\x00\x00\x18ftypisom'), EntryType.VIDEO)
+        self.assertEqual(sniff_header(b'ID3\x04\x00'), EntryType.AUDIO)
+        self.assertEqual(sniff_header(b'\xff\xfb\x90\x64'), EntryType.AUDIO)
+        self.assertEqual(sniff_header(b'%PDF-1.7'), EntryType.TEXT)
+        self.assertEqual(sniff_header('Grüße\n'.encode()[:6]), EntryType.TEXT)  # Cut mid character
+        self.assertIsNone(sniff_header(b'\x00\x01\x02\x03binary'))
+
+        # Short signatures only count when the fields after them hold up, so text that begins with them is still text.
+        self.assertEqual(sniff_header(b'BM\x36\x00\x0c\x00\x00\x00\x00\x00\x36\x00\x00\x00\x28\x00\x00\x00'),
+                         EntryType.IMAGE)
+        self.assertEqual(sniff_header(b'FLV\x01\x05\x00\x00\x00\x09'), EntryType.VIDEO)
+        self.assertEqual(sniff_header(b'CWS\x0a\x8c\x2b\x00\x00\x78\x9c'), EntryType.VIDEO)
+        for text in (b'BMW service log, March\n', b'FLV notes: check the encoder\n', b'FWS 2023 budget\n',
+                     b'CWS\tcolumn one\n', b'ZWS'):
+            with self.subTest(text=text):
+                self.assertEqual(sniff_header(text), EntryType.TEXT)
+        self.assertIsNone(sniff_header(b''))
+
+    def test_entries(self):
+        """
+        Test that extensions are matched whatever their case, that content types find mislabelled files, and that
+        files whose contents aren't recognised fall back to their extensions.
+        """
+        self.assertEqual(Entry(self.archive / 'photo.JPG').entry_type, EntryType.IMAGE)
+        self.assertEqual(Entry(self.archive / 'photo_without_extension').entry_type, EntryType.UNKNOWN)
+        self.assertEqual(Entry(self.archive / 'photo_without_extension').content_type, EntryType.IMAGE)
+        self.assertEqual(Entry(self.archive / 'song.txt').content_type, EntryType.AUDIO)
+        self.assertEqual(Entry(self.archive / 'empty.mp4').content_type, EntryType.VIDEO)
+        self.assertIsNone(sniff(self.archive / 'missing'))
+
+        paths: list[Path] = sorted(self.archive.iterdir())
+        self.assertEqual(list(sniff_many(paths, workers=3)), [sniff(p) for p in paths])
+
+    def test_archyve(self):
+        """
+        Test that the type filters go by content when asked to, whether walked or materialized.
+        """
+        self.assertEqual({e.name for e in Archyve(self.archive).images}, {'photo.JPG'})
+        for materialize in (False, True):
+            archyve: Archyve = Archyve(self.archive, type_detection='content', workers=2, materialize=materialize)
+            self.assertEqual({e.name for e in archyve.images}, {'photo.JPG', 'photo_without_extension'})
+            archyve: Archyve = Archyve(self.archive, type_detection='content', materialize=materialize)
+            self.assertEqual({e.name for e in archyve.audios}, {'song.txt'})
+            self.assertNotIn('flv.txt', {e.name for e in archyve.videos})
+        self.assertRaises(ValueError, Archyve, self.archive, type_detection='guess')
+
+    def test_shared_header(self):
+        """
+        Test that a duplicate search classifies the files it reads the start of, so they don't need reading again.
+        """
+        archyve: Archyve = Archyve(self.archive, type_detection='content', materialize=True)
+        (self.archive / 'song_copy').write_bytes((self.archive / 'song.txt').read_bytes())
+        archyve.duplicates(block_size=1024)
+        types: dict[str, EntryType | None] = {e.name: e.cached_content_type() for e in archyve}
+        self.assertEqual(types['song.txt'], EntryType.AUDIO)
+        self.assertEqual(types['song_copy'], EntryType.AUDIO)
+
+
+if __name__ == '__main__':
+    main()
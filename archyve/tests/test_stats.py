@@ -0,0 +1,109 @@
+"""
+Module contains unit tests for the stats module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.stats import Summary, redundant_rows, summarize
+from contextlib import nullcontext
+from archyve.table import EntryTable
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from unittest.mock import patch
+from archyve.archyve import Archyve
+from datetime import datetime, timezone
+from pathlib import Path
+import os
+
+
+class TestStats(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        files: dict[str, tuple[bytes, datetime]] = {
+            '2023/march/a.jpg': (b'a' * 3000, datetime(2023, 3, 1)),
+            '2023/march/b.JPG': (b'a' * 3000, datetime(2023, 3, 20)),
+            '2023/may/c.mp4': (b'c' * 5000, datetime(2023, 5, 2)),
+            '2024/d.jpg': (b'a' * 3000, datetime(2024, 1, 9)),
+            '2024/e.txt': (b'e' * 10, datetime(2024, 1, 9)),
+            'f': (b'f' * 7, datetime(2024, 6, 30)),
+        }
+        for name, (contents, modified) in files.items():
+            path: Path = self.archive / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(contents)
+            timestamp: float = modified.replace(hour=12, tzinfo=timezone.utc).timestamp()
+            os.utime(path, (timestamp, timestamp))
+        # A hard link to a copy takes up no more space, so isn't wasted.
+        os.link(self.archive / '2024' / 'd.jpg', self.archive / '2024' / 'g.jpg')
+
+    def test_summarize(self):
+        """
+        Test grouping on each key, and on several at once, with and without NumPy.
+        """
+        for numpy in (True, False):
+            with self.subTest(numpy=numpy), patch('archyve.stats.numpy', None) if not numpy else nullcontext():
+                summary: Summary = Archyve(self.archive).summarize(by='type')
+                self.assertEqual(summary.columns, ('type', 'files', 'bytes'))
+                self.assertEqual(summary.rows, [('image', 4, 12000), ('text', 1, 10), ('unknown', 1, 7),
+                                                ('video', 1, 5000)])
+                self.assertEqual(summary.total('files'), 7)
+
+                archyve: Archyve = Archyve(self.archive, materialize=True)
+                self.assertEqual(archyve.summarize(by=('year', 'extension')).rows,
+                                 [('2023', '.jpg', 2, 6000), ('2023', '.mp4', 1, 5000), ('2024', '', 1, 7),
+                                  ('2024', '.jpg', 2, 6000), ('2024', '.txt', 1, 10)])
+                self.assertEqual([(r['month'], r['files']) for r in archyve.summarize(by='month')],
+                                 [('2023-03', 2), ('2023-05', 1), ('2024-01', 3), ('2024-06', 1)])
+                self.assertEqual(len(archyve.summarize(by='day')), 5)
+                self.assertEqual(archyve.summarize(by='directory', depth=1).rows,
+                                 [(str(self.archive), 1, 7), (str(self.archive / '2023'), 3, 11000),
+                                  (str(self.archive / '2024'), 3, 6010)])
+                self.assertEqual(archyve.summarize(by='directory')[str(self.archive / '2023' / 'may')]['bytes'], 5000)
+                self.assertEqual(archyve.videos.summarize().rows, [('video', 1, 5000)])
+
+        # A relative directory is shortened to depth just as an absolute one is.
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.root)
+        self.assertEqual(Archyve('archive').summarize(by='directory', depth=1).rows,
+                         [(str(self.archive.resolve() / d), n, b) for d, n, b in (('', 1, 7), ('2023', 3, 11000),
+                                                                                  ('2024', 3, 6010))])
+
+    def test_duplicates(self):
+        """
+        Test that every copy of a file but the first is counted as wasted, except hard links to a copy already counted.
+        """
+        for numpy in (True, False):
+            with self.subTest(numpy=numpy), patch('archyve.stats.numpy', None) if not numpy else nullcontext():
+                summary: Summary = Archyve(self.archive).summarize(by='directory', depth=1, duplicates=True)
+                self.assertEqual(summary.columns, ('directory', 'files', 'bytes', 'copies', 'wasted_bytes'))
+                self.assertEqual(summary.total('copies'), 2)
+                self.assertEqual(summary.total('wasted_bytes'), 6000)
+                top: Summary = summary.top('wasted_bytes', 1)
+                self.assertEqual(len(top), 1)
+                self.assertEqual(top.rows[0][3:], (1, 3000))
+                self.assertIn('wasted_bytes', str(summary))
+
+    def test_devices(self):
+        """
+        Test that files on different devices are never taken for hard links, even when their inode numbers match.
+        """
+        table: EntryTable = EntryTable()
+        for path, device, inode in (('a', 1, 10), ('b', 2, 10), ('c', 1, 10), ('d', 1, 0), ('e', 1, 0)):
+            stat: os.stat_result = os.stat_result((0, inode, device, 1, 0, 0, 100, 0, 0, 0),
+                                                  {'st_mtime_ns': 0, 'st_ctime_ns': 0})
+            table.append(os.path.join(self.root, path), stat)
+        group: list[Path] = [self.root / p for p in 'abcde']
+        # 'c' is a link to 'a'; 'b' is another file with the same inode number; 'd' and 'e' have no inode numbers.
+        self.assertEqual(redundant_rows(table, range(len(table)), [group]), {1, 3, 4})
+        self.assertEqual(table.stat(1).st_dev, 2)
+
+    def test_errors(self):
+        """
+        Test that unknown keys are refused and that an empty table has an empty summary.
+        """
+        with self.assertRaises(ValueError):
+            Archyve(self.archive).summarize(by='colour')
+        self.assertEqual(summarize(EntryTable(), by=('type', 'year')).rows, [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Module contains unit tests for the verify module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.verify import Verification, identical, verify_group
+from archyve import verify
+from archyve.tests.run_unit_tests import ArchiveTestCase
+from unittest import main
+from unittest.mock import patch
+from archyve.archyve import Archyve
+from pathlib import Path
+import os
+
+
+class TestVerify(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data: bytes = os.urandom(10000)
+        for name, data in (('a', self.data), ('b', self.data), ('c', self.data[:5000] + b'!' + self.data[5001:]),
+                           ('d', self.data[:5000] + b'!' + self.data[5001:]), ('e', b'!' + self.data[1:]),
+                           ('empty_1', b''), ('empty_2', b''), ('short', self.data[:100])):
+            (self.archive / name).write_bytes(data)
+
+    def paths(self, *name: str) -> list[str]:
+        """
+        :param name: The names of files in the archive.
+        :return: Their paths.
+        """
+        return [str(self.archive / n) for n in name]
+
+    def test_verify_group(self):
+        """
+        Test that a group is split wherever its files differ, that exactly the bytes needed are read, and that links
+        to the same file and empty files aren't read at all.
+        """
+        verification: Verification = verify_group(self.paths('c', 'a', 'e', 'short', 'b', 'd', 'missing'), 1000)
+        self.assertEqual(verification.groups, [self.paths('c', 'd'), self.paths('a', 'b')])
+        # The first blocks tell 'e' apart, and 'short' is set aside by its size; the others are read whole.
+        self.assertEqual(verification.bytes_read, 1000 + 4 * 10000)
+        self.assertEqual(list(verification.failed), self.paths('missing'))
+        self.assertIsInstance(verification.failed[self.paths('missing')[0]], FileNotFoundError)
+
+        # Reading stops as soon as no two files can be identical ('c' differs from 'a' at byte 5000).
+        self.assertEqual(verify_group(self.paths('a', 'c', 'e'), 1000), Verification([], 1000 * 3 + 2 * 5000, {}))
+
+        os.link(self.archive / 'a', self.archive / 'link')
+        self.assertEqual(verify_group(self.paths('a', 'link', 'empty_1', 'empty_2')),
+                         Verification([self.paths('a', 'link'), self.paths('empty_1', 'empty_2')], 0, {}))
+        self.assertTrue(identical(self.archive / 'a', self.archive / 'b'))
+        self.assertFalse(identical(self.archive / 'a', self.archive / 'd'))
+        self.assertRaises(FileNotFoundError, identical, self.archive / 'a', self.archive / 'missing')
+
+    def test_batches(self):
+        """
+        Test that groups too big to map at once are verified in batches with the same result.
+        """
+        names: list[str] = ['e', 'a', 'c', 'short', 'b', 'd', 'empty_1', 'a', 'b', 'empty_2', 'c'] * 3
+        expected: Verification = verify_group(self.paths(*names))
+        with patch('archyve.verify.MAX_OPEN', 4):
+            batched: Verification = verify_group(self.paths(*names))
+        self.assertEqual(batched.groups, expected.groups)
+        self.assertEqual([len(g) for g in expected.groups], [3, 3 * 4, 3 * 3, 3, 3 * 2])  # e, a/b, c/d, short, empty
+        self.assertGreater(batched.bytes_read, expected.bytes_read)  # The earlier classes are read with each batch.
+
+        # However many different files there are, no more than MAX_OPEN are mapped at once.
+        for i in range(40):
+            (self.archive / f'distinct_{i}').write_bytes(i.to_bytes(2, 'big') * 50)
+        names = [f'distinct_{i}' for i in range(40)] + ['a', 'b', 'distinct_7']
+        with patch('archyve.verify.MAX_OPEN', 8), patch('archyve.verify._classes', wraps=verify._classes) as mapped:
+            batched = verify_group(self.paths(*names))
+        self.assertEqual(batched.groups, [self.paths('distinct_7', 'distinct_7'), self.paths('a', 'b')])
+        self.assertLessEqual(max(len(c.args[0]) for c in mapped.call_args_list), 8)
+
+    def test_archyve(self):
+        """
+        Test that a verified duplicate search splits a group whose digests collide, and that deleting against an
+        original only removes true copies of it.
+        """
+        with patch('archyve.archyve.file_digest', return_value=b'collision'):
+            self.assertEqual(len(Archyve(self.archive).duplicates(block_size=1000)), 2)  # a-b-c-d, empty_1-empty_2
+            archyve: Archyve = Archyve(self.archive)
+            groups: list[list[str]] = [sorted(e.name for e in g) for g in archyve.duplicates(1000, verify=True)]
+        self.assertEqual(sorted(groups), [['a', 'b'], ['c', 'd'], ['empty_1', 'empty_2']])
+        self.assertEqual(archyve.bytes_read['verify'], 4 * 10000)
+
+        failed: dict[Path, Exception] = Archyve.delete(self.paths('b', 'c', 'a', 'missing'),
+                                                       original=self.archive / 'a')
+        self.assertEqual(sorted(p.name for p in failed), ['a', 'c', 'missing'])
+        self.assertEqual(sorted(p.name for p in self.archive.iterdir()),
+                         ['a', 'c', 'd', 'e', 'empty_1', 'empty_2', 'short'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Module contains unit tests for the watch module.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.watch import ADDED, MODIFIED, REMOVED, Change, Snapshot, Watch, _Inotify
+from archyve.tests.run_unit_tests import ArchiveTestCase, group_names
+from unittest import main, skipUnless
+from archyve.archyve import Archyve
+from pathlib import Path
+
+
+class TestWatch(ArchiveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot: Path = self.root / 'snapshot.json'
+        (self.archive / 'a.bin').write_bytes(b'a' * 1000)
+        (self.archive / 'b.bin').write_bytes(b'a' * 1000)
+        (self.archive / 'c.bin').write_bytes(b'c' * 2000)
+
+    def test_rescan(self):
+        """
+        Test that a rescan reports what changed since the last one, and nothing when nothing did.
+        """
+        archyve: Archyve = Archyve(self.archive)
+        self.assertEqual([c.kind for c in archyve.rescan(self.snapshot)], [ADDED] * 3)
+        self.assertEqual(archyve.rescan(self.snapshot), [])
+
+        (self.archive / 'a.bin').write_bytes(b'changed')
+        (self.archive / 'b.bin').unlink()
+        (self.archive / 'd.bin').write_bytes(b'new')
+        self.assertEqual(archyve.rescan(self.snapshot),
+                         [Change(MODIFIED, str(self.archive / 'a.bin')), Change(REMOVED, str(self.archive / 'b.bin')),
+                          Change(ADDED, str(self.archive / 'd.bin'))])
+        self.assertEqual(Snapshot.load(self.snapshot).keys(),
+                         {str(self.archive / n) for n in ('a.bin', 'c.bin', 'd.bin')})
+
+    def check_incremental(self, watch: Watch):
+        """
+        Makes changes to the archive and checks the watch keeps the duplicate groups up to date by only hashing what
+        it has to.
+        :param watch: A watch over the archive.
+        """
+        self.assertEqual(group_names(watch.duplicates()), [['a.bin', 'b.bin']])
+
+        # A copy of the unique file: only the two 2000 byte files are hashed.
+        (self.archive / 'sub').mkdir()
+        (self.archive / 'sub' / 'c_copy.bin').write_bytes(b'c' * 2000)
+        self.assertEqual(watch.changes(timeout=5), [Change(ADDED, str(self.archive / 'sub' / 'c_copy.bin'))])
+        self.assertEqual(group_names(watch.duplicates()), [['a.bin', 'b.bin'], ['c.bin', 'c_copy.bin']])
+        self.assertEqual(watch.index.bytes_read, 4000)
+
+        # Changing a file's contents (but not its size) splits its group.
+        (self.archive / 'b.bin').write_bytes(b'b' * 1000)
+        self.assertEqual(watch.changes(timeout=5), [Change(MODIFIED, str(self.archive / 'b.bin'))])
+        self.assertEqual(group_names(watch.duplicates()), [['c.bin', 'c_copy.bin']])
+        self.assertEqual(watch.index.bytes_read, 5000)
+
+        (self.archive / 'c.bin').unlink()
+        self.assertEqual(watch.changes(timeout=5), [Change(REMOVED, str(self.archive / 'c.bin'))])
+        self.assertEqual(watch.duplicates(), [])
+        self.assertEqual(watch.changes(timeout=0.2), [])
+
+    def test_polling(self):
+        """
+        Test that a polling watch updates the duplicate groups incrementally, and keeps its snapshot saved.
+        """
+        with Archyve(self.archive).watch(self.snapshot, interval=0.05, inotify=False) as watch:
+            self.check_incremental(watch)
+        self.assertEqual(Archyve(self.archive).rescan(self.snapshot), [])
+
+    def test_seed(self):
+        """
+        Test that a new watch starts out with the same groups as a duplicate search, empty files included.
+        """
+        (self.archive / 'empty_1.bin').write_bytes(b'')
+        (self.archive / 'empty_2.bin').write_bytes(b'')
+        expected: list[list[str]] = group_names(Archyve(self.archive).duplicates())
+        self.assertEqual(expected, [['a.bin', 'b.bin'], ['empty_1.bin', 'empty_2.bin']])
+        for materialize in (False, True):
+            with self.subTest(materialize=materialize), \
+                    Archyve(self.archive, materialize=materialize).watch(inotify=False) as watch:
+                self.assertEqual(group_names(watch.duplicates()), expected)
+
+    @skipUnless(_Inotify.available(), 'inotify is only available on Linux')
+    def test_inotify(self):
+        """
+        Test that an inotify watch (including of folders made after it started) updates the duplicate groups
+        incrementally.
+        """
+        with Archyve(self.archive, materialize=True).watch() as watch:
+            self.assertIsNotNone(watch._inotify)
+            self.check_incremental(watch)
+
+
+if __name__ == '__main__':
+    main()
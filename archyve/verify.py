@@ -0,0 +1,184 @@
+"""
+Module contains the byte by byte check that the files in a group of duplicates really are identical, rather than just
+sharing a digest, before any of them are removed. Every member of a group is memory-mapped at once and the group is
+compared one block at a time in a single pass, so each file is read once however many copies of it there are
+(comparing each copy with an original in turn reads the original once per copy). A group is split as soon as its
+members' blocks differ, and reading stops as soon as no two members can still be identical. Hard links to the same
+file are identical without being read. Groups of more than MAX_OPEN files are verified in batches instead, and the
+first file of each set of identical files found so far is read again with every batch.
+
+Files must not be truncated while they are being verified: reading a mapping beyond the end of its file raises SIGBUS
+on POSIX.
+
+Usage:
+    verification = verify_group(['a.jpg', 'copy of a.jpg', 'b.jpg'])
+    print(verification.groups, verification.bytes_read)
+
+Author: ali.kellaway139@gmail.com
+"""
+from typing import Final, NamedTuple, Sequence
+from contextlib import ExitStack
+import mmap
+import os
+
+
+# The number of bytes compared at a time. Each block is sliced out of the mappings into a buffer small enough to stay
+# in the CPU's cache; comparing memoryviews of the mappings directly is done item by item, and is several times slower.
+VERIFY_BLOCK: Final[int] = 64 * 1024
+
+# The most files mapped at once (each mapping holds a file descriptor); larger groups are verified in batches.
+MAX_OPEN: Final[int] = 256
+
+
+class Verification(NamedTuple):
+    """
+    The outcome of verifying a group of files.
+    """
+    groups: list[list[str]]  # The groups of files with identical contents (of two or more each), in the order given
+    bytes_read: int  # The number of bytes compared to tell them apart
+    failed: dict[str, Exception]  # The reason each file that couldn't be read couldn't be, by path
+
+
+def _split(maps: dict[int, mmap.mmap], members: list[int], size: int,
+           block_size: int) -> tuple[list[list[int]], int]:
+    """
+    Splits files of the same size into classes with the same contents, one block at a time.
+    :param maps: The mapping of each (non empty) file, by index.
+    :param members: The indices of the files to split.
+    :param size: The size of every file.
+    :param block_size: The number of bytes compared at a time.
+    :return: The classes (including classes of one file), and the number of bytes read.
+    """
+    live: list[list[int]] = [members]
+    settled: list[list[int]] = []
+    read: int = 0
+    for start in range(0, size, block_size):
+        still_live: list[list[int]] = []
+        for group in live:
+            blocks: list[tuple[bytes, list[int]]] = []
+            for i in group:
+                block: bytes = maps[i][start:start + block_size]
+                read += len(block)
+                for reference, same in blocks:
+                    if block == reference:
+                        same.append(i)
+                        break
+                else:
+                    blocks.append((block, [i]))
+            for _, same in blocks:
+                (still_live if len(same) > 1 else settled).append(same)
+        live = still_live
+        if not live:  # No two files can still be identical.
+            break
+    return live + settled, read
+
+
+def _classes(paths: Sequence[str], block_size: int) -> tuple[list[list[int]], int, dict[str, Exception]]:
+    """
+    Maps every file at once and splits them into classes with the same contents.
+    :param paths: The files (no more than MAX_OPEN).
+    :param block_size: The number of bytes compared at a time.
+    :return: The classes of indices into paths (including classes of one file) in the order given, the number of bytes
+             read and the files that couldn't be read.
+    """
+    failed: dict[str, Exception] = {}
+    classes: list[list[int]] = []
+    read: int = 0
+    with ExitStack() as stack:
+        maps: dict[int, mmap.mmap] = {}
+        files: dict[tuple, int] = {}  # The first index of each file, by its size and identity
+        links: dict[int, list[int]] = {}  # The indices of every path to each file, by its first index
+        for i, path in enumerate(paths):
+            try:
+                with open(path, 'rb') as f:
+                    stat: os.stat_result = os.fstat(f.fileno())
+                    identity: tuple = (stat.st_size, stat.st_dev, stat.st_ino) if stat.st_ino else (stat.st_size, i)
+                    if identity in files:  # Another link to a file already mapped.
+                        links[files[identity]].append(i)
+                        continue
+                    if stat.st_size:  # Empty files can't be mapped (and are all the same).
+                        maps[i] = stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                    files[identity], links[i] = i, [i]
+            except (OSError, ValueError) as e:
+                failed[path] = e
+
+        # Files of different sizes can't be identical, so are split before anything is read.
+        sizes: dict[int, list[int]] = {}
+        for identity, first in files.items():
+            sizes.setdefault(identity[0], []).append(first)
+        for size, members in sizes.items():
+            split, split_read = _split(maps, members, size, block_size) if size and len(members) > 1 else \
+                ([members], 0)
+            read += split_read
+            classes += [sorted(j for i in c for j in links[i]) for c in split]
+    return sorted(classes), read, failed
+
+
+def _batched(paths: Sequence[str], block_size: int) -> tuple[list[list[int]], int, dict[str, Exception]]:
+    """
+    Splits more files than can be mapped at once into classes with the same contents: each batch of files is compared
+    with the first file of every class found so far, a chunk of them at a time, so that no more than MAX_OPEN files
+    are ever mapped at once.
+    :param paths: The files.
+    :param block_size: The number of bytes compared at a time.
+    :return: The classes of indices into paths (including classes of one file), the number of bytes read and the
+             files that couldn't be read.
+    """
+    classes: list[list[int]] = []
+    read: int = 0
+    failed: dict[str, Exception] = {}
+    half: int = max(1, MAX_OPEN // 2)
+    for offset in range(0, len(paths), half):
+        remaining: list[int] = list(range(offset, min(offset + half, len(paths))))
+        known: dict[int, list[int]] = {c[0]: c for c in classes}
+        representatives: list[int] = list(known)
+        new: list[list[int]] = []
+        # Compare the batch with each chunk of the classes found so far (or just with itself if there are none yet);
+        # the files that match none of them are split among themselves by the last comparison.
+        for chunk in (representatives[i:i + half] for i in range(0, max(1, len(representatives)), half)):
+            members: list[int] = chunk + remaining
+            batch_classes, batch_read, batch_failed = _classes([paths[i] for i in members], block_size)
+            read += batch_read
+            failed.update(batch_failed)
+            new = []
+            for batch_class in batch_classes:
+                indices: list[int] = [members[i] for i in batch_class]
+                if indices[0] in known:  # The class of an earlier file (classes are in order, so it comes first).
+                    known[indices[0]].extend(indices[1:])
+                else:
+                    new.append(indices)
+            remaining = [i for c in new for i in c]
+            if not remaining:
+                break
+        classes += new
+        if any(paths[c[0]] in failed for c in classes):  # Gone since it was first read.
+            classes = [c for c in ([i for i in c if paths[i] not in failed] for c in classes) if c]
+    return classes, read, failed
+
+
+def verify_group(paths: Sequence[os.PathLike | str], block_size: int = VERIFY_BLOCK) -> Verification:
+    """
+    Splits a group of files into the groups whose contents are identical, comparing them byte by byte. A file that
+    can't be read is left out (see Verification.failed).
+    :param paths: The files, e.g. a group of duplicates found by their digests.
+    :param block_size: The number of bytes compared at a time.
+    :return: The groups of identical files (in the order given, so the first file given is first in its group), the
+             bytes read and the files that couldn't be read.
+    """
+    paths: list[str] = [os.fspath(p) for p in paths]
+    classes, read, failed = _classes(paths, block_size) if len(paths) <= MAX_OPEN else _batched(paths, block_size)
+    return Verification([[paths[i] for i in c] for c in sorted(classes) if len(c) > 1], read, failed)
+
+
+def identical(a: os.PathLike | str, b: os.PathLike | str, buffer_size: int = VERIFY_BLOCK) -> bool:
+    """
+    Compares two files byte by byte.
+    :param a: A file.
+    :param b: Another file.
+    :param buffer_size: The number of bytes compared at a time.
+    :return: Whether the files have the same contents.
+    """
+    verification: Verification = verify_group([a, b], buffer_size)
+    if verification.failed:
+        raise next(iter(verification.failed.values()))
+    return bool(verification.groups)
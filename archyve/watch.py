@@ -0,0 +1,494 @@
+"""
+Module contains the pieces needed to keep an archyve's duplicates up to date as files come and go, without walking and
+hashing everything again:
+    - Snapshot: the size, modification time and inode of every file in a set of directories, which can be saved between
+      runs and compared with a newer snapshot to find what was added, removed or modified.
+    - DuplicateIndex: duplicate groups that are updated one change at a time. Only the files that changed (and files
+      that never needed hashing before because their size was unique) are ever hashed.
+    - Watch: waits for changes (using inotify on Linux, else by polling), and applies them to a snapshot and an index.
+
+Author: ali.kellaway139@gmail.com
+"""
+from archyve.file_structure_functions import _Folder, _Walk
+from archyve.cache import EntryCache, Fingerprint
+from archyve.hashing import DEFAULT_ALGORITHM, file_digest
+from typing import Final, Generator, Iterable, NamedTuple, Sequence
+from archyve.parallel import ordered_starmap
+from archyve.entry import Entry
+from pathlib import Path
+from time import monotonic, sleep
+import ctypes.util
+import select
+import ctypes
+import struct
+import json
+import sys
+import os
+
+
+# The kinds of change.
+ADDED: Final[str] = 'added'
+REMOVED: Final[str] = 'removed'
+MODIFIED: Final[str] = 'modified'
+
+# The inotify events that are listened for (see inotify(7)).
+_IN_CLOSE_WRITE: Final[int] = 0x00000008
+_IN_MOVED_FROM: Final[int] = 0x00000040
+_IN_MOVED_TO: Final[int] = 0x00000080
+_IN_CREATE: Final[int] = 0x00000100
+_IN_DELETE: Final[int] = 0x00000200
+_IN_Q_OVERFLOW: Final[int] = 0x00004000
+_IN_IGNORED: Final[int] = 0x00008000
+_IN_ISDIR: Final[int] = 0x40000000
+_IN_NONBLOCK: Final[int] = 0o4000
+_IN_CLOEXEC: Final[int] = 0o2000000
+_WATCH_MASK: Final[int] = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT: Final[struct.Struct] = struct.Struct('iIII')
+
+
+class Change(NamedTuple):
+    """
+    Something that happened to a file.
+    """
+    kind: str  # ADDED, REMOVED or MODIFIED
+    path: str
+
+
+class Snapshot(dict[str, Fingerprint]):
+    """
+    The fingerprint (size, modification time and inode) of every file in some directories, by path.
+    """
+
+    @staticmethod
+    def take(files: Iterable[os.DirEntry]) -> 'Snapshot':
+        """
+        :param files: The files found by a directory walk (see file_structure_functions.scan).
+        :return: A snapshot of the files.
+        """
+        return Snapshot((f.path, Fingerprint.of(f.stat())) for f in files)
+
+    @staticmethod
+    def load(location: Path | str) -> 'Snapshot':
+        """
+        :param location: Where a snapshot was saved.
+        :return: The snapshot (empty if nothing has been saved there).
+        """
+        try:
+            with open(location) as f:
+                return Snapshot((path, Fingerprint(*fingerprint)) for path, fingerprint in json.load(f).items())
+        except FileNotFoundError:
+            return Snapshot()
+
+    def save(self, location: Path | str) -> None:
+        """
+        Saves the snapshot. The file is replaced in one step, so an interrupted save never leaves half a snapshot.
+        :param location: Where to save the snapshot.
+        """
+        temporary: str = f'{location}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self, f)
+        os.replace(temporary, location)
+
+    def diff(self, newer: 'Snapshot') -> list[Change]:
+        """
+        :param newer: A later snapshot of the same directories.
+        :return: What happened between this snapshot and the newer one (in path order).
+        """
+        changes: list[Change] = [Change(REMOVED, p) for p in self.keys() - newer.keys()]
+        for path, fingerprint in newer.items():
+            old: Fingerprint | None = self.get(path)
+            if old is None:
+                changes.append(Change(ADDED, path))
+            elif old != fingerprint:
+                changes.append(Change(MODIFIED, path))
+        return sorted(changes, key=lambda c: c.path)
+
+
+class DuplicateIndex:
+    """
+    Duplicate groups that are kept up to date one change at a time. Files are bucketed by size; a file is only hashed
+    once another file of the same size turns up (and only the files that need it are hashed, not the whole bucket
+    again).
+    """
+
+    def __init__(self, cache: EntryCache | None = None, workers: int = 1, backend: str = 'thread'):
+        """
+        :param cache: The persistent cache to look for digests in before hashing a file (and to keep them in).
+        :param workers: The number of files to hash at once.
+        :param backend: 'thread' or 'process' (see parallel.ordered_starmap).
+        """
+        self.cache: EntryCache | None = cache
+        self.workers: int = workers
+        self.backend: str = backend
+        self.bytes_read: int = 0
+        self._sizes: dict[str, int] = {}
+        self._buckets: dict[int, set[str]] = {}
+        self._digests: dict[str, bytes] = {}
+        self._groups: dict[tuple[int, bytes], set[str]] = {}
+
+    def seed(self, snapshot: Snapshot, entries: Iterable[Entry]) -> None:
+        """
+        Fills the index from a snapshot, reusing the digests of entries that have been hashed already (e.g. by
+        Archyve.duplicates), so nothing needs to be hashed now.
+        :param snapshot: The files to index.
+        :param entries: Entries that may know their digests.
+        """
+        for path, fingerprint in snapshot.items():
+            self._sizes[path] = fingerprint.size
+            self._buckets.setdefault(fingerprint.size, set()).add(path)
+        for entry in entries:
+            path: str = os.fspath(entry)
+            if path not in self._sizes:
+                continue
+            # Empty files are all equal, so are never hashed (see __digest_all).
+            digest: bytes | None = b'' if not self._sizes[path] else entry.cached_digest()
+            if digest is not None:
+                self.__place(path, digest)
+
+    def apply(self, changes: Sequence[Change], snapshot: Snapshot) -> None:
+        """
+        Updates the groups for a batch of changes.
+        :param changes: What happened.
+        :param snapshot: A snapshot taken after the changes, with the new sizes of the files.
+        """
+        touched: set[int] = set()
+        for kind, path in changes:
+            if kind in (REMOVED, MODIFIED):
+                self.__remove(path)
+            if kind in (ADDED, MODIFIED) and path in snapshot:
+                size: int = snapshot[path].size
+                self._sizes[path] = size
+                self._buckets.setdefault(size, set()).add(path)
+                touched.add(size)
+
+        # Every file in a bucket that now has company needs a digest to be compared by.
+        unhashed: list[str] = [p for size in touched if len(self._buckets.get(size, ())) > 1
+                               for p in sorted(self._buckets[size]) if p not in self._digests]
+        for path, digest in zip(unhashed, self.__digest_all(unhashed)):
+            if digest is not None:
+                self.__place(path, digest)
+
+    def __digest_all(self, paths: list[str]) -> list[bytes | None]:
+        """
+        :param paths: The files to hash (their cached digests are used where they are still valid).
+        :return: The digest of each file in order (None for files that disappeared before they could be read).
+        """
+        digests: dict[str, bytes | None] = {p: b'' for p in paths if not self._sizes[p]}  # Empty files are all equal.
+        entries: dict[str, Entry] = {p: Entry(p, cache=self.cache) for p in paths if p not in digests}
+        missing: list[str] = []
+        for path, entry in entries.items():
+            try:
+                digests[path] = entry.cached_digest()
+            except FileNotFoundError:
+                digests[path] = None
+                continue
+            if digests[path] is None:
+                missing.append(path)
+
+        arguments = ((p, DEFAULT_ALGORITHM) for p in missing)
+        for path, digest in zip(missing, ordered_starmap(_digest_or_none, arguments, self.workers, self.backend)):
+            if digest is not None:
+                entries[path].add_digest(digest)
+                self.bytes_read += self._sizes[path]
+            digests[path] = digest
+        if self.cache is not None:
+            self.cache.flush()
+        return [digests[p] for p in paths]
+
+    def __place(self, path: str, digest: bytes) -> None:
+        """
+        :param path: A file.
+        :param digest: Its digest.
+        """
+        self._digests[path] = digest
+        self._groups.setdefault((self._sizes[path], digest), set()).add(path)
+
+    def __remove(self, path: str) -> None:
+        """
+        :param path: A file that is no longer (or no longer as it was) in the index.
+        """
+        size: int | None = self._sizes.pop(path, None)
+        if size is None:
+            return
+        self._buckets[size].discard(path)
+        if not self._buckets[size]:
+            del self._buckets[size]
+        digest: bytes | None = self._digests.pop(path, None)
+        if digest is not None:
+            group: set[str] = self._groups[size, digest]
+            group.discard(path)
+            if not group:
+                del self._groups[size, digest]
+
+    def duplicates(self) -> list[list[Entry]]:
+        """
+        :return: The current groups of files with the same contents (each group and the groups themselves in path
+                 order).
+        """
+        groups: list[list[str]] = sorted(sorted(g) for g in self._groups.values() if len(g) > 1)
+        return [[Entry(p, cache=self.cache, memo={DEFAULT_ALGORITHM: self._digests[p]}) for p in g] for g in groups]
+
+
+def _digest_or_none(path: str, algorithm: str) -> bytes | None:
+    """
+    :param path: A file.
+    :param algorithm: The hash algorithm.
+    :return: The digest of the file, or None if it has gone (files can vanish between an event and its handling).
+    """
+    try:
+        return file_digest(path, algorithm)
+    except FileNotFoundError:
+        return None
+
+
+class _Inotify:
+    """
+    A thin wrapper around Linux's inotify, which tells us when files in the watched directories change.
+    """
+
+    def __init__(self):
+        self._libc: ctypes.CDLL = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd: int = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders: dict[int, _Folder] = {}
+
+    @staticmethod
+    def available() -> bool:
+        """
+        :return: Whether inotify can be used here.
+        """
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            return hasattr(ctypes.CDLL(ctypes.util.find_library('c')), 'inotify_init1')
+        except OSError:
+            return False
+
+    def add(self, folder: _Folder) -> None:
+        """
+        :param folder: A folder to watch.
+        """
+        wd: int = self._libc.inotify_add_watch(self.fd, os.fsencode(folder[0]), _WATCH_MASK)
+        if wd >= 0:  # The folder may have gone already.
+            self.folders[wd] = folder
+
+    def read(self, timeout: float | None) -> list[tuple[_Folder | None, int, str]] | None:
+        """
+        :param timeout: How many seconds to wait for an event (forever if None).
+        :return: The folder, mask and name of each event (the folder is None when the kernel dropped events), or None
+                 if nothing happened within the timeout.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return None
+        try:
+            data: bytes = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events: list[tuple[_Folder | None, int, str]] = []
+        offset: int = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name: str = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\x00'))
+            offset += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                events.append((None, mask, ''))
+            elif mask & _IN_IGNORED:
+                self.folders.pop(wd, None)
+            elif wd in self.folders:
+                events.append((self.folders[wd], mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Watch:
+    """
+    Keeps a snapshot and the duplicate groups of some directories up to date as their files change. Iterating a watch
+    waits for changes and yields them a batch at a time; the groups (see duplicates) already include each batch when it
+    is yielded.
+    """
+
+    def __init__(self, directories: Sequence[Path | str], snapshot: Snapshot, index: DuplicateIndex,
+                 include: Sequence[str] = (), exclude: Sequence[str] = (), max_depth: int | None = None,
+                 interval: float = 1.0, inotify: bool = True, settle: float = 0.1, location: Path | str | None = None):
+        """
+        :param directories: The directories to watch.
+        :param snapshot: A snapshot of the directories as they are now.
+        :param index: The duplicate groups of the directories as they are now.
+        :param include: Glob patterns a file must match (any of) to be watched.
+        :param exclude: Glob patterns for files and directories to ignore.
+        :param max_depth: How many levels of sub-folders to watch.
+        :param interval: How many seconds to wait between looks when polling.
+        :param inotify: Whether to use inotify when it is available (otherwise the directories are polled).
+        :param settle: How many seconds to wait after an event for others that belong in the same batch.
+        :param location: Where to keep the snapshot saved (after every batch of changes), if anywhere.
+        """
+        self.snapshot: Snapshot = snapshot
+        self.index: DuplicateIndex = index
+        self.interval: float = interval
+        self.settle: float = settle
+        self.location: Path | str | None = location
+        self._settings: tuple = (tuple(include), tuple(exclude), max_depth)
+        self._roots: list[_Folder] = [_Walk(*self._settings).root(d) for d in directories]
+        self._pending: list[Change] = []
+        self._inotify: _Inotify | None = None
+        if inotify and _Inotify.available():
+            self._inotify = _Inotify()
+            for root in self._roots:
+                self.__watch_tree(root)
+            # Anything that changed while the watches were being added would otherwise be missed.
+            self._pending = self.__rescan()
+
+    def __walk(self) -> Generator[os.DirEntry, None, None]:
+        """
+        :return: A generator of every file being watched.
+        """
+        for root in self._roots:
+            yield from _Walk(*self._settings).walk(root)
+
+    def __rescan(self) -> list[Change]:
+        """
+        :return: The changes found by walking the directories again and comparing them with the snapshot.
+        """
+        return self.snapshot.diff(Snapshot.take(self.__walk()))
+
+    def __watch_tree(self, folder: _Folder) -> list[str]:
+        """
+        Watches a folder and every folder below it.
+        :param folder: The folder.
+        :return: The files found in the folders.
+        """
+        walk: _Walk = _Walk(*self._settings)
+        files: list[str] = []
+        stack: list[_Folder] = [folder]
+        while stack:
+            current: _Folder = stack.pop()
+            self._inotify.add(current)
+            try:
+                found, sub_folders = walk.list(current)
+            except FileNotFoundError:
+                continue
+            files.extend(f.path for f in found)
+            stack.extend(sub_folders)
+        return files
+
+    def __reconcile(self, paths: Iterable[str]) -> list[Change]:
+        """
+        Compares what is on disk now with the snapshot for some paths.
+        :param paths: The paths that may have changed (files, or folders whose files may all have changed).
+        :return: What happened to them.
+        """
+        changes: list[Change] = []
+        for path in sorted(set(paths)):
+            old: Fingerprint | None = self.snapshot.get(path)
+            try:
+                stat: os.stat_result = os.stat(path)
+                new: Fingerprint | None = Fingerprint.of(stat) if os.path.isfile(path) else None
+            except OSError:
+                new: Fingerprint | None = None
+            if new is not None and not self.__accepts(path):
+                new = None
+            if old is None and new is not None:
+                changes.append(Change(ADDED, path))
+            elif old is not None and new is None:
+                changes.append(Change(REMOVED, path))
+            elif old != new:
+                changes.append(Change(MODIFIED, path))
+        return changes
+
+    def __accepts(self, path: str) -> bool:
+        """
+        :param path: A file below one of the roots.
+        :return: Whether the watch's settings include the file.
+        """
+        for root, _, _ in self._roots:
+            if path.startswith(root + os.sep):
+                return _Walk(*self._settings).accepts(os.path.relpath(path, root).replace(os.sep, '/'))
+        return False
+
+    def __inotify_changes(self, timeout: float | None) -> list[Change]:
+        """
+        :param timeout: How many seconds to wait for something to happen (forever if None).
+        :return: The changes that inotify reported.
+        """
+        events = self._inotify.read(timeout)
+        if events is None:
+            return []
+        # Let the rest of a burst of events arrive so that they are handled together.
+        deadline: float = monotonic() + self.settle
+        while (remaining := deadline - monotonic()) > 0 and (more := self._inotify.read(remaining)) is not None:
+            events.extend(more)
+
+        dirty: list[str] = []
+        for folder, mask, name in events:
+            if folder is None:  # The kernel dropped events, so we don't know what changed.
+                return self.__rescan()
+            path: str = os.path.join(folder[0], name)
+            if not mask & _IN_ISDIR:
+                dirty.append(path)
+            elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                relative: str = f'{folder[1]}{name}'
+                if _Walk(*self._settings).accepts(relative, directory=True):
+                    dirty.extend(self.__watch_tree((path, f'{relative}/', folder[2] + 1)))
+            else:  # A folder was deleted or moved away: everything we knew below it may have gone.
+                dirty.extend(p for p in self.snapshot if p.startswith(path + os.sep))
+        return self.__reconcile(dirty)
+
+    def changes(self, timeout: float | None = None) -> list[Change]:
+        """
+        Waits for files to change, then updates the snapshot and the duplicate groups.
+        :param timeout: How many seconds to wait (forever if None).
+        :return: What changed (empty if nothing did within the timeout).
+        """
+        changes: list[Change] = self._pending
+        self._pending = []
+        if not changes:
+            if self._inotify is not None:
+                changes = self.__inotify_changes(timeout)
+            else:
+                deadline: float | None = None if timeout is None else monotonic() + timeout
+                while not (changes := self.__rescan()):
+                    if deadline is not None and monotonic() >= deadline:
+                        break
+                    sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - monotonic())))
+
+        if changes:
+            for kind, path in changes:
+                if kind == REMOVED:
+                    self.snapshot.pop(path, None)
+                else:
+                    try:
+                        self.snapshot[path] = Fingerprint.of(os.stat(path))
+                    except OSError:
+                        self.snapshot.pop(path, None)
+            self.index.apply(changes, self.snapshot)
+            if self.location is not None:
+                self.snapshot.save(self.location)
+        return changes
+
+    def __iter__(self) -> Generator[list[Change], None, None]:
+        while True:
+            if changes := self.changes():
+                yield changes
+
+    def duplicates(self) -> list[list[Entry]]:
+        """
+        :return: The current groups of files with the same contents.
+        """
+        return self.index.duplicates()
+
+    def close(self) -> None:
+        """
+        Stops watching.
+        """
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self) -> 'Watch':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()